@@ -6,6 +6,11 @@ import requests
 from dotenv import load_dotenv
 import sys
 
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from tracing import TracedClient, Tracer
+
 # 加载环境变量
 load_dotenv()
 
@@ -15,11 +20,13 @@ DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 class AdvancedAIAgent:
     def __init__(self):
         self.conversation_history = []
+        # 工具调用与API调用追踪 (默认关闭，设置 tracer.enabled = True 开启)
+        self.tracer = Tracer()
         # 使用OpenAI客户端，配置DeepSeek基础URL
-        self.client = OpenAI(
+        self.client = TracedClient(OpenAI(
             api_key=DEEPSEEK_API_KEY,
             base_url="https://api.deepseek.com"
-        )
+        ), self.tracer)
         self.available_tools = {
             "get_current_time": self.get_current_time,
             "search_weather": self.search_weather,
@@ -51,7 +58,12 @@ class AdvancedAIAgent:
             return f"计算错误: {str(e)}"
     
     def handle_function_call(self, function_call):
-        """处理函数调用"""
+        """处理函数调用 (开启追踪时记录每次调用的耗时、参数和结果大小)"""
+        if self.tracer.enabled:
+            return self.tracer.trace_tool_call(self._call_function, function_call)
+        return self._call_function(function_call)
+    
+    def _call_function(self, function_call):
         function_name = function_call.get("name")
         function_args = {}
         
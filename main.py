@@ -1,15 +1,110 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import time
+
+# 启动计时起点 (--profile-startup)
+_STARTED = time.perf_counter()
+
 import os
 import sys
 import argparse
+import importlib
+import threading
+from concurrent.futures import Future
 from pathlib import Path
 
 # 添加src目录到路径
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from src.reading_type_agent import ReadingTypeAgent
+# openai、pandas 等较重的模块和数据文件在后台线程中加载 (见 start_loading)，
+# 横幅和输入提示符不必等待加载完成
+HEAVY_MODULES = ("dotenv", "openai", "pandas")
+
+
+def load_agent(args, timings: list):
+    """导入智能体模块并创建智能体 (加载编码库和字典)，按步骤记录耗时 [(步骤, 秒)]"""
+    def step(name, func):
+        start = time.perf_counter()
+        result = func()
+        timings.append((name, time.perf_counter() - start))
+        return result
+    
+    for module_name in HEAVY_MODULES:
+        step(f"导入 {module_name}", lambda: importlib.import_module(module_name))
+    module = step("导入 reading_type_agent", lambda: importlib.import_module("src.reading_type_agent"))
+    agent = step("创建智能体 (加载编码库和字典)", module.ReadingTypeAgent)
+    
+    if args.cache:
+        from src.completion_cache import CompletionCache
+        step("打开补全缓存", lambda: agent.enable_completion_cache(CompletionCache(args.cache)))
+    
+    if args.trace:
+        agent.tracer.enabled = True
+    
+    # 命令行的 '缓存统计' 命令显示紧凑工具结果节省的token
+    agent.tool_result_meter.enabled = True
+    
+    # 设置系统消息
+    agent.add_message("system", module.SYSTEM_PROMPT)
+    return agent
+
+
+def start_loading(args, timings: list) -> Future:
+    """在后台线程中加载智能体，返回结果为智能体的Future"""
+    future = Future()
+    
+    def run():
+        try:
+            future.set_result(load_agent(args, timings))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, name="agent-loader", daemon=True).start()
+    return future
+
+
+def print_startup_profile(timings: list, prompt_ready: float, loaded: float):
+    """输出启动耗时 (--profile-startup)"""
+    print("\n⏱️ 启动耗时:")
+    print(f"   • 提示符就绪: {prompt_ready * 1000:.0f}ms")
+    for name, elapsed in timings:
+        print(f"   • {name}: {elapsed * 1000:.0f}ms")
+    print(f"   • 后台加载完成: {loaded * 1000:.0f}ms")
+
+def run_evaluate(args) -> int:
+    """main.py evaluate: 用编码库评估语义解析器"""
+    import json
+    from src.dictionary_manager import DictionaryManager
+    from src.parser_evaluation import evaluate, format_report
+    
+    report = evaluate(args.codes, args.dictionaries, args.parsers, text=args.text,
+                      workers=args.workers, chunk_size=args.chunk_size)
+    for line in format_report(report, DictionaryManager(args.dictionaries)):
+        print(line)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\n📄 评估结果已保存: {args.output}")
+    return 0
+
+def run_encode(args) -> int:
+    """main.py encode: 离线批量编码 (不访问网络，不调用大模型)"""
+    from src.batch_encoder import encode_file, print_progress
+    
+    try:
+        stats = encode_file(args.input, args.output, column=args.column, sheet=args.sheet,
+                            codes_file=args.codes, dictionaries_file=args.dictionaries,
+                            workers=args.workers, chunk_size=args.chunk_size, progress=print_progress)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"❌ 批量编码失败: {e}", file=sys.stderr)
+        return 1
+    print(file=sys.stderr)
+    print(f"✅ 已编码 {stats['rows']:,} 行，结果保存到 {args.output}")
+    print(f"   • 编码库精确匹配: {stats['library']:,}")
+    print(f"   • 本地生成: {stats['generated']:,} (字段组合待核对 {stats['invalid']:,})")
+    print(f"   • 空描述: {stats['empty']:,}")
+    print(f"   • 用时 {stats['seconds']:.2f}s, {stats['rows_per_second']:,.0f} 行/秒")
+    return 0
 
 def main():
     """主函数"""
@@ -18,12 +113,53 @@ def main():
                        help="启用流式输出 (默认开启)")
     parser.add_argument("--no-stream", action="store_true",
                        help="禁用流式输出")
+    parser.add_argument("--timing", action="store_true",
+                       help="每轮回复后显示首token耗时和总耗时")
+    parser.add_argument("--cache", nargs="?", const="completion_cache.sqlite3", metavar="PATH",
+                       help="开启补全缓存，相同的请求直接返回本地缓存的回复 (默认文件 completion_cache.sqlite3)")
+    parser.add_argument("--trace", nargs="?", const="traces.jsonl", metavar="PATH",
+                       help="追踪每次工具调用和API调用，退出时导出到文件 (默认文件 traces.jsonl)")
+    parser.add_argument("--trace-format", choices=["jsonl", "otlp"], default="jsonl",
+                       help="追踪导出格式: jsonl 每行一个span，otlp 为OpenTelemetry OTLP/JSON (默认 jsonl)")
+    parser.add_argument("--profile-startup", action="store_true",
+                       help="显示启动各阶段 (模块导入、数据加载) 的耗时")
+    
+    # 不进入对话的离线命令
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    evaluate = commands.add_parser("evaluate", help="用编码库评估语义解析器的准确率和吞吐量")
+    evaluate.add_argument("--codes", default="reading_type_codes.csv", help="作为标注样本的编码库")
+    evaluate.add_argument("--dictionaries", default="field_dictionaries.csv", help="字段字典")
+    evaluate.add_argument("--parsers", nargs="+", choices=["basic", "enhanced"], default=["basic", "enhanced"],
+                          help="评估的解析器 (默认两个都评估)")
+    evaluate.add_argument("--text", choices=["name", "description", "both"], default="both",
+                          help="样本文本: 编码名称、说明或两者 (默认 both)")
+    evaluate.add_argument("--workers", type=int, help="工作进程数 (默认CPU核数)")
+    evaluate.add_argument("--chunk-size", type=int, default=256, help="每个任务的样本数")
+    evaluate.add_argument("--output", metavar="PATH", help="把评估结果保存为JSON，便于不同提交之间比较")
+    encode = commands.add_parser("encode", help="离线批量编码: 逐行读取量测描述，查编码库或本地生成编码")
+    encode.add_argument("--input", required=True, help="输入文件 (.csv 或 .xlsx)")
+    encode.add_argument("--output", required=True, help="输出CSV文件")
+    encode.add_argument("--column", help="描述所在的列名或列序号 (默认自动识别 description/描述/name/名称 等列)")
+    encode.add_argument("--sheet", help="xlsx的工作表名 (默认第一个)")
+    encode.add_argument("--codes", default="reading_type_codes.csv", help="编码库")
+    encode.add_argument("--dictionaries", default="field_dictionaries.csv", help="字段字典")
+    encode.add_argument("--workers", type=int, help="工作进程数 (默认CPU核数)")
+    encode.add_argument("--chunk-size", type=int, default=1000, help="每块的行数")
     
     args = parser.parse_args()
     
+    if args.command == "evaluate":
+        return run_evaluate(args)
+    if args.command == "encode":
+        return run_encode(args)
+    
     # 处理流式输出参数
     stream = args.stream and not args.no_stream
     
+    # 显示横幅的同时在后台导入模块、加载数据
+    timings = []
+    loading = start_loading(args, timings)
+    
     print("🚀 ReadingTypeID智能编码助手")
     print("=" * 60)
     print("💡 我可以帮您:")
@@ -40,49 +176,35 @@ def main():
     print("   - '查询commodity字段'")
     print("=" * 60)
     
-    # 创建AI助手实例
-    try:
-        agent = ReadingTypeAgent()
-    except Exception as e:
-        print(f"❌ 初始化失败: {e}")
-        print("请检查:")
-        print("1. DEEPSEEK_API_KEY环境变量是否设置")
-        print("2. 数据文件是否存在 (reading_type_codes.csv, field_dictionaries.csv)")
-        print("3. 网络连接是否正常")
-        return 1
+    agent = None
     
-    # 设置系统消息
-    agent.add_message("system", """你是一个专业的ReadingTypeID编码助手，基于IEC61968-9-2024标准。你的任务是：
-
-1. 理解用户的量测需求，搜索现有编码或生成新编码
-2. 提供准确的ReadingType编码信息和解释
-3. 管理和维护编码库
-4. 导出和分析编码数据
-
-核心原则：
-- 准确理解用户意图，提供精确的编码信息
-- 对于模糊的需求，主动询问细节
-- 解释编码的含义和标准依据
-- 保持友好和专业的对话风格
-- 使用emoji增强可读性
-
-当用户提及具体的量测名称时，优先搜索现有编码。
-当用户要求生成新编码时，分析描述并映射到正确的字段值。
-当用户询问字典信息时，提供清晰的字段说明。
-
-可用的工具函数：
-- search_reading_type: 搜索编码库
-- generate_reading_type: 生成新编码
-- query_dictionary: 查询字典
-- view_codes_library: 浏览编码库
-- filter_codes: 筛选编码
-- add_to_library: 添加编码
-- export_data: 导出数据
-- get_statistics: 获取统计信息""")
-    
-    # 显示数据库状态
-    stats = agent.database.get_statistics()
-    print(f"\n📊 数据库状态: {stats['total_codes']}个编码, {len(agent.dictionary.field_dictionaries)}个字段")
+    def get_agent():
+        """等待后台加载完成，首次获取时显示数据库状态；加载失败时返回None"""
+        nonlocal agent
+        if agent is not None:
+            return agent
+        if not loading.done():
+            print("⏳ 正在加载编码库...")
+        try:
+            agent = loading.result()
+        except Exception as e:
+            print(f"❌ 初始化失败: {e}")
+            print("请检查:")
+            print("1. DEEPSEEK_API_KEY环境变量是否设置")
+            print("2. 数据文件是否存在 (reading_type_codes.csv, field_dictionaries.csv)")
+            print("3. 网络连接是否正常")
+            return None
+        
+        # 显示数据库状态
+        stats = agent.database.get_statistics()
+        print(f"\n📊 数据库状态: {stats['total_codes']}个编码, {len(agent.dictionary.field_dictionaries)}个字段")
+        return agent
+    
+    if args.profile_startup:
+        prompt_ready = time.perf_counter() - _STARTED
+        if get_agent() is None:
+            return 1
+        print_startup_profile(timings, prompt_ready, time.perf_counter() - _STARTED)
     
     # 对话循环
     while True:
@@ -96,18 +218,48 @@ def main():
             if user_input == "":
                 continue
             
+            if user_input.lower() in ["帮助", "help", "?"]:
+                print_help()
+                continue
+            
+            # 以下命令需要智能体，等待后台加载完成
+            if get_agent() is None:
+                return 1
+            
             # 特殊命令处理
             if user_input.lower() in ["清除历史", "clear", "重置"]:
                 agent.clear_history()
                 print("🧹 对话历史已清除")
                 continue
             
-            if user_input.lower() in ["帮助", "help", "?"]:
-                print_help()
+            if user_input.lower() in ["缓存统计", "cache"]:
+                for line in agent.prompt_cache_meter.format_summary():
+                    print(line)
+                if agent.completion_cache is not None:
+                    for line in agent.completion_cache.format_stats():
+                        print(line)
+                for line in agent.tool_result_meter.format_summary():
+                    print(line)
+                for line in agent.speculation_meter.format_summary():
+                    print(line)
+                continue
+            
+            if user_input.lower() in ["调用指标", "metrics"]:
+                for line in agent.metrics.format_summary():
+                    print(line)
+                continue
+            
+            if user_input.lower() in ["追踪统计", "trace"]:
+                for line in agent.tracer.format_summary():
+                    print(line)
                 continue
             
             # 获取AI回复
+            agent.last_timing = None
             agent.get_response(user_input, stream=stream)
+            if args.timing and agent.last_timing:
+                print(f"⏱️ 首token {agent.last_timing['ttft'] * 1000:.0f}ms, "
+                      f"总耗时 {agent.last_timing['total'] * 1000:.0f}ms")
             
         except KeyboardInterrupt:
             print("\n👋 再见！感谢使用ReadingTypeID编码助手!")
@@ -115,6 +267,10 @@ def main():
         except Exception as e:
             print(f"\n❌ 发生错误: {e}")
             print("请重试或输入'退出'结束程序")
+    
+    if args.trace and agent is not None:
+        count = agent.tracer.export(args.trace, args.trace_format)
+        print(f"🧭 已导出 {count} 条调用追踪到 {args.trace}")
 
 def print_help():
     """显示帮助信息"""
@@ -140,8 +296,13 @@ def print_help():
     print("   '统计信息' - 查看数据库统计")
     print("   '导出数据' - 导出编码库")
     
+    print("\n⚡ 以上搜索、浏览、字典、统计和导出命令按示例格式输入时在本地直接执行")
+    
     print("\n🔧 系统命令:")
     print("   '清除历史' - 清除对话历史")
+    print("   '缓存统计' - 查看提示缓存命中率、工具结果节省的token和工具预取命中率")
+    print("   '调用指标' - 查看大模型调用的首token耗时、总耗时、token数和工具调用轮数 (p50/p95/p99)")
+    print("   '追踪统计' - 查看各工具和API调用的耗时分布 (需以 --trace 启动)")
     print("   '帮助' - 显示此帮助")
     print("   '退出' - 退出程序")
 
@@ -1,6 +1,6 @@
 import os
+import sys
 import json
-import csv
 import datetime
 import xml.etree.ElementTree as ET
 from difflib import SequenceMatcher
@@ -9,25 +9,189 @@ from openai import OpenAI
 from dotenv import load_dotenv
 import re
 
+# 添加src目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+import prompt_cache
+from history_logger import get_history_logger
+import reading_type_codec
+from tracing import TracedClient, Tracer
+
 # 加载环境变量
 load_dotenv()
 
 # 设置DeepSeek API密钥
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 
+# 工具定义: 进程内只构建一次并冻结 (键按字典序排列)，保证每次请求的前缀逐字节一致，
+# 命中DeepSeek的上下文缓存
+TOOLS_DEFINITION = prompt_cache.freeze_json([
+    {
+        "type": "function",
+        "function": {
+            "name": "search_reading_type",
+            "description": "在ReadingType编码库中搜索匹配的编码",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "要搜索的量测名称或关键词"
+                    }
+                },
+                "required": ["name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "generate_reading_type",
+            "description": "根据描述或字段值生成ReadingTypeID",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "description": {
+                        "type": "string",
+                        "description": "量测的详细描述"
+                    },
+                    "field_values": {
+                        "type": "object",
+                        "description": "具体的字段值字典"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "query_dictionary",
+            "description": "查询ReadingType字段字典信息",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "field_name": {
+                        "type": "string",
+                        "description": "要查询的字段名称"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "view_codes_library",
+            "description": "查看编码库内容",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "page": {
+                        "type": "integer",
+                        "description": "页码，默认为1"
+                    },
+                    "per_page": {
+                        "type": "integer", 
+                        "description": "每页显示数量，默认为20"
+                    },
+                    "category": {
+                        "type": "string",
+                        "description": "筛选的类别"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "filter_codes",
+            "description": "筛选编码库",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "category": {
+                        "type": "string",
+                        "description": "按类别筛选"
+                    },
+                    "measurement_kind": {
+                        "type": "string",
+                        "description": "按测量类型筛选"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "add_to_library",
+            "description": "添加新编码到库中",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "编码名称"
+                    },
+                    "reading_type_id": {
+                        "type": "string",
+                        "description": "ReadingTypeID编码"
+                    },
+                    "description": {
+                        "type": "string",
+                        "description": "编码说明"
+                    },
+                    "category": {
+                        "type": "string",
+                        "description": "编码类别"
+                    }
+                },
+                "required": ["name", "reading_type_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "export_data",
+            "description": "导出编码库数据",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "description": "导出格式 (csv/json)"
+                    },
+                    "category": {
+                        "type": "string",
+                        "description": "筛选导出的类别"
+                    }
+                }
+            }
+        }
+    }
+])
+
 class ReadingTypeAgent:
     def __init__(self):
         self.conversation_history = []
+        # 工具调用与API调用追踪 (默认关闭，设置 tracer.enabled = True 开启)
+        self.tracer = Tracer()
         # 使用OpenAI客户端，配置DeepSeek基础URL
-        self.client = OpenAI(
+        self.client = TracedClient(OpenAI(
             api_key=DEEPSEEK_API_KEY,
             base_url="https://api.deepseek.com"
-        )
+        ), self.tracer)
+        
+        # 提示缓存命中统计
+        self.prompt_cache_meter = prompt_cache.PromptCacheMeter()
         
         # 数据文件路径
         self.codes_file = "reading_type_codes.csv"
         self.dictionaries_file = "field_dictionaries.csv"
-        self.history_file = "operation_history.csv"
+        self.history_file = "operation_history.jsonl"
         
         # 加载数据
         self.reading_type_codes = self.load_reading_type_codes()
@@ -311,11 +475,7 @@ class ReadingTypeAgent:
     
     def build_reading_type_id(self, field_values):
         """构建ReadingTypeID字符串"""
-        values = []
-        for i in range(16):
-            field_key = f"field_{i+1}"
-            values.append(str(field_values.get(field_key, 0)))
-        return "-".join(values)
+        return reading_type_codec.build_reading_type_id(reading_type_codec.from_field_dict(field_values))
     
     def query_dictionary(self, args):
         """查询字典信息"""
@@ -453,10 +613,11 @@ class ReadingTypeAgent:
         if not self.validate_reading_type_id(reading_type_id):
             return "❌ ReadingTypeID格式不正确，应为16个数字用'-'分隔"
         
-        # 检查是否已存在
+        # 检查是否已存在 (编码按紧凑键比较，不受写法影响)
+        key = reading_type_codec.canonical_key(reading_type_codec.parse_reading_type_id(reading_type_id))
         for code in self.reading_type_codes:
             if (code.get('name', '').lower() == name.lower() or 
-                code.get('reading_type_id', '') == reading_type_id):
+                self._code_key(code) == key):
                 return f"❌ 编码已存在: {code.get('name', 'N/A')} ({code.get('reading_type_id', 'N/A')})"
         
         # 添加新编码
@@ -471,9 +632,7 @@ class ReadingTypeAgent:
         }
         
         # 解析字段值
-        fields = reading_type_id.split('-')
-        for i, field_value in enumerate(fields):
-            new_code[f'field_{i+1}'] = field_value
+        new_code.update(reading_type_codec.to_field_dict(reading_type_codec.parse_reading_type_id(reading_type_id)))
         
         self.reading_type_codes.append(new_code)
         
@@ -485,19 +644,17 @@ class ReadingTypeAgent:
         
         return f"✅ 成功添加编码到库中:\n📊 名称: {name}\n🔢 ID: {reading_type_id}\n📝 说明: {description}"
     
+    def _code_key(self, code):
+        """编码记录的紧凑键，非法编码返回None"""
+        try:
+            return reading_type_codec.canonical_key(
+                reading_type_codec.parse_reading_type_id(str(code.get('reading_type_id', ''))))
+        except ValueError:
+            return None
+    
     def validate_reading_type_id(self, reading_type_id):
         """验证ReadingTypeID格式"""
-        parts = reading_type_id.split('-')
-        if len(parts) != 16:
-            return False
-        
-        for part in parts:
-            try:
-                float(part)  # 允许小数和负数
-            except ValueError:
-                return False
-        
-        return True
+        return reading_type_codec.is_valid_reading_type_id(reading_type_id)
     
     def save_reading_type_codes(self):
         """保存编码库到文件"""
@@ -540,30 +697,16 @@ class ReadingTypeAgent:
         return SequenceMatcher(None, a.lower(), b.lower()).ratio()
     
     def log_operation(self, input_text, operation_type, result, user_action="pending"):
-        """记录操作历史"""
-        try:
-            history_entry = {
-                'id': '',  # 由CSV文件行数决定
-                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'input_text': input_text,
-                'operation_type': operation_type,
-                'result': result[:200] + "..." if len(result) > 200 else result,  # 限制长度
-                'user_action': user_action
-            }
-            
-            # 追加到历史文件
-            file_exists = os.path.isfile(self.history_file)
-            with open(self.history_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=history_entry.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(history_entry)
-        
-        except Exception as e:
-            print(f"记录历史失败: {e}")
+        """记录操作历史 (放入队列，由后台线程批量写入JSONL历史文件)"""
+        get_history_logger(self.history_file).log(operation_type, input_text, result, user_action)
     
     def handle_function_call(self, function_call):
-        """处理函数调用"""
+        """处理函数调用 (开启追踪时记录每次调用的耗时、参数和结果大小)"""
+        if self.tracer.enabled:
+            return self.tracer.trace_tool_call(self._call_function, function_call)
+        return self._call_function(function_call)
+    
+    def _call_function(self, function_call):
         function_name = function_call.get("name")
         function_args = {}
         
@@ -595,165 +738,16 @@ class ReadingTypeAgent:
         self.add_message("user", user_input)
         
         try:
-            # 创建可用工具的描述
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "search_reading_type",
-                        "description": "在ReadingType编码库中搜索匹配的编码",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string",
-                                    "description": "要搜索的量测名称或关键词"
-                                }
-                            },
-                            "required": ["name"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_reading_type",
-                        "description": "根据描述或字段值生成ReadingTypeID",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "description": {
-                                    "type": "string",
-                                    "description": "量测的详细描述"
-                                },
-                                "field_values": {
-                                    "type": "object",
-                                    "description": "具体的字段值字典"
-                                }
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "query_dictionary",
-                        "description": "查询ReadingType字段字典信息",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "field_name": {
-                                    "type": "string",
-                                    "description": "要查询的字段名称"
-                                }
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "view_codes_library",
-                        "description": "查看编码库内容",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "page": {
-                                    "type": "integer",
-                                    "description": "页码，默认为1"
-                                },
-                                "per_page": {
-                                    "type": "integer", 
-                                    "description": "每页显示数量，默认为20"
-                                },
-                                "category": {
-                                    "type": "string",
-                                    "description": "筛选的类别"
-                                }
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "filter_codes",
-                        "description": "筛选编码库",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "category": {
-                                    "type": "string",
-                                    "description": "按类别筛选"
-                                },
-                                "measurement_kind": {
-                                    "type": "string",
-                                    "description": "按测量类型筛选"
-                                }
-                            }
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "add_to_library",
-                        "description": "添加新编码到库中",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "name": {
-                                    "type": "string",
-                                    "description": "编码名称"
-                                },
-                                "reading_type_id": {
-                                    "type": "string",
-                                    "description": "ReadingTypeID编码"
-                                },
-                                "description": {
-                                    "type": "string",
-                                    "description": "编码说明"
-                                },
-                                "category": {
-                                    "type": "string",
-                                    "description": "编码类别"
-                                }
-                            },
-                            "required": ["name", "reading_type_id"]
-                        }
-                    }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "export_data",
-                        "description": "导出编码库数据",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "format": {
-                                    "type": "string",
-                                    "description": "导出格式 (csv/json)"
-                                },
-                                "category": {
-                                    "type": "string",
-                                    "description": "筛选导出的类别"
-                                }
-                            }
-                        }
-                    }
-                }
-            ]
-            
             # 调用DeepSeek API，非流式方式，因为需要检查是否有工具调用
             response = self.client.chat.completions.create(
                 model="deepseek-chat",
                 messages=self.conversation_history,
-                tools=tools,
+                tools=TOOLS_DEFINITION,
                 tool_choice="auto",
                 stream=False  # 工具调用时使用非流式
             )
             
+            self.prompt_cache_meter.record(response.usage)
             response_message = response.choices[0].message
             
             # 处理工具调用
@@ -778,11 +772,16 @@ class ReadingTypeAgent:
                     second_response = self.client.chat.completions.create(
                         model="deepseek-chat",
                         messages=self.conversation_history,
-                        stream=True
+                        tools=TOOLS_DEFINITION,
+                        tool_choice="none",
+                        stream=True,
+                        stream_options={"include_usage": True}
                     )
                     
                     full_response = ""
                     for chunk in second_response:
+                        if chunk.usage is not None:
+                            self.prompt_cache_meter.record(chunk.usage)
                         if chunk.choices and len(chunk.choices) > 0:
                             content = chunk.choices[0].delta.content
                             if content:
@@ -795,8 +794,11 @@ class ReadingTypeAgent:
                     second_response = self.client.chat.completions.create(
                         model="deepseek-chat",
                         messages=self.conversation_history,
+                        tools=TOOLS_DEFINITION,
+                        tool_choice="none",
                         stream=False
                     )
+                    self.prompt_cache_meter.record(second_response.usage)
                     ai_response = second_response.choices[0].message.content
                     print(f"\n🤖 ReadingType助手: {ai_response}")
                 
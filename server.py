@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ReadingTypeID智能编码助手HTTP服务入口 (接口说明见 src/agent_server.py)"""
+
+import sys
+from pathlib import Path
+
+# 添加src目录到路径
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from src.agent_server import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""智能体对话轮次的公共实现
+
+一轮对话: 带工具定义调用模型 -> 如有工具调用则执行工具 -> 再次调用模型得到最终回复。
+ReadingTypeAgent 和 OptimizedReadingTypeAgent 共用这里的消息构造、工具执行和异步实现。
+
+同一条assistant消息中的多个工具调用彼此独立，在有界线程池中并发执行，
+结果按原顺序返回；有副作用的工具 (serial_tools) 作为屏障单独执行。
+
+流式模式下第一次调用也以流式获取: 文本边收边输出，tool_calls 增量按index拼接，
+某个调用的参数一完整 (下一个调用开始或流结束) 就立即提交执行。
+"""
+
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import AbstractSet, Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+# 流式输出回调: 每收到一段文本调用一次，可以是普通函数或协程函数
+TokenCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+# 工具执行报告回调: 每轮工具执行完成后调用一次，参数为 execute_tool_calls 的返回值
+ToolReportCallback = Callable[[Dict], None]
+
+# usage回调: 每次API调用完成后调用一次，参数为响应中的usage (如 PromptCacheMeter.record)
+UsageCallback = Callable[[object], object]
+
+# 耗时回调: 每轮结束后调用一次，参数为 {"ttft": 用户看到第一段回复文本的耗时(秒), "total": 总耗时(秒),
+#           "streamed": 是否流式}
+TimingCallback = Callable[[Dict], None]
+
+# 工具线程池大小 (所有会话共用)
+TOOL_WORKERS = 8
+
+_tool_executor = None
+_tool_executor_lock = threading.Lock()
+
+
+def assistant_tool_call_message(response_message) -> Dict:
+    """把API返回的带tool_calls的assistant消息转换为可写入对话历史的字典"""
+    return {
+        "role": "assistant",
+        "content": response_message.content,
+        "tool_calls": [
+            {
+                "id": tool_call.id,
+                "type": "function",
+                "function": {
+                    "name": tool_call.function.name,
+                    "arguments": tool_call.function.arguments
+                }
+            }
+            for tool_call in response_message.tool_calls
+        ]
+    }
+
+
+def tool_call_info(tool_call) -> Dict:
+    """工具调用 -> handle_function_call 所需的 {"name", "arguments"}"""
+    return {
+        "name": tool_call.function.name,
+        "arguments": tool_call.function.arguments
+    }
+
+
+def tool_result_message(tool_call, content: str) -> Dict:
+    """工具执行结果 -> tool消息"""
+    return {
+        "role": "tool",
+        "content": content,
+        "tool_call_id": tool_call.id
+    }
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """获取共用的工具线程池 (首次使用时创建)"""
+    global _tool_executor
+    if _tool_executor is None:
+        with _tool_executor_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS,
+                                                    thread_name_prefix="tool")
+    return _tool_executor
+
+
+def _plan_batches(tool_calls, serial_tools: AbstractSet[str]) -> List[List]:
+    """按顺序把工具调用分批: 相邻的独立调用为一批，serial_tools 中的调用单独成批"""
+    batches, current = [], []
+    for tool_call in tool_calls:
+        if tool_call.function.name in serial_tools:
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([tool_call])
+        else:
+            current.append(tool_call)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _run_tool_call(handle_function_call: Callable[[Dict], str], tool_call) -> Dict:
+    """执行单个工具调用并计时，异常只影响本调用"""
+    start = time.perf_counter()
+    error = None
+    try:
+        content = handle_function_call(tool_call_info(tool_call))
+    except Exception as e:
+        error = str(e)
+        content = f"错误: 工具 '{tool_call.function.name}' 执行失败: {error}"
+    return {
+        "tool_call": tool_call,
+        "name": tool_call.function.name,
+        "content": content,
+        "elapsed": time.perf_counter() - start,
+        "error": error
+    }
+
+
+def _tool_report(results: List[Dict], start: float) -> Dict:
+    """汇总工具执行结果与耗时"""
+    return {
+        "results": results,
+        "elapsed": time.perf_counter() - start,
+        "serial_elapsed": sum(result["elapsed"] for result in results)
+    }
+
+
+def execute_tool_calls(tool_calls, handle_function_call: Callable[[Dict], str],
+                       serial_tools: AbstractSet[str] = frozenset()) -> Dict:
+    """执行一条assistant消息中的全部工具调用
+
+    Args:
+        tool_calls: API返回的工具调用列表
+        handle_function_call: 同步工具执行函数
+        serial_tools: 有副作用、需要按顺序单独执行的工具名称
+
+    Returns:
+        {"results": 按原顺序的 {"tool_call", "name", "content", "elapsed", "error"} 列表,
+         "elapsed": 实际耗时(秒), "serial_elapsed": 各调用耗时之和(秒)}
+    """
+    start = time.perf_counter()
+    results = []
+    for batch in _plan_batches(tool_calls, serial_tools):
+        if len(batch) == 1:
+            results.append(_run_tool_call(handle_function_call, batch[0]))
+        else:
+            results.extend(get_tool_executor().map(
+                lambda tool_call: _run_tool_call(handle_function_call, tool_call), batch))
+    return _tool_report(results, start)
+
+
+async def execute_tool_calls_async(tool_calls, handle_function_call: Callable[[Dict], str],
+                                   serial_tools: AbstractSet[str] = frozenset()) -> Dict:
+    """异步版 execute_tool_calls，工具在线程池中执行，不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    results = []
+    for batch in _plan_batches(tool_calls, serial_tools):
+        results.extend(await asyncio.gather(*(
+            loop.run_in_executor(get_tool_executor(), _run_tool_call, handle_function_call, tool_call)
+            for tool_call in batch
+        )))
+    return _tool_report(results, start)
+
+
+def format_tool_report(report: Dict) -> List[str]:
+    """工具执行报告 -> 输出行"""
+    lines = [f"🔧 工具使用: {result['name']} ({result['elapsed'] * 1000:.1f}ms)"
+             + (" ❌" if result["error"] else "")
+             for result in report["results"]]
+    if len(report["results"]) > 1:
+        lines.append(f"⏱️ {len(report['results'])}个工具调用耗时 {report['elapsed'] * 1000:.1f}ms"
+                     f" (逐个执行合计 {report['serial_elapsed'] * 1000:.1f}ms)")
+    return lines
+
+
+class ToolCallAssembler:
+    """按index拼接流式返回的tool_calls增量
+
+    每个调用的参数完整时 (出现下一个index或流结束) 调用 on_complete，
+    拼好的调用与API返回的tool_call结构一致 (id、function.name、function.arguments)。
+    """
+
+    def __init__(self, on_complete: Callable[[object], None]):
+        self.on_complete = on_complete
+        self.tool_calls = []
+        self._index = None
+
+    def add(self, deltas) -> None:
+        """处理一个chunk中的tool_calls增量"""
+        for delta in deltas:
+            if delta.index != self._index:
+                self._complete_current()
+                self._index = delta.index
+                self.tool_calls.append(SimpleNamespace(
+                    id=None, type="function", function=SimpleNamespace(name="", arguments="")))
+            tool_call = self.tool_calls[-1]
+            if delta.id:
+                tool_call.id = delta.id
+            if delta.function is not None:
+                if delta.function.name:
+                    tool_call.function.name = delta.function.name
+                if delta.function.arguments:
+                    tool_call.function.arguments += delta.function.arguments
+
+    def finish(self) -> List:
+        """流结束，返回全部工具调用"""
+        self._complete_current()
+        self._index = None
+        return self.tool_calls
+
+    def _complete_current(self) -> None:
+        if self._index is not None:
+            self.on_complete(self.tool_calls[-1])
+
+
+class _EagerToolRunner:
+    """工具调用参数完整后立即提交到线程池
+
+    遇到 serial_tools 中的工具后，它和之后的调用推迟到流结束、前面的调用完成后再按批执行。
+    """
+
+    def __init__(self, handle_function_call: Callable[[Dict], str], serial_tools: AbstractSet[str],
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.handle_function_call = handle_function_call
+        self.serial_tools = serial_tools
+        self.loop = loop
+        self.started = []
+        self.start_time = None
+        self._deferred = False
+
+    def start(self, tool_call) -> None:
+        if self.start_time is None:
+            self.start_time = time.perf_counter()
+        if self._deferred or tool_call.function.name in self.serial_tools:
+            self._deferred = True
+            self.started.append((tool_call, None))
+        elif self.loop is not None:
+            self.started.append((tool_call, self.loop.run_in_executor(
+                get_tool_executor(), _run_tool_call, self.handle_function_call, tool_call)))
+        else:
+            self.started.append((tool_call, get_tool_executor().submit(
+                _run_tool_call, self.handle_function_call, tool_call)))
+
+    def collect(self) -> Dict:
+        """等待全部调用完成，返回与 execute_tool_calls 相同格式的报告"""
+        results = [future.result() for _, future in self.started if future is not None]
+        deferred = [tool_call for tool_call, future in self.started if future is None]
+        if deferred:
+            results.extend(execute_tool_calls(deferred, self.handle_function_call, self.serial_tools)["results"])
+        return _tool_report(results, self.start_time)
+
+    async def collect_async(self) -> Dict:
+        """异步版 collect"""
+        results = list(await asyncio.gather(*(future for _, future in self.started if future is not None)))
+        deferred = [tool_call for tool_call, future in self.started if future is None]
+        if deferred:
+            report = await execute_tool_calls_async(deferred, self.handle_function_call, self.serial_tools)
+            results.extend(report["results"])
+        return _tool_report(results, self.start_time)
+
+
+def _streamed_message(parts: List[str], tool_calls: List) -> SimpleNamespace:
+    """流式结果 -> 与API返回结构一致的assistant消息"""
+    return SimpleNamespace(content="".join(parts) or None, tool_calls=tool_calls or None)
+
+
+def stream_completion(client, model: str, messages: List[Dict], tools: Sequence[Dict],
+                      handle_function_call: Callable[[Dict], str],
+                      serial_tools: AbstractSet[str] = frozenset(),
+                      on_token: Optional[Callable[[str], None]] = None,
+                      on_usage: Optional[UsageCallback] = None) -> Dict:
+    """以流式方式执行带工具定义的第一次调用
+
+    文本片段到达即交给 on_token，工具调用参数完整后立即在线程池中执行。
+
+    Args:
+        client: OpenAI客户端
+        model: 模型名称
+        messages: 对话历史
+        tools: 工具定义
+        handle_function_call: 同步工具执行函数
+        serial_tools: 需要按顺序单独执行的工具名称
+        on_token: 文本回调
+        on_usage: usage回调
+
+    Returns:
+        {"message": assistant消息 (content, tool_calls), "report": 工具执行报告 (无工具调用时为None)}
+    """
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    runner = _EagerToolRunner(handle_function_call, serial_tools)
+    assembler = ToolCallAssembler(runner.start)
+    parts = []
+    for chunk in stream:
+        _record_usage(on_usage, getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            parts.append(delta.content)
+            if on_token is not None:
+                on_token(delta.content)
+        if delta.tool_calls:
+            assembler.add(delta.tool_calls)
+
+    tool_calls = assembler.finish()
+    return {
+        "message": _streamed_message(parts, tool_calls),
+        "report": runner.collect() if tool_calls else None
+    }
+
+
+async def stream_completion_async(client, model: str, messages: List[Dict], tools: Sequence[Dict],
+                                  handle_function_call: Callable[[Dict], str],
+                                  serial_tools: AbstractSet[str] = frozenset(),
+                                  on_token: Optional[TokenCallback] = None,
+                                  on_usage: Optional[UsageCallback] = None) -> Dict:
+    """异步版 stream_completion，工具在线程池中执行，不阻塞事件循环"""
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=tools,
+        tool_choice="auto",
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    runner = _EagerToolRunner(handle_function_call, serial_tools, asyncio.get_running_loop())
+    assembler = ToolCallAssembler(runner.start)
+    parts = []
+    async for chunk in stream:
+        _record_usage(on_usage, getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            parts.append(delta.content)
+            if on_token is not None:
+                await emit_token(on_token, delta.content)
+        if delta.tool_calls:
+            assembler.add(delta.tool_calls)
+
+    tool_calls = assembler.finish()
+    return {
+        "message": _streamed_message(parts, tool_calls),
+        "report": await runner.collect_async() if tool_calls else None
+    }
+
+
+async def run_turn_async(client, model: str, messages: List[Dict], tools: List[Dict],
+                         handle_function_call: Callable[[Dict], str],
+                         on_token: Optional[TokenCallback] = None,
+                         serial_tools: AbstractSet[str] = frozenset(),
+                         on_tool_report: Optional[ToolReportCallback] = None,
+                         on_usage: Optional[UsageCallback] = None,
+                         on_timing: Optional[TimingCallback] = None) -> str:
+    """异步执行一轮对话
+
+    Args:
+        client: AsyncOpenAI客户端
+        model: 模型名称
+        messages: 本会话的对话历史 (已包含本轮用户消息)，工具调用和最终回复会追加到其中
+        tools: 工具定义
+        handle_function_call: 同步工具执行函数，在线程池中运行，不阻塞事件循环
+        on_token: 流式输出回调，提供时两次调用都以流式方式获取
+        serial_tools: 需要按顺序单独执行的工具名称
+        on_tool_report: 工具执行报告回调
+        on_usage: usage回调
+        on_timing: 耗时回调
+
+    第二次调用同样携带工具定义 (tool_choice="none")，与第一次调用共享相同的请求前缀，
+    以便命中服务端的上下文缓存。
+
+    Returns:
+        最终回复文本
+    """
+    start = time.perf_counter()
+    first_token = []
+    if on_token is not None:
+        user_on_token = on_token
+
+        async def timed_on_token(content: str) -> None:
+            if not first_token:
+                first_token.append(time.perf_counter() - start)
+            await emit_token(user_on_token, content)
+
+        on_token = timed_on_token
+        first = await stream_completion_async(client, model, messages, tools, handle_function_call,
+                                              serial_tools, on_token, on_usage)
+        response_message, report = first["message"], first["report"]
+    else:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=tools,
+            tool_choice="auto",
+            stream=False
+        )
+        _record_usage(on_usage, response.usage)
+        response_message = response.choices[0].message
+        report = None
+        if response_message.tool_calls:
+            report = await execute_tool_calls_async(response_message.tool_calls,
+                                                    handle_function_call, serial_tools)
+
+    if response_message.tool_calls:
+        messages.append(assistant_tool_call_message(response_message))
+        messages.extend(tool_result_message(result["tool_call"], result["content"])
+                        for result in report["results"])
+        if on_tool_report is not None:
+            on_tool_report(report)
+
+        if on_token is not None:
+            ai_response = await _stream_text_async(client, model, messages, tools, on_token, on_usage)
+        else:
+            second_response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                tools=tools,
+                tool_choice="none",
+                stream=False
+            )
+            _record_usage(on_usage, second_response.usage)
+            ai_response = second_response.choices[0].message.content
+    else:
+        # 流式时文本已在第一次调用中逐段输出
+        ai_response = response_message.content
+
+    messages.append({"role": "assistant", "content": ai_response})
+    if on_timing is not None:
+        total = time.perf_counter() - start
+        on_timing({"ttft": first_token[0] if first_token else total, "total": total,
+                   "streamed": on_token is not None})
+    return ai_response
+
+
+async def _stream_text_async(client, model: str, messages: List[Dict], tools: List[Dict],
+                             on_token: TokenCallback, on_usage: Optional[UsageCallback] = None) -> str:
+    """流式获取回复文本"""
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        tools=tools,
+        tool_choice="none",
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            _record_usage(on_usage, chunk.usage)
+        if chunk.choices:
+            content = chunk.choices[0].delta.content
+            if content:
+                parts.append(content)
+                await emit_token(on_token, content)
+    return "".join(parts)
+
+
+def _record_usage(on_usage: Optional[UsageCallback], usage) -> None:
+    if on_usage is not None and usage is not None:
+        on_usage(usage)
+
+
+async def emit_token(on_token: TokenCallback, content: str) -> None:
+    """调用流式回调 (兼容普通函数和协程函数)"""
+    result = on_token(content)
+    if inspect.isawaitable(result):
+        await result
@@ -0,0 +1,375 @@
+"""ReadingType智能编码助手HTTP服务
+
+进程启动时只创建一个 ReadingTypeAgent，编码库、字典和工具定义加载一次，所有会话共用；
+每个会话只保存自己的对话历史 (SessionStore，按数量和空闲时间淘汰)。
+
+对话在后台线程的事件循环中以 get_response_async 执行，网络请求不占用Flask工作线程，
+多个会话的请求可以并发进行；流式回复以SSE (text/event-stream) 推送。
+
+接口:
+    POST   /api/sessions               创建会话 -> {"session_id"}
+    GET    /api/sessions/<id>          会话历史
+    DELETE /api/sessions/<id>          删除会话
+    POST   /api/chat                   {"message", "session_id"?, "stream"?} -> 回复或SSE事件流
+    GET    /api/tools                  可直接调用的工具 (默认只有只读工具)
+    POST   /api/tools/<name>           以JSON对象参数直接执行工具，不调用大模型
+    GET    /api/metrics                大模型调用指标 (?session_id= 另含该会话，?format=prometheus 文本格式)
+    GET    /api/traces                 工具和API调用的耗时汇总 (?format=jsonl|otlp 导出span明细)
+    GET    /api/health                 服务状态
+
+运行: python server.py --port 5000 [--trace] [--allow-write-tools]
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from .reading_type_agent import SYSTEM_PROMPT, ReadingTypeAgent
+
+# 流式回复结束标记
+_DONE = object()
+
+# 工具参数的JSON Schema类型 -> Python类型 (bool是int的子类，单独排除)
+_SCHEMA_TYPES = {"string": str, "integer": int, "number": (int, float), "boolean": bool,
+                 "object": dict, "array": list}
+
+
+class SessionStore:
+    """有界的会话历史存储 (线程安全)
+
+    超过 max_sessions 时淘汰最久未使用的会话，空闲超过 ttl 秒的会话在访问时清除。
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600, system_prompt: Optional[str] = SYSTEM_PROMPT):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.system_prompt = system_prompt
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> str:
+        """创建会话，返回会话ID"""
+        session_id = uuid.uuid4().hex
+        messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+        with self._lock:
+            self._sessions[session_id] = {"messages": messages, "busy": False, "last_used": time.monotonic()}
+            self._expire()
+            self._evict()
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """获取会话，不存在或已过期时返回None"""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["last_used"] = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def acquire(self, session_id: str) -> Optional[List[Dict]]:
+        """标记会话正在对话并返回其历史；会话不存在或已有进行中的对话时返回None"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session["busy"]:
+                return None
+            session["busy"] = True
+            session["last_used"] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            return session["messages"]
+
+    def release(self, session_id: str) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session["busy"] = False
+                session["last_used"] = time.monotonic()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self) -> None:
+        """超过上限时淘汰最久未使用的会话，正在对话的会话不淘汰 (全部在对话时暂时超出上限)"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        for session_id in [session_id for session_id, session in self._sessions.items()
+                           if not session["busy"]][:excess]:
+            del self._sessions[session_id]
+
+    def _expire(self) -> None:
+        deadline = time.monotonic() - self.ttl
+        for session_id in [session_id for session_id, session in self._sessions.items()
+                           if not session["busy"] and session["last_used"] < deadline]:
+            del self._sessions[session_id]
+
+
+class AgentService:
+    """共用一个智能体实例处理所有会话的对话"""
+
+    def __init__(self, agent: Optional[ReadingTypeAgent] = None, sessions: Optional[SessionStore] = None,
+                 turn_timeout: float = 120, allow_write_tools: bool = False):
+        """
+        Args:
+            turn_timeout: 一轮对话的超时秒数
+            allow_write_tools: 是否允许直接调用有副作用的工具 (添加编码、导出文件)
+        """
+        self.agent = agent if agent is not None else ReadingTypeAgent()
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.turn_timeout = turn_timeout
+        self.allow_write_tools = allow_write_tools
+        # 所有会话的对话在同一个后台事件循环中执行 (AsyncOpenAI客户端绑定到该循环)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="agent-loop", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_id: str, message: str, on_token=None):
+        """提交一轮对话，返回 concurrent.futures.Future，结果为 {"reply", "timing", "tools"}
+
+        会话不存在时抛出KeyError，会话已有进行中的对话时抛出RuntimeError
+        """
+        messages = self.sessions.acquire(session_id)
+        if messages is None:
+            if self.sessions.get(session_id) is None:
+                raise KeyError(session_id)
+            raise RuntimeError("该会话有正在进行的对话")
+
+        future = asyncio.run_coroutine_threadsafe(self._turn(session_id, messages, message, on_token), self.loop)
+        future.add_done_callback(lambda _: self.sessions.release(session_id))
+        return future
+
+    async def _turn(self, session_id: str, messages: List[Dict], message: str, on_token) -> Dict:
+        result = {"timing": None, "tools": []}
+
+        def on_tool_report(report: Dict) -> None:
+            result["tools"].extend({"name": item["name"], "elapsed": item["elapsed"], "error": item["error"]}
+                                   for item in report["results"])
+
+        def on_timing(timing: Dict) -> None:
+            result["timing"] = timing
+
+        # 本轮的API调用和工具调用轮数计入该会话的指标
+        with self.agent.metrics.session(session_id):
+            result["reply"] = await self.agent.get_response_async(message, messages, on_token=on_token,
+                                                                  on_tool_report=on_tool_report, on_timing=on_timing)
+        return result
+
+    def chat(self, session_id: str, message: str) -> Dict:
+        """同步执行一轮对话，超时时取消该轮对话并抛出TimeoutError"""
+        future = self.submit(session_id, message)
+        try:
+            return future.result(self.turn_timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stream(self, session_id: str, message: str):
+        """执行一轮对话，逐个产出事件 {"type": "token"|"done", ...}"""
+        events = queue.Queue()
+        future = self.submit(session_id, message, on_token=lambda content: events.put(
+            {"type": "token", "content": content}))
+        future.add_done_callback(lambda _: events.put(_DONE))
+
+        while True:
+            try:
+                event = events.get(timeout=self.turn_timeout)
+            except queue.Empty:
+                future.cancel()
+                yield {"type": "error", "error": "对话超时"}
+                return
+            if event is _DONE:
+                break
+            yield event
+        yield dict(future.result(), type="done")
+
+    def tool_names(self) -> List[str]:
+        """可直接调用的工具 (未开启 allow_write_tools 时不含有副作用的工具)"""
+        return [name for name in self.agent.available_tools
+                if self.allow_write_tools or name not in self.agent.serial_tools]
+
+    def call_tool(self, name: str, args: Dict) -> Dict:
+        """直接执行工具 (不调用大模型)，返回 {"result": 文本, "data": 结构化结果}
+
+        工具不存在时抛出KeyError，不允许直接调用时抛出PermissionError，参数不符合工具定义时抛出ValueError
+        """
+        if name not in self.agent.available_tools:
+            raise KeyError(name)
+        if name not in self.tool_names():
+            raise PermissionError(name)
+        check_arguments(self._tool_parameters(name), args)
+        result = self.agent.available_tools[name](args)
+        return {"result": str(result), "data": getattr(result, "data", None)}
+
+    def _tool_parameters(self, name: str) -> Dict:
+        for tool in self.agent.get_tools_definition():
+            if tool["function"]["name"] == name:
+                return tool["function"]["parameters"]
+        return {}
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+def check_arguments(parameters: Dict, args: Dict) -> None:
+    """按工具定义的参数schema检查必填参数和参数类型，不符合时抛出ValueError"""
+    properties = parameters.get("properties", {})
+    missing = [name for name in parameters.get("required", ()) if name not in args]
+    if missing:
+        raise ValueError(f"缺少参数 {', '.join(missing)}")
+    for name, value in args.items():
+        expected = properties.get(name, {}).get("type")
+        if expected not in _SCHEMA_TYPES:
+            continue
+        if (not isinstance(value, _SCHEMA_TYPES[expected])
+                or (isinstance(value, bool) and expected in ("integer", "number"))):
+            raise ValueError(f"参数 {name} 应为{expected}类型")
+
+
+def _sse(event: Dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def create_app(service: Optional[AgentService] = None) -> Flask:
+    """创建Flask应用"""
+    service = service if service is not None else AgentService()
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+    app.extensions["agent_service"] = service
+
+    def error(message: str, status: int):
+        return jsonify({"error": message}), status
+
+    @app.post("/api/sessions")
+    def create_session():
+        return jsonify({"session_id": service.sessions.create()}), 201
+
+    @app.get("/api/sessions/<session_id>")
+    def get_session(session_id):
+        session = service.sessions.get(session_id)
+        if session is None:
+            return error("会话不存在或已过期", 404)
+        return jsonify({"session_id": session_id, "messages": session["messages"], "busy": session["busy"]})
+
+    @app.delete("/api/sessions/<session_id>")
+    def delete_session(session_id):
+        if not service.sessions.delete(session_id):
+            return error("会话不存在或已过期", 404)
+        service.agent.metrics.drop_session(session_id)
+        return "", 204
+
+    @app.post("/api/chat")
+    def chat():
+        body = request.get_json(silent=True)
+        if body is None:
+            body = {}
+        if not isinstance(body, dict):
+            return error("请求体必须为JSON对象", 400)
+        message, session_id = body.get("message"), body.get("session_id")
+        if message is not None and not isinstance(message, str):
+            return error("message必须为字符串", 400)
+        if session_id is not None and not isinstance(session_id, str):
+            return error("session_id必须为字符串", 400)
+        message = (message or "").strip()
+        if not message:
+            return error("缺少message", 400)
+        session_id = session_id or service.sessions.create()
+
+        try:
+            if body.get("stream"):
+                events = service.stream(session_id, message)
+                first = next(events)
+
+                def generate():
+                    yield _sse(dict(first, session_id=session_id))
+                    for event in events:
+                        yield _sse(event)
+
+                return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            return jsonify(dict(service.chat(session_id, message), session_id=session_id))
+        except KeyError:
+            return error("会话不存在或已过期", 404)
+        except RuntimeError as e:
+            return error(str(e), 409)
+        except TimeoutError:
+            return error("对话超时", 504)
+
+    @app.get("/api/tools")
+    def list_tools():
+        names = set(service.tool_names())
+        return jsonify({"tools": [tool["function"] for tool in service.agent.get_tools_definition()
+                                  if tool["function"]["name"] in names]})
+
+    @app.post("/api/tools/<name>")
+    def call_tool(name):
+        args = request.get_json(silent=True) if request.get_data() else {}
+        if not isinstance(args, dict):
+            return error("参数必须为JSON对象", 400)
+        try:
+            return jsonify(dict(service.call_tool(name, args), name=name))
+        except KeyError:
+            return error(f"未知工具: {name}", 404)
+        except PermissionError:
+            return error(f"工具 {name} 有副作用，服务未开启直接调用 (--allow-write-tools)", 403)
+        except Exception as e:
+            # 参数已按schema检查，工具仍然失败时多为参数取值无效 (如页码、字段名)
+            return error(f"参数无效: {e}", 400)
+
+    @app.get("/api/metrics")
+    def metrics():
+        if request.args.get("format") == "prometheus":
+            return Response(service.agent.metrics.to_prometheus(), mimetype="text/plain; version=0.0.4")
+        return jsonify(service.agent.get_metrics(request.args.get("session_id")))
+
+    @app.get("/api/traces")
+    def traces():
+        tracer = service.agent.tracer
+        fmt = request.args.get("format")
+        if fmt == "otlp":
+            return jsonify(tracer.to_otlp())
+        if fmt == "jsonl":
+            lines = "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in tracer.spans())
+            return Response(lines, mimetype="application/x-ndjson")
+        return jsonify({"enabled": tracer.enabled, "summary": tracer.summary()})
+
+    @app.get("/api/health")
+    def health():
+        return jsonify({"status": "ok", "sessions": len(service.sessions),
+                        "codes": len(service.agent.database.reading_type_codes)})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReadingTypeID智能编码助手HTTP服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--max-sessions", type=int, default=1000, help="最多保留的会话数")
+    parser.add_argument("--session-ttl", type=float, default=3600, help="会话空闲超时(秒)")
+    parser.add_argument("--trace", action="store_true", help="追踪每次工具调用和API调用 (GET /api/traces 查看)")
+    parser.add_argument("--allow-write-tools", action="store_true",
+                        help="允许经 POST /api/tools/<name> 直接调用添加编码、导出数据等有副作用的工具")
+    args = parser.parse_args()
+
+    service = AgentService(sessions=SessionStore(args.max_sessions, args.session_ttl),
+                           allow_write_tools=args.allow_write_tools)
+    service.agent.tracer.enabled = args.trace
+    create_app(service).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""离线批量编码
+
+main.py encode 的实现: 从CSV或xlsx逐行读取量测描述，为每条描述确定ReadingTypeID，
+结果按输入顺序逐块写入CSV。全程不访问网络，也不调用大模型:
+1. 编码库中有同名编码时直接使用 (按名称索引查找)
+2. 否则用语义解析器在本地生成编码，并校验编码格式和字段组合
+
+输入按 chunk_size 行分块，交给工作进程解析；同时在处理中的块不超过 2×workers 个，
+内存占用与输入行数无关，百万行的输入也只占用固定的内存。
+每个工作进程缓存最近解析过的描述，重复的描述不再解析。
+"""
+
+import csv
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import reading_type_codec
+from reading_type_database import ReadingTypeDatabase
+from semantic_parser import SemanticParser
+
+# 输出CSV的列
+OUTPUT_COLUMNS = ("row", "input", "reading_type_id", "source", "matched_name", "valid", "errors")
+
+# 未指定描述列时依次尝试的列名
+DESCRIPTION_COLUMNS = ("description", "描述", "量测描述", "name", "名称", "量测名称")
+
+# 结果来源
+SOURCE_LIBRARY = "library"
+SOURCE_GENERATED = "generated"
+SOURCE_EMPTY = "empty"
+
+# 工作进程内的编码库和解析器 (每个进程只加载一次)
+_resolver = None
+
+
+def read_rows(path: str, sheet: Optional[str] = None) -> Tuple[List[str], Iterator[Sequence]]:
+    """流式读取表格，返回 (表头, 数据行迭代器)
+
+    .xlsx 以只读模式逐行读取 (需要 openpyxl)，其余文件按 UTF-8 CSV 读取。
+    """
+    if path.lower().endswith((".xlsx", ".xlsm")):
+        try:
+            import openpyxl
+        except ImportError:
+            raise RuntimeError("读取xlsx文件需要安装 openpyxl (pip install openpyxl)，或先另存为CSV")
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+
+        def cells():
+            try:
+                yield from rows
+            finally:
+                workbook.close()
+    else:
+        f = open(path, newline="", encoding="utf-8-sig")
+        rows = csv.reader(f)
+
+        def cells():
+            with f:
+                yield from rows
+
+    iterator = cells()
+    header = next(iterator, None)
+    if header is None:
+        return [], iter(())
+    return ["" if cell is None else str(cell).strip() for cell in header], iterator
+
+
+def find_column(header: Sequence[str], column: Optional[str] = None) -> int:
+    """描述列的位置: 指定的列名或序号 (从1开始)，否则按 DESCRIPTION_COLUMNS 查找，找不到时使用第一列"""
+    if column:
+        if column in header:
+            return list(header).index(column)
+        if column.isdigit() and 1 <= int(column) <= len(header):
+            return int(column) - 1
+        raise ValueError(f"输入中没有列 '{column}' (现有列: {', '.join(header)})")
+    lowered = [name.lower() for name in header]
+    for name in DESCRIPTION_COLUMNS:
+        if name in lowered:
+            return lowered.index(name)
+    return 0
+
+
+class Resolver:
+    """描述 -> 编码结果 (编码库精确匹配优先，否则本地生成并校验)"""
+
+    def __init__(self, codes_file: str = "reading_type_codes.csv", dictionaries_file: str = "field_dictionaries.csv",
+                 cache_size: int = 65536):
+        self.database = ReadingTypeDatabase(codes_file, dictionaries_file)
+        self.parser = SemanticParser()
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    def _resolve(self, text: str) -> Tuple[str, str, str, bool, str]:
+        """Returns: (reading_type_id, 来源, 匹配的编码名称, 是否有效, 错误信息)"""
+        if not text:
+            return "", SOURCE_EMPTY, "", False, "描述为空"
+        for code in self.database.get_codes_by_name(text):
+            reading_type_id = str(code.get("reading_type_id", ""))
+            if reading_type_codec.is_valid_reading_type_id(reading_type_id):
+                return (reading_type_codec.normalize_reading_type_id(reading_type_id), SOURCE_LIBRARY,
+                        str(code.get("name", "")), True, "")
+
+        analysis = self.parser.analyze_measurement_description(text)
+        reading_type_id = self.parser.build_reading_type_id(analysis)
+        valid, errors = self.parser.validate_field_combination(analysis)
+        if not reading_type_codec.is_valid_reading_type_id(reading_type_id):
+            valid, errors = False, errors + ["生成的编码格式不正确"]
+        return reading_type_id, SOURCE_GENERATED, "", valid, "; ".join(errors)
+
+
+def _init_worker(codes_file: str, dictionaries_file: str) -> None:
+    global _resolver
+    _resolver = Resolver(codes_file, dictionaries_file)
+
+
+def _encode_chunk(rows: List[Tuple[int, str]]) -> List[Tuple]:
+    """[(行号, 描述)] -> 输出行"""
+    return [(number, text) + _resolver.resolve(text) for number, text in rows]
+
+
+def _chunks(rows: Iterator[Sequence], index: int, chunk_size: int) -> Iterator[List[Tuple[int, str]]]:
+    """数据行 -> [(行号, 描述)] 块，行号从2开始 (与表格中的行号一致)"""
+    chunk = []
+    for number, row in enumerate(rows, 2):
+        value = row[index] if index < len(row) else None
+        chunk.append((number, "" if value is None else str(value).strip()))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encode_file(input_path: str, output_path: str, column: Optional[str] = None, sheet: Optional[str] = None,
+                codes_file: str = "reading_type_codes.csv", dictionaries_file: str = "field_dictionaries.csv",
+                workers: Optional[int] = None, chunk_size: int = 1000,
+                progress: Optional[Callable[[Dict], None]] = None, progress_interval: float = 1.0) -> Dict:
+    """批量编码
+
+    Args:
+        column: 描述列的列名或序号，默认自动识别
+        workers: 工作进程数 (默认CPU核数)，为1时在当前进程中处理
+        chunk_size: 每块的行数
+        progress: 进度回调，每 progress_interval 秒及结束时以 stats 调用
+
+    Returns:
+        {"rows", "library", "generated", "invalid", "empty", "seconds", "rows_per_second"}
+    """
+    header, rows = read_rows(input_path, sheet)
+    index = find_column(header, column)
+    workers = max(1, workers or os.cpu_count() or 1)
+    stats = {"rows": 0, SOURCE_LIBRARY: 0, SOURCE_GENERATED: 0, "invalid": 0, SOURCE_EMPTY: 0,
+             "seconds": 0.0, "rows_per_second": 0.0}
+    start = last_report = time.perf_counter()
+
+    def record(results: List[Tuple]) -> None:
+        nonlocal last_report
+        writer.writerows(results)
+        for result in results:
+            stats[result[3]] += 1
+            stats["invalid"] += result[3] == SOURCE_GENERATED and not result[5]
+        stats["rows"] += len(results)
+        now = time.perf_counter()
+        stats["seconds"] = now - start
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        if progress is not None and now - last_report >= progress_interval:
+            last_report = now
+            progress(stats)
+
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_COLUMNS)
+        chunks = _chunks(rows, index, chunk_size)
+        if workers == 1:
+            _init_worker(codes_file, dictionaries_file)
+            for chunk in chunks:
+                record(_encode_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(codes_file, dictionaries_file)) as pool:
+                # 按提交顺序取回结果，处理中的块数有上限
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_encode_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        record(pending.popleft().result())
+                while pending:
+                    record(pending.popleft().result())
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    if progress is not None:
+        progress(stats)
+    return stats
+
+
+def print_progress(stats: Dict, file=sys.stderr) -> None:
+    """在同一行刷新进度"""
+    print(f"\r⏳ 已处理 {stats['rows']:,} 行 ({stats['rows_per_second']:,.0f} 行/秒): "
+          f"编码库 {stats[SOURCE_LIBRARY]:,}, 生成 {stats[SOURCE_GENERATED]:,} "
+          f"(待核对 {stats['invalid']:,}), 空 {stats[SOURCE_EMPTY]:,}", end="", file=file, flush=True)
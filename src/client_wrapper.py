@@ -0,0 +1,121 @@
+"""OpenAI客户端包装的公共实现
+
+补全缓存、调用追踪和指标记录都只拦截 chat.completions.create，其余属性原样转发给被包装的客户端。
+WrappedCompletions 负责同步/异步调用和流式响应的逐段转发，子类只实现以下钩子:
+- _start(params): 调用前执行，返回本次调用的状态 (如开始时间、span)
+- _failed(state, error): 调用抛出异常
+- _completed(state, response): 非流式响应返回
+- _observer(state): 流式响应的观察者，每段调用 add(chunk)，流结束或出错时调用 finish(error)
+"""
+
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+
+class StreamObserver:
+    """流式响应观察者的接口"""
+
+    def add(self, chunk) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+class WrappedCompletions:
+    """chat.completions 的同步包装"""
+
+    def __init__(self, completions):
+        self._completions = completions
+
+    def _enabled(self) -> bool:
+        """返回False时直接转发，不调用任何钩子"""
+        return True
+
+    def _start(self, params: Dict):
+        return None
+
+    def _failed(self, state, error: Exception) -> None:
+        pass
+
+    def _completed(self, state, response) -> None:
+        pass
+
+    def _observer(self, state) -> StreamObserver:
+        return StreamObserver()
+
+    def create(self, **params):
+        if not self._enabled():
+            return self._completions.create(**params)
+        state = self._start(params)
+        try:
+            response = self._completions.create(**params)
+        except Exception as e:
+            self._failed(state, e)
+            raise
+        return self._finish(state, response, params)
+
+    def _finish(self, state, response, params: Dict):
+        if params.get("stream"):
+            return self._forward_stream(response, self._observer(state))
+        self._completed(state, response)
+        return response
+
+    @staticmethod
+    def _forward_stream(stream, observer: StreamObserver):
+        error = None
+        try:
+            for chunk in stream:
+                observer.add(chunk)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observer.finish(error)
+
+
+class AsyncWrappedCompletions(WrappedCompletions):
+    """chat.completions 的异步包装，钩子与同步版相同"""
+
+    async def create(self, **params):
+        if not self._enabled():
+            return await self._completions.create(**params)
+        state = self._start(params)
+        try:
+            response = await self._completions.create(**params)
+        except Exception as e:
+            self._failed(state, e)
+            raise
+        return self._finish(state, response, params)
+
+    @staticmethod
+    async def _forward_stream(stream, observer: StreamObserver):
+        error = None
+        try:
+            async for chunk in stream:
+                observer.add(chunk)
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observer.finish(error)
+
+
+class WrappedClient:
+    """OpenAI客户端包装，chat.completions 换成 _completions_class 的实例，其余属性转发"""
+
+    _completions_class = WrappedCompletions
+
+    def __init__(self, client, *args):
+        """
+        Args:
+            client: 被包装的客户端
+            args: 传给 _completions_class 的其余参数
+        """
+        self._client = client
+        self.chat = SimpleNamespace(completions=self._completions_class(client.chat.completions, *args))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
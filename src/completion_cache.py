@@ -0,0 +1,390 @@
+"""对话补全缓存
+
+不同用户的对话经常几乎相同 (例如都问 "生成A相电压编码")，每次都要调用两次DeepSeek。
+CompletionCache 以 模型 + 规范化后的消息 + 工具定义 + 采样参数 的哈希为键，
+把API返回的assistant消息保存在本地SQLite文件中，支持过期时间和容量上限。
+
+CachedClient / AsyncCachedClient 包装OpenAI客户端，对智能体透明:
+命中时直接构造响应 (流式请求回放为分段响应)，未命中时调用API并写入缓存。
+传入 LLMMetrics 时每次缓存查找都计入指标 (命中/未命中次数，命中时的耗时)。
+显式指定了非确定性采样参数 (temperature > 0、top_p < 1、n > 1) 的请求默认不使用缓存。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from agent_runtime import ToolCallAssembler
+from client_wrapper import WrappedClient
+from prompt_cache import canonical_json
+
+# 不影响结果、不参与缓存键的请求参数
+_TRANSPORT_PARAMS = frozenset({"stream", "stream_options", "timeout", "extra_headers",
+                               "extra_query", "extra_body", "user"})
+
+
+def _normalize_text(text):
+    if not isinstance(text, str):
+        return text
+    return " ".join(text.split())
+
+
+def _normalize_arguments(arguments: str) -> str:
+    try:
+        return json.dumps(json.loads(arguments), ensure_ascii=False, sort_keys=True)
+    except (TypeError, ValueError):
+        return _normalize_text(arguments)
+
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    """规范化消息: 合并空白，工具调用参数按键排序，tool_call_id 替换为出现顺序编号"""
+    call_ids = {}
+    normalized = []
+    for message in messages:
+        item = {"role": message.get("role"), "content": _normalize_text(message.get("content"))}
+        if message.get("tool_calls"):
+            item["tool_calls"] = []
+            for tool_call in message["tool_calls"]:
+                call_ids.setdefault(tool_call.get("id"), f"#{len(call_ids)}")
+                function = tool_call.get("function", {})
+                item["tool_calls"].append({
+                    "id": call_ids[tool_call.get("id")],
+                    "name": function.get("name"),
+                    "arguments": _normalize_arguments(function.get("arguments"))
+                })
+        if message.get("tool_call_id") is not None:
+            item["tool_call_id"] = call_ids.get(message["tool_call_id"], message["tool_call_id"])
+        normalized.append(item)
+    return normalized
+
+
+def request_key(params: Dict) -> str:
+    """请求参数 -> 缓存键 (SHA-256)"""
+    payload = {name: value for name, value in params.items() if name not in _TRANSPORT_PARAMS}
+    payload["messages"] = normalize_messages(payload.get("messages") or [])
+    return hashlib.sha256(canonical_json(payload).encode("utf-8")).hexdigest()
+
+
+def is_deterministic(params: Dict) -> bool:
+    """请求是否没有显式要求随机采样"""
+    return (params.get("temperature") in (None, 0)
+            and params.get("top_p") in (None, 1)
+            and params.get("n") in (None, 1))
+
+
+class CompletionCache:
+    """基于SQLite的补全缓存 (线程安全，多进程可共用同一文件)"""
+
+    def __init__(self, path: str = "completion_cache.sqlite3", ttl: float = 7 * 24 * 3600,
+                 max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 cache_sampled: bool = False):
+        """
+        Args:
+            path: SQLite文件路径
+            ttl: 缓存有效期(秒)
+            max_entries: 最多缓存条数，超出时淘汰最久未使用的条目
+            max_bytes: 缓存内容总字节数上限
+            cache_sampled: 是否缓存显式指定了随机采样参数的请求
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL,
+                response TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+        self._conn.commit()
+
+    def key_for(self, params: Dict) -> Optional[str]:
+        """计算请求的缓存键，不适合缓存的请求返回None"""
+        if not self.cache_sampled and not is_deterministic(params):
+            with self._lock:
+                self.skipped += 1
+            return None
+        return request_key(params)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存的assistant消息，未命中或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created, response FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[0] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[1])
+
+    def put(self, key: str, message: Dict) -> None:
+        """写入assistant消息 {"content", "tool_calls", "finish_reason"}，并按容量上限淘汰"""
+        response = json.dumps(message, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, created, accessed, size, response) "
+                "VALUES (?, ?, ?, ?, ?)", (key, now, now, len(response.encode("utf-8")), response))
+            self._evict(now)
+            self._conn.commit()
+            self.stores += 1
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+        count, total = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        removed = []
+        for key, size in self._conn.execute("SELECT key, size FROM completions ORDER BY accessed"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            removed.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", removed)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """缓存统计"""
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": total
+            }
+
+    def format_stats(self) -> List[str]:
+        """缓存统计 -> 输出行"""
+        stats = self.stats()
+        return [f"💾 补全缓存: 命中 {stats['hits']}/{stats['hits'] + stats['misses']} ({stats['hit_ratio']:.1%}), "
+                f"跳过 {stats['skipped']}, {stats['entries']}条 {stats['bytes'] / 1024:.1f}KB"]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _message_from_response(response) -> Dict:
+    choice = response.choices[0]
+    message = choice.message
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"id": tool_call.id, "type": "function",
+             "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}}
+            for tool_call in message.tool_calls or ()
+        ] or None,
+        "finish_reason": choice.finish_reason
+    }
+
+
+def _with_fresh_ids(cached: Dict) -> Dict:
+    """回放时生成新的tool_call_id，避免同一会话中重复"""
+    tool_calls = [dict(tool_call, id=f"call_{uuid.uuid4().hex[:24]}")
+                  for tool_call in cached.get("tool_calls") or ()]
+    return dict(cached, tool_calls=tool_calls or None)
+
+
+def _cached_completion(key: str, model: str, cached: Dict) -> ChatCompletion:
+    cached = _with_fresh_ids(cached)
+    return ChatCompletion.model_validate({
+        "id": f"cache-{key[:16]}", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": cached["content"], "tool_calls": cached["tool_calls"]},
+            "finish_reason": cached.get("finish_reason") or "stop"
+        }]
+    })
+
+
+def _cached_chunks(key: str, model: str, cached: Dict) -> List[ChatCompletionChunk]:
+    cached = _with_fresh_ids(cached)
+    deltas = []
+    if cached["content"]:
+        deltas.append({"role": "assistant", "content": cached["content"]})
+    for index, tool_call in enumerate(cached["tool_calls"] or ()):
+        deltas.append({"tool_calls": [dict(tool_call, index=index)]})
+    choices = [{"index": 0, "delta": delta, "finish_reason": None} for delta in deltas]
+    choices.append({"index": 0, "delta": {}, "finish_reason": cached.get("finish_reason") or "stop"})
+    return [ChatCompletionChunk.model_validate({
+        "id": f"cache-{key[:16]}", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model, "choices": [choice]
+    }) for choice in choices]
+
+
+class _StreamRecorder:
+    """边转发流式响应边拼接完整消息，流正常结束时写入缓存"""
+
+    def __init__(self, cache: CompletionCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.parts = []
+        self.assembler = ToolCallAssembler(lambda tool_call: None)
+        self.finish_reason = None
+
+    def add(self, chunk) -> None:
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            self.parts.append(choice.delta.content)
+        if choice.delta.tool_calls:
+            self.assembler.add(choice.delta.tool_calls)
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+    def finish(self) -> None:
+        if self.finish_reason is None:
+            return
+        tool_calls = self.assembler.finish()
+        self.cache.put(self.key, {
+            "content": "".join(self.parts) or None,
+            "tool_calls": [
+                {"id": tool_call.id, "type": "function",
+                 "function": {"name": tool_call.function.name, "arguments": tool_call.function.arguments}}
+                for tool_call in tool_calls
+            ] or None,
+            "finish_reason": self.finish_reason
+        })
+
+
+class _CachedCompletions:
+    def __init__(self, completions, cache: CompletionCache, metrics=None):
+        self._completions = completions
+        self.cache = cache
+        self.metrics = metrics
+
+    def _record(self, hit: bool, start: float) -> None:
+        if self.metrics is not None:
+            self.metrics.record_cache(hit, time.perf_counter() - start)
+
+    def create(self, **params):
+        start = time.perf_counter()
+        key = self.cache.key_for(params)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if params.get("stream"):
+                    response = iter(_cached_chunks(key, params.get("model"), cached))
+                else:
+                    response = _cached_completion(key, params.get("model"), cached)
+                self._record(True, start)
+                return response
+            self._record(False, start)
+
+        response = self._completions.create(**params)
+        if key is None:
+            return response
+        if params.get("stream"):
+            return self._record_stream(response, key)
+        self.cache.put(key, _message_from_response(response))
+        return response
+
+    def _record_stream(self, stream, key: str):
+        recorder = _StreamRecorder(self.cache, key)
+        for chunk in stream:
+            recorder.add(chunk)
+            yield chunk
+        recorder.finish()
+
+
+class _AsyncCachedCompletions(_CachedCompletions):
+    # SQLite读写在线程中执行: 所有会话共用一个事件循环，磁盘慢或数据库被锁时不能阻塞其他会话
+    async def create(self, **params):
+        start = time.perf_counter()
+        key = self.cache.key_for(params)
+        if key is not None:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                if params.get("stream"):
+                    response = _replay_async(_cached_chunks(key, params.get("model"), cached))
+                else:
+                    response = _cached_completion(key, params.get("model"), cached)
+                self._record(True, start)
+                return response
+            self._record(False, start)
+
+        response = await self._completions.create(**params)
+        if key is None:
+            return response
+        if params.get("stream"):
+            return self._record_stream_async(response, key)
+        await asyncio.to_thread(self.cache.put, key, _message_from_response(response))
+        return response
+
+    async def _record_stream_async(self, stream, key: str):
+        recorder = _StreamRecorder(self.cache, key)
+        async for chunk in stream:
+            recorder.add(chunk)
+            yield chunk
+        await asyncio.to_thread(recorder.finish)
+
+
+async def _replay_async(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class CachedClient(WrappedClient):
+    """带补全缓存的OpenAI客户端包装，只拦截 chat.completions.create"""
+
+    _completions_class = _CachedCompletions
+
+    def __init__(self, client, cache: CompletionCache, metrics=None):
+        """
+        Args:
+            client: 被包装的客户端
+            cache: 补全缓存
+            metrics: 记录缓存命中的 LLMMetrics (可选)
+        """
+        super().__init__(client, cache, metrics)
+        self.cache = cache
+
+
+class AsyncCachedClient(CachedClient):
+    """带补全缓存的AsyncOpenAI客户端包装"""
+
+    _completions_class = _AsyncCachedCompletions
@@ -1,6 +1,7 @@
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import csv
 import datetime
+import itertools
 
 class DictionaryManager:
     """ReadingType字典管理类"""
@@ -9,6 +10,10 @@ class DictionaryManager:
         self.dictionaries_file = dictionaries_file
         self.field_dictionaries = self.load_dictionaries()
         
+        # 字段名 -> {字段值: 字典项} 的索引和 (字段名, 字段值) -> 显示名称的缓存，字典变化时失效
+        self._value_index = None
+        self._display_names = {}
+        
         # 字段中文名映射
         self.chinese_field_names = {
             "macroPeriod": "宏周期",
@@ -36,7 +41,7 @@ class DictionaryManager:
             df = pd.read_csv(self.dictionaries_file)
             
             dictionaries = {}
-            for _, row in df.iterrows():
+            for row in df.to_dict('records'):
                 field_name = str(row['field_name']).strip()
                 if field_name not in dictionaries:
                     dictionaries[field_name] = []
@@ -52,14 +57,71 @@ class DictionaryManager:
             print(f"加载字典失败: {e}")
             return {}
     
+    def _get_value_index(self) -> Dict[str, Dict[str, Dict]]:
+        """字段名 -> {字段值字符串: 字典项}，同一取值出现多次时使用第一项"""
+        if self._value_index is None:
+            index = {}
+            for field_name, items in self.field_dictionaries.items():
+                values = index[field_name] = {}
+                for item in items:
+                    values.setdefault(_value_key(item['value']), item)
+            self._value_index = index
+        return self._value_index
+    
+    def get_field_item(self, field_name: str, value) -> Optional[Dict]:
+        """按字段值查找字典项，没有时返回None"""
+        return self._get_value_index().get(field_name, {}).get(_value_key(value))
+    
     def get_field_description(self, field_name: str, value: str) -> str:
         """获取字段值的描述"""
-        if field_name in self.field_dictionaries:
-            for item in self.field_dictionaries[field_name]:
-                if str(item['value']) == str(value):
-                    return item['display_name']
+        item = self.get_field_item(field_name, value)
+        if item is not None:
+            return item['display_name']
         return f"值: {value}"
     
+    def decode_many(self, reading_type_ids: Iterable[str], chunk_size: int = 65536) -> Iterator[Dict]:
+        """批量把ReadingTypeID解码为可读的字段显示名称
+        
+        按块用批量编解码解析编码，每块中每个字段的取值先去重，
+        每个 (字段, 值) 只查一次字典，查询结果在多次调用之间缓存。
+        
+        Args:
+            reading_type_ids: ReadingTypeID序列或迭代器 (逐块读取，不需要整体载入内存)
+            chunk_size: 每块的编码数
+            
+        Yields:
+            按输入顺序每个编码一行 {"reading_type_id": 输入的编码, "valid": 是否合法, 各字段名: 显示名称}，
+            非法编码的各字段为空字符串
+        """
+        import numpy as np
+        import reading_type_codec
+        
+        field_names = list(self.chinese_field_names)
+        keys = ["reading_type_id", "valid"] + field_names
+        iterator = iter(reading_type_ids)
+        while True:
+            ids = list(itertools.islice(iterator, chunk_size))
+            if not ids:
+                return
+            matrix, valid = reading_type_codec.decode_batch(ids)
+            columns = []
+            for j, field_name in enumerate(field_names):
+                values, inverse = np.unique(matrix[:, j], return_inverse=True)
+                labels = np.array([self._display_name(field_name, value) for value in values.tolist()], dtype=object)
+                column = labels[inverse]
+                column[~valid] = ""
+                columns.append(column.tolist())
+            for row in zip(ids, valid.tolist(), *columns):
+                yield dict(zip(keys, row))
+    
+    def _display_name(self, field_name: str, value: int) -> str:
+        """字段值的显示名称 (缓存)"""
+        key = (field_name, value)
+        name = self._display_names.get(key)
+        if name is None:
+            name = self._display_names[key] = str(self.get_field_description(field_name, value))
+        return name
+    
     def get_field_options(self, field_name: str, limit: int = 50) -> List[Dict]:
         """获取字段的所有可选值
         
@@ -128,9 +190,8 @@ class DictionaryManager:
             return False, f"字段 '{field_name}' 不存在"
         
         # 检查值是否已存在
-        for item in self.field_dictionaries[field_name]:
-            if str(item['value']) == str(value):
-                return False, f"值 '{value}' 已存在于字段 '{field_name}' 中"
+        if self.get_field_item(field_name, value) is not None:
+            return False, f"值 '{value}' 已存在于字段 '{field_name}' 中"
         
         # 添加新值
         new_item = {
@@ -141,6 +202,8 @@ class DictionaryManager:
         }
         
         self.field_dictionaries[field_name].append(new_item)
+        self._value_index = None
+        self._display_names.clear()
         
         # 保存到文件
         success = self.save_dictionaries()
@@ -194,14 +257,7 @@ class DictionaryManager:
         Returns:
             是否有效
         """
-        if field_name not in self.field_dictionaries:
-            return False
-        
-        for item in self.field_dictionaries[field_name]:
-            if str(item['value']) == str(value):
-                return True
-        
-        return False
+        return self.get_field_item(field_name, value) is not None
     
     def get_statistics(self) -> Dict:
         """获取字典统计信息"""
@@ -298,4 +354,9 @@ class DictionaryManager:
     
     def get_field_chinese_name(self, field_name: str) -> str:
         """获取字段的中文名称"""
-        return self.chinese_field_names.get(field_name, field_name) 
\ No newline at end of file
+        return self.chinese_field_names.get(field_name, field_name) 
+
+
+def _value_key(value) -> str:
+    """字段值 -> 索引键 (字典中的负数可能用'–'书写)"""
+    return str(value).strip().replace('–', '-')
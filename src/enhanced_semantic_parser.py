@@ -4,6 +4,8 @@ from typing import Dict, List, Optional, Tuple, Set
 from difflib import SequenceMatcher
 from collections import defaultdict
 
+from . import reading_type_codec
+
 class EnhancedSemanticParser:
     """增强版语义解析器，提供更准确的ReadingType字段值解析"""
     
@@ -512,8 +514,7 @@ class EnhancedSemanticParser:
         report.append("")
         
         # 构建ReadingTypeID
-        values = [str(analysis[f"field_{i+1}"]) for i in range(16)]
-        reading_type_id = "-".join(values)
+        reading_type_id = self.build_reading_type_id(analysis)
         report.append(f"🔢 生成编码: {reading_type_id}")
         report.append("")
         
@@ -543,31 +544,16 @@ class EnhancedSemanticParser:
     
     def build_reading_type_id(self, field_values: Dict[str, int]) -> str:
         """构建ReadingTypeID字符串"""
-        values = []
-        for i in range(16):
-            field_key = f"field_{i+1}"
-            values.append(str(field_values.get(field_key, 0)))
-        return "-".join(values)
+        return reading_type_codec.build_reading_type_id(reading_type_codec.from_field_dict(field_values))
     
     def parse_reading_type_id(self, reading_type_id: str) -> Dict[str, int]:
         """解析ReadingTypeID字符串
         
         Args:
-            reading_type_id: ReadingTypeID字符串，格式如 "0-0-2-6-1-1-37-0-0-0-0-0-224-3-38-0"
+            reading_type_id: ReadingTypeID字符串，格式如 "0-0-2-6-1-1-37-0-0-0-0-0-224-3-38-0"，
+                也接受'.'分隔的写法
             
         Returns:
             字段值字典 {field_1: value1, field_2: value2, ...}
         """
-        parts = reading_type_id.split('-')
-        
-        if len(parts) != 16:
-            raise ValueError(f"ReadingTypeID格式错误，应包含16个字段，实际包含{len(parts)}个")
-        
-        field_values = {}
-        for i, value in enumerate(parts):
-            try:
-                field_values[f"field_{i+1}"] = int(value)
-            except ValueError:
-                raise ValueError(f"字段{i+1}的值'{value}'不是有效的整数")
-        
-        return field_values 
\ No newline at end of file
+        return reading_type_codec.to_field_dict(reading_type_codec.parse_reading_type_id(reading_type_id)) 
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""操作历史记录
+
+搜索、生成、添加等操作的历史以JSON Lines写入 operation_history.jsonl，每行一条:
+
+    {"timestamp": "2025-06-12T11:34:31.226", "operation": "search", "input": "有功电能",
+     "result": "...(最多200字符)", "result_length": 290, "user_action": "pending"}
+
+log() 只把记录放入内存队列，由后台线程按批写入 (每 flush_interval 秒或攒够 batch_size 条)，
+不占用请求的处理时间。文件超过 max_bytes 时轮转为 .1、.2 …，最多保留 backup_count 个旧文件。
+同一文件只有一个 HistoryLogger (get_history_logger)，进程退出时写完队列中剩余的记录。
+"""
+
+import atexit
+import datetime
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+# 记录中保留的结果长度
+MAX_RESULT_CHARS = 200
+
+
+class HistoryLogger:
+    """带内存队列和后台批量写入的JSON Lines历史记录器 (线程安全)"""
+
+    def __init__(self, path: str = "operation_history.jsonl", max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 5, flush_interval: float = 1.0, batch_size: int = 256,
+                 max_queue: int = 10000):
+        """
+        Args:
+            path: 历史文件路径
+            max_bytes: 超过该大小时轮转 (0 表示不轮转)
+            backup_count: 保留的旧文件数
+            flush_interval: 后台写入的最长间隔 (秒)
+            batch_size: 队列达到该条数时立即写入
+            max_queue: 队列上限，写入跟不上时丢弃新记录并计数，不阻塞调用方
+        """
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._flush_wanted = False
+        self._enqueued = 0
+        self._done = 0
+        # 文件写入与轮转锁 (后台线程与关闭后的同步写入)
+        self._file_lock = threading.Lock()
+
+    def log(self, operation_type: str, input_text: str, result: str = "", user_action: str = "pending",
+            **extra) -> bool:
+        """记录一次操作，返回是否已放入队列 (队列已满时丢弃)"""
+        result = "" if result is None else str(result)
+        record = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "operation": operation_type,
+            "input": input_text,
+            "result": result[:MAX_RESULT_CHARS] + "..." if len(result) > MAX_RESULT_CHARS else result,
+            "result_length": len(result),
+            "user_action": user_action,
+        }
+        record.update(extra)
+
+        with self._cond:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                if len(self._pending) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+                self._pending.append(record)
+                self._enqueued += 1
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="history-logger", daemon=True)
+                    self._thread.start()
+                elif len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+        if closed:
+            # 关闭之后 (进程退出过程中) 的记录直接写入
+            self._write([record])
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                # 空闲时等待第一条记录，之后最多再等 flush_interval 秒攒成一批
+                self._cond.wait_for(lambda: self._pending or self._closed or self._flush_wanted)
+                self._cond.wait_for(lambda: self._closed or self._flush_wanted
+                                    or len(self._pending) >= self.batch_size, self.flush_interval)
+                batch = list(self._pending)
+                self._pending.clear()
+                self._flush_wanted = False
+                closing = self._closed
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._done += len(batch)
+                self._cond.notify_all()
+                if closing and not self._pending:
+                    return
+
+    def _write(self, batch) -> None:
+        data = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+        encoded = data.encode("utf-8")
+        with self._file_lock:
+            try:
+                self._rotate_if_needed(len(encoded))
+                with open(self.path, "ab") as f:
+                    f.write(encoded)
+                self.written += len(batch)
+                self.batches += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"记录历史失败: {e}")
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        if not self.max_bytes:
+            return
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待当前队列中的记录写入文件，返回是否在超时前完成"""
+        with self._cond:
+            if self._thread is None:
+                return True
+            target = self._enqueued
+            self._flush_wanted = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._done >= target, timeout)
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """写完队列中的记录并停止后台线程，之后的记录同步写入"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            pending = len(self._pending)
+        return {"written": self.written, "pending": pending, "dropped": self.dropped,
+                "batches": self.batches, "errors": self.errors}
+
+
+# 路径 -> 共用的记录器
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def get_history_logger(path: str = "operation_history.jsonl") -> HistoryLogger:
+    """获取写入该文件的记录器 (同一文件的所有写入方共用一个记录器和后台线程)"""
+    key = os.path.abspath(path)
+    with _loggers_lock:
+        logger = _loggers.get(key)
+        if logger is None:
+            logger = _loggers[key] = HistoryLogger(path)
+        return logger
+
+
+def flush_all(timeout: Optional[float] = 5.0) -> None:
+    """等待所有记录器队列中的记录写入文件 (删除历史文件所在目录之前调用)"""
+    with _loggers_lock:
+        loggers = list(_loggers.values())
+    for logger in loggers:
+        logger.flush(timeout)
+
+
+@atexit.register
+def close_all() -> None:
+    """写完所有记录器队列中的记录 (进程退出时自动调用)"""
+    with _loggers_lock:
+        loggers = list(_loggers.values())
+    for logger in loggers:
+        logger.close()
@@ -0,0 +1,178 @@
+"""对话历史压缩
+
+conversation_history 会随对话无限增长，每轮请求都要把之前的工具输出 (编码库列表、统计信息等)
+重新发送给大模型。HistoryManager 在每次请求前按token预算压缩历史:
+
+1. 开头的系统提示和最近几轮对话原样保留
+2. 较早轮次中的工具输出和长回复截断
+3. 仍超出预算时，把最早的轮次折叠为本地生成的摘要 (不调用大模型)，或直接丢弃
+
+超出预算时一次压缩到预算的 compact_ratio 以下，之后的若干轮只在末尾追加消息，
+请求前缀保持不变，可以持续命中服务端的上下文缓存。
+"""
+
+import re
+from typing import Dict, List, Optional
+
+# 摘要系统消息的开头，用于在后续压缩时识别并合并已有摘要
+SUMMARY_PREFIX = "以下是较早对话的摘要:"
+
+_ELIDED = "…[已省略"
+_CJK = re.compile(r"[　-〿一-鿿＀-￯]")
+
+# 每条消息的固定开销 (角色、分隔符)
+_MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """估算文本的token数 (DeepSeek: 中文约0.6 token/字，其他字符约0.3 token/字符)"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+def message_tokens(message: Dict) -> int:
+    """估算一条消息的token数"""
+    tokens = _MESSAGE_OVERHEAD + estimate_tokens(message.get("content"))
+    for tool_call in message.get("tool_calls") or ():
+        function = tool_call.get("function", {})
+        tokens += estimate_tokens(function.get("name")) + estimate_tokens(function.get("arguments"))
+    return tokens
+
+
+def _truncate(text: Optional[str], limit: int) -> Optional[str]:
+    """截断文本并注明省略的字数，已截断过的文本不再处理"""
+    if not text or len(text) <= limit or _ELIDED in text:
+        return text
+    return f"{text[:limit]}\n{_ELIDED}{len(text) - limit}字]"
+
+
+def _one_line(text: Optional[str], limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class HistoryManager:
+    """按token预算压缩对话历史"""
+
+    def __init__(self, max_tokens: int = 4000, keep_recent_turns: int = 4,
+                 stale_tool_chars: int = 200, stale_message_chars: int = 400,
+                 summarize: bool = True, max_summary_lines: int = 20,
+                 compact_ratio: float = 0.75):
+        """
+        Args:
+            max_tokens: 压缩后历史的token预算
+            keep_recent_turns: 原样保留的最近轮数 (一轮从一条用户消息开始)
+            stale_tool_chars: 较早轮次中工具输出保留的字数
+            stale_message_chars: 较早轮次中用户和助手消息保留的字数
+            summarize: 超出预算时把最早的轮次折叠为摘要；为False时直接丢弃
+            max_summary_lines: 摘要保留的最多轮数，更早的只记录数量
+            compact_ratio: 超出预算时压缩到 max_tokens * compact_ratio 以下
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.stale_tool_chars = stale_tool_chars
+        self.stale_message_chars = stale_message_chars
+        self.summarize = summarize
+        self.max_summary_lines = max_summary_lines
+        self.compact_ratio = compact_ratio
+
+    def count_tokens(self, messages: List[Dict]) -> int:
+        """估算消息列表的token数"""
+        return sum(message_tokens(message) for message in messages)
+
+    def compact(self, messages: List[Dict]) -> Dict:
+        """原地压缩对话历史
+
+        Args:
+            messages: 对话历史，压缩结果直接写回该列表
+
+        Returns:
+            {"before": 压缩前token数, "after": 压缩后token数,
+             "elided": 截断的消息数, "folded_turns": 折叠或丢弃的轮数}
+        """
+        before = self.count_tokens(messages)
+        stats = {"before": before, "after": before, "elided": 0, "folded_turns": 0}
+        if before <= self.max_tokens:
+            return stats
+
+        head, summary_lines, turns = self._split(messages)
+        recent_start = max(len(turns) - self.keep_recent_turns, 0)
+
+        # 截断较早轮次中的工具输出和长消息
+        for turn in turns[:recent_start]:
+            for i, message in enumerate(turn):
+                limit = self.stale_tool_chars if message["role"] == "tool" else self.stale_message_chars
+                content = _truncate(message.get("content"), limit)
+                if content is not message.get("content"):
+                    turn[i] = dict(message, content=content)
+                    stats["elided"] += 1
+
+        # 仍超出压缩目标时从最早的轮次开始折叠
+        target = int(self.max_tokens * self.compact_ratio)
+        fixed_tokens = self.count_tokens(head) + sum(self.count_tokens(turn) for turn in turns[recent_start:])
+        stale = turns[:recent_start]
+        stale_tokens = [self.count_tokens(turn) for turn in stale]
+        folded = 0
+        while folded < len(stale) and fixed_tokens + self._summary_tokens(summary_lines) + \
+                sum(stale_tokens[folded:]) > target:
+            summary_lines.append(self._summarize_turn(stale[folded]))
+            folded += 1
+        stale = stale[folded:]
+        stats["folded_turns"] = folded
+
+        compacted = list(head)
+        if self.summarize and summary_lines:
+            compacted.append(self._summary_message(summary_lines))
+        for turn in stale + turns[recent_start:]:
+            compacted.extend(turn)
+
+        messages[:] = compacted
+        stats["after"] = self.count_tokens(messages)
+        return stats
+
+    def _split(self, messages: List[Dict]):
+        """拆分为 开头的系统消息、已有摘要行、按用户消息划分的轮次"""
+        head, summary_lines, turns = [], [], []
+        index = 0
+        while index < len(messages) and messages[index]["role"] == "system":
+            content = messages[index].get("content") or ""
+            if content.startswith(SUMMARY_PREFIX):
+                summary_lines.extend(line for line in content[len(SUMMARY_PREFIX):].splitlines() if line)
+            else:
+                head.append(messages[index])
+            index += 1
+
+        for message in messages[index:]:
+            if message["role"] == "user" or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return head, summary_lines, turns
+
+    def _summarize_turn(self, turn: List[Dict]) -> str:
+        """把一轮对话折叠为一行摘要"""
+        user = next((message.get("content") for message in turn if message["role"] == "user"), "")
+        tools = [tool_call["function"]["name"]
+                 for message in turn for tool_call in message.get("tool_calls") or ()]
+        reply = next((message.get("content") for message in reversed(turn)
+                      if message["role"] == "assistant" and message.get("content")), "")
+
+        line = f"- 用户: {_one_line(user, 40)}"
+        if tools:
+            line += f" | 工具: {', '.join(tools)}"
+        return line + f" | 助手: {_one_line(reply, 60)}"
+
+    def _summary_message(self, summary_lines: List[str]) -> Dict:
+        lines = list(summary_lines)
+        if len(lines) > self.max_summary_lines:
+            omitted = len(lines) - self.max_summary_lines
+            if lines[0].startswith("(更早的"):
+                omitted += int(re.search(r"\d+", lines[0]).group()) - 1
+            lines = [f"(更早的{omitted}轮对话已省略)"] + lines[-self.max_summary_lines:]
+        return {"role": "system", "content": SUMMARY_PREFIX + "\n" + "\n".join(lines)}
+
+    def _summary_tokens(self, summary_lines: List[str]) -> int:
+        if not self.summarize or not summary_lines:
+            return 0
+        return message_tokens(self._summary_message(summary_lines))
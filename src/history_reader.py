@@ -0,0 +1,257 @@
+"""操作历史查询
+
+HistoryReader 以只读内存映射打开历史文件及其轮转文件 (operation_history.jsonl.N … .1 和当前文件)，
+为每个文件建立稀疏时间索引: 每 index_every 条记录记下一个 (时间戳, 偏移)。
+按时间范围查询时跳过整体在范围外的文件，在索引中二分查找起始偏移，只解析范围内的行；
+操作类型计数、最常见输入和失败记录都在扫描过程中累计，不把文件整体载入内存。
+
+索引按文件的 (设备, inode) 缓存: 轮转只重命名文件，已建立的索引继续有效；
+当前文件增长时只为新写入的部分补充索引。
+同一历史文件的记录由一个后台线程按时间顺序写入 (history_logger)，文件内的时间戳单调不减。
+"""
+
+import datetime
+import json
+import mmap
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, deque
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from tracing import tool_error
+
+# json.dumps 写出的记录以时间戳开头，建立索引时直接截取，不解析整行
+_TIMESTAMP_PREFIX = b'{"timestamp": "'
+
+TimeBound = Union[None, str, datetime.date, datetime.datetime]
+
+
+def time_key(value: TimeBound) -> Optional[str]:
+    """时间范围的边界 -> 与记录时间戳可直接比较的ISO字符串
+
+    日期表示当天零点；字符串按ISO格式原样比较，"2025-06-12" 即当天零点。
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(timespec="milliseconds")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value).strip().replace(" ", "T")
+
+
+def is_failure(record: Dict) -> bool:
+    """记录的操作是否失败 (结果为错误信息，或用户拒绝了结果)"""
+    return tool_error(record.get("result")) is not None or record.get("user_action") == "rejected"
+
+
+def _line_timestamp(line: bytes) -> Optional[str]:
+    if line.startswith(_TIMESTAMP_PREFIX):
+        end = line.find(b'"', len(_TIMESTAMP_PREFIX))
+        if end > 0:
+            return line[len(_TIMESTAMP_PREFIX):end].decode("ascii", "replace")
+    try:
+        return str(json.loads(line)["timestamp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class _SegmentIndex:
+    """一个历史文件的稀疏时间索引"""
+
+    __slots__ = ("size", "count", "times", "offsets", "first", "last")
+
+    def __init__(self):
+        # 已建立索引的字节数 (到最后一个完整行为止)
+        self.size = 0
+        self.count = 0
+        self.times = []
+        self.offsets = []
+        self.first = None
+        self.last = None
+
+
+class HistoryReader:
+    """操作历史文件的只读查询 (线程安全)"""
+
+    def __init__(self, path: str = "operation_history.jsonl", index_every: int = 256):
+        """
+        Args:
+            path: 历史文件路径 (轮转文件为 path.1、path.2 …)
+            index_every: 稀疏索引的间隔记录数
+        """
+        self.path = os.path.abspath(path)
+        self.index_every = max(1, index_every)
+        # (设备, inode) -> _SegmentIndex
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def segments(self) -> List[str]:
+        """历史文件，按时间从旧到新"""
+        directory, name = os.path.split(self.path)
+        pattern = re.compile(re.escape(name) + r"\.(\d+)$")
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            return []
+        rotated = sorted(((int(match.group(1)), os.path.join(directory, entry))
+                          for entry in entries for match in [pattern.match(entry)] if match), reverse=True)
+        segments = [path for _, path in rotated]
+        if os.path.exists(self.path):
+            segments.append(self.path)
+        return segments
+
+    def _index(self, stat: os.stat_result, mm: mmap.mmap) -> _SegmentIndex:
+        """取得 (必要时补充) 文件的索引"""
+        key = (stat.st_dev, stat.st_ino)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and (index.size > len(mm) or index.first != self._first_timestamp(mm)):
+                # inode被复用 (旧文件删除后新建的文件)
+                index = None
+            if index is None:
+                index = self._indexes[key] = _SegmentIndex()
+            position = index.size
+            while position < len(mm):
+                end = mm.find(b"\n", position)
+                if end < 0:
+                    # 写入中的最后一行，下次查询时再建立索引
+                    break
+                timestamp = _line_timestamp(mm[position:end])
+                if timestamp is not None:
+                    if index.count % self.index_every == 0:
+                        index.times.append(timestamp)
+                        index.offsets.append(position)
+                    if index.first is None:
+                        index.first = timestamp
+                    index.last = timestamp
+                    index.count += 1
+                position = end + 1
+            index.size = position
+            return index
+
+    @staticmethod
+    def _first_timestamp(mm: mmap.mmap) -> Optional[str]:
+        end = mm.find(b"\n")
+        return _line_timestamp(mm[:end]) if end >= 0 else None
+
+    def _prune(self, paths: List[str]) -> None:
+        """丢弃已不存在的文件的索引"""
+        live = set()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            live.add((stat.st_dev, stat.st_ino))
+        with self._lock:
+            for key in set(self._indexes) - live:
+                del self._indexes[key]
+
+    def scan(self, since: TimeBound = None, until: TimeBound = None, operation: Optional[str] = None,
+             failed: Optional[bool] = None) -> Iterator[Dict]:
+        """按时间顺序逐条返回范围内的记录
+
+        Args:
+            since: 起始时间 (包含)
+            until: 结束时间 (不包含)
+            operation: 只返回该操作类型的记录
+            failed: True 只返回失败的记录，False 只返回成功的记录
+        """
+        since, until = time_key(since), time_key(until)
+        segments = self.segments()
+        self._prune(segments)
+        for path in segments:
+            try:
+                with open(path, "rb") as f:
+                    stat = os.fstat(f.fileno())
+                    if stat.st_size == 0:
+                        continue
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        yield from self._scan_segment(self._index(stat, mm), mm, since, until, operation, failed)
+            except (OSError, ValueError):
+                # 文件在查询过程中被轮转删除
+                continue
+
+    @staticmethod
+    def _scan_segment(index: _SegmentIndex, mm: mmap.mmap, since: Optional[str], until: Optional[str],
+                      operation: Optional[str], failed: Optional[bool]) -> Iterator[Dict]:
+        if not index.count:
+            return
+        if (since is not None and index.last < since) or (until is not None and index.first >= until):
+            return
+        position = 0
+        if since is not None:
+            # 最后一个时间戳早于 since 的索引点之后才可能出现范围内的记录
+            point = bisect_left(index.times, since)
+            position = index.offsets[point - 1] if point > 0 else 0
+        while position < index.size:
+            end = mm.find(b"\n", position, index.size)
+            if end < 0:
+                break
+            line = mm[position:end]
+            position = end + 1
+            try:
+                record = json.loads(line)
+                timestamp = str(record["timestamp"])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if since is not None and timestamp < since:
+                continue
+            if until is not None and timestamp >= until:
+                return
+            if operation is not None and record.get("operation") != operation:
+                continue
+            if failed is not None and is_failure(record) != failed:
+                continue
+            yield record
+
+    def count_operations(self, since: TimeBound = None, until: TimeBound = None) -> Dict[str, int]:
+        """各操作类型的记录数，按数量从多到少"""
+        counts = Counter(record.get("operation") for record in self.scan(since, until))
+        return dict(counts.most_common())
+
+    def top_inputs(self, n: int = 10, since: TimeBound = None, until: TimeBound = None,
+                   operation: Optional[str] = None) -> List[Tuple[str, int]]:
+        """出现最多的 n 个输入及次数"""
+        return Counter(record.get("input") for record in self.scan(since, until, operation)).most_common(n)
+
+    def summarize(self, since: TimeBound = None, until: TimeBound = None, operation: Optional[str] = None,
+                  top: int = 10, failures: int = 10) -> Dict:
+        """一次扫描得到范围内的汇总
+
+        Returns:
+            {"total", "first", "last", "operations": {操作类型: 次数}, "top_inputs": [(输入, 次数)],
+             "failed": 失败次数, "failures": 最近 failures 条失败记录}
+        """
+        operations = Counter()
+        inputs = Counter()
+        recent_failures = deque(maxlen=max(0, failures))
+        total = failed = 0
+        first = last = None
+        for record in self.scan(since, until, operation):
+            total += 1
+            if first is None:
+                first = record["timestamp"]
+            last = record["timestamp"]
+            operations[record.get("operation")] += 1
+            inputs[record.get("input")] += 1
+            if is_failure(record):
+                failed += 1
+                recent_failures.append(record)
+        return {
+            "total": total, "first": first, "last": last,
+            "operations": dict(operations.most_common()),
+            "top_inputs": inputs.most_common(top) if top > 0 else [],
+            "failed": failed,
+            "failures": list(recent_failures),
+        }
+
+    def stats(self) -> Dict:
+        """已建立索引的文件数、记录数和索引点数"""
+        with self._lock:
+            return {"segments": len(self._indexes),
+                    "records": sum(index.count for index in self._indexes.values()),
+                    "index_points": sum(len(index.times) for index in self._indexes.values())}
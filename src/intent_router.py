@@ -0,0 +1,146 @@
+"""本地意图路由
+
+识别命令行横幅和帮助中列出的明确命令 (如 '搜索有功电能'、'查询commodity字段'、
+'查看编码库'、'统计')，直接映射为本地工具调用，不经过大模型。
+只匹配完整的命令句式，含糊或复合的输入一律返回None，交给大模型处理。
+本地只路由只读命令: 导出等会写文件或修改编码库的操作需要用户在对话中确认，一律交给大模型。
+
+交给大模型的输入，predict 猜测模型可能发起的只读工具调用，供预取使用。
+"""
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 搜索词中出现这些内容时说明不是单纯的搜索命令
+_AMBIGUOUS_MARKERS = ("生成", "添加", "并且", "然后", "以及", "如何", "怎么", "什么", "为什么", "吗", "呢")
+# 搜索词中出现这些连接词或分隔符时是多个量测的复合搜索，由大模型拆分
+_COMPOUND_MARKERS = ("和", "与", "及", "、", ",", "，")
+
+# 搜索词只允许中英文、数字、空格和少量连接符
+_SEARCH_TERM = re.compile(r"[\w一-鿿\-+/()（） ]{1,30}")
+
+_SEARCH = re.compile(r"(?:搜索|查找|检索)\s*(?:编码\s*)?[:：]?\s*(?P<name>.+?)\s*(?:的编码|编码)?")
+_QUERY_FIELD = re.compile(r"(?:查询|查看)\s*(?:字典\s*)?(?P<field>[A-Za-z]+|[一-鿿]+?)\s*(?:字段|字段字典|的可选值)?")
+_QUERY_ALL_FIELDS = re.compile(r"(?:查询|查看)\s*(?:字典|字段字典|所有字段)")
+_VIEW_LIBRARY = re.compile(r"(?:查看|浏览)\s*(?:(?P<category>[一-鿿]+?)类)?\s*(?:编码库|编码)"
+                           r"(?:\s*第?\s*(?P<page>\d+)\s*页)?")
+_STATISTICS = re.compile(r"(?:查看)?\s*统计(?:信息)?|(?:数据库|编码库)统计(?:信息)?")
+# 寒暄类输入通常不会调用工具
+_SMALL_TALK = ("你好", "您好", "谢谢", "再见", "hello", "hi", "thanks")
+
+_GENERATE = re.compile(r"(?:请|帮我)?\s*(?:生成|创建|新建)\s*(?:一个)?\s*(?P<description>.+?)\s*(?:的编码|编码)?")
+_PREDICT_SEARCH = re.compile(r"(?:请|帮我)?\s*(?:搜索|查找|检索|找一下|查一下)?\s*(?:编码\s*)?[:：]?\s*"
+                             r"(?P<name>.+?)\s*(?:的编码|编码)?")
+
+
+class IntentRouter:
+    """本地意图路由器"""
+
+    def __init__(self, fields: Iterable[Tuple[str, str]],
+                 categories: Optional[Callable[[], Iterable[str]]] = None):
+        """
+        Args:
+            fields: (英文字段名, 中文名) 列表，用于识别字典查询命令
+            categories: 返回当前编码库类别的函数，用于识别按类别浏览命令
+        """
+        self.field_aliases = {}
+        for name, chinese_name in fields:
+            self.field_aliases[name.lower()] = name
+            self.field_aliases[chinese_name] = name
+        self.categories = categories or (lambda: ())
+
+    def route(self, user_input: str) -> Optional[Tuple[str, Dict]]:
+        """识别命令
+
+        Args:
+            user_input: 用户输入
+
+        Returns:
+            (工具名称, 工具参数)，只会是只读工具；不是明确命令时返回None
+        """
+        text = user_input.strip().rstrip("。.!！")
+        if not text:
+            return None
+
+        for rule in (self._route_statistics, self._route_view_library, self._route_dictionary,
+                     self._route_search):
+            routed = rule(text)
+            if routed is not None:
+                return routed
+        return None
+
+    def predict(self, user_input: str, limit: int = 3) -> List[Tuple[str, Dict]]:
+        """猜测大模型对该输入会发起的只读工具调用
+
+        生成类输入预测 generate_reading_type，其余预测 search_reading_type
+        (用 "和" 连接的多个量测各一个调用)；提问或过长的输入不预测。
+
+        Returns:
+            [(工具名称, 工具参数)]，最多 limit 个
+        """
+        text = user_input.strip().rstrip("。.!！")
+        if not text or len(text) > 40:
+            return []
+
+        match = _GENERATE.fullmatch(text)
+        if match:
+            description = match.group("description").strip()
+            if not _SEARCH_TERM.fullmatch(description):
+                return []
+            return [("generate_reading_type", {"description": description})]
+
+        if any(marker in text for marker in _AMBIGUOUS_MARKERS) or text.lower().startswith(_SMALL_TALK):
+            return []
+        match = _PREDICT_SEARCH.fullmatch(text)
+        if not match:
+            # 多行等不符合句式的输入
+            return []
+        names = [part.strip() for part in match.group("name").split("和") if part.strip()]
+        if not all(_SEARCH_TERM.fullmatch(part) for part in names):
+            return []
+        return [("search_reading_type", {"name": part}) for part in names[:limit]]
+
+    def _route_statistics(self, text: str) -> Optional[Tuple[str, Dict]]:
+        if _STATISTICS.fullmatch(text):
+            return "get_statistics", {}
+        return None
+
+    def _route_view_library(self, text: str) -> Optional[Tuple[str, Dict]]:
+        match = _VIEW_LIBRARY.fullmatch(text)
+        if not match:
+            return None
+
+        args = {}
+        category = match.group("category")
+        if category:
+            if category not in self._known_categories():
+                return None
+            args["category"] = category
+        if match.group("page"):
+            args["page"] = int(match.group("page"))
+        return "view_codes_library", args
+
+    def _route_dictionary(self, text: str) -> Optional[Tuple[str, Dict]]:
+        if _QUERY_ALL_FIELDS.fullmatch(text):
+            return "query_dictionary", {}
+
+        match = _QUERY_FIELD.fullmatch(text)
+        if not match:
+            return None
+        field = self.field_aliases.get(match.group("field").lower())
+        if field is None:
+            return None
+        return "query_dictionary", {"field_name": field}
+
+    def _route_search(self, text: str) -> Optional[Tuple[str, Dict]]:
+        match = _SEARCH.fullmatch(text)
+        if not match:
+            return None
+
+        name = match.group("name").strip()
+        if not _SEARCH_TERM.fullmatch(name) or any(marker in name for marker in _AMBIGUOUS_MARKERS + _COMPOUND_MARKERS):
+            return None
+        return "search_reading_type", {"name": name}
+
+    def _known_categories(self) -> List[str]:
+        return [str(category) for category in self.categories() if category]
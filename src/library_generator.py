@@ -0,0 +1,470 @@
+"""合成编码库生成器
+
+按测量对象 (商品类型 + 测量类型) 的配置，从 field_dictionaries.csv 的合法取值中抽样字段组合，
+测量类型与单位遵守 SemanticParser 的组合规则，并按字段取值合成中文名称和说明 (说明中的单位与uom一致)。
+字段组合按批在numpy矩阵上抽样、去重和合成文字，结果按批写入与 reading_type_codes.csv 相同格式的CSV，
+内存占用与行数无关，可生成千万行的编码库。
+
+相同的种子、行数和字典文件生成完全相同的文件，便于复现基准测试。
+
+用法:
+    python src/library_generator.py --rows 1000000 --seed 42 --output reading_type_codes_1m.csv
+"""
+
+import argparse
+import csv
+import io
+import math
+import time
+from itertools import accumulate, repeat
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import reading_type_codec
+from semantic_parser import SemanticParser
+
+FIELD_NAMES = [
+    "macroPeriod", "aggregate", "measurePeriod", "accumulationBehaviour",
+    "flowDirection", "commodity", "measurementKind", "harmonic",
+    "argumentNumerator", "TOU", "cpp", "tier", "phase", "multiplier", "uom", "currency"
+]
+
+(MACRO_PERIOD, AGGREGATE, MEASURE_PERIOD, ACCUMULATION, FLOW, COMMODITY, KIND, HARMONIC,
+ ARGUMENT_NUMERATOR, TOU, CPP, TIER, PHASE, MULTIPLIER, UOM, CURRENCY) = range(16)
+
+FIELD_COLUMNS = [f"field_{i}" for i in range(1, 17)]
+COLUMNS = ["id", "name", "description", "reading_type_id"] + FIELD_COLUMNS + ["created_at", "source", "category"]
+
+# 商品类型 -> (名称前缀, 类别, 可用的测量类型)
+COMMODITIES = {
+    1: ("电表", "表计", [37, 12, 54, 4, 8, 38]),
+    41: ("储能", "储能", [37, 12, 54, 4, 46, 118, 119, 183, 11]),
+    902: ("BMS", "储能", [54, 4, 46, 119, 118]),
+    903: ("PCS", "储能", [37, 12, 54, 4, 38, 118]),
+    40: ("气象", "其他", [46]),
+}
+COMMODITY_WEIGHTS = {1: 6, 41: 3, 902: 1, 903: 2, 40: 0.2}
+
+# 测量类型 -> 名称、单位、累积行为、是否为计费类 (带宏周期和时段/阶梯/关键峰值期)
+# 单位按IEC字典取值；规则中约束的测量类型 (功率/电能/电压/电流/状态) 与 SemanticParser 的组合规则一致
+KINDS = {
+    37: {"label": "有功功率", "uom": 38, "accumulation": [12, 6], "multipliers": [0, 3, 6]},
+    12: {"label": "电能", "uom": 72, "accumulation": [3, 4], "multipliers": [0, 3, 6], "tariff": True},
+    8: {"label": "需量", "uom": 38, "accumulation": [4], "multipliers": [3, 6], "tariff": True},
+    54: {"label": "电压", "uom": 29, "accumulation": [12, 6], "multipliers": [0, 3]},
+    4: {"label": "电流", "uom": 5, "accumulation": [12, 6], "multipliers": [0]},
+    38: {"label": "功率因数", "uom": 65, "accumulation": [12], "multipliers": [0]},
+    46: {"label": "温度", "uom": 23, "accumulation": [12], "multipliers": [0], "no_flow": True},
+    118: {"label": "告警", "uom": 0, "accumulation": [0], "multipliers": [0], "alarm": True},
+    119: {"label": "电池容量", "uom": 106, "accumulation": [12], "multipliers": [0, 3], "no_flow": True},
+    183: {"label": "电池充放电量", "uom": 106, "accumulation": [3, 4], "multipliers": [0, 3]},
+    11: {"label": "带电状态", "uom": 109, "accumulation": [12], "multipliers": [0], "no_flow": True},
+}
+
+# 单位 -> 说明中的单位符号 (None 表示说明中不写单位)
+UNIT_SYMBOLS = {38: "W", 72: "Wh", 29: "V", 5: "A", 106: "Ah", 23: "°C", 0: None, 65: None, 109: None}
+MULTIPLIER_PREFIXES = {0: "", 3: "k", 6: "M"}
+
+# 告警类型按时段字段 (TOU) 区分，告警编号按关键峰值期字段 (cpp) 区分，取值均在字典范围内
+ALARMS = ["过压", "欠压", "过流", "过温", "通信", "绝缘", "接地", "消防"]
+
+# 字段取值 -> (中文, 权重)；0 表示不适用，名称中不出现
+PHASES = {0: ("", 4), 224: ("三相", 3), 128: ("A相", 2), 64: ("B相", 2), 32: ("C相", 2),
+          132: ("AB线", 1), 66: ("BC线", 1)}
+FLOWS = {0: ("", 3), 1: ("正向", 3), 19: ("反向", 2), 4: ("净", 1), 20: ("总", 1)}
+ACCUMULATIONS = {0: "状态", 3: "累计", 4: "区间", 6: "指示", 12: "瞬时"}
+AGGREGATES = {2: ("平均", 3), 8: ("最大", 2), 9: ("最小", 2), 26: ("累加", 1)}
+MACRO_PERIODS = {0: ("", 8), 11: ("日", 3), 13: ("月", 3), 24: ("周", 1), 8: ("结算周期", 1)}
+# 测量周期 -> 分钟数 (IEC measurePeriod 取值)
+MEASURE_PERIOD_MINUTES = {
+    3: 1, 10: 2, 14: 3, 8: 4, 6: 5, 9: 6, 11: 7, 12: 8, 13: 9, 1: 10, 78: 12, 17: 13, 18: 14,
+    2: 15, 19: 16, 20: 17, 21: 18, 22: 19, 31: 20, 23: 21, 24: 22, 25: 23, 26: 24, 27: 25, 28: 26,
+    29: 27, 30: 28, 5: 30, 7: 60, 79: 120, 83: 180, 80: 240, 81: 360, 82: 720, 4: 1440,
+}
+COMMON_PERIODS = {2: 8, 6: 4, 7: 4, 5: 2, 3: 1, 4: 1}
+# 计费类的时段/阶梯/关键峰值期取值为 0..7
+TARIFF_VALUES = list(range(8))
+TARIFF_WEIGHTS = [8, 2, 2, 2, 1, 1, 1, 1]
+
+
+def load_field_values(dictionaries_file: str = "field_dictionaries.csv") -> Dict[str, set]:
+    """读取字典中每个字段的非负整数取值 (负数乘数和小数谐波无法写入ReadingTypeID，不参与抽样)"""
+    values = {}
+    with open(dictionaries_file, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                value = int(str(row["field_value"]).strip())
+            except ValueError:
+                continue
+            if value >= 0:
+                values.setdefault(str(row["field_name"]).strip(), set()).add(value)
+    return values
+
+
+def period_label(minutes: int) -> str:
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440 * 24}小时"
+    if minutes % 60 == 0:
+        return f"{minutes // 60}小时"
+    return f"{minutes}分钟"
+
+
+def row_keys(matrix: np.ndarray) -> np.ndarray:
+    """N×16 字段矩阵 -> 每行的64位哈希键"""
+    return reading_type_codec.hash_batch(matrix)
+
+
+class SeenFilter:
+    """布隆过滤器，记录已生成组合的哈希键 (按批查询和写入)
+
+    千万行时用集合保存全部编码需要上GB内存，布隆过滤器只需每行约1.2字节。
+    误判 (包括哈希碰撞) 只会让一个未出现过的组合被当作重复而重新抽样，不会产生重复编码。
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """加入一批64位键，返回每个键是否为新键 (已存在或误判为存在时为False，批内重复的键只有第一个为True)"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        h1 = reading_type_codec.hash_batch(keys[first, None])
+        h2 = reading_type_codec.hash_batch((h1 ^ np.uint64(0x9E3779B97F4A7C15))[:, None]) | np.uint64(1)
+        size = np.uint64(self.size)
+        present = np.ones(len(first), dtype=bool)
+        positions = []
+        with np.errstate(over="ignore"):
+            for i in range(self.hashes):
+                position = (h1 + np.uint64(i) * h2) % size
+                byte, bit = (position >> np.uint64(3)).astype(np.intp), (position & np.uint64(7)).astype(np.uint8)
+                present &= ((self.bits[byte] >> bit) & 1).astype(bool)
+                positions.append((byte, bit))
+        for byte, bit in positions:
+            np.bitwise_or.at(self.bits, byte[~present], np.left_shift(1, bit[~present]).astype(np.uint8))
+        fresh = np.zeros(len(keys), dtype=bool)
+        fresh[first[~present]] = True
+        return fresh
+
+
+def _draw(rng: np.random.Generator, table: tuple, count: int) -> np.ndarray:
+    """按累积权重抽取 count 个取值"""
+    values, cumulative, _ = table
+    if not values or count == 0:
+        return np.zeros(count, dtype=np.int64)
+    picks = np.searchsorted(cumulative, rng.random(count) * cumulative[-1], side="right")
+    return np.asarray(values, dtype=np.int64)[picks]
+
+
+def _labels(column: np.ndarray, label: Callable[[int], str]) -> np.ndarray:
+    """整列取值 -> 对应文字的object数组 (每个不同的取值只调用一次 label)"""
+    values, inverse = np.unique(column, return_inverse=True)
+    return np.array([label(value) for value in values.tolist()], dtype=object)[inverse.ravel()]
+
+
+class LibraryGenerator:
+    """合成编码库生成器"""
+
+    def __init__(self, dictionaries_file: str = "field_dictionaries.csv", seed: int = 0,
+                 source: str = "合成数据", created_at: str = "2025-01-01 00:00:00"):
+        """
+        Args:
+            dictionaries_file: 字段字典，抽样的取值限定在字典内
+            seed: 随机种子
+            source: 写入source列的来源
+            created_at: 写入created_at列的时间
+        """
+        self.seed = seed
+        self.source = source
+        self.created_at = created_at
+        self.field_values = load_field_values(dictionaries_file)
+        self.rules = SemanticParser().combination_rules
+        self._build_tables()
+
+    def _allowed(self, field_name: str, value: int) -> bool:
+        return value in self.field_values.get(field_name, ())
+
+    def _weighted(self, field_name: str, options: Dict) -> tuple:
+        """{取值: (中文, 权重)} -> (取值列表, 累积权重, 中文字典)，去掉字典中没有的取值"""
+        kept = {value: option for value, option in options.items() if self._allowed(field_name, value)}
+        return (list(kept), list(accumulate(weight for _, weight in kept.values())),
+                {value: label for value, (label, _) in kept.items()})
+
+    def _build_tables(self) -> None:
+        """按字典过滤配置，得到可抽样的取值表"""
+        kinds = {}
+        for kind, spec in KINDS.items():
+            if not (self._allowed("measurementKind", kind) and self._allowed("uom", spec["uom"])):
+                continue
+            # 配置中的单位必须满足组合规则
+            if any(kind in rule["kinds"] and spec["uom"] not in rule["uoms"] for rule in self.rules):
+                continue
+            kinds[kind] = dict(spec,
+                               accumulation=[v for v in spec["accumulation"] if self._allowed("accumulationBehaviour", v)],
+                               multipliers=[v for v in spec["multipliers"] if self._allowed("multiplier", v)])
+
+        # 测量对象 (商品类型, 测量类型)，权重为商品类型的权重在其测量类型间均分
+        self.profiles, self.profile_weights = [], []
+        for commodity, (prefix, category, commodity_kinds) in COMMODITIES.items():
+            if not self._allowed("commodity", commodity):
+                continue
+            usable = [kind for kind in commodity_kinds
+                      if kind in kinds and kinds[kind]["accumulation"] and kinds[kind]["multipliers"]]
+            for kind in usable:
+                self.profiles.append((commodity, kind))
+                self.profile_weights.append(COMMODITY_WEIGHTS[commodity] / len(usable))
+        if not self.profiles:
+            raise ValueError("字典中没有可用于生成编码的商品类型/测量类型组合")
+        self.kinds = kinds
+
+        self.phases = self._weighted("phase", PHASES)
+        self.flows = self._weighted("flowDirection", FLOWS)
+        self.aggregates = self._weighted("aggregate", AGGREGATES)
+        self.macro_periods = self._weighted("macroPeriod", MACRO_PERIODS)
+        periods = {value: (period_label(minutes), COMMON_PERIODS.get(value, 0.2))
+                   for value, minutes in MEASURE_PERIOD_MINUTES.items()}
+        self.periods = self._weighted("measurePeriod", periods)
+        self.tariff = {field: self._weighted(field, {value: (str(value), weight)
+                                                     for value, weight in zip(TARIFF_VALUES, TARIFF_WEIGHTS)})
+                       for field in ("TOU", "cpp", "tier")}
+        self.uniform_tariff = {field: (table[0], list(range(1, len(table[0]) + 1)), table[2])
+                               for field, table in self.tariff.items()}
+
+        # 测量类型 -> 抽到重复组合时可以改动的 [(字段序号, 可选取值)]
+        self.variants = {}
+        for kind, spec in kinds.items():
+            if spec.get("alarm"):
+                fields = [(PHASE, self.phases[0]), (TOU, self.tariff["TOU"][0]), (CPP, self.tariff["cpp"][0])]
+            elif kind == 11:
+                fields = []
+            else:
+                fields = [(PHASE, self.phases[0]), (MEASURE_PERIOD, [0] + self.periods[0]),
+                          (AGGREGATE, self.aggregates[0]), (ACCUMULATION, spec["accumulation"]),
+                          (MULTIPLIER, spec["multipliers"])]
+                if not spec.get("no_flow"):
+                    fields.append((FLOW, self.flows[0]))
+                if spec.get("tariff"):
+                    fields += [(MACRO_PERIOD, self.macro_periods[0]), (TOU, self.tariff["TOU"][0]),
+                               (TIER, self.tariff["tier"][0]), (CPP, self.tariff["cpp"][0])]
+            self.variants[kind] = [(index, options) for index, options in fields if len(options) > 1]
+
+    def sample_batch(self, rng: np.random.Generator, profiles: np.ndarray) -> np.ndarray:
+        """为每个测量对象 (self.profiles 的序号) 抽样16个字段值，返回 N×16 矩阵"""
+        matrix = np.zeros((len(profiles), 16), dtype=np.int64)
+        for index in np.unique(profiles).tolist():
+            rows = np.flatnonzero(profiles == index)
+            matrix[rows] = self._sample_profile(rng, *self.profiles[index], len(rows))
+        return matrix
+
+    def _sample_profile(self, rng: np.random.Generator, commodity: int, kind: int, count: int) -> np.ndarray:
+        spec = self.kinds[kind]
+        values = np.zeros((count, 16), dtype=np.int64)
+        values[:, COMMODITY], values[:, KIND], values[:, UOM] = commodity, kind, spec["uom"]
+        accumulation = values[:, ACCUMULATION] = rng.choice(spec["accumulation"], count)
+        values[:, MULTIPLIER] = rng.choice(spec["multipliers"], count)
+
+        if spec.get("alarm"):
+            values[:, PHASE] = _draw(rng, self.phases, count)
+            values[:, TOU] = _draw(rng, self.uniform_tariff["TOU"], count)
+            values[:, CPP] = _draw(rng, self.uniform_tariff["cpp"], count)
+        elif kind != 11:
+            values[:, PHASE] = _draw(rng, self.phases, count)
+            if not spec.get("no_flow"):
+                values[:, FLOW] = _draw(rng, self.flows, count)
+            # 区间量必有测量周期，瞬时量按一定比例带周期 (此时为周期内的统计值)
+            periodic = (accumulation == 4) | (rng.random(count) < 0.3)
+            values[periodic, MEASURE_PERIOD] = _draw(rng, self.periods, int(periodic.sum()))
+            aggregated = periodic & (accumulation != 4) & (values[:, MEASURE_PERIOD] != 0)
+            values[aggregated, AGGREGATE] = _draw(rng, self.aggregates, int(aggregated.sum()))
+            if spec.get("tariff"):
+                values[:, MACRO_PERIOD] = _draw(rng, self.macro_periods, count)
+                for index, field in ((TOU, "TOU"), (TIER, "tier"), (CPP, "cpp")):
+                    chosen = rng.random(count) < 0.5
+                    values[chosen, index] = _draw(rng, self.tariff[field], int(chosen.sum()))
+        return values
+
+    def perturb_batch(self, rng: np.random.Generator, matrix: np.ndarray) -> np.ndarray:
+        """每行随机改动一个字段 (均匀抽取)，用于从已生成的组合走到相邻的组合
+
+        直接修改 matrix，返回每行是否有可改动的字段
+        """
+        movable = np.zeros(len(matrix), dtype=bool)
+        kinds = matrix[:, KIND]
+        for kind in np.unique(kinds).tolist():
+            variants = self.variants[kind]
+            if not variants:
+                continue
+            rows = np.flatnonzero(kinds == kind)
+            movable[rows] = True
+            choices = rng.integers(len(variants), size=len(rows))
+            for choice, (index, options) in enumerate(variants):
+                target = rows[choices == choice]
+                # 均匀抽取与当前不同的取值
+                options = np.asarray(options, dtype=np.int64)
+                picked = options[rng.integers(len(options) - 1, size=len(target))]
+                matrix[target, index] = np.where(picked == matrix[target, index], options[-1], picked)
+
+        # 保持与抽样相同的约束: 区间量必有测量周期且不聚合，带周期的瞬时量必有聚合类型
+        interval = movable & (matrix[:, ACCUMULATION] == 4)
+        matrix[interval, AGGREGATE] = 0
+        missing = interval & (matrix[:, MEASURE_PERIOD] == 0)
+        matrix[missing, MEASURE_PERIOD] = _draw(rng, self.periods, int(missing.sum()))
+        other = movable & ~interval
+        matrix[other & (matrix[:, MEASURE_PERIOD] == 0), AGGREGATE] = 0
+        missing = other & (matrix[:, MEASURE_PERIOD] != 0) & (matrix[:, AGGREGATE] == 0)
+        matrix[missing, AGGREGATE] = _draw(rng, self.aggregates, int(missing.sum()))
+        return movable
+
+    def describe_batch(self, matrix: np.ndarray) -> Tuple[List[str], List[str], List[str]]:
+        """字段矩阵 -> (名称列表, 说明列表, 类别列表)
+
+        每列的取值先换成文字 (每个不同的取值只换一次)，再按列拼接字符串
+        """
+        column = lambda index: matrix[:, index]  # noqa: E731
+        prefix = _labels(column(COMMODITY), lambda value: COMMODITIES[value][0])
+        kind_label = _labels(column(KIND), lambda value: self.kinds[value]["label"])
+        phase = _labels(column(PHASE), lambda value: self.phases[2].get(value, ""))
+        alarm = np.isin(column(KIND), [kind for kind, spec in self.kinds.items() if spec.get("alarm")])
+
+        alarm_names = (prefix + phase + _labels(column(CPP), lambda value: f"{value}号" if value else "")
+                       + _labels(column(TOU), lambda value: ALARMS[value] if 0 <= value < len(ALARMS) else "")
+                       + kind_label)
+        names = (prefix
+                 + _labels(column(MACRO_PERIOD), lambda value: self.macro_periods[2].get(value, ""))
+                 + _labels(column(MEASURE_PERIOD), lambda value: self.periods[2].get(value, ""))
+                 + _labels(column(AGGREGATE), lambda value: self.aggregates[2].get(value, ""))
+                 + phase
+                 + _labels(column(FLOW), lambda value: self.flows[2].get(value, ""))
+                 + kind_label
+                 + _labels(column(TIER), lambda value: f"第{value}阶梯" if value else "")
+                 + _labels(column(TOU), lambda value: f"费率{value}" if value else "")
+                 + _labels(column(CPP), lambda value: f"尖峰{value}" if value else ""))
+        names = np.where(alarm, alarm_names, names)
+
+        def unit(key: int) -> str:
+            uom, multiplier = divmod(key, 64)
+            symbol = UNIT_SYMBOLS.get(uom)
+            if symbol is not None:
+                return f"，单位{MULTIPLIER_PREFIXES.get(multiplier, '')}{symbol}"
+            return "，无单位" if uom in (0, 109) else ""
+
+        descriptions = (names + _labels(column(ACCUMULATION), lambda value: ACCUMULATIONS.get(value, "")) + "量测"
+                        + _labels(column(UOM) * 64 + column(MULTIPLIER), unit))
+        categories = np.where(alarm, "告警", _labels(column(COMMODITY), lambda value: COMMODITIES[value][1]))
+        return names.tolist(), descriptions.tolist(), categories.tolist()
+
+    def iter_batches(self, rows: int, walk: int = 32, saturation: float = 16.0,
+                     batch_size: int = 65536) -> Iterator[np.ndarray]:
+        """按批生成共 rows 行ReadingTypeID互不相同的字段矩阵
+
+        每批按权重抽样测量对象和字段值，与已生成的组合重复的行随机改动字段走到相邻组合，最多 walk 步。
+        每个测量对象记录最近生成一条编码平均需要的步数 (指数滑动平均)，超过 saturation 时认为其组合
+        已基本用尽，之后不再抽样；全部测量对象用尽时抛出ValueError
+        """
+        rng = np.random.default_rng(self.seed)
+        seen = SeenFilter(rows)
+        active = np.arange(len(self.profiles))
+        costs = np.ones(len(self.profiles))
+        remaining = rows
+        while remaining > 0:
+            if not len(active):
+                raise ValueError(f"生成第{rows - remaining + 1}条编码时全部字段组合已用尽")
+            cumulative = np.cumsum(np.asarray(self.profile_weights)[active])
+            count = min(remaining, batch_size)
+            profiles = active[np.searchsorted(cumulative, rng.random(count) * cumulative[-1], side="right")]
+            matrix = self.sample_batch(rng, profiles)
+
+            steps = np.full(count, walk)
+            accepted = np.zeros(count, dtype=bool)
+            pending = np.arange(count)
+            for step in range(1, walk + 1):
+                fresh = seen.add(row_keys(matrix[pending]))
+                accepted[pending[fresh]] = True
+                steps[pending[fresh]] = step
+                pending = pending[~fresh]
+                if step == walk or not len(pending):
+                    break
+                moved = matrix[pending]
+                movable = self.perturb_batch(rng, moved)
+                matrix[pending] = moved
+                pending = pending[movable]
+
+            # 同一批内某测量对象的 k 次抽样合并为一次更新: 衰减 0.9**k，向本批的平均步数靠拢 (失败按 walk 步计)
+            for index in np.unique(profiles).tolist():
+                drawn = profiles == index
+                decay = 0.9 ** int(drawn.sum())
+                costs[index] = decay * costs[index] + (1 - decay) * float(steps[drawn].mean())
+            active = active[costs[active] <= saturation]
+
+            batch = matrix[accepted]
+            remaining -= len(batch)
+            if len(batch):
+                yield batch
+
+    def _rows(self, matrix: np.ndarray, first_id: int) -> Iterator[Tuple]:
+        """一批字段矩阵 -> 与 COLUMNS 顺序一致的行元组，id 从 first_id 开始"""
+        names, descriptions, categories = self.describe_batch(matrix)
+        return zip(range(first_id, first_id + len(matrix)), names, descriptions,
+                   reading_type_codec.encode_batch(matrix), *matrix.T.tolist(),
+                   repeat(self.created_at), repeat(self.source), categories)
+
+    def iter_codes(self, rows: int, **options) -> Iterator[Dict]:
+        """逐条生成 rows 条ReadingTypeID互不相同的编码 (字典，键与 COLUMNS 一致)，options 传给 iter_batches"""
+        code_id = 1
+        for matrix in self.iter_batches(rows, **options):
+            for row in self._rows(matrix, code_id):
+                yield dict(zip(COLUMNS, row))
+            code_id += len(matrix)
+
+    def write_csv(self, output: str, rows: int,
+                  progress: Optional[Callable[[int], None]] = None, progress_every: int = 100000) -> int:
+        """生成编码库并按批写入CSV，返回写入的行数
+
+        Args:
+            progress: 每写入 progress_every 行调用一次，参数为已写入行数
+        """
+        written = 0
+        with open(output, "w", encoding="utf-8-sig", newline="") as f:
+            csv.writer(f).writerow(COLUMNS)
+            for matrix in self.iter_batches(rows):
+                # 整批先写入内存再一次写入文件，避免逐行编码
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(self._rows(matrix, written + 1))
+                f.write(buffer.getvalue())
+                previous, written = written, written + len(matrix)
+                if progress is not None and written // progress_every > previous // progress_every:
+                    progress(written)
+        return written
+
+
+def generate_library(output: str, rows: int, seed: int = 0,
+                     dictionaries_file: str = "field_dictionaries.csv") -> int:
+    """生成 rows 行的合成编码库写入 output，返回写入的行数"""
+    return LibraryGenerator(dictionaries_file, seed).write_csv(output, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成与IEC字段字典一致的合成ReadingType编码库")
+    parser.add_argument("--rows", type=int, default=10000, help="生成的编码条数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子 (相同种子生成相同的文件)")
+    parser.add_argument("--output", default="reading_type_codes_synthetic.csv", help="输出CSV文件")
+    parser.add_argument("--dictionaries", default="field_dictionaries.csv", help="字段字典文件")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    def progress(written):
+        elapsed = time.perf_counter() - start
+        print(f"   已生成 {written:,} 条 ({written / elapsed:,.0f} 条/秒)")
+
+    generator = LibraryGenerator(args.dictionaries, args.seed)
+    written = generator.write_csv(args.output, args.rows, progress=progress)
+    print(f"✅ 已生成 {written:,} 条编码: {args.output} (种子 {args.seed}, 耗时 {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""大模型调用指标
+
+MeteredClient 包装 chat.completions.create，每次调用记录首token耗时、总耗时和
+提示/补全/缓存命中的token数；智能体在每轮对话结束时记录工具调用轮数。
+指标按进程和按会话汇总 (p50/p95/p99)，会话由 LLMMetrics.session 设置的上下文变量区分，
+HTTP服务中每轮对话在自己的会话范围内执行，命令行的对话不属于任何会话，只计入进程汇总。
+
+补全缓存包装在本客户端之外，命中缓存的回复不是真正的API调用，不计入调用指标，
+而由缓存包装调用 record_cache 单独记录命中/未命中次数和命中时的耗时。
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from client_wrapper import AsyncWrappedCompletions, StreamObserver, WrappedClient, WrappedCompletions
+from prompt_cache import cached_prompt_tokens
+
+# 当前会话ID (None 表示不属于任何会话)
+_current_session = contextvars.ContextVar("metrics_session", default=None)
+
+# 每次调用的指标 (耗时为毫秒)
+CALL_SERIES = ("ttft_ms", "latency_ms", "prompt_tokens", "completion_tokens", "cached_tokens")
+# 每轮对话的指标
+TURN_SERIES = ("tool_rounds",)
+# 补全缓存命中的指标
+CACHE_SERIES = ("cache_hit_ms",)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def current_session() -> Optional[str]:
+    return _current_session.get()
+
+
+def _quantile(ordered: List[float], q: float) -> float:
+    """最近邻秩分位数"""
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Series:
+    """一项指标: 累计次数与总和，最近 window 个样本用于计算分位数"""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def summary(self) -> Dict:
+        ordered = sorted(self.samples)
+        summary = {"count": self.count, "total": self.total,
+                   "mean": self.total / self.count if self.count else 0.0, "max": self.max}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = _quantile(ordered, q) if ordered else 0.0
+        return summary
+
+
+class _Aggregate:
+    """一组 (进程或一个会话的) 指标"""
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.turns = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.series = {name: Series(window) for name in CALL_SERIES + TURN_SERIES + CACHE_SERIES}
+
+    def add_call(self, values: Dict, error: bool) -> None:
+        self.calls += 1
+        self.errors += bool(error)
+        for name in CALL_SERIES:
+            if values.get(name) is not None:
+                self.series[name].add(values[name])
+
+    def add_turn(self, tool_rounds: int) -> None:
+        self.turns += 1
+        self.series["tool_rounds"].add(tool_rounds)
+
+    def add_cache(self, hit: bool, latency_ms: float) -> None:
+        if hit:
+            self.cache_hits += 1
+            self.series["cache_hit_ms"].add(latency_ms)
+        else:
+            self.cache_misses += 1
+
+    def summary(self) -> Dict:
+        summary = {"calls": self.calls, "errors": self.errors, "turns": self.turns,
+                   "cache_hits": self.cache_hits, "cache_misses": self.cache_misses}
+        summary.update((name, series.summary()) for name, series in self.series.items())
+        return summary
+
+
+class LLMMetrics:
+    """进程和会话的大模型调用指标 (线程安全，可被并发会话共用)"""
+
+    def __init__(self, window: int = 10000, session_window: int = 1000, max_sessions: int = 1000):
+        """
+        Args:
+            window: 进程汇总计算分位数使用的最近样本数
+            session_window: 每个会话计算分位数使用的最近样本数
+            max_sessions: 保留指标的会话数，超过时淘汰最久未使用的会话
+        """
+        self.session_window = session_window
+        self.max_sessions = max_sessions
+        self._process = _Aggregate(window)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _targets(self, session_id: Optional[str]) -> List[_Aggregate]:
+        if session_id is None:
+            return [self._process]
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Aggregate(self.session_window)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return [self._process, session]
+
+    @contextmanager
+    def session(self, session_id: Optional[str]):
+        """在范围内 (同一线程或异步任务中) 的API调用和对话轮次计入该会话的指标"""
+        token = _current_session.set(session_id)
+        try:
+            yield
+        finally:
+            _current_session.reset(token)
+
+    def record_call(self, ttft: Optional[float], latency: float, usage=None, error: bool = False,
+                    session_id: Optional[str] = None) -> None:
+        """记录一次API调用 (耗时为秒，session_id 为None时使用当前会话)"""
+        values = {"ttft_ms": None if ttft is None else ttft * 1000, "latency_ms": latency * 1000}
+        if usage is not None:
+            cached, prompt_tokens = cached_prompt_tokens(usage)
+            values.update(prompt_tokens=prompt_tokens, cached_tokens=cached,
+                          completion_tokens=getattr(usage, "completion_tokens", None) or 0)
+        with self._lock:
+            for aggregate in self._targets(session_id or current_session()):
+                aggregate.add_call(values, error)
+
+    def record_turn(self, tool_rounds: int, session_id: Optional[str] = None) -> None:
+        """记录一轮对话的工具调用轮数"""
+        with self._lock:
+            for aggregate in self._targets(session_id or current_session()):
+                aggregate.add_turn(tool_rounds)
+
+    def record_cache(self, hit: bool, latency: float, session_id: Optional[str] = None) -> None:
+        """记录一次补全缓存查找 (latency 为秒，只有命中时计入 cache_hit_ms)"""
+        with self._lock:
+            for aggregate in self._targets(session_id or current_session()):
+                aggregate.add_cache(hit, latency * 1000)
+
+    def drop_session(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def get_metrics(self, session_id: Optional[str] = None) -> Dict:
+        """指标汇总
+
+        Returns:
+            {"process": 汇总, "sessions": 会话数, "session": 该会话的汇总 (指定 session_id 时)}，
+            汇总为 {"calls", "errors", "turns", "cache_hits", "cache_misses", 各指标: {"count", "total", "mean", "max", "p50", "p95", "p99"}}
+        """
+        with self._lock:
+            metrics = {"process": self._process.summary(), "sessions": len(self._sessions)}
+            if session_id is not None:
+                session = self._sessions.get(session_id)
+                metrics["session"] = session.summary() if session is not None else None
+        return metrics
+
+    def format_summary(self) -> List[str]:
+        """进程汇总 -> 输出行"""
+        process = self.get_metrics()["process"]
+        lines = [f"📈 大模型调用: {process['calls']}次 (失败 {process['errors']}), {process['turns']}轮对话"]
+        for name, label in (("ttft_ms", "首token"), ("latency_ms", "总耗时")):
+            stats = process[name]
+            lines.append(f"   • {label}: p50 {stats['p50']:.0f}ms, p95 {stats['p95']:.0f}ms, p99 {stats['p99']:.0f}ms")
+        tokens = {name: process[name] for name in ("prompt_tokens", "completion_tokens", "cached_tokens")}
+        lines.append(f"   • tokens: 提示 {tokens['prompt_tokens']['total']:.0f} (p95 {tokens['prompt_tokens']['p95']:.0f}), "
+                     f"补全 {tokens['completion_tokens']['total']:.0f} (p95 {tokens['completion_tokens']['p95']:.0f}), "
+                     f"缓存命中 {tokens['cached_tokens']['total']:.0f}")
+        lines.append(f"   • 工具调用轮数: 平均 {process['tool_rounds']['mean']:.2f}, 最多 {process['tool_rounds']['max']:.0f}")
+        if process["cache_hits"] or process["cache_misses"]:
+            lines.append(f"   • 补全缓存: 命中 {process['cache_hits']}, 未命中 {process['cache_misses']}, "
+                         f"命中耗时 p95 {process['cache_hit_ms']['p95']:.1f}ms")
+        return lines
+
+    def to_prometheus(self, prefix: str = "reading_type_llm") -> str:
+        """进程汇总 -> Prometheus文本格式 (summary类型，分位数基于最近的样本)"""
+        process = self.get_metrics()["process"]
+        lines = []
+        for name in ("calls", "errors", "turns", "cache_hits", "cache_misses"):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {process[name]}"]
+        for name in CALL_SERIES + TURN_SERIES + CACHE_SERIES:
+            stats = process[name]
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} summary")
+            lines += [f'{metric}{{quantile="{q}"}} {stats[f"p{round(q * 100)}"]}' for q in QUANTILES]
+            lines += [f"{metric}_sum {stats['total']}", f"{metric}_count {stats['count']}"]
+        return "\n".join(lines) + "\n"
+
+
+def _has_output(chunk) -> bool:
+    if not chunk.choices:
+        return False
+    delta = chunk.choices[0].delta
+    return bool(getattr(delta, "content", None) or getattr(delta, "tool_calls", None))
+
+
+class _StreamMeter(StreamObserver):
+    """流式回复: 记录首个输出片段的时间和最后的usage，流结束时记录指标"""
+
+    def __init__(self, metrics: LLMMetrics, start: float):
+        self.metrics = metrics
+        self.start = start
+        self.session_id = current_session()
+        self.ttft = None
+        self.usage = None
+
+    def add(self, chunk) -> None:
+        if self.ttft is None and _has_output(chunk):
+            self.ttft = time.perf_counter() - self.start
+        if getattr(chunk, "usage", None) is not None:
+            self.usage = chunk.usage
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        latency = time.perf_counter() - self.start
+        self.metrics.record_call(latency if self.ttft is None else self.ttft, latency, self.usage, error is not None,
+                                 self.session_id)
+
+
+class _MeteredCompletions(WrappedCompletions):
+    def __init__(self, completions, metrics: LLMMetrics):
+        super().__init__(completions)
+        self.metrics = metrics
+
+    def _start(self, params: Dict) -> float:
+        return time.perf_counter()
+
+    def _failed(self, start: float, error: Exception) -> None:
+        self.metrics.record_call(None, time.perf_counter() - start, error=True)
+
+    def _completed(self, start: float, response) -> None:
+        latency = time.perf_counter() - start
+        self.metrics.record_call(latency, latency, getattr(response, "usage", None))
+
+    def _observer(self, start: float) -> _StreamMeter:
+        return _StreamMeter(self.metrics, start)
+
+
+class _AsyncMeteredCompletions(AsyncWrappedCompletions, _MeteredCompletions):
+    pass
+
+
+class MeteredClient(WrappedClient):
+    """记录调用指标的OpenAI客户端包装，只拦截 chat.completions.create"""
+
+    _completions_class = _MeteredCompletions
+
+    def __init__(self, client, metrics: LLMMetrics):
+        super().__init__(client, metrics)
+        self.metrics = metrics
+
+
+class AsyncMeteredClient(MeteredClient):
+    """记录调用指标的AsyncOpenAI客户端包装"""
+
+    _completions_class = _AsyncMeteredCompletions
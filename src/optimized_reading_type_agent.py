@@ -1,47 +1,74 @@
 import os
 import json
+import time
 import csv
 import datetime
 import xml.etree.ElementTree as ET
 from difflib import SequenceMatcher
-import pandas as pd
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 import re
 from typing import Dict, List, Optional, Tuple
 
+from .agent_runtime import (TimingCallback, TokenCallback, ToolReportCallback,
+                            assistant_tool_call_message, execute_tool_calls,
+                            format_tool_report, run_turn_async, stream_completion,
+                            tool_result_message)
+from .completion_cache import AsyncCachedClient, CachedClient, CompletionCache
 from .enhanced_semantic_parser import EnhancedSemanticParser
 from .enhanced_dictionary_manager import EnhancedDictionaryManager
+from .history_manager import HistoryManager
+from .metrics import AsyncMeteredClient, LLMMetrics, MeteredClient
+from .prompt_cache import PromptCacheMeter, freeze_json
+from .reading_type_codec import canonical_key, parse_reading_type_id, to_field_dict
+from .reading_type_database import ReadingTypeDatabase
+from .tracing import AsyncTracedClient, TracedClient, Tracer
 
 # 加载环境变量
 load_dotenv()
 
-# 设置DeepSeek API密钥
+# 设置DeepSeek API密钥和服务地址
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
 
 class OptimizedReadingTypeAgent:
     """优化版ReadingType智能编码助手"""
     
+    # 冻结的工具定义，进程内所有实例共用
+    _tools_definition = None
+    
     def __init__(self):
         self.conversation_history = []
         
-        # 使用OpenAI客户端，配置DeepSeek基础URL
-        self.client = OpenAI(
+        # 工具调用与API调用追踪 (默认关闭，设置 tracer.enabled = True 开启)
+        self.tracer = Tracer()
+        
+        # 大模型调用指标 (首token耗时、总耗时、token数和工具调用轮数，按进程和会话汇总)
+        self.metrics = LLMMetrics()
+        
+        # 使用OpenAI客户端，配置DeepSeek基础URL (异步客户端供并发会话使用)
+        self.model = "deepseek-chat"
+        self.client = MeteredClient(TracedClient(OpenAI(
             api_key=DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
-        )
+            base_url=DEEPSEEK_BASE_URL
+        ), self.tracer), self.metrics)
+        self.async_client = AsyncMeteredClient(AsyncTracedClient(AsyncOpenAI(
+            api_key=DEEPSEEK_API_KEY,
+            base_url=DEEPSEEK_BASE_URL
+        ), self.tracer), self.metrics)
         
         # 数据文件路径
         self.codes_file = "reading_type_codes.csv"
         self.dictionaries_file = "field_dictionaries.csv"
-        self.history_file = "operation_history.csv"
+        self.history_file = "operation_history.jsonl"
         
         # 初始化增强组件
         self.dictionary_manager = EnhancedDictionaryManager(self.dictionaries_file)
         self.semantic_parser = EnhancedSemanticParser(self.dictionary_manager)
         
-        # 加载编码库
-        self.reading_type_codes = self.load_reading_type_codes()
+        # 加载编码库 (相近编码检索使用数据库的字段矩阵)
+        self.database = ReadingTypeDatabase(self.codes_file, self.dictionaries_file, self.history_file)
+        self.reading_type_codes = self.database.reading_type_codes
         
         # ReadingType字段定义
         self.field_names = [
@@ -62,17 +89,26 @@ class OptimizedReadingTypeAgent:
             "get_analysis_report": self.get_analysis_report
         }
         
+        # 有副作用的工具按顺序单独执行，其余工具调用并发执行
+        self.serial_tools = frozenset({"export_data"})
+        
+        # 每次请求前按token预算压缩对话历史 (设为None可关闭)
+        self.history_manager = HistoryManager()
+        
+        # 提示缓存命中统计 (按调用记录缓存命中的提示token比例)
+        self.prompt_cache_meter = PromptCacheMeter()
+        
+        # 最近一轮的耗时 {"ttft": 首token耗时, "total": 总耗时, "streamed": 是否流式}
+        self.last_timing = None
+        
+        # 补全缓存 (默认关闭，通过 enable_completion_cache 开启)
+        self.completion_cache = None
+        
         # 用户反馈学习
         self.feedback_data = []
-    
-    def load_reading_type_codes(self):
-        """加载ReadingType编码库"""
-        try:
-            df = pd.read_csv(self.codes_file)
-            return df.to_dict('records')
-        except FileNotFoundError:
-            print(f"警告: 编码库文件 {self.codes_file} 未找到")
-            return []
+        
+        # 编码验证结果缓存 (紧凑键 -> 结果行)
+        self.validation_cache = {}
     
     def add_message(self, role, content):
         """添加消息到对话历史"""
@@ -235,6 +271,15 @@ class OptimizedReadingTypeAgent:
                 result.append("")
                 result.extend(suggestions)
             
+            # 显示编码库中的相同或相近编码
+            nearest = self.database.nearest_codes(reading_type_id, k=3, max_distance=8)
+            if nearest:
+                result.append("")
+                result.append("📚 编码库中的相近编码:")
+                for code, distance in nearest:
+                    tag = "相同编码" if distance == 0 else f"差异度 {distance:g}"
+                    result.append(f"  • {code.get('name', 'N/A')}: {code.get('reading_type_id', 'N/A')} ({tag})")
+            
             result.append("")
             result.append("✅ 是否采纳此编码？输入'是'确认，'否'取消，或提出修改建议。")
             
@@ -362,51 +407,63 @@ class OptimizedReadingTypeAgent:
         
         try:
             # 解析ReadingTypeID
-            field_values = self.semantic_parser.parse_reading_type_id(reading_type_id)
-            
-            # 转换为字段名格式
-            field_dict = {}
-            for i, field_name in enumerate(self.field_names):
-                field_key = f"field_{i+1}"
-                if field_key in field_values:
-                    field_dict[field_name] = str(field_values[field_key])
-            
-            # 验证字段组合
-            is_valid, warnings = self.dictionary_manager.validate_field_combination(field_dict)
+            values = parse_reading_type_id(reading_type_id)
             
             result = []
             result.append("🔍 ReadingType编码验证结果:")
             result.append(f"🔢 编码: {reading_type_id}")
-            result.append(f"✅ 基本格式: {'有效' if len(reading_type_id.split('-')) == 16 else '无效'}")
+            result.append("✅ 基本格式: 有效")
             result.append("")
             
-            # 显示字段解析
-            result.append("📋 字段解析:")
-            for field_name, value in field_dict.items():
-                if value != '0':
-                    chinese_name = self.dictionary_manager.chinese_field_names.get(field_name, field_name)
-                    field_desc = self.dictionary_manager.get_field_description(field_name, value)
-                    
-                    # 获取上下文信息
-                    context = self.dictionary_manager.get_value_context(field_name, value)
-                    status = "✅" if context else "⚠️"
-                    
-                    result.append(f"  {status} {chinese_name}: {value} ({field_desc})")
-            
-            # 显示验证警告
-            if warnings:
-                result.append("")
-                result.append("⚠️ 字段组合建议:")
-                for warning in warnings:
-                    result.append(f"  • {warning}")
-            else:
-                result.append("\n✅ 字段组合验证通过")
+            # 字段解析结果只取决于编码本身，按紧凑键缓存，不同写法共用
+            key = canonical_key(values)
+            if key not in self.validation_cache:
+                self.validation_cache[key] = self._validate_fields(to_field_dict(values))
+            result.extend(self.validation_cache[key])
             
             return "\n".join(result)
             
         except Exception as e:
             return f"❌ 验证时发生错误: {str(e)}"
     
+    def _validate_fields(self, field_values):
+        """生成字段解析与组合验证的结果行"""
+        # 转换为字段名格式
+        field_dict = {}
+        for i, field_name in enumerate(self.field_names):
+            field_key = f"field_{i+1}"
+            if field_key in field_values:
+                field_dict[field_name] = str(field_values[field_key])
+        
+        # 验证字段组合
+        is_valid, warnings = self.dictionary_manager.validate_field_combination(field_dict)
+        
+        result = []
+        
+        # 显示字段解析
+        result.append("📋 字段解析:")
+        for field_name, value in field_dict.items():
+            if value != '0':
+                chinese_name = self.dictionary_manager.chinese_field_names.get(field_name, field_name)
+                field_desc = self.dictionary_manager.get_field_description(field_name, value)
+                
+                # 获取上下文信息
+                context = self.dictionary_manager.get_value_context(field_name, value)
+                status = "✅" if context else "⚠️"
+                
+                result.append(f"  {status} {chinese_name}: {value} ({field_desc})")
+        
+        # 显示验证警告
+        if warnings:
+            result.append("")
+            result.append("⚠️ 字段组合建议:")
+            for warning in warnings:
+                result.append(f"  • {warning}")
+        else:
+            result.append("\n✅ 字段组合验证通过")
+        
+        return result
+    
     def get_analysis_report(self, args):
         """获取详细分析报告"""
         description = args.get("description", "")
@@ -493,23 +550,8 @@ class OptimizedReadingTypeAgent:
             return "\n".join(result)
     
     def log_operation(self, input_text, operation_type, result, user_action="pending"):
-        """记录操作历史"""
-        try:
-            log_entry = {
-                'timestamp': datetime.datetime.now().isoformat(),
-                'input': input_text,
-                'operation': operation_type,
-                'result_length': len(result),
-                'user_action': user_action
-            }
-            
-            # 简单的CSV记录
-            with open(self.history_file, 'a', newline='', encoding='utf-8') as f:
-                if f.tell() == 0:  # 文件为空，写入标题
-                    f.write('timestamp,input,operation,result_length,user_action\n')
-                f.write(f"{log_entry['timestamp']},{log_entry['input']},{log_entry['operation']},{log_entry['result_length']},{log_entry['user_action']}\n")
-        except Exception as e:
-            print(f"记录历史失败: {e}")
+        """记录操作历史 (与编码库写入同一个JSONL历史文件，写入不阻塞请求)"""
+        self.database.log_operation(input_text, operation_type, result, user_action)
     
     def add_user_feedback(self, description: str, generated_code: str, 
                          user_rating: int, correct_code: str = ""):
@@ -545,7 +587,12 @@ class OptimizedReadingTypeAgent:
     
     # 保持与原版本的兼容性
     def handle_function_call(self, function_call):
-        """处理函数调用"""
+        """处理函数调用 (开启追踪时记录每次调用的耗时、参数和结果大小)"""
+        if self.tracer.enabled:
+            return self.tracer.trace_tool_call(self._call_function, function_call)
+        return self._call_function(function_call)
+    
+    def _call_function(self, function_call):
         function_name = function_call.get("name")
         function_args = {}
         
@@ -556,144 +603,186 @@ class OptimizedReadingTypeAgent:
                 pass
         
         if function_name in self.available_tools:
-            function_response = self.available_tools[function_name](function_args)
-            
-            # 添加函数结果到对话历史
-            self.add_message("function", {
-                "name": function_name,
-                "content": function_response
-            })
-            
-            return function_response
+            # 结果由调用方以tool消息写入对应会话的对话历史
+            return self.available_tools[function_name](function_args)
         else:
             return f"错误: 未知的函数 '{function_name}'"
     
-    def get_response(self, user_input, stream=True):
-        """获取AI回复（保持与原版本兼容）"""
-        # 添加用户输入到对话历史
-        self.add_message("user", user_input)
-        
-        try:
-            # 工具描述（更新版本）
-            tools = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "search_reading_type",
-                        "description": "搜索现有的ReadingType编码",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "name": {"type": "string", "description": "要搜索的量测名称"}
-                            },
-                            "required": ["name"]
-                        }
+    def get_tools_definition(self):
+        """获取工具定义
+        
+        每个进程只构建一次并冻结 (键按字典序排列)，各请求共用同一份定义，
+        保证请求前缀逐字节一致，命中DeepSeek的上下文缓存。
+        """
+        cls = type(self)
+        if cls.__dict__.get("_tools_definition") is None:
+            cls._tools_definition = freeze_json(self._build_tools_definition())
+        return cls._tools_definition
+    
+    def _build_tools_definition(self):
+        """构建工具定义"""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": "search_reading_type",
+                    "description": "搜索现有的ReadingType编码",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "name": {"type": "string", "description": "要搜索的量测名称"}
+                        },
+                        "required": ["name"]
                     }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "generate_reading_type_enhanced",
-                        "description": "使用增强AI算法生成ReadingType编码",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "description": {"type": "string", "description": "量测描述"},
-                                "field_values": {"type": "object", "description": "指定的字段值"}
-                            }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "generate_reading_type_enhanced",
+                    "description": "使用增强AI算法生成ReadingType编码",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "description": {"type": "string", "description": "量测描述"},
+                            "field_values": {"type": "object", "description": "指定的字段值"}
                         }
                     }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "smart_dictionary_search",
-                        "description": "智能字典搜索功能",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "search_term": {"type": "string", "description": "搜索关键词"},
-                                "field_name": {"type": "string", "description": "限定字段名(可选)"}
-                            },
-                            "required": ["search_term"]
-                        }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "smart_dictionary_search",
+                    "description": "智能字典搜索功能",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "search_term": {"type": "string", "description": "搜索关键词"},
+                            "field_name": {"type": "string", "description": "限定字段名(可选)"}
+                        },
+                        "required": ["search_term"]
                     }
-                },
-                {
-                    "type": "function",
-                    "function": {
-                        "name": "validate_reading_type",
-                        "description": "验证ReadingType编码的有效性",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "reading_type_id": {"type": "string", "description": "要验证的ReadingTypeID"}
-                            },
-                            "required": ["reading_type_id"]
-                        }
+                }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "validate_reading_type",
+                    "description": "验证ReadingType编码的有效性",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "reading_type_id": {"type": "string", "description": "要验证的ReadingTypeID"}
+                        },
+                        "required": ["reading_type_id"]
                     }
                 }
-            ]
-            
-            # 调用DeepSeek API
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=self.conversation_history,
-                tools=tools,
-                tool_choice="auto",
-                stream=False
-            )
-            
-            response_message = response.choices[0].message
+            }
+        ]
+    
+    def get_response(self, user_input, stream=True):
+        """获取AI回复（保持与原版本兼容）"""
+        # 添加用户输入到对话历史
+        self.add_message("user", user_input)
+        self._compact_history(self.conversation_history)
+        
+        start = time.perf_counter()
+        output = {"ttft": None, "line_open": False}
+        
+        def print_token(content: str) -> None:
+            """流式输出文本片段，记录首token耗时"""
+            if output["ttft"] is None:
+                output["ttft"] = time.perf_counter() - start
+            if not output["line_open"]:
+                output["line_open"] = True
+                print("\n🤖 AI助手: ", end="", flush=True)
+            print(content, end="", flush=True)
+        
+        try:
+            tools = self.get_tools_definition()
+            if stream:
+                # 第一次调用也以流式获取: 文本边收边输出，工具调用参数完整后立即开始执行
+                first = stream_completion(self.client, self.model, self.conversation_history, tools,
+                                          self.handle_function_call, self.serial_tools,
+                                          print_token, self.prompt_cache_meter.record)
+                response_message, report = first["message"], first["report"]
+                if output["line_open"]:
+                    output["line_open"] = False
+                    print()
+            else:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.conversation_history,
+                    tools=tools,
+                    tool_choice="auto",
+                    stream=False
+                )
+                self.prompt_cache_meter.record(response.usage)
+                response_message = response.choices[0].message
+                report = None
+                if response_message.tool_calls:
+                    # 执行工具调用 (多个调用并发执行，结果保持原顺序)
+                    report = execute_tool_calls(response_message.tool_calls,
+                                                self.handle_function_call, self.serial_tools)
             
             # 处理工具调用
-            if hasattr(response_message, 'tool_calls') and response_message.tool_calls:
-                self.add_message("assistant", response_message)
+            if response_message.tool_calls:
+                for line in format_tool_report(report):
+                    print(line)
                 
-                # 处理每个工具调用
-                for tool_call in response_message.tool_calls:
-                    function_info = {
-                        "name": tool_call.function.name,
-                        "arguments": tool_call.function.arguments
-                    }
-                    tool_result = self.handle_function_call(function_info)
-                    print(f"🔧 使用工具: {tool_call.function.name}")
+                # 先添加完整的assistant响应（包含tool_calls），再添加所有工具调用结果
+                self.conversation_history.append(assistant_tool_call_message(response_message))
+                self.conversation_history.extend(tool_result_message(result["tool_call"], result["content"])
+                                                 for result in report["results"])
                 
                 # 再次调用API获取最终回复
                 if stream:
-                    print("\n🤖 AI助手: ", end="", flush=True)
                     second_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
+                        model=self.model,
                         messages=self.conversation_history,
-                        stream=True
+                        tools=tools,
+                        tool_choice="none",
+                        stream=True,
+                        stream_options={"include_usage": True}
                     )
                     
                     full_response = ""
                     for chunk in second_response:
+                        if chunk.usage is not None:
+                            self.prompt_cache_meter.record(chunk.usage)
                         if chunk.choices and len(chunk.choices) > 0:
                             content = chunk.choices[0].delta.content
                             if content:
-                                print(content, end="", flush=True)
+                                print_token(content)
                                 full_response += content
                     
-                    print()
+                    print()  # 换行
                     ai_response = full_response
                 else:
                     second_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
+                        model=self.model,
                         messages=self.conversation_history,
+                        tools=tools,
+                        tool_choice="none",
                         stream=False
                     )
+                    self.prompt_cache_meter.record(second_response.usage)
                     ai_response = second_response.choices[0].message.content
                     print(f"\n🤖 AI助手: {ai_response}")
                 
                 self.add_message("assistant", ai_response)
             else:
-                # 没有工具调用，直接返回回复
+                # 没有工具调用，直接返回回复 (流式时已逐段输出)
                 ai_response = response_message.content
-                print(f"\n🤖 AI助手: {ai_response}")
+                if not stream:
+                    print(f"\n🤖 AI助手: {ai_response}")
                 self.add_message("assistant", ai_response)
             
+            total = time.perf_counter() - start
+            self.last_timing = {"ttft": output["ttft"] if output["ttft"] is not None else total,
+                                "total": total, "streamed": stream}
+            self.metrics.record_turn(1 if response_message.tool_calls else 0)
             return ai_response
             
         except Exception as e:
@@ -701,6 +790,65 @@ class OptimizedReadingTypeAgent:
             print(error_msg)
             return error_msg
     
+    async def get_response_async(self, user_input: str,
+                                 conversation_history: Optional[List[Dict]] = None,
+                                 on_token: Optional[TokenCallback] = None,
+                                 on_tool_report: Optional[ToolReportCallback] = None,
+                                 on_timing: Optional[TimingCallback] = None) -> str:
+        """异步获取AI回复
+        
+        网络请求使用AsyncOpenAI，工具在线程池中执行，多个会话可在同一事件循环中并发。
+        
+        Args:
+            user_input: 用户输入
+            conversation_history: 会话的对话历史，并发会话各自传入自己的列表；为None时使用本实例的历史
+            on_token: 流式输出回调，提供时两次调用都以流式方式获取
+            on_tool_report: 工具执行报告回调，参数含各工具调用结果与耗时
+            on_timing: 耗时回调，参数含首token耗时与总耗时
+            
+        Returns:
+            最终回复文本，出错时为错误信息
+        """
+        messages = self.conversation_history if conversation_history is None else conversation_history
+        messages.append({"role": "user", "content": user_input})
+        self._compact_history(messages)
+        
+        tool_rounds = []
+        
+        def count_tool_round(report: Dict) -> None:
+            tool_rounds.append(report)
+            if on_tool_report is not None:
+                on_tool_report(report)
+        
+        try:
+            reply = await run_turn_async(self.async_client, self.model, messages,
+                                         self.get_tools_definition(), self.handle_function_call, on_token,
+                                         self.serial_tools, count_tool_round,
+                                         self.prompt_cache_meter.record, on_timing)
+            self.metrics.record_turn(len(tool_rounds))
+            return reply
+        except Exception as e:
+            return f"❌ 获取回复时发生错误: {str(e)}"
+    
+    def get_metrics(self, session_id: Optional[str] = None) -> Dict:
+        """大模型调用指标的进程汇总 (指定 session_id 时另含该会话的汇总)"""
+        return self.metrics.get_metrics(session_id)
+    
+    def enable_completion_cache(self, cache: CompletionCache) -> None:
+        """开启补全缓存: 相同的请求直接返回本地缓存的回复，不再调用API"""
+        if self.completion_cache is not None:
+            self.client = self.client._client
+            self.async_client = self.async_client._client
+        self.completion_cache = cache
+        # 缓存包装在指标包装之外，命中时由缓存包装计入 cache_hits 和命中耗时
+        self.client = CachedClient(self.client, cache, self.metrics)
+        self.async_client = AsyncCachedClient(self.async_client, cache, self.metrics)
+    
+    def _compact_history(self, messages: List[Dict]) -> None:
+        """按token预算压缩对话历史"""
+        if self.history_manager is not None:
+            self.history_manager.compact(messages)
+    
     def clear_history(self):
         """清除对话历史"""
         self.conversation_history = [] 
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""语义解析器评估
+
+编码库中每条编码的名称和说明都对应一个已知的 ReadingTypeID，可以当作带标注的样本。
+evaluate() 用解析器 (basic: SemanticParser，enhanced: EnhancedSemanticParser) 解析样本文本，
+再与编码库中的编码逐字段比较，报告以下内容:
+- 各字段准确率和整码完全匹配率
+- commodity、measurementKind 的混淆情况
+- 解析吞吐量
+
+样本分块后，两个解析器的分块同时提交到进程池并行解析。
+吞吐量按各分块在工作进程内的解析耗时计算，不含进程启动和数据传输的开销。
+"""
+
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import reading_type_codec
+from .dictionary_manager import DictionaryManager
+from .enhanced_semantic_parser import EnhancedSemanticParser
+from .semantic_parser import SemanticParser
+
+PARSERS = ("basic", "enhanced")
+
+# 报告混淆情况的字段
+CONFUSION_FIELDS = ("commodity", "measurementKind")
+
+# 样本文本: 名称、说明，或两者以"，"连接
+TEXT_MODES = ("name", "description", "both")
+
+# 工作进程内的解析器 (每个进程只创建一次)
+_parsers = {}
+_dictionaries_file = "field_dictionaries.csv"
+
+
+def load_samples(codes_file: str = "reading_type_codes.csv", text: str = "both") -> Tuple[List[str], np.ndarray]:
+    """编码库 -> (样本文本列表, N×16 的期望字段矩阵)，跳过编码无效或文本为空的行"""
+    if text not in TEXT_MODES:
+        raise ValueError(f"不支持的样本文本: {text} (可选 {', '.join(TEXT_MODES)})")
+    df = pd.read_csv(codes_file, encoding="utf-8-sig", dtype=str, keep_default_na=False)
+    names, descriptions = df["name"].str.strip(), df["description"].str.strip()
+    if text == "name":
+        texts = names
+    elif text == "description":
+        texts = descriptions
+    else:
+        texts = names.where(descriptions == "", names + "，" + descriptions)
+
+    matrix, valid = reading_type_codec.decode_batch(df["reading_type_id"].tolist())
+    keep = valid & (texts != "").to_numpy()
+    return texts[keep].tolist(), matrix[keep]
+
+
+def _init_worker(dictionaries_file: str) -> None:
+    global _dictionaries_file
+    _dictionaries_file = dictionaries_file
+    _parsers.clear()
+
+
+def _get_parser(name: str):
+    """解析器名称 -> 文本到16个字段值的函数"""
+    parse = _parsers.get(name)
+    if parse is None:
+        if name == "basic":
+            parser = SemanticParser()
+            analyze = parser.analyze_measurement_description
+        elif name == "enhanced":
+            parser = EnhancedSemanticParser(DictionaryManager(_dictionaries_file))
+            analyze = lambda text: parser.analyze_description_enhanced(text)[0]  # noqa: E731
+        else:
+            raise ValueError(f"未知的解析器: {name} (可选 {', '.join(PARSERS)})")
+        parse = _parsers[name] = lambda text: reading_type_codec.from_field_dict(analyze(text))
+    return parse
+
+
+def _parse_chunk(name: str, texts: Sequence[str]) -> Tuple[List[Tuple[int, ...]], float]:
+    """解析一块样本，返回 (预测的字段值, 解析耗时秒数)"""
+    parse = _get_parser(name)
+    start = time.perf_counter()
+    predictions = [parse(text) for text in texts]
+    return predictions, time.perf_counter() - start
+
+
+def score(expected: np.ndarray, predicted: np.ndarray, field_names: Sequence[str], top: int = 10) -> Dict:
+    """逐字段比较期望值与预测值
+
+    Returns:
+        {"exact_match", "field_accuracy": {字段: 准确率}, "mean_field_accuracy",
+         "confusion": {字段: {"accuracy", "pairs": [[期望值, 预测值, 次数], ...]}}}，
+        pairs 为出现最多的 top 组错误 (期望值 != 预测值)
+    """
+    count = len(expected)
+    correct = expected == predicted
+    field_accuracy = correct.mean(axis=0) if count else np.zeros(len(field_names))
+    confusion = {}
+    for field in CONFUSION_FIELDS:
+        index = field_names.index(field)
+        errors = Counter(zip(expected[~correct[:, index], index].tolist(),
+                             predicted[~correct[:, index], index].tolist()))
+        confusion[field] = {"accuracy": float(field_accuracy[index]),
+                            "pairs": [[want, got, n] for (want, got), n in errors.most_common(top)]}
+    return {
+        "exact_match": float(correct.all(axis=1).mean()) if count else 0.0,
+        "field_accuracy": {name: float(value) for name, value in zip(field_names, field_accuracy)},
+        "mean_field_accuracy": float(field_accuracy.mean()),
+        "confusion": confusion,
+    }
+
+
+def evaluate(codes_file: str = "reading_type_codes.csv", dictionaries_file: str = "field_dictionaries.csv",
+             parsers: Sequence[str] = PARSERS, text: str = "both", workers: Optional[int] = None,
+             chunk_size: int = 256, top: int = 10) -> Dict:
+    """用各解析器解析编码库的样本并评分
+
+    Args:
+        workers: 工作进程数 (默认CPU核数)，为1时在当前进程中解析
+        chunk_size: 每个任务的样本数
+        top: 每个字段报告的混淆对数
+
+    Returns:
+        {"samples", "text", "workers", "wall_seconds",
+         "parsers": {解析器: score() 的结果 + {"parse_seconds", "throughput"}}}，throughput 为每秒解析的样本数
+    """
+    for name in parsers:
+        if name not in PARSERS:
+            raise ValueError(f"未知的解析器: {name} (可选 {', '.join(PARSERS)})")
+    texts, expected = load_samples(codes_file, text)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), max(1, chunk_size))]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks) * len(parsers) or 1))
+
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(dictionaries_file)
+        results = {name: [_parse_chunk(name, chunk) for chunk in chunks] for name in parsers}
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(dictionaries_file,)) as pool:
+            futures = {name: [pool.submit(_parse_chunk, name, chunk) for chunk in chunks] for name in parsers}
+            results = {name: [future.result() for future in futures[name]] for name in parsers}
+    wall = time.perf_counter() - start
+
+    field_names = SemanticParser().field_names
+    report = {"samples": len(texts), "text": text, "workers": workers, "wall_seconds": wall, "parsers": {}}
+    for name in parsers:
+        predictions = [values for chunk_predictions, _ in results[name] for values in chunk_predictions]
+        predicted = np.array(predictions, dtype=np.int64).reshape(-1, reading_type_codec.FIELD_COUNT)
+        elapsed = sum(seconds for _, seconds in results[name])
+        report["parsers"][name] = dict(score(expected, predicted, field_names, top),
+                                       parse_seconds=elapsed,
+                                       throughput=len(texts) / elapsed if elapsed > 0 else 0.0)
+    return report
+
+
+def format_report(report: Dict, dictionary: Optional[DictionaryManager] = None) -> List[str]:
+    """评估结果 -> 输出行 (提供字典时混淆对显示取值的名称)"""
+    def label(field, value):
+        if dictionary is None:
+            return str(value)
+        # 字典中的说明可能换行
+        return " ".join(dictionary.get_field_description(field, str(value)).split())
+
+    names = list(report["parsers"])
+    parsers = report["parsers"]
+
+    def compare(key, fmt):
+        return ", ".join(f"{name} {format(parsers[name][key], fmt)}" for name in names)
+
+    lines = [f"🧪 解析器评估: {report['samples']}条样本 (文本: {report['text']}), "
+             f"{report['workers']}个进程, 用时 {report['wall_seconds']:.2f}s",
+             f"   • 完全匹配率: {compare('exact_match', '.1%')}",
+             f"   • 平均字段准确率: {compare('mean_field_accuracy', '.1%')}",
+             f"   • 吞吐量 (条/秒, 单进程): {compare('throughput', '.0f')}",
+             "\n📋 各字段准确率:",
+             f"   {'field':<22}" + "".join(f"{name:>10}" for name in names)]
+    for field in parsers[names[0]]["field_accuracy"]:
+        lines.append(f"   {field:<22}" + "".join(f"{parsers[name]['field_accuracy'][field]:>10.1%}" for name in names))
+
+    for field in CONFUSION_FIELDS:
+        for name in names:
+            pairs = parsers[name]["confusion"][field]["pairs"]
+            if not pairs:
+                continue
+            lines.append(f"\n🔀 {field} 常见错误 ({name}):")
+            lines.extend(f"   {label(field, want)} → {label(field, got)}: {n}次" for want, got, n in pairs)
+    return lines
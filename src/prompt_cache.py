@@ -0,0 +1,114 @@
+"""提示前缀缓存
+
+DeepSeek 对请求中与之前请求相同的前缀 (工具定义、系统提示、较早的对话) 启用上下文缓存，
+命中部分计费更低、首token更快。前缀必须逐字节一致才能命中，因此:
+
+- 工具定义每个进程只构建一次，键按字典序排列后冻结，各请求共用同一份
+- PromptCacheMeter 按每次调用记录返回的 usage，统计缓存命中的提示token比例
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+class FrozenDict(dict):
+    """只读字典，可直接作为请求参数序列化"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("工具定义已冻结，不能修改")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze_json(obj):
+    """递归冻结JSON结构: 字典按键排序后转为FrozenDict，列表转为元组"""
+    if isinstance(obj, dict):
+        return FrozenDict((key, freeze_json(obj[key])) for key in sorted(obj))
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze_json(item) for item in obj)
+    return obj
+
+
+def canonical_json(obj) -> str:
+    """字节稳定的JSON序列化"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def cached_prompt_tokens(usage) -> Tuple[int, int]:
+    """从usage中读取 (缓存命中的提示token数, 提示token总数)
+
+    兼容DeepSeek的 prompt_cache_hit_tokens 和OpenAI的 prompt_tokens_details.cached_tokens
+    """
+    if usage is None:
+        return 0, 0
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+    return int(cached or 0), int(prompt_tokens)
+
+
+class PromptCacheMeter:
+    """按调用记录提示缓存命中情况 (线程安全，可被并发会话共用)"""
+
+    def __init__(self, max_records: int = 1000):
+        self.records = deque(maxlen=max_records)
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, usage) -> Optional[Dict]:
+        """记录一次调用的usage
+
+        Returns:
+            {"prompt_tokens", "cached_tokens", "ratio"}，usage为空时返回None
+        """
+        if usage is None:
+            return None
+        cached, prompt_tokens = cached_prompt_tokens(usage)
+        entry = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached,
+            "ratio": cached / prompt_tokens if prompt_tokens else 0.0
+        }
+        with self._lock:
+            self.records.append(entry)
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached
+        return entry
+
+    def summary(self) -> Dict:
+        """汇总统计"""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+            }
+
+    def format_summary(self) -> List[str]:
+        """汇总统计 -> 输出行"""
+        summary = self.summary()
+        lines = [f"🗄️ 提示缓存: {summary['calls']}次调用, "
+                 f"命中 {summary['cached_tokens']}/{summary['prompt_tokens']} tokens ({summary['ratio']:.1%})"]
+        with self._lock:
+            recent = list(self.records)[-5:]
+        for entry in recent:
+            lines.append(f"   • {entry['cached_tokens']}/{entry['prompt_tokens']} ({entry['ratio']:.1%})")
+        return lines
@@ -1,35 +1,99 @@
 import os
 import json
-from openai import OpenAI
+import time
+import asyncio
+import datetime
+import math
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 
+from agent_runtime import (TimingCallback, TokenCallback, ToolReportCallback,
+                           assistant_tool_call_message, emit_token, execute_tool_calls,
+                           format_tool_report, run_turn_async, stream_completion,
+                           tool_result_message)
 from reading_type_database import ReadingTypeDatabase
+from completion_cache import AsyncCachedClient, CachedClient, CompletionCache
 from dictionary_manager import DictionaryManager
+from history_logger import get_history_logger
+from history_reader import HistoryReader, TimeBound, time_key
+from intent_router import IntentRouter
+from metrics import AsyncMeteredClient, LLMMetrics, MeteredClient
+from history_manager import HistoryManager
+from prompt_cache import PromptCacheMeter, freeze_json
 from semantic_parser import SemanticParser
+from speculation import SpeculationMeter, ToolPrefetcher
+from tool_result import ToolResult, ToolResultMeter, result_content, result_text
+from tracing import AsyncTracedClient, TracedClient, Tracer
 
 # 加载环境变量
 load_dotenv()
 
-# 设置DeepSeek API密钥
+# 设置DeepSeek API密钥和服务地址
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+# 系统提示 (命令行和HTTP服务的会话共用)
+SYSTEM_PROMPT = """你是一个专业的ReadingTypeID编码助手，基于IEC61968-9-2024标准。你的任务是：
+
+1. 理解用户的量测需求，搜索现有编码或生成新编码
+2. 提供准确的ReadingType编码信息和解释
+3. 管理和维护编码库
+4. 导出和分析编码数据
+
+核心原则：
+- 准确理解用户意图，提供精确的编码信息
+- 对于模糊的需求，主动询问细节
+- 解释编码的含义和标准依据
+- 保持友好和专业的对话风格
+- 使用emoji增强可读性
+
+当用户提及具体的量测名称时，优先搜索现有编码。
+当用户要求生成新编码时，分析描述并映射到正确的字段值。
+当用户询问字典信息时，提供清晰的字段说明。
+
+可用的工具函数：
+- search_reading_type: 搜索编码库
+- generate_reading_type: 生成新编码
+- query_dictionary: 查询字典
+- view_codes_library: 浏览编码库
+- filter_codes: 筛选编码
+- add_to_library: 添加编码
+- export_data: 导出数据
+- get_statistics: 获取统计信息
+- query_history: 查询操作历史"""
 
 class ReadingTypeAgent:
     """ReadingType智能编码助手"""
     
+    # 冻结的工具定义，进程内所有实例共用
+    _tools_definition = None
+    
     def __init__(self):
         self.conversation_history = []
         
-        # 初始化OpenAI客户端
-        self.client = OpenAI(
+        # 工具调用与API调用追踪 (默认关闭，设置 tracer.enabled = True 开启)
+        self.tracer = Tracer()
+        
+        # 大模型调用指标 (首token耗时、总耗时、token数和工具调用轮数，按进程和会话汇总)
+        self.metrics = LLMMetrics()
+        
+        # 初始化OpenAI客户端 (同步客户端供命令行使用，异步客户端供并发会话使用)
+        self.model = "deepseek-chat"
+        self.client = MeteredClient(TracedClient(OpenAI(
             api_key=DEEPSEEK_API_KEY,
-            base_url="https://api.deepseek.com"
-        )
+            base_url=DEEPSEEK_BASE_URL
+        ), self.tracer), self.metrics)
+        self.async_client = AsyncMeteredClient(AsyncTracedClient(AsyncOpenAI(
+            api_key=DEEPSEEK_API_KEY,
+            base_url=DEEPSEEK_BASE_URL
+        ), self.tracer), self.metrics)
         
         # 初始化核心模块
         self.database = ReadingTypeDatabase()
         self.dictionary = DictionaryManager()
         self.parser = SemanticParser()
+        self.history_reader = HistoryReader(self.database.history_file)
         
         # 可用工具
         self.available_tools = {
@@ -40,162 +104,165 @@ class ReadingTypeAgent:
             "filter_codes": self._filter_codes,
             "add_to_library": self._add_to_library,
             "export_data": self._export_data,
-            "get_statistics": self._get_statistics
+            "get_statistics": self._get_statistics,
+            "query_history": self._query_history
         }
+        
+        # 有副作用的工具按顺序单独执行，其余工具调用并发执行
+        self.serial_tools = frozenset({"add_to_library", "export_data"})
+        
+        # 每次请求前按token预算压缩对话历史 (设为None可关闭)
+        self.history_manager = HistoryManager()
+        
+        # 提示缓存命中统计 (按调用记录缓存命中的提示token比例)
+        self.prompt_cache_meter = PromptCacheMeter()
+        
+        # 最近一轮的耗时 {"ttft": 首token耗时, "total": 总耗时, "streamed": 是否流式}
+        self.last_timing = None
+        
+        # 补全缓存 (默认关闭，通过 enable_completion_cache 开启)
+        self.completion_cache = None
+        
+        # 工具结果以紧凑JSON发送给大模型 (为False时发送渲染后的文本)；
+        # 节省token的统计需要额外渲染文本，默认关闭 (设置 tool_result_meter.enabled = True 开启)
+        self.compact_tool_results = True
+        self.tool_result_meter = ToolResultMeter(enabled=False)
+        
+        # 第一次请求大模型的同时按用户输入预取这些只读工具的结果 (设为空集合可关闭)
+        self.speculative_tools = frozenset({"search_reading_type", "generate_reading_type"})
+        self.speculation_meter = SpeculationMeter()
+        
+        # 明确的命令直接在本地执行，不调用大模型 (设为None可关闭)
+        self.intent_router = IntentRouter(
+            self.dictionary.get_all_fields(),
+            lambda: {code.get('category') for code in self.database.reading_type_codes}
+        )
     
     def add_message(self, role: str, content):
         """添加消息到对话历史"""
         self.conversation_history.append({"role": role, "content": content})
     
-    def _search_reading_type(self, args: Dict) -> str:
+    def _search_reading_type(self, args: Dict) -> ToolResult:
         """搜索ReadingType编码"""
         search_term = args.get("name", "").strip()
         
         if not search_term:
-            return "❌ 请提供要搜索的量测名称"
+            return ToolResult.error("请提供要搜索的量测名称")
         
         exact_matches, fuzzy_matches = self.database.search_codes(search_term)
         
-        result = []
-        
         if exact_matches:
-            result.append("✅ 找到精确匹配:")
-            for match in exact_matches:
-                result.append(f"📊 名称: {match.get('name', 'N/A')}")
-                result.append(f"🔢 ReadingTypeID: {match.get('reading_type_id', 'N/A')}")
-                result.append(f"📝 说明: {match.get('description', 'N/A')}")
-                result.append(f"🏷️ 类别: {match.get('category', 'N/A')}")
-                result.append(f"⏰ 创建时间: {match.get('created_at', 'N/A')}")
-                result.append("---")
-        
-        if fuzzy_matches and not exact_matches:
-            result.append("🔍 找到相似的编码:")
-            for i, (match, similarity) in enumerate(fuzzy_matches[:5], 1):
-                result.append(f"{i}. {match.get('name', 'N/A')} (相似度: {similarity:.2f})")
-                result.append(f"   ReadingTypeID: {match.get('reading_type_id', 'N/A')}")
-                result.append(f"   说明: {match.get('description', 'N/A')}")
-            result.append("\n❓ 以上是否有您需要的编码？如果没有，我可以为您生成新的编码。")
-        
-        if not exact_matches and not fuzzy_matches:
-            result.append(f"❌ 未找到与'{search_term}'相关的编码")
-            result.append("💡 我可以为您生成新的ReadingTypeID，请告诉我更多详细信息:")
-            result.append("- 设备类型 (如: 电表、储能、气象)")
-            result.append("- 测量内容 (如: 电压、电流、功率、能量)")
-            result.append("- 特殊要求 (如: 相位、时间周期)")
-        
-        return "\n".join(result)
-    
-    def _generate_reading_type(self, args: Dict) -> str:
+            data = {"query": search_term, "match": "exact", "codes": [
+                _code_fields(match, "name", "reading_type_id", "description", "category", "created_at")
+                for match in exact_matches
+            ]}
+        elif fuzzy_matches:
+            data = {"query": search_term, "match": "similar", "codes": [
+                dict(_code_fields(match, "name", "reading_type_id", "description"), similarity=round(similarity, 2))
+                for match, similarity in fuzzy_matches[:5]
+            ]}
+        else:
+            data = {"query": search_term, "match": "none", "codes": []}
+        return ToolResult(data, _render_search)
+    
+    def _generate_reading_type(self, args: Dict) -> ToolResult:
         """生成ReadingType编码"""
         description = args.get("description", "")
         field_values = args.get("field_values", {})
         
         if not description and not field_values:
-            return "❌ 请提供量测描述或字段值"
+            return ToolResult.error("请提供量测描述或字段值")
         
         try:
             if field_values:
                 # 直接使用提供的字段值
                 reading_type_id = self.parser.build_reading_type_id(field_values)
-                result = ["🤖 AI生成结果:", f"🔢 ReadingTypeID: {reading_type_id}"]
-                
-                # 显示字段详情
-                result.append("\n📋 字段详情:")
+                data = {"reading_type_id": reading_type_id, "fields": []}
                 for i, field_name in enumerate(self.parser.field_names):
                     value = field_values.get(f"field_{i+1}", 0)
-                    field_info = self.dictionary.get_field_description(field_name, str(value))
-                    result.append(f"  {i+1:2d}. {field_name}: {value} ({field_info})")
+                    data["fields"].append({"index": i + 1, "name": field_name, "value": value,
+                                           "meaning": self.dictionary.get_field_description(field_name, str(value))})
             else:
                 # 基于描述分析生成
                 analysis = self.parser.analyze_measurement_description(description)
                 reading_type_id = self.parser.build_reading_type_id(analysis)
+                data = {"description": description, "reading_type_id": reading_type_id}
                 
-                result = ["🤖 AI分析结果:", f"📝 输入描述: {description}"]
-                
-                # 显示识别要素
+                # 识别要素
                 info = self.parser.extract_measurement_info(description)
-                if any(info.values()):
-                    result.append("\n🔍 识别要素:")
-                    for key, values in info.items():
-                        if values:
-                            chinese_key = {
-                                'device_types': '设备类型',
-                                'measurement_kinds': '测量类型',
-                                'flow_directions': '流向',
-                                'phases': '相位',
-                                'time_periods': '时间周期',
-                                'units': '单位',
-                                'behaviors': '行为'
-                            }.get(key, key)
-                            result.append(f"  - {chinese_key}: {', '.join(values)}")
+                elements = {_ELEMENT_NAMES.get(key, key): values for key, values in info.items() if values}
+                if elements:
+                    data["elements"] = elements
                 
-                # 显示字段映射
-                result.append(f"\n💡 建议编码: {reading_type_id}")
-                result.append("\n📋 字段映射:")
+                # 字段映射 (只保留非零字段)
+                data["fields"] = []
                 for i, field_name in enumerate(self.parser.field_names):
                     value = analysis.get(f"field_{i+1}", 0)
-                    if value != 0:  # 只显示非零字段
-                        field_info = self.dictionary.get_field_description(field_name, str(value))
-                        chinese_name = self.dictionary.get_field_chinese_name(field_name)
-                        result.append(f"  {i+1:2d}. {chinese_name}({field_name}): {value} = {field_info}")
+                    if value != 0:
+                        data["fields"].append({
+                            "index": i + 1, "name": field_name, "value": value,
+                            "chinese_name": self.dictionary.get_field_chinese_name(field_name),
+                            "meaning": self.dictionary.get_field_description(field_name, str(value))
+                        })
                 
                 # 验证字段组合
                 is_valid, errors = self.parser.validate_field_combination(analysis)
                 if not is_valid:
-                    result.append("\n⚠️ 字段组合问题:")
-                    for error in errors:
-                        result.append(f"  - {error}")
+                    data["errors"] = errors
                 
                 # 建议缺失字段
                 suggestions = self.parser.suggest_missing_fields(analysis, description)
                 if suggestions:
-                    result.append("\n💭 完善建议:")
-                    for suggestion in suggestions:
-                        result.append(f"  - {suggestion}")
+                    data["suggestions"] = suggestions
             
-            result.append("\n✅ 是否采纳此编码？输入'是'确认，'否'取消，或提出修改建议。")
-            return "\n".join(result)
+            # 编码库中已有的相同或相近编码
+            nearest = self._nearest_codes(reading_type_id)
+            if nearest:
+                data["nearest"] = nearest
+            return ToolResult(data, _render_generate, _compact_generate)
             
         except Exception as e:
-            return f"❌ 生成编码时发生错误: {str(e)}"
+            return ToolResult.error(f"生成编码时发生错误: {str(e)}")
     
-    def _query_dictionary(self, args: Dict) -> str:
+    def _nearest_codes(self, reading_type_id: str, k: int = 3, max_distance: float = 8) -> List[Dict]:
+        """编码库中与生成编码相同或相近的编码"""
+        return [dict(_code_fields(code, "name", "reading_type_id"), distance=distance)
+                for code, distance in self.database.nearest_codes(reading_type_id, k=k, max_distance=max_distance)]
+    
+    def _query_dictionary(self, args: Dict) -> ToolResult:
         """查询字典信息"""
         field_name = args.get("field_name", "").strip()
         
         if not field_name:
-            # 显示所有字段
-            result = ["📚 ReadingType字段字典:"]
-            fields = self.dictionary.get_all_fields()
-            for i, (name, chinese_name) in enumerate(fields, 1):
-                result.append(f"{i:2d}. {name} ({chinese_name})")
-            result.append("\n💡 使用 '查询字典 [字段名]' 查看具体字段的可选值")
-            return "\n".join(result)
+            # 所有字段
+            return ToolResult({"fields": dict(self.dictionary.get_all_fields())}, _render_dictionary_fields)
         
         # 查询具体字段
         options = self.dictionary.get_field_options(field_name, limit=30)
-        if options:
-            result = [f"📖 字段 '{field_name}' 的可选值:"]
-            chinese_name = self.dictionary.get_field_chinese_name(field_name)
-            result.append(f"({chinese_name})")
-            result.append("")
-            
-            for item in options:
-                result.append(f"  {item['value']}: {item['display_name']}")
-                if item.get('description') and len(str(item['description'])) < 100:
-                    result.append(f"    {item['description']}")
-            
-            if len(self.dictionary.get_field_options(field_name, limit=1000)) > 30:
-                result.append(f"\n... 显示前30个值，完整列表可导出查看")
-            
-            return "\n".join(result)
-        else:
-            return f"❌ 未找到字段 '{field_name}' 或该字段没有预定义值"
+        if not options:
+            return ToolResult.error(f"未找到字段 '{field_name}' 或该字段没有预定义值")
+        
+        data = {
+            "field": field_name,
+            "chinese_name": self.dictionary.get_field_chinese_name(field_name),
+            "options": [
+                dict({"value": item['value'], "display_name": item['display_name']},
+                     **({"description": item['description']}
+                        if not _missing(item.get('description')) and item['description']
+                        and len(str(item['description'])) < 100 else {}))
+                for item in options
+            ]
+        }
+        if len(self.dictionary.get_field_options(field_name, limit=1000)) > 30:
+            data["truncated"] = True
+        return ToolResult(data, _render_dictionary_options, _compact_dictionary_options)
     
-    def _view_codes_library(self, args: Dict) -> str:
+    def _view_codes_library(self, args: Dict) -> ToolResult:
         """查看编码库"""
         page = int(args.get("page", 1))
         per_page = int(args.get("per_page", 15))
+        if page < 1 or per_page < 1:
+            raise ValueError("page和per_page必须为正整数")
         category = args.get("category", "")
         
         # 筛选数据
@@ -206,54 +273,33 @@ class ReadingTypeAgent:
         
         total = len(filtered_codes)
         start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        page_codes = filtered_codes[start_idx:end_idx]
+        page_codes = filtered_codes[start_idx:start_idx + per_page]
         
-        result = [f"📚 编码库 (第{page}页, 共{total}条记录)"]
+        data = {"page": page, "per_page": per_page, "total": total,
+                "total_pages": (total + per_page - 1) // per_page}
         if category:
-            result[0] += f" - 类别: {category}"
-        
-        result.append("=" * 60)
-        
-        for i, code in enumerate(page_codes, start_idx + 1):
-            result.append(f"{i:3d}. {code.get('name', 'N/A')}")
-            result.append(f"     📋 ID: {code.get('reading_type_id', 'N/A')}")
-            result.append(f"     📝 说明: {code.get('description', 'N/A')[:50]}...")
-            result.append(f"     🏷️ 类别: {code.get('category', 'N/A')} | 📅 {code.get('created_at', 'N/A')}")
-            result.append("")
-        
-        # 分页信息
-        total_pages = (total + per_page - 1) // per_page
-        if total_pages > 1:
-            result.append(f"📄 第{page}/{total_pages}页")
-            if page < total_pages:
-                result.append("💡 可以查看下一页或指定页码")
-        
-        return "\n".join(result)
+            data["category"] = category
+        data["codes"] = [
+            dict(_code_fields(code, "name", "reading_type_id", "category", "created_at"),
+                 description=code.get('description', 'N/A')[:50])
+            for code in page_codes
+        ]
+        return ToolResult(data, _render_library_page)
     
-    def _filter_codes(self, args: Dict) -> str:
+    def _filter_codes(self, args: Dict) -> ToolResult:
         """筛选编码"""
         category = args.get("category", "")
         measurement_kind = args.get("measurement_kind", "")
         
         filtered_codes = self.database.filter_codes(category, measurement_kind)
         
-        if not filtered_codes:
-            return f"❌ 未找到符合条件的编码 (类别: {category}, 测量类型: {measurement_kind})"
-        
-        result = [f"🔍 筛选结果 (共{len(filtered_codes)}条):"]
-        
-        for i, code in enumerate(filtered_codes[:15], 1):  # 限制显示数量
-            result.append(f"{i:2d}. {code.get('name', 'N/A')}")
-            result.append(f"    📋 ID: {code.get('reading_type_id', 'N/A')}")
-            result.append(f"    🏷️ 类别: {code.get('category', 'N/A')}")
-        
-        if len(filtered_codes) > 15:
-            result.append(f"\n... 还有 {len(filtered_codes) - 15} 个结果，可使用查看编码库功能查看完整列表")
-        
-        return "\n".join(result)
+        # 最多返回15条，其余只给出数量
+        return ToolResult({
+            "category": category, "measurement_kind": measurement_kind, "total": len(filtered_codes),
+            "codes": [_code_fields(code, "name", "reading_type_id", "category") for code in filtered_codes[:15]]
+        }, _render_filter)
     
-    def _add_to_library(self, args: Dict) -> str:
+    def _add_to_library(self, args: Dict) -> ToolResult:
         """添加编码到库中"""
         name = args.get("name", "")
         reading_type_id = args.get("reading_type_id", "")
@@ -262,12 +308,10 @@ class ReadingTypeAgent:
         
         success, message = self.database.add_code(name, reading_type_id, description, category)
         
-        if success:
-            return f"✅ {message}"
-        else:
-            return f"❌ {message}"
+        return ToolResult({"ok": success, "message": message},
+                          lambda data: f"{'✅' if data['ok'] else '❌'} {data['message']}")
     
-    def _export_data(self, args: Dict) -> str:
+    def _export_data(self, args: Dict) -> ToolResult:
         """导出数据"""
         format_type = args.get("format", "csv").lower()
         filter_category = args.get("category", "")
@@ -275,46 +319,80 @@ class ReadingTypeAgent:
         success, result = self.database.export_data(format_type, filter_category)
         
         if success:
-            return f"✅ 数据已导出到文件: {result}\n📊 共导出 {len(self.database.reading_type_codes)} 条记录"
-        else:
-            return f"❌ 导出失败: {result}"
+            return ToolResult({"file": result, "count": len(self.database.reading_type_codes)},
+                              lambda data: f"✅ 数据已导出到文件: {data['file']}\n📊 共导出 {data['count']} 条记录")
+        return ToolResult.error(f"导出失败: {result}")
     
-    def _get_statistics(self, args: Dict) -> str:
+    def _get_statistics(self, args: Dict) -> ToolResult:
         """获取统计信息"""
         stats = self.database.get_statistics()
         dict_stats = self.dictionary.get_statistics()
         
-        result = ["📊 ReadingType编码库统计信息"]
-        result.append("=" * 40)
-        
-        # 基本统计
-        result.append(f"📚 总编码数量: {stats['total_codes']}")
-        result.append(f"📖 字典字段数: {dict_stats['total_fields']}")
-        result.append(f"🔧 自定义值数: {dict_stats['custom_values_count']}")
+        field_stats = dict_stats['field_stats'].values()
+        return ToolResult({
+            "total_codes": stats['total_codes'],
+            "dictionary_fields": dict_stats['total_fields'],
+            "custom_values": dict_stats['custom_values_count'],
+            "categories": stats['category_stats'],
+            "sources": stats['source_stats'],
+            "dictionary": {field_stat['chinese_name']: field_stat['total_values'] for field_stat in field_stats},
+            "dictionary_custom": {field_stat['chinese_name']: field_stat['custom_values']
+                                  for field_stat in field_stats if field_stat['custom_values'] > 0}
+        }, _render_statistics)
+    
+    def _query_history(self, args: Dict) -> ToolResult:
+        """查询操作历史"""
+        try:
+            since = _history_bound(args.get("since"))
+            until = _history_bound(args.get("until"))
+            days = float(args.get("days") or 0)
+            top = int(args.get("top", 10))
+            if days > 0 and since is None:
+                since = datetime.datetime.now() - datetime.timedelta(days=days)
+        except (TypeError, ValueError, OverflowError) as e:
+            return ToolResult.error(f"查询参数无效: {str(e)}")
+        operation = args.get("operation") or None
         
-        # 按类别统计
-        result.append("\n🏷️ 按类别分布:")
-        for category, count in stats['category_stats'].items():
-            percentage = (count / stats['total_codes']) * 100 if stats['total_codes'] > 0 else 0
-            result.append(f"  • {category}: {count} ({percentage:.1f}%)")
+        # 先写完队列中尚未写入的记录
+        get_history_logger(self.database.history_file).flush(timeout=1)
+        summary = self.history_reader.summarize(since, until, operation, top=top, failures=10)
+        return ToolResult({
+            "since": time_key(since), "until": time_key(until), "operation": operation,
+            "total": summary["total"], "operations": summary["operations"],
+            "top_inputs": [{"input": text, "count": count} for text, count in summary["top_inputs"]],
+            "failed": summary["failed"],
+            "failures": [dict(_code_fields(record, "timestamp", "operation", "input"),
+                              result=str(record.get("result", ""))[:100])
+                         for record in summary["failures"]]
+        }, _render_history)
+    
+    def _run_local_command(self, user_input: str, messages: List[Dict]) -> Optional[str]:
+        """输入是明确的命令时直接执行对应工具
         
-        # 按来源统计
-        result.append("\n📅 按来源分布:")
-        for source, count in stats['source_stats'].items():
-            percentage = (count / stats['total_codes']) * 100 if stats['total_codes'] > 0 else 0
-            result.append(f"  • {source}: {count} ({percentage:.1f}%)")
+        命令和结果按普通对话写入对话历史，后续大模型轮次可以引用。
         
-        # 字典统计
-        result.append("\n📖 字典详情:")
-        for field_name, field_stat in dict_stats['field_stats'].items():
-            result.append(f"  • {field_stat['chinese_name']}: {field_stat['total_values']}个值")
-            if field_stat['custom_values'] > 0:
-                result.append(f"    (含{field_stat['custom_values']}个自定义值)")
+        Returns:
+            工具输出，不是明确命令时返回None
+        """
+        if self.intent_router is None:
+            return None
+        routed = self.intent_router.route(user_input)
+        if routed is None:
+            return None
         
-        return "\n".join(result)
+        tool_name, args = routed
+        result = result_text(self.available_tools[tool_name](args))
+        messages.append({"role": "user", "content": user_input})
+        messages.append({"role": "assistant", "content": result})
+        return result
     
     def handle_function_call(self, function_call: Dict) -> str:
-        """处理函数调用"""
+        """处理函数调用 (开启追踪时记录每次调用的耗时、参数和结果大小)"""
+        if self.tracer.enabled:
+            return self.tracer.trace_tool_call(self._call_function, function_call)
+        return self._call_function(function_call)
+    
+    def _call_function(self, function_call: Dict) -> str:
         function_name = function_call.get("name")
         function_args = {}
         
@@ -325,13 +403,42 @@ class ReadingTypeAgent:
                 pass
         
         if function_name in self.available_tools:
-            function_response = self.available_tools[function_name](function_args)
-            return function_response
+            return self._tool_content(function_name, self.available_tools[function_name](function_args))
         else:
             return f"错误: 未知的函数 '{function_name}'"
     
-    def get_tools_definition(self) -> List[Dict]:
-        """获取工具定义"""
+    def _tool_content(self, function_name: str, result) -> str:
+        """工具返回值 -> 发送给大模型的tool消息内容"""
+        return result_content(result, self.compact_tool_results, self.tool_result_meter, function_name)
+    
+    def _start_prefetch(self, user_input: str) -> Optional[ToolPrefetcher]:
+        """按用户输入预测工具调用并开始预取，没有可预取的调用时返回None"""
+        if not self.speculative_tools or self.intent_router is None:
+            return None
+        try:
+            predictions = [(name, args) for name, args in self.intent_router.predict(user_input)
+                           if name in self.speculative_tools]
+        except Exception:
+            # 预测只是优化，失败时照常由大模型决定工具调用
+            return None
+        if not predictions:
+            return None
+        return ToolPrefetcher(lambda name, args: self.available_tools[name](args), self.handle_function_call,
+                              predictions, self._tool_content, self.speculation_meter, self.tracer)
+    
+    def get_tools_definition(self) -> Sequence[Dict]:
+        """获取工具定义
+        
+        每个进程只构建一次并冻结 (键按字典序排列)，各请求共用同一份定义，
+        保证请求前缀逐字节一致，命中DeepSeek的上下文缓存。
+        """
+        cls = type(self)
+        if cls.__dict__.get("_tools_definition") is None:
+            cls._tools_definition = freeze_json(self._build_tools_definition())
+        return cls._tools_definition
+    
+    def _build_tools_definition(self) -> List[Dict]:
+        """构建工具定义"""
         return [
             {
                 "type": "function",
@@ -489,113 +596,458 @@ class ReadingTypeAgent:
                         "properties": {}
                     }
                 }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "query_history",
+                    "description": "查询操作历史 (搜索、生成、添加等)，统计各操作次数、最常见的输入和失败的操作",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "since": {
+                                "type": "string",
+                                "description": "起始时间 (包含)，ISO日期或时间如2025-06-12、2025-06-12T08:00，也可以是今天、昨天"
+                            },
+                            "until": {
+                                "type": "string",
+                                "description": "结束时间 (不包含)，格式同since"
+                            },
+                            "days": {
+                                "type": "number",
+                                "description": "最近的天数，未指定since时使用，如7表示最近一周"
+                            },
+                            "operation": {
+                                "type": "string",
+                                "description": "只统计该操作类型，如search、generate、add"
+                            },
+                            "top": {
+                                "type": "integer",
+                                "description": "返回最常见输入的数量，默认为10"
+                            }
+                        }
+                    }
+                }
             }
         ]
     
     def get_response(self, user_input: str, stream: bool = True) -> str:
         """获取AI的回复"""
+        # 明确的命令在本地执行，不调用API
+        try:
+            local_response = self._run_local_command(user_input, self.conversation_history)
+        except Exception as e:
+            local_response = f"发生错误: {str(e)}"
+        if local_response is not None:
+            print(f"\n🤖 ReadingType助手: {local_response}")
+            return local_response
+        
         # 添加用户输入到对话历史
         self.add_message("user", user_input)
+        self._compact_history(self.conversation_history)
+        
+        start = time.perf_counter()
+        output = {"ttft": None, "line_open": False}
+        prefetcher = None
+        
+        def print_token(content: str) -> None:
+            """流式输出文本片段，记录首token耗时"""
+            if output["ttft"] is None:
+                output["ttft"] = time.perf_counter() - start
+            if not output["line_open"]:
+                output["line_open"] = True
+                print("\n🤖 ReadingType助手: ", end="", flush=True)
+            print(content, end="", flush=True)
         
         try:
-            # 调用DeepSeek API
-            response = self.client.chat.completions.create(
-                model="deepseek-chat",
-                messages=self.conversation_history,
-                tools=self.get_tools_definition(),
-                tool_choice="auto",
-                stream=False  # 工具调用时使用非流式
-            )
-            
-            response_message = response.choices[0].message
+            prefetcher = self._start_prefetch(user_input)
+            handle_function_call = prefetcher.handle_function_call if prefetcher else self.handle_function_call
+            tools = self.get_tools_definition()
+            if stream:
+                # 第一次调用也以流式获取: 文本边收边输出，工具调用参数完整后立即开始执行
+                first = stream_completion(self.client, self.model, self.conversation_history, tools,
+                                          handle_function_call, self.serial_tools,
+                                          print_token, self.prompt_cache_meter.record)
+                response_message, report = first["message"], first["report"]
+                if output["line_open"]:
+                    output["line_open"] = False
+                    print()
+            else:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.conversation_history,
+                    tools=tools,
+                    tool_choice="auto",
+                    stream=False
+                )
+                self.prompt_cache_meter.record(response.usage)
+                response_message = response.choices[0].message
+                report = None
+                if response_message.tool_calls:
+                    print("\n🤖 ReadingType助手正在处理...")
+                    # 执行工具调用 (多个调用并发执行，结果保持原顺序)
+                    report = execute_tool_calls(response_message.tool_calls,
+                                                handle_function_call, self.serial_tools)
             
             # 处理工具调用
-            if hasattr(response_message, 'tool_calls') and response_message.tool_calls:
-                print("\n🤖 ReadingType助手正在处理...")
+            if response_message.tool_calls:
+                for line in format_tool_report(report):
+                    print(line)
                 
-                # 添加完整的assistant响应到对话历史（包含tool_calls）
-                assistant_message = {
-                    "role": "assistant",
-                    "content": response_message.content,
-                    "tool_calls": []
-                }
-                
-                # 构建assistant消息和执行工具调用
-                tool_results = []
-                for tool_call in response_message.tool_calls:
-                    # 添加tool_call到assistant消息
-                    assistant_message["tool_calls"].append({
-                        "id": tool_call.id,
-                        "type": "function",
-                        "function": {
-                            "name": tool_call.function.name,
-                            "arguments": tool_call.function.arguments
-                        }
-                    })
-                    
-                    function_info = {
-                        "name": tool_call.function.name,
-                        "arguments": tool_call.function.arguments
-                    }
-                    tool_result = self.handle_function_call(function_info)
-                    print(f"🔧 工具使用: {tool_call.function.name}")
-                    
-                    # 收集工具调用结果
-                    tool_results.append({
-                        "role": "tool",
-                        "content": tool_result,
-                        "tool_call_id": tool_call.id
-                    })
-                
-                # 先添加assistant消息到历史
-                self.conversation_history.append(assistant_message)
-                
-                # 然后添加所有工具调用结果
-                for tool_result in tool_results:
-                    self.conversation_history.append(tool_result)
+                # 先添加完整的assistant响应（包含tool_calls），再添加所有工具调用结果
+                self.conversation_history.append(assistant_tool_call_message(response_message))
+                self.conversation_history.extend(tool_result_message(result["tool_call"], result["content"])
+                                                 for result in report["results"])
                 
                 # 再次调用API获取最终回复
                 if stream:
-                    print("\n🤖 ReadingType助手: ", end="", flush=True)
                     second_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
+                        model=self.model,
                         messages=self.conversation_history,
-                        stream=True
+                        tools=tools,
+                        tool_choice="none",
+                        stream=True,
+                        stream_options={"include_usage": True}
                     )
                     
                     full_response = ""
                     for chunk in second_response:
+                        if chunk.usage is not None:
+                            self.prompt_cache_meter.record(chunk.usage)
                         if chunk.choices and len(chunk.choices) > 0:
                             content = chunk.choices[0].delta.content
                             if content:
-                                print(content, end="", flush=True)
+                                print_token(content)
                                 full_response += content
                     
                     print()  # 换行
                     ai_response = full_response
                 else:
                     second_response = self.client.chat.completions.create(
-                        model="deepseek-chat",
+                        model=self.model,
                         messages=self.conversation_history,
+                        tools=tools,
+                        tool_choice="none",
                         stream=False
                     )
+                    self.prompt_cache_meter.record(second_response.usage)
                     ai_response = second_response.choices[0].message.content
                     print(f"\n🤖 ReadingType助手: {ai_response}")
                 
                 self.add_message("assistant", ai_response)
             else:
-                # 没有工具调用，直接返回回复
+                # 没有工具调用，直接返回回复 (流式时已逐段输出)
                 ai_response = response_message.content
-                print(f"\n🤖 ReadingType助手: {ai_response}")
+                if not stream:
+                    print(f"\n🤖 ReadingType助手: {ai_response}")
                 self.add_message("assistant", ai_response)
             
+            total = time.perf_counter() - start
+            self.last_timing = {"ttft": output["ttft"] if output["ttft"] is not None else total,
+                                "total": total, "streamed": stream}
+            self.metrics.record_turn(1 if response_message.tool_calls else 0)
             return ai_response
         
         except Exception as e:
             error_msg = f"发生错误: {str(e)}"
             print(f"\n🤖 ReadingType助手: {error_msg}")
             return error_msg
+        finally:
+            if prefetcher is not None:
+                prefetcher.finish()
 
+    async def get_response_async(self, user_input: str,
+                                 conversation_history: Optional[List[Dict]] = None,
+                                 on_token: Optional[TokenCallback] = None,
+                                 on_tool_report: Optional[ToolReportCallback] = None,
+                                 on_timing: Optional[TimingCallback] = None) -> str:
+        """异步获取AI的回复
+        
+        网络请求使用AsyncOpenAI，工具在线程池中执行，多个会话可在同一事件循环中并发。
+        
+        Args:
+            user_input: 用户输入
+            conversation_history: 会话的对话历史，并发会话各自传入自己的列表；为None时使用本实例的历史
+            on_token: 流式输出回调，提供时两次调用都以流式方式获取
+            on_tool_report: 工具执行报告回调，参数含各工具调用结果与耗时
+            on_timing: 耗时回调，参数含首token耗时与总耗时
+            
+        Returns:
+            最终回复文本，出错时为错误信息
+        """
+        messages = self.conversation_history if conversation_history is None else conversation_history
+        
+        try:
+            local_response = await asyncio.to_thread(self._run_local_command, user_input, messages)
+            if local_response is not None:
+                if on_token is not None:
+                    await emit_token(on_token, local_response)
+                return local_response
+            
+            messages.append({"role": "user", "content": user_input})
+            self._compact_history(messages)
+        except Exception as e:
+            return f"发生错误: {str(e)}"
+        
+        tool_rounds = []
+        
+        def count_tool_round(report: Dict) -> None:
+            tool_rounds.append(report)
+            if on_tool_report is not None:
+                on_tool_report(report)
+        
+        prefetcher = None
+        try:
+            prefetcher = self._start_prefetch(user_input)
+            reply = await run_turn_async(self.async_client, self.model, messages, self.get_tools_definition(),
+                                         prefetcher.handle_function_call if prefetcher else self.handle_function_call,
+                                         on_token, self.serial_tools, count_tool_round,
+                                         self.prompt_cache_meter.record, on_timing)
+            self.metrics.record_turn(len(tool_rounds))
+            return reply
+        except Exception as e:
+            return f"发生错误: {str(e)}"
+        finally:
+            if prefetcher is not None:
+                prefetcher.finish()
+    
+    def get_metrics(self, session_id: Optional[str] = None) -> Dict:
+        """大模型调用指标的进程汇总 (指定 session_id 时另含该会话的汇总)"""
+        return self.metrics.get_metrics(session_id)
+    
+    def enable_completion_cache(self, cache: CompletionCache) -> None:
+        """开启补全缓存: 相同的请求直接返回本地缓存的回复，不再调用API"""
+        if self.completion_cache is not None:
+            self.client = self.client._client
+            self.async_client = self.async_client._client
+        self.completion_cache = cache
+        # 缓存包装在指标包装之外，命中时由缓存包装计入 cache_hits 和命中耗时
+        self.client = CachedClient(self.client, cache, self.metrics)
+        self.async_client = AsyncCachedClient(self.async_client, cache, self.metrics)
+    
+    def _compact_history(self, messages: List[Dict]) -> None:
+        """按token预算压缩对话历史"""
+        if self.history_manager is not None:
+            self.history_manager.compact(messages)
+    
     def clear_history(self):
         """清除对话历史"""
-        self.conversation_history = [] 
\ No newline at end of file
+        self.conversation_history = [] 
+
+
+# 识别要素的中文名称
+_ELEMENT_NAMES = {
+    'device_types': '设备类型',
+    'measurement_kinds': '测量类型',
+    'flow_directions': '流向',
+    'phases': '相位',
+    'time_periods': '时间周期',
+    'units': '单位',
+    'behaviors': '行为'
+}
+
+
+def _missing(value) -> bool:
+    """字段值是否缺失 (pandas读入的空单元格为NaN，不能写入JSON)"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _code_fields(code: Dict, *keys: str) -> Dict:
+    """编码记录中的指定字段 (缺失的字段不输出)"""
+    return {key: code[key] for key in keys if not _missing(code.get(key))}
+
+
+# 查询操作历史时可用的相对日期 -> 距今天的天数
+_RELATIVE_DAYS = {"今天": 0, "today": 0, "昨天": 1, "yesterday": 1, "前天": 2}
+
+
+def _history_bound(value) -> TimeBound:
+    """查询操作历史的时间边界 (相对日期换算为当天零点，带时区的时间换算为本地时间)"""
+    if value is None or value == "":
+        return None
+    value = str(value).strip()
+    if value.lower() in _RELATIVE_DAYS:
+        return datetime.date.today() - datetime.timedelta(days=_RELATIVE_DAYS[value.lower()])
+    # 校验格式，比较时仍使用原字符串
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        # 历史记录的时间戳是不带时区的本地时间
+        return parsed.astimezone().replace(tzinfo=None)
+    return value
+
+
+# 以下函数把工具的结构化结果渲染为面向用户的文本
+
+def _render_search(data: Dict) -> str:
+    result = []
+    if data["match"] == "exact":
+        result.append("✅ 找到精确匹配:")
+        for match in data["codes"]:
+            result.append(f"📊 名称: {match.get('name', 'N/A')}")
+            result.append(f"🔢 ReadingTypeID: {match.get('reading_type_id', 'N/A')}")
+            result.append(f"📝 说明: {match.get('description', 'N/A')}")
+            result.append(f"🏷️ 类别: {match.get('category', 'N/A')}")
+            result.append(f"⏰ 创建时间: {match.get('created_at', 'N/A')}")
+            result.append("---")
+    elif data["match"] == "similar":
+        result.append("🔍 找到相似的编码:")
+        for i, match in enumerate(data["codes"], 1):
+            result.append(f"{i}. {match.get('name', 'N/A')} (相似度: {match['similarity']:.2f})")
+            result.append(f"   ReadingTypeID: {match.get('reading_type_id', 'N/A')}")
+            result.append(f"   说明: {match.get('description', 'N/A')}")
+        result.append("\n❓ 以上是否有您需要的编码？如果没有，我可以为您生成新的编码。")
+    else:
+        result.append(f"❌ 未找到与'{data['query']}'相关的编码")
+        result.append("💡 我可以为您生成新的ReadingTypeID，请告诉我更多详细信息:")
+        result.append("- 设备类型 (如: 电表、储能、气象)")
+        result.append("- 测量内容 (如: 电压、电流、功率、能量)")
+        result.append("- 特殊要求 (如: 相位、时间周期)")
+    return "\n".join(result)
+
+
+def _render_generate(data: Dict) -> str:
+    if "description" not in data:
+        result = ["🤖 AI生成结果:", f"🔢 ReadingTypeID: {data['reading_type_id']}", "\n📋 字段详情:"]
+        for field in data["fields"]:
+            result.append(f"  {field['index']:2d}. {field['name']}: {field['value']} ({field['meaning']})")
+    else:
+        result = ["🤖 AI分析结果:", f"📝 输入描述: {data['description']}"]
+        if data.get("elements"):
+            result.append("\n🔍 识别要素:")
+            for name, values in data["elements"].items():
+                result.append(f"  - {name}: {', '.join(values)}")
+        
+        result.append(f"\n💡 建议编码: {data['reading_type_id']}")
+        result.append("\n📋 字段映射:")
+        for field in data["fields"]:
+            result.append(f"  {field['index']:2d}. {field['chinese_name']}({field['name']}): "
+                          f"{field['value']} = {field['meaning']}")
+        
+        if data.get("errors"):
+            result.append("\n⚠️ 字段组合问题:")
+            result.extend(f"  - {error}" for error in data["errors"])
+        if data.get("suggestions"):
+            result.append("\n💭 完善建议:")
+            result.extend(f"  - {suggestion}" for suggestion in data["suggestions"])
+    
+    if data.get("nearest"):
+        result.append("\n📚 编码库中的相近编码:")
+        for code in data["nearest"]:
+            tag = "相同编码" if code["distance"] == 0 else f"差异度 {code['distance']:g}"
+            result.append(f"  - {code.get('name', 'N/A')}: {code.get('reading_type_id', 'N/A')} ({tag})")
+        if data["nearest"][0]["distance"] == 0:
+            result.append("💡 编码库中已有相同编码，可直接使用，无需重复添加")
+    
+    result.append("\n✅ 是否采纳此编码？输入'是'确认，'否'取消，或提出修改建议。")
+    return "\n".join(result)
+
+
+def _compact_generate(data: Dict) -> Dict:
+    # 字段含义已包含取值 (如 "128.phaseA")，发送给大模型时只保留 字段名 -> 含义
+    return dict(data, fields={field["name"]: field["meaning"] for field in data["fields"]})
+
+
+def _render_dictionary_fields(data: Dict) -> str:
+    result = ["📚 ReadingType字段字典:"]
+    for i, (name, chinese_name) in enumerate(data["fields"].items(), 1):
+        result.append(f"{i:2d}. {name} ({chinese_name})")
+    result.append("\n💡 使用 '查询字典 [字段名]' 查看具体字段的可选值")
+    return "\n".join(result)
+
+
+def _render_dictionary_options(data: Dict) -> str:
+    result = [f"📖 字段 '{data['field']}' 的可选值:", f"({data['chinese_name']})", ""]
+    for item in data["options"]:
+        result.append(f"  {item['value']}: {item['display_name']}")
+        if item.get('description'):
+            result.append(f"    {item['description']}")
+    if data.get("truncated"):
+        result.append(f"\n... 显示前30个值，完整列表可导出查看")
+    return "\n".join(result)
+
+
+def _compact_dictionary_options(data: Dict) -> Dict:
+    # 显示名称已包含取值 (如 "16.phaseN")，发送给大模型时只保留 显示名称 -> 说明
+    return dict(data, options={item["display_name"]: item.get("description", "") for item in data["options"]})
+
+
+def _render_library_page(data: Dict) -> str:
+    page, total, total_pages = data["page"], data["total"], data["total_pages"]
+    result = [f"📚 编码库 (第{page}页, 共{total}条记录)"]
+    if data.get("category"):
+        result[0] += f" - 类别: {data['category']}"
+    result.append("=" * 60)
+    
+    for i, code in enumerate(data["codes"], (page - 1) * data["per_page"] + 1):
+        result.append(f"{i:3d}. {code.get('name', 'N/A')}")
+        result.append(f"     📋 ID: {code.get('reading_type_id', 'N/A')}")
+        result.append(f"     📝 说明: {code['description']}...")
+        result.append(f"     🏷️ 类别: {code.get('category', 'N/A')} | 📅 {code.get('created_at', 'N/A')}")
+        result.append("")
+    
+    # 分页信息
+    if total_pages > 1:
+        result.append(f"📄 第{page}/{total_pages}页")
+        if page < total_pages:
+            result.append("💡 可以查看下一页或指定页码")
+    return "\n".join(result)
+
+
+def _render_filter(data: Dict) -> str:
+    if not data["total"]:
+        return f"❌ 未找到符合条件的编码 (类别: {data['category']}, 测量类型: {data['measurement_kind']})"
+    
+    result = [f"🔍 筛选结果 (共{data['total']}条):"]
+    for i, code in enumerate(data["codes"], 1):
+        result.append(f"{i:2d}. {code.get('name', 'N/A')}")
+        result.append(f"    📋 ID: {code.get('reading_type_id', 'N/A')}")
+        result.append(f"    🏷️ 类别: {code.get('category', 'N/A')}")
+    if data["total"] > len(data["codes"]):
+        result.append(f"\n... 还有 {data['total'] - len(data['codes'])} 个结果，可使用查看编码库功能查看完整列表")
+    return "\n".join(result)
+
+
+def _render_statistics(data: Dict) -> str:
+    total = data["total_codes"]
+    result = ["📊 ReadingType编码库统计信息", "=" * 40]
+    
+    # 基本统计
+    result.append(f"📚 总编码数量: {total}")
+    result.append(f"📖 字典字段数: {data['dictionary_fields']}")
+    result.append(f"🔧 自定义值数: {data['custom_values']}")
+    
+    # 按类别、来源统计
+    for title, counts in (("\n🏷️ 按类别分布:", data["categories"]), ("\n📅 按来源分布:", data["sources"])):
+        result.append(title)
+        for name, count in counts.items():
+            percentage = (count / total) * 100 if total > 0 else 0
+            result.append(f"  • {name}: {count} ({percentage:.1f}%)")
+    
+    # 字典统计
+    result.append("\n📖 字典详情:")
+    for chinese_name, total_values in data["dictionary"].items():
+        result.append(f"  • {chinese_name}: {total_values}个值")
+        if chinese_name in data["dictionary_custom"]:
+            result.append(f"    (含{data['dictionary_custom'][chinese_name]}个自定义值)")
+    return "\n".join(result)
+
+
+def _render_history(data: Dict) -> str:
+    scope = f"{data['since'] or '最早'} ~ {data['until'] or '现在'}"
+    if data["operation"]:
+        scope += f", 操作: {data['operation']}"
+    if not data["total"]:
+        return f"📭 没有操作记录 ({scope})"
+    
+    result = [f"🗂️ 操作历史 ({scope}): 共{data['total']}条, 失败{data['failed']}条"]
+    result.append("\n📊 按操作类型:")
+    result.extend(f"  • {name}: {count}" for name, count in data["operations"].items())
+    if data["top_inputs"]:
+        result.append("\n🔝 最常见的输入:")
+        result.extend(f"  {i:2d}. {item['input']} ({item['count']}次)" for i, item in enumerate(data["top_inputs"], 1))
+    if data["failures"]:
+        result.append("\n❗ 最近失败的操作:")
+        for record in data["failures"]:
+            result.append(f"  - [{record.get('timestamp', 'N/A')}] {record.get('operation', 'N/A')}: "
+                          f"{record.get('input', 'N/A')} → {record['result']}")
+    return "\n".join(result)
@@ -0,0 +1,381 @@
+"""ReadingTypeID编解码
+
+ReadingTypeID由16个整数字段组成，库中使用'-'分隔，测试数据和IEC文档中常见'.'分隔。
+本模块是解析/构建ReadingTypeID的唯一实现:
+- 支持'-'和'.'两种分隔符，支持负数 (如乘数字段 "0-...--3-..." 或 "–3")
+- "12.0" 这类整数值小数 (pandas导出的浮点列) 视为12，真正的小数值视为非法
+- 单个编码解析为16个int的元组，批量编码解析为 N×16 的int64矩阵
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+FIELD_COUNT = 16
+
+# 批量快速路径单个字段允许的最大位数 (保证int64不溢出)
+_MAX_DIGITS = 18
+_DOT_TO_DASH = bytes.maketrans(b'.', b'-')
+
+# 通用格式: '-'分隔时字段可带小数，'.'分隔时字段只能是整数
+_NUMBER = r'(-?\d+(?:\.\d+)?)'
+_INTEGER = r'(-?\d+)'
+_DASH_ID = re.compile(r'\s*' + _NUMBER + (r'-' + _NUMBER) * (FIELD_COUNT - 1) + r'\s*')
+_DOT_ID = re.compile(r'\s*' + _INTEGER + (r'\.' + _INTEGER) * (FIELD_COUNT - 1) + r'\s*')
+
+
+def parse_reading_type_id(reading_type_id: str) -> Tuple[int, ...]:
+    """解析ReadingTypeID为16个整数字段
+
+    Args:
+        reading_type_id: 如 "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0" 或 "0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0"
+
+    Returns:
+        16个字段值的元组
+
+    Raises:
+        ValueError: 格式错误或字段值不是整数
+    """
+    if not isinstance(reading_type_id, str):
+        raise ValueError(f"ReadingTypeID必须是字符串，实际为{type(reading_type_id).__name__}")
+
+    # 快速路径: 16个非负整数用'-'分隔
+    parts = reading_type_id.split('-')
+    if len(parts) == FIELD_COUNT and all(part.isdigit() for part in parts):
+        return tuple(map(int, parts))
+
+    text = reading_type_id.replace('–', '-')
+    match = _DASH_ID.fullmatch(text) or _DOT_ID.fullmatch(text)
+    if not match:
+        raise ValueError(f"ReadingTypeID格式错误，应包含{FIELD_COUNT}个以'-'或'.'分隔的数字: '{reading_type_id}'")
+
+    values = []
+    for i, part in enumerate(match.groups()):
+        if '.' in part:
+            number = float(part)
+            if number != int(number):
+                raise ValueError(f"字段{i+1}的值'{part}'不是有效的整数")
+            values.append(int(number))
+        else:
+            values.append(int(part))
+    return tuple(values)
+
+
+def is_valid_reading_type_id(reading_type_id: str) -> bool:
+    """验证ReadingTypeID格式"""
+    try:
+        parse_reading_type_id(reading_type_id)
+        return True
+    except ValueError:
+        return False
+
+
+def build_reading_type_id(values: Sequence[int], separator: str = '-') -> str:
+    """由16个字段值构建ReadingTypeID字符串"""
+    if len(values) != FIELD_COUNT:
+        raise ValueError(f"ReadingTypeID必须包含{FIELD_COUNT}个字段，实际为{len(values)}个")
+    return separator.join(str(int(value)) for value in values)
+
+
+def normalize_reading_type_id(reading_type_id: str, separator: str = '-') -> str:
+    """把任意合法写法的ReadingTypeID规范为标准显示形式"""
+    return build_reading_type_id(parse_reading_type_id(reading_type_id), separator)
+
+
+def from_field_dict(field_values: Dict[str, int]) -> Tuple[int, ...]:
+    """{field_1: v1, ...} 字典 -> 16个字段值的元组 (缺失字段为0)"""
+    return tuple(int(field_values.get(f"field_{i+1}", 0)) for i in range(FIELD_COUNT))
+
+
+def to_field_dict(values: Sequence[int]) -> Dict[str, int]:
+    """16个字段值 -> {field_1: v1, ...} 字典"""
+    return {f"field_{i+1}": int(value) for i, value in enumerate(values)}
+
+
+def decode_batch(reading_type_ids: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """批量解析ReadingTypeID
+
+    Args:
+        reading_type_ids: ReadingTypeID列 (列表、pandas Series等)
+
+    Returns:
+        (N×16 int64矩阵, 长度为N的合法标记)，非法编码对应行为全0
+    """
+    ids = reading_type_ids if isinstance(reading_type_ids, list) else list(reading_type_ids)
+    count = len(ids)
+    matrix = np.zeros((count, FIELD_COUNT), dtype=np.int64)
+    valid = np.zeros(count, dtype=bool)
+    if count == 0:
+        return matrix, valid
+
+    try:
+        plain = _decode_plain(ids)
+    except TypeError:
+        # 列中有非字符串 (如pandas的NaN)，转为字符串后再解析
+        ids = [rid if isinstance(rid, str) else str(rid) for rid in ids]
+        plain = _decode_plain(ids)
+    if plain is not None:
+        valid[:] = True
+        return plain, valid
+
+    # 混合格式: 逐个解析
+    for i, rid in enumerate(ids):
+        try:
+            matrix[i] = parse_reading_type_id(rid)
+            valid[i] = True
+        except ValueError:
+            continue
+    return matrix, valid
+
+
+def encode_batch(matrix: np.ndarray, separator: str = '-') -> List[str]:
+    """把 N×16 字段矩阵批量编码为ReadingTypeID字符串列表"""
+    matrix = np.asarray(matrix)
+    if matrix.ndim != 2 or matrix.shape[1] != FIELD_COUNT:
+        raise ValueError(f"字段矩阵形状必须为 N×{FIELD_COUNT}，实际为{matrix.shape}")
+    matrix = matrix.astype(np.int64)
+    if len(matrix) == 0:
+        return []
+    if '\n' in separator:
+        template = separator.join(['%d'] * FIELD_COUNT)
+        return [template % row for row in map(tuple, matrix.tolist())]
+    if len(separator) == 1 and separator.isascii():
+        text = _encode_plain(matrix, separator)
+    else:
+        # 多字符或非ASCII分隔符 (如'–'): 先用占位符拼出整段文本，再一次性替换
+        text = _encode_plain(matrix, '\x1f').replace('\x1f', separator)
+    return text.split('\n')[:-1]
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """64位整数混合 (splitmix64 的终结函数)"""
+    with np.errstate(over="ignore"):
+        x = x ^ (x >> np.uint64(30))
+        x = x * np.uint64(0xBF58476D1CE4E5B9)
+        x = x ^ (x >> np.uint64(27))
+        x = x * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+def hash_batch(matrix: np.ndarray) -> np.ndarray:
+    """N×16 字段矩阵 -> 每行的64位哈希 (uint64)
+
+    相同的行哈希相同；不同的行可能碰撞，用于分组时需再比较字段值。
+    """
+    keys = np.zeros(len(matrix), dtype=np.uint64)
+    for column in np.asarray(matrix, dtype=np.int64).T:
+        keys = _mix(keys ^ column.astype(np.uint64))
+    return keys
+
+
+def _decode_plain(ids: List[str]) -> Optional[np.ndarray]:
+    """整列都是16个整数用'-'、'–'或'.'分隔时 (负数写作 "--3"、"0.-3")，直接在字节数组上解析
+
+    分隔符的规范化和解析都在整列文本上向量化完成，不满足该格式 (如带小数的字段、首尾空白)
+    时返回None，由调用方逐个解析。
+    """
+    count = len(ids)
+    text = '\n'.join(ids) + '\n'
+    if '–' in text:
+        text = text.replace('–', '-')
+    data = text.encode('ascii', 'replace')
+    if data.translate(None, b'0123456789-.\n'):
+        return None
+    # '.'分隔的行换成'-'分隔解析，最后检查每行只用了一种分隔符 ('.'分隔时字段只能是整数)
+    original = None
+    if b'.' in data:
+        original = np.frombuffer(data, dtype=np.uint8)
+        data = data.translate(_DOT_TO_DASH)
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    # '-'和'\n'都小于'0'；紧跟在分隔符、换行或开头之后的'-'是负号，其余是分隔符
+    below = buf < ord('0')
+    signed = data.startswith(b'-') or b'--' in data or b'\n-' in data
+    if signed:
+        sign = np.empty_like(below)
+        sign[0] = buf[0] == ord('-')
+        np.logical_and(buf[1:] == ord('-'), below[:-1], out=sign[1:])
+        below &= ~sign
+    # 每行恰好16个分隔符且最后一个是换行
+    sep_pos = np.flatnonzero(below)
+    if (sep_pos.size != count * FIELD_COUNT or data.count(b'\n') != count
+            or (buf[sep_pos[FIELD_COUNT - 1::FIELD_COUNT]] != ord('\n')).any()):
+        return None
+
+    if original is not None:
+        kinds = original[sep_pos].reshape(count, FIELD_COUNT)[:, :FIELD_COUNT - 1]
+        if (kinds != kinds[:, :1]).any():
+            return None
+
+    starts = np.empty_like(sep_pos)
+    starts[0] = 0
+    starts[1:] = sep_pos[:-1] + 1
+    if signed:
+        negative = sign[starts]
+        # 负号只能出现在字段开头，且每个字段只有一个
+        if negative.sum() != sign.sum():
+            return None
+        starts += negative
+    lengths = sep_pos - starts
+    if lengths.min() < 1 or lengths.max() > _MAX_DIGITS:
+        return None
+
+    # 按位累加: 第j轮只处理长度超过j的字段 (上一轮的子集)
+    digits = buf - np.uint8(ord('0'))
+    values = digits[starts].astype(np.int64)
+    index = np.flatnonzero(lengths > 1)
+    for j in range(1, int(lengths.max())):
+        if j > 1:
+            index = index[lengths[index] > j]
+        values[index] = values[index] * 10 + digits[starts[index] + j]
+    if signed:
+        np.negative(values, out=values, where=negative)
+    return values.reshape(count, FIELD_COUNT)
+
+
+def _encode_plain(matrix: np.ndarray, separator: str) -> str:
+    """在字节数组上向量化拼出所有编码，返回每行一个编码 (以换行结尾) 的文本"""
+    flat = matrix.ravel()
+    negative = flat < 0
+    magnitude = np.abs(flat)
+    if magnitude.max() < 2 ** 31:
+        magnitude = magnitude.astype(np.uint32)
+
+    # 每个字段的位数、负号和分隔符决定输出位置
+    lengths = np.ones(flat.size, dtype=np.int64)
+    bound = 10
+    while bound <= magnitude.max():
+        lengths += magnitude >= bound
+        bound *= 10
+    widths = lengths + negative + 1
+    sep_pos = np.cumsum(widths) - 1
+
+    out = np.empty(int(sep_pos[-1]) + 1, dtype=np.uint8)
+    out[sep_pos] = ord(separator)
+    out[sep_pos[FIELD_COUNT - 1::FIELD_COUNT]] = ord('\n')
+    if negative.any():
+        out[(sep_pos - widths + 1)[negative]] = ord('-')
+
+    # 从个位开始逐位写入，每轮只保留还有高位的字段
+    rest, position = magnitude, sep_pos - 1
+    while True:
+        rest, digit = np.divmod(rest, 10)
+        out[position] = digit + ord('0')
+        more = np.flatnonzero(rest)
+        if not more.size:
+            break
+        rest, position = rest[more], position[more] - 1
+    return out.tobytes().decode('ascii')
+
+
+# 紧凑键: 16个字段按固定位宽依次拼成128位 (高位在前)，字节序即字段字典序。
+# 位宽覆盖标准字典全部取值: 商品/测量类型/单位等最大904，相位最大17153，乘数为-24..24
+FIELD_BITS = (6, 6, 7, 5, 5, 10, 10, 6, 10, 10, 6, 6, 15, 6, 10, 10)
+KEY_SIZE = 16
+
+_MULTIPLIER_INDEX = 13
+_FIELD_OFFSETS = tuple(128 - sum(FIELD_BITS[:i + 1]) for i in range(FIELD_COUNT))
+_FIELD_MIN = tuple(-(1 << (bits - 1)) if i == _MULTIPLIER_INDEX else 0
+                   for i, bits in enumerate(FIELD_BITS))
+_FIELD_MAX = tuple(low + (1 << bits) - 1 for low, bits in zip(_FIELD_MIN, FIELD_BITS))
+
+
+def pack_key(values: Sequence[int]) -> bytes:
+    """16个字段值 -> 16字节紧凑键
+
+    写法不同但等价的编码 ("0.0.2..."、"0-0-2..."、"12.0") 得到同一个键，
+    可用作索引、集合运算和缓存的键。
+
+    Raises:
+        ValueError: 字段数不对或字段值超出该字段位宽
+    """
+    if len(values) != FIELD_COUNT:
+        raise ValueError(f"ReadingTypeID必须包含{FIELD_COUNT}个字段，实际为{len(values)}个")
+    key = 0
+    for i, value in enumerate(values):
+        value = int(value)
+        if not _FIELD_MIN[i] <= value <= _FIELD_MAX[i]:
+            raise ValueError(f"字段{i+1}的值{value}超出紧凑键范围[{_FIELD_MIN[i]}, {_FIELD_MAX[i]}]")
+        key |= (value - _FIELD_MIN[i]) << _FIELD_OFFSETS[i]
+    return key.to_bytes(KEY_SIZE, 'big')
+
+
+def unpack_key(key: bytes) -> Tuple[int, ...]:
+    """16字节紧凑键 -> 16个字段值"""
+    if len(key) != KEY_SIZE:
+        raise ValueError(f"紧凑键长度必须为{KEY_SIZE}字节，实际为{len(key)}字节")
+    number = int.from_bytes(key, 'big')
+    return tuple(((number >> offset) & ((1 << bits) - 1)) + low
+                 for offset, bits, low in zip(_FIELD_OFFSETS, FIELD_BITS, _FIELD_MIN))
+
+
+def reading_type_key(reading_type_id: str) -> bytes:
+    """ReadingTypeID (任意合法写法) -> 紧凑键"""
+    return pack_key(parse_reading_type_id(reading_type_id))
+
+
+def key_to_reading_type_id(key: bytes, separator: str = '-') -> str:
+    """紧凑键 -> ReadingTypeID显示形式"""
+    return build_reading_type_id(unpack_key(key), separator)
+
+
+def canonical_key(values: Sequence[int]) -> Union[bytes, str]:
+    """索引/集合运算/缓存用的键: 通常为紧凑键，字段值超出位宽 (如自定义字典值) 时退化为标准写法字符串"""
+    try:
+        return pack_key(values)
+    except ValueError:
+        return build_reading_type_id(values)
+
+
+def pack_batch(matrix: np.ndarray) -> Tuple[List[bytes], np.ndarray]:
+    """批量把 N×16 字段矩阵打包为紧凑键
+
+    Returns:
+        (键列表, 长度为N的可打包标记)，超出位宽的行对应键为None
+    """
+    matrix = np.asarray(matrix, dtype=np.int64)
+    if matrix.ndim != 2 or matrix.shape[1] != FIELD_COUNT:
+        raise ValueError(f"字段矩阵形状必须为 N×{FIELD_COUNT}，实际为{matrix.shape}")
+    low = np.array(_FIELD_MIN, dtype=np.int64)
+    high = np.array(_FIELD_MAX, dtype=np.int64)
+    packable = ((matrix >= low) & (matrix <= high)).all(axis=1)
+
+    # 分别拼出高64位和低64位，跨越第64位的字段拆成两部分
+    shifted = (matrix - low).astype(np.uint64)
+    halves = np.zeros((len(matrix), 2), dtype=np.uint64)
+    for i, (offset, bits) in enumerate(zip(_FIELD_OFFSETS, FIELD_BITS)):
+        column = shifted[:, i]
+        if offset >= 64:
+            halves[:, 0] |= column << np.uint64(offset - 64)
+        elif offset + bits <= 64:
+            halves[:, 1] |= column << np.uint64(offset)
+        else:
+            halves[:, 0] |= column >> np.uint64(64 - offset)
+            halves[:, 1] |= column << np.uint64(offset)
+
+    data = halves.astype('>u8').tobytes()
+    keys = [data[n:n + KEY_SIZE] if ok else None
+            for n, ok in zip(range(0, len(data), KEY_SIZE), packable.tolist())]
+    return keys, packable
+
+
+def unpack_batch(keys: Sequence[bytes]) -> np.ndarray:
+    """批量把紧凑键解包为 N×16 字段矩阵"""
+    if len(keys) == 0:
+        return np.zeros((0, FIELD_COUNT), dtype=np.int64)
+    halves = np.frombuffer(b''.join(keys), dtype='>u8').reshape(-1, 2).astype(np.uint64)
+    if len(halves) != len(keys):
+        raise ValueError(f"紧凑键长度必须为{KEY_SIZE}字节")
+    matrix = np.empty((len(keys), FIELD_COUNT), dtype=np.int64)
+    for i, (offset, bits) in enumerate(zip(_FIELD_OFFSETS, FIELD_BITS)):
+        mask = np.uint64((1 << bits) - 1)
+        if offset >= 64:
+            column = halves[:, 0] >> np.uint64(offset - 64)
+        elif offset + bits <= 64:
+            column = halves[:, 1] >> np.uint64(offset)
+        else:
+            column = (halves[:, 0] << np.uint64(64 - offset)) | (halves[:, 1] >> np.uint64(offset))
+        matrix[:, i] = (column & mask).astype(np.int64) + _FIELD_MIN[i]
+    return matrix
@@ -1,16 +1,23 @@
 import os
-import csv
+import re
 import datetime
+import itertools
+import threading
+import numpy as np
 import pandas as pd
 from difflib import SequenceMatcher
+from operator import itemgetter
 from typing import List, Dict, Optional, Tuple
 
+import reading_type_codec
+from history_logger import get_history_logger
+
 class ReadingTypeDatabase:
     """ReadingType编码数据库管理类"""
     
     def __init__(self, codes_file="reading_type_codes.csv", 
                  dictionaries_file="field_dictionaries.csv",
-                 history_file="operation_history.csv"):
+                 history_file="operation_history.jsonl"):
         self.codes_file = codes_file
         self.dictionaries_file = dictionaries_file
         self.history_file = history_file
@@ -22,9 +29,28 @@ class ReadingTypeDatabase:
             "argumentNumerator", "TOU", "cpp", "tier", "phase", "multiplier", "uom", "currency"
         ]
         
+        # 相近编码检索的字段权重: 商品类型和测量类型决定"是什么量"，权重最高
+        self.field_distance_weights = {
+            "macroPeriod": 1, "aggregate": 1, "measurePeriod": 2, "accumulationBehaviour": 3,
+            "flowDirection": 3, "commodity": 5, "measurementKind": 5, "harmonic": 1,
+            "argumentNumerator": 1, "TOU": 1, "cpp": 1, "tier": 1, "phase": 2,
+            "multiplier": 2, "uom": 4, "currency": 0.5
+        }
+        
         # 加载数据
         self.reading_type_codes = self.load_reading_type_codes()
         self.field_dictionaries = self.load_field_dictionaries()
+        
+        # 字段矩阵缓存 (N×16)，编码库变化时失效
+        self._field_matrix = None
+        self._field_matrix_valid = None
+        # 紧凑键 -> 行号列表的索引，与字段矩阵同时失效
+        self._key_index = None
+        # 小写名称 -> 行号列表的索引，编码库变化时失效
+        self._name_index = None
+        
+        # 编码库写操作锁 (工具可能在多个线程中并发执行)
+        self._write_lock = threading.RLock()
     
     def load_reading_type_codes(self) -> List[Dict]:
         """加载ReadingType编码库"""
@@ -49,7 +75,7 @@ class ReadingTypeDatabase:
             df = pd.read_csv(self.dictionaries_file)
             # 按字段名分组
             dictionaries = {}
-            for _, row in df.iterrows():
+            for row in df.to_dict('records'):
                 field_name = str(row['field_name']).strip()
                 if field_name not in dictionaries:
                     dictionaries[field_name] = []
@@ -148,18 +174,7 @@ class ReadingTypeDatabase:
         """验证ReadingTypeID格式"""
         if not reading_type_id:
             return False
-            
-        parts = reading_type_id.split('-')
-        if len(parts) != 16:
-            return False
-        
-        for part in parts:
-            try:
-                float(part)  # 允许小数和负数
-            except ValueError:
-                return False
-        
-        return True
+        return reading_type_codec.is_valid_reading_type_id(reading_type_id)
     
     def add_code(self, name: str, reading_type_id: str, 
                  description: str = "", category: str = "用户生成") -> Tuple[bool, str]:
@@ -180,38 +195,44 @@ class ReadingTypeDatabase:
         # 验证编码格式
         if not self.validate_reading_type_id(reading_type_id):
             return False, "ReadingTypeID格式不正确，应为16个数字用'-'分隔"
+        # 统一为'-'分隔的标准写法
+        reading_type_id = reading_type_codec.normalize_reading_type_id(reading_type_id)
         
-        # 检查是否已存在
-        for code in self.reading_type_codes:
-            if (str(code.get('name', '')).lower() == name.lower() or 
-                str(code.get('reading_type_id', '')) == reading_type_id):
+        # 检查与写入在同一把锁内完成，并发会话同时添加时不会重复
+        with self._write_lock:
+            # 检查是否已存在 (编码按紧凑键比较，不受写法影响)
+            existing = self.get_codes_by_reading_type_id(reading_type_id)
+            existing += self.get_codes_by_name(name)
+            if existing:
+                code = existing[0]
                 return False, f"编码已存在: {code.get('name', 'N/A')} ({code.get('reading_type_id', 'N/A')})"
-        
-        # 添加新编码
-        new_code = {
-            'id': len(self.reading_type_codes) + 1,
-            'name': name,
-            'description': description,
-            'reading_type_id': reading_type_id,
-            'created_at': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'source': '用户生成',
-            'category': category
-        }
-        
-        # 解析字段值
-        fields = reading_type_id.split('-')
-        for i, field_value in enumerate(fields):
-            new_code[f'field_{i+1}'] = field_value
-        
-        self.reading_type_codes.append(new_code)
-        
-        # 保存到文件
-        success = self.save_reading_type_codes()
-        if success:
-            self.log_operation(f"添加编码: {name}", "add", f"成功添加编码 {reading_type_id}")
-            return True, f"成功添加编码: {name} ({reading_type_id})"
-        else:
-            return False, "保存编码失败"
+            
+            # 添加新编码
+            new_code = {
+                'id': len(self.reading_type_codes) + 1,
+                'name': name,
+                'description': description,
+                'reading_type_id': reading_type_id,
+                'created_at': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'source': '用户生成',
+                'category': category
+            }
+            
+            # 解析字段值
+            new_code.update(reading_type_codec.to_field_dict(reading_type_codec.parse_reading_type_id(reading_type_id)))
+            
+            self.reading_type_codes.append(new_code)
+            self._field_matrix = None
+            self._key_index = None
+            self._name_index = None
+            
+            # 保存到文件
+            success = self.save_reading_type_codes()
+            if success:
+                self.log_operation(f"添加编码: {name}", "add", f"成功添加编码 {reading_type_id}")
+                return True, f"成功添加编码: {name} ({reading_type_id})"
+            else:
+                return False, "保存编码失败"
     
     def save_reading_type_codes(self) -> bool:
         """保存编码库到文件"""
@@ -290,27 +311,387 @@ class ReadingTypeDatabase:
     
     def log_operation(self, input_text: str, operation_type: str, 
                      result: str, user_action: str = "pending") -> None:
-        """记录操作历史"""
+        """记录操作历史 (放入队列，由后台线程批量写入JSONL历史文件)"""
+        get_history_logger(self.history_file).log(operation_type, input_text, result, user_action)
+    
+    def get_field_matrix(self) -> np.ndarray:
+        """获取编码库的字段矩阵
+        
+        Returns:
+            N×16 的int64矩阵，第i行为第i条编码的16个字段值；
+            无法解析的ReadingTypeID对应行为全0，见 get_field_matrix_valid()
+        """
+        return self.get_field_matrix_snapshot()[0]
+    
+    def get_field_matrix_valid(self) -> np.ndarray:
+        """获取字段矩阵中每一行是否由合法ReadingTypeID解析而来"""
+        return self.get_field_matrix_snapshot()[1]
+    
+    def get_field_matrix_snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """在写操作锁内同时取出字段矩阵和合法标记
+        
+        需要同时使用两者时应调用本方法: 分别调用 get_field_matrix() 和 get_field_matrix_valid()
+        之间若有其他线程添加编码，两者的行数会不一致。
+        
+        Returns:
+            (N×16 int64矩阵, 长度为N的合法标记)
+        """
+        with self._write_lock:
+            if self._field_matrix is None:
+                self._field_matrix, self._field_matrix_valid = self._build_field_matrix()
+            return self._field_matrix, self._field_matrix_valid
+    
+    def _build_field_matrix(self) -> Tuple[np.ndarray, np.ndarray]:
+        """由reading_type_id列构建字段矩阵"""
+        return reading_type_codec.decode_batch([code.get('reading_type_id', '') for code in self.reading_type_codes])
+    
+    def nearest_codes(self, field_vector, k: int = 5,
+                      max_distance: Optional[float] = None) -> List[Tuple[Dict, float]]:
+        """查找与给定字段值最接近的已有编码 (加权汉明距离)
+        
+        距离为取值不同的字段的权重之和，见 field_distance_weights。
+        
+        Args:
+            field_vector: 16个字段值、{field_1: v1, ...} 字典或ReadingTypeID字符串
+            k: 返回数量
+            max_distance: 只返回距离不超过该值的编码
+            
+        Returns:
+            [(编码, 距离), ...]，按距离从小到大排序，距离相同时按库中顺序
+        """
+        if isinstance(field_vector, str):
+            values = reading_type_codec.parse_reading_type_id(field_vector)
+        elif isinstance(field_vector, dict):
+            values = reading_type_codec.from_field_dict(field_vector)
+        else:
+            values = tuple(int(value) for value in field_vector)
+        if len(values) != len(self.field_names):
+            raise ValueError(f"字段值必须为{len(self.field_names)}个，实际为{len(values)}个")
+        
+        matrix, valid = self.get_field_matrix_snapshot()
+        if k <= 0 or len(matrix) == 0:
+            return []
+        weights = np.array([self.field_distance_weights[name] for name in self.field_names], dtype=float)
+        distances = (matrix != np.asarray(values, dtype=np.int64)) @ weights
+        distances[~valid] = np.inf
+        if max_distance is not None:
+            distances[distances > max_distance] = np.inf
+        
+        # 先用partition找出第k小的距离，只对不超过它的候选做稳定排序
+        candidates = np.arange(len(distances))
+        if k < len(distances):
+            kth = np.partition(distances, k - 1)[k - 1]
+            candidates = np.flatnonzero(distances <= kth)
+        candidates = candidates[np.argsort(distances[candidates], kind='stable')][:k]
+        return [(self.reading_type_codes[i], float(distances[i]))
+                for i in candidates.tolist() if np.isfinite(distances[i])]
+    
+    def get_codes_by_reading_type_id(self, reading_type_id: str) -> List[Dict]:
+        """按ReadingTypeID查找编码 ("0.0.2..."、"0-0-2..."、"12.0" 等写法视为同一编码)
+        
+        Returns:
+            匹配的编码列表，格式非法时为空列表
+        """
         try:
-            history_entry = {
-                'id': '',  # 由CSV文件行数决定
-                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'input_text': input_text,
-                'operation_type': operation_type,
-                'result': result[:200] + "..." if len(result) > 200 else result,  # 限制长度
-                'user_action': user_action
-            }
+            key = reading_type_codec.canonical_key(reading_type_codec.parse_reading_type_id(reading_type_id))
+        except ValueError:
+            return []
+        return [self.reading_type_codes[i] for i in self._get_key_index().get(key, [])]
+    
+    def get_codes_by_name(self, name: str) -> List[Dict]:
+        """按名称查找编码 (不区分大小写，忽略首尾空白)"""
+        index = self._name_index
+        if index is None:
+            index = {}
+            for i, code in enumerate(self.reading_type_codes):
+                index.setdefault(str(code.get('name', '')).strip().lower(), []).append(i)
+            self._name_index = index
+        return [self.reading_type_codes[i] for i in index.get(str(name).strip().lower(), [])]
+    
+    def diff_library(self, other) -> Dict[str, List[Dict]]:
+        """按编码比较两个编码库
+        
+        Args:
+            other: 另一个ReadingTypeDatabase或编码记录列表
             
-            # 追加到历史文件
-            file_exists = os.path.isfile(self.history_file)
-            with open(self.history_file, 'a', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=history_entry.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(history_entry)
+        Returns:
+            {'added': 仅在other中的编码, 'removed': 仅在本库中的编码, 'common': 两库共有的本库编码}
+        """
+        other_codes = other.reading_type_codes if isinstance(other, ReadingTypeDatabase) else list(other)
+        other_keys = self._codes_keys(other_codes)
+        own_keys = self._codes_keys(self.reading_type_codes)
+        own_key_set = {key for key in own_keys if key is not None}
+        other_key_set = {key for key in other_keys if key is not None}
         
-        except Exception as e:
-            print(f"记录历史失败: {e}")
+        added, seen = [], set()
+        for code, key in zip(other_codes, other_keys):
+            if key is not None and key not in own_key_set and key not in seen:
+                seen.add(key)
+                added.append(code)
+        removed = [code for code, key in zip(self.reading_type_codes, own_keys)
+                   if key is not None and key not in other_key_set]
+        common = [code for code, key in zip(self.reading_type_codes, own_keys)
+                  if key is not None and key in other_key_set]
+        return {'added': added, 'removed': removed, 'common': common}
+    
+    def union_library(self, other) -> List[Dict]:
+        """合并两个编码库: 本库全部编码 + other中本库没有的编码 (不修改本库)"""
+        return self.reading_type_codes + self.diff_library(other)['added']
+    
+    def _get_key_index(self) -> Dict:
+        """紧凑键 -> 行号列表"""
+        with self._write_lock:
+            if self._key_index is None or self._field_matrix is None:
+                index = {}
+                for i, key in enumerate(self._matrix_keys(*self.get_field_matrix_snapshot())):
+                    if key is not None:
+                        index.setdefault(key, []).append(i)
+                self._key_index = index
+            return self._key_index
+    
+    def _codes_keys(self, codes: List[Dict]) -> List:
+        """编码记录列表 -> 每条记录的键 (非法编码为None)"""
+        if codes is self.reading_type_codes:
+            return self._matrix_keys(*self.get_field_matrix_snapshot())
+        matrix, valid = reading_type_codec.decode_batch(
+            str(code.get('reading_type_id', '')) for code in codes)
+        return self._matrix_keys(matrix, valid)
+    
+    @staticmethod
+    def _matrix_keys(matrix: np.ndarray, valid: np.ndarray) -> List:
+        """字段矩阵 -> 每行的键 (非法行为None)"""
+        keys, packable = reading_type_codec.pack_batch(matrix)
+        for i in np.flatnonzero(valid & ~packable).tolist():
+            keys[i] = reading_type_codec.canonical_key(matrix[i])
+        for i in np.flatnonzero(~valid).tolist():
+            keys[i] = None
+        return keys
+    
+    @staticmethod
+    def _field_column_matrix(codes: List[Dict]) -> np.ndarray:
+        """由field_1..field_16列构建字段矩阵 (无法转换的值为NaN)"""
+        columns = [f"field_{i+1}" for i in range(16)]
+        try:
+            values = itertools.chain.from_iterable(map(itemgetter(*columns), codes))
+            return np.fromiter(values, dtype=np.float64, count=16 * len(codes)).reshape(-1, 16)
+        except (KeyError, TypeError, ValueError):
+            frame = pd.DataFrame(codes, columns=columns)
+            return frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float).reshape(-1, 16)
+    
+    def audit(self, analyze_names: bool = False) -> Dict:
+        """对整个编码库做一致性审计
+        
+        基于字段矩阵做向量化检查:
+        - 无法解析的ReadingTypeID、字段列与ReadingTypeID不一致
+        - 字段值不在字典中
+        - 测量类型与单位的组合规则 (与SemanticParser共用规则)
+        - 名称/说明中的单位与编码单位不一致
+        - 重复编码，以及仅时段/关键峰值期/阶梯不同的近似重复编码
+        
+        Args:
+            analyze_names: 是否用SemanticParser分析名称，名称中识别出的商品类型、测量类型、相位、单位
+                与编码不一致时也记入 name_mismatches (每个不同的名称分析一次，较慢: 10万条约需10秒)
+        
+        Returns:
+            结构化审计报告，问题行均为 {'id', 'name', 'reading_type_id', ...}
+        """
+        from semantic_parser import SemanticParser
+        
+        # 审计期间其他线程可能添加编码: 矩阵、合法标记和编码列表取自同一时刻
+        with self._write_lock:
+            matrix, valid = self.get_field_matrix_snapshot()
+            codes = self.reading_type_codes[:len(matrix)]
+        
+        def identity(i):
+            code = codes[i]
+            return {'id': code.get('id'), 'name': code.get('name'), 'reading_type_id': code.get('reading_type_id')}
+        
+        def rows(mask, **extra_columns):
+            """把布尔掩码展开为问题行列表
+            
+            extra_columns 为附加列: 与编码库等长的数组，或所有行共用的常量
+            """
+            indices = np.flatnonzero(mask)
+            constants = {key: value for key, value in extra_columns.items() if np.ndim(value) == 0}
+            columns = {key: value[indices].tolist() for key, value in extra_columns.items()
+                       if key not in constants}
+            result = []
+            for n, i in enumerate(indices.tolist()):
+                row = identity(i)
+                row.update(constants)
+                for key, values in columns.items():
+                    row[key] = values[n]
+                result.append(row)
+            return result
+        
+        def groups(keys, distinct_ids=False):
+            """字段值完全相同的行分组"""
+            result = []
+            for members in self._matrix_groups(keys[valid], np.flatnonzero(valid)):
+                group = [identity(i) for i in members]
+                if distinct_ids and all(row['reading_type_id'] == group[0]['reading_type_id'] for row in group):
+                    continue
+                result.append(group)
+            return result
+        
+        report = {'total_codes': len(codes)}
+        report['invalid_ids'] = rows(~valid)
+        
+        # 字段列 (field_1..field_16) 与ReadingTypeID不一致
+        mismatch = valid & (self._field_column_matrix(codes) != matrix).any(axis=1)
+        report['field_column_mismatches'] = rows(mismatch)
+        
+        # 字段值不在字典中 (按列检查，先转为按列连续存储)
+        columns = np.ascontiguousarray(matrix.T)
+        report['unknown_values'] = {}
+        for j, field_name in enumerate(self.field_names):
+            allowed = self._dictionary_values(field_name)
+            if allowed is None:
+                continue
+            unknown = valid & ~np.isin(columns[j], allowed)
+            if unknown.any():
+                report['unknown_values'][field_name] = rows(unknown, value=columns[j])
+        
+        # 组合规则
+        kinds, uoms = columns[6], columns[14]
+        report['rule_violations'] = []
+        parser = SemanticParser()
+        for rule in parser.combination_rules:
+            violated = valid & np.isin(kinds, rule['kinds']) & ~np.isin(uoms, rule['uoms'])
+            report['rule_violations'].extend(rows(violated, rule=rule['message']))
+        
+        # 名称/说明中的单位与编码单位不一致
+        expected_uoms = self._unit_cues(codes)
+        cue_mismatch = valid & (expected_uoms >= 0) & (expected_uoms != uoms)
+        report['name_mismatches'] = rows(cue_mismatch, field='uom', stored=uoms, expected=expected_uoms,
+                                         source='unit_cue')
+        
+        # 名称的语义分析结果与编码不一致
+        if analyze_names:
+            for field_name, expected in self._name_analysis(parser, codes).items():
+                stored = columns[self.field_names.index(field_name)]
+                mismatch = valid & (expected >= 0) & (expected != stored)
+                report['name_mismatches'].extend(rows(mismatch, field=field_name, stored=stored, expected=expected,
+                                                      source='parser'))
+        
+        # 重复编码，以及仅时段/关键峰值期/阶梯不同的近似重复编码
+        report['duplicate_ids'] = groups(matrix)
+        masked = matrix.copy()
+        masked[:, [self.field_names.index(name) for name in ("TOU", "cpp", "tier")]] = 0
+        report['near_duplicates'] = groups(masked, distinct_ids=True)
+        
+        report['summary'] = {
+            key: (sum(len(v) for v in value.values()) if isinstance(value, dict) else len(value))
+            for key, value in report.items() if key != 'total_codes'
+        }
+        return report
+    
+    def _matrix_groups(self, rows: np.ndarray, row_indices: np.ndarray) -> List[List[int]]:
+        """找出字段值完全相同的行，返回原始行号分组 (仅包含多于1行的分组，按首行的行号排序)"""
+        if len(rows) == 0:
+            return []
+        # 按64位哈希排序后相同的行相邻，只为多于1行的分组取出成员 (绝大多数行不重复)
+        hashes = reading_type_codec.hash_batch(rows)
+        order = np.argsort(hashes, kind='stable')
+        sorted_hashes = hashes[order]
+        starts = np.concatenate(([0], np.flatnonzero(sorted_hashes[1:] != sorted_hashes[:-1]) + 1))
+        ends = np.append(starts[1:], len(rows))
+        repeated = ends - starts > 1
+        result = []
+        for start, end in zip(starts[repeated].tolist(), ends[repeated].tolist()):
+            members = order[start:end]
+            if (rows[members] == rows[members[0]]).all():
+                result.append(row_indices[members].tolist())
+                continue
+            # 哈希碰撞: 组内按字段值再分组
+            for group in self._exact_groups(rows[members]):
+                if len(group) > 1:
+                    result.append(row_indices[members[group]].tolist())
+        result.sort()
+        return result
+    
+    @staticmethod
+    def _exact_groups(rows: np.ndarray) -> List[np.ndarray]:
+        """按字段值分组，返回每组的行号 (组内保持原顺序)"""
+        keys = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))).ravel()
+        _, inverse = np.unique(keys, return_inverse=True)
+        return [np.flatnonzero(inverse.ravel() == group) for group in range(inverse.max() + 1)]
+    
+    def _dictionary_values(self, field_name: str) -> Optional[np.ndarray]:
+        """字段在字典中的全部整数取值"""
+        if field_name not in self.field_dictionaries:
+            return None
+        values = []
+        for item in self.field_dictionaries[field_name]:
+            try:
+                value = float(str(item['value']).replace('–', '-'))
+            except ValueError:
+                continue
+            if value == int(value):
+                values.append(int(value))
+        return np.array(values, dtype=np.int64)
+    
+    def _name_analysis(self, parser, codes: List[Dict],
+                       fields: Tuple[str, ...] = ("commodity", "measurementKind", "phase", "uom")
+                       ) -> Dict[str, np.ndarray]:
+        """用语义分析器分析每条编码的名称
+        
+        Returns:
+            {字段名: 每行从名称分析出的值}，分析结果为该字段的默认值 (名称中没有对应关键词) 时为-1
+        """
+        # 每个不同的名称只分析一次
+        index = {}
+        inverse = np.array([index.setdefault(str(code.get('name', '')), len(index))
+                            for code in codes], dtype=np.intp)
+        analyses = [parser.analyze_measurement_description(name) for name in index]
+        
+        result = {}
+        for field_name in fields:
+            key = f"field_{self.field_names.index(field_name) + 1}"
+            default = parser.keyword_mappings[field_name].get('default', 0)
+            values = np.array([-1 if analysis[key] == default else analysis[key] for analysis in analyses],
+                              dtype=np.int64)
+            result[field_name] = values[inverse] if len(inverse) else np.zeros(0, dtype=np.int64)
+        return result
+    
+    def _unit_cues(self, codes: List[Dict]) -> np.ndarray:
+        """从名称和说明中提取显式单位，返回对应的uom值 (无单位线索为-1)"""
+        if not codes:
+            return np.zeros(0, dtype=np.int64)
+        
+        # 单位符号 -> uom值，如 "72.W·h" -> {"Wh": 72}
+        symbol_map = {}
+        for item in self.field_dictionaries.get('uom', []):
+            parts = str(item['display_name']).split('.', 1)
+            if len(parts) == 2:
+                symbol = parts[1].replace('·', '').strip()
+                if symbol and str(item['value']).isdigit():
+                    symbol_map.setdefault(symbol, int(item['value']))
+        
+        def resolve(symbol):
+            symbol = symbol.replace('·', '')
+            if symbol in symbol_map:
+                return symbol_map[symbol]
+            # 去掉乘数前缀 (k·Wh -> Wh)
+            if len(symbol) > 1 and symbol[0] in 'kMGmµμ' and symbol[1:] in symbol_map:
+                return symbol_map[symbol[1:]]
+            return -1
+        
+        # 每条文本取第一个单位线索: 括号中的单位符号，或 "单位" 后的符号
+        cue_pattern = re.compile(r'[（(]\s*([A-Za-z°·/²]+)\s*[）)]|单位\s*([A-Za-z°·/²]+)')
+        
+        def cues(column):
+            texts = [code.get(column, '') for code in codes]
+            matches = map(cue_pattern.search, (text if isinstance(text, str) else str(text) for text in texts))
+            return [match.group(match.lastindex) if match else '' for match in matches]
+        
+        # 名称中的单位线索优先，其次为说明
+        symbols = [name_cue or description_cue for name_cue, description_cue in zip(cues('name'), cues('description'))]
+        
+        # 每个不同的单位符号只解析一次
+        resolved = {symbol: resolve(symbol) for symbol in set(symbols)}
+        resolved[''] = -1
+        return np.array([resolved[symbol] for symbol in symbols], dtype=np.int64)
     
     def get_chinese_field_name(self, field_name: str) -> str:
         """获取字段的中文名称"""
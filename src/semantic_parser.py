@@ -1,6 +1,8 @@
 import re
 from typing import Dict, List, Optional, Tuple
 
+import reading_type_codec
+
 class SemanticParser:
     """语义解析器，用于解析用户描述并生成ReadingType字段值"""
     
@@ -14,6 +16,110 @@ class SemanticParser:
         
         # 关键词映射规则
         self.keyword_mappings = self._init_keyword_mappings()
+        
+        # 字段组合规则 (测量类型 -> 允许的单位)
+        self.combination_rules = self._init_combination_rules()
+        
+        # 量测要素标签与预编译的单次扫描正则
+        self.element_tags = self._init_element_tags()
+        self._element_pattern, self._element_keyword_tags, self._element_unit_tags = \
+            self._compile_element_pattern(self.element_tags)
+    
+    def _init_combination_rules(self) -> List[Dict]:
+        """初始化字段组合规则
+        
+        每条规则: 测量类型(field_7)属于kinds时，单位(field_15)必须属于uoms
+        """
+        return [
+            {'kinds': [37, 53, 15], 'uoms': [38, 0], 'message': "功率类型应该使用瓦特(W)作为单位"},
+            {'kinds': [12], 'uoms': [72, 0], 'message': "能量类型应该使用瓦时(Wh)作为单位"},
+            {'kinds': [54], 'uoms': [29, 0], 'message': "电压类型应该使用伏特(V)作为单位"},
+            {'kinds': [4], 'uoms': [5, 0], 'message': "电流类型应该使用安培(A)作为单位"},
+            {'kinds': [118], 'uoms': [0], 'message': "状态类型不应该有物理单位"},
+        ]
+    
+    def _init_element_tags(self) -> List[Dict]:
+        """初始化量测要素标签 (extract_measurement_info使用)
+        
+        列表顺序即输出顺序。keywords为子串匹配的关键词，units为按单词边界匹配的单位写法；
+        category为空的标签只作为其他标签的修饰，不直接输出。
+        """
+        return [
+            # 设备类型
+            {'category': 'device_types', 'label': '电表', 'keywords': ['表计', '电表', '电能表']},
+            {'category': 'device_types', 'label': '储能', 'keywords': ['储能', '电池', 'pcs']},
+            {'category': 'device_types', 'label': '气象', 'keywords': ['气象', '环境']},
+            # 测量类型 (功率按有功/无功修饰细分)
+            {'category': 'measurement_kinds', 'label': '电压', 'keywords': ['电压']},
+            {'category': 'measurement_kinds', 'label': '电流', 'keywords': ['电流']},
+            {'category': 'measurement_kinds', 'label': '功率', 'keywords': ['功率']},
+            {'category': 'measurement_kinds', 'label': '电能', 'keywords': ['能量', '电能']},
+            # 流向
+            {'category': 'flow_directions', 'label': '正向', 'keywords': ['正向', '充电']},
+            {'category': 'flow_directions', 'label': '反向', 'keywords': ['反向', '放电']},
+            {'category': 'flow_directions', 'label': '净值', 'keywords': ['净', '双向']},
+            # 相位
+            {'category': 'phases', 'label': 'A相', 'keywords': ['a相']},
+            {'category': 'phases', 'label': 'B相', 'keywords': ['b相']},
+            {'category': 'phases', 'label': 'C相', 'keywords': ['c相']},
+            {'category': 'phases', 'label': '三相', 'keywords': ['三相']},
+            # 时间周期
+            {'category': 'time_periods', 'label': '15分钟', 'keywords': ['15分钟', '15min']},
+            {'category': 'time_periods', 'label': '5分钟', 'keywords': ['5分钟', '5min']},
+            {'category': 'time_periods', 'label': '1小时', 'keywords': ['小时']},
+            # 单位
+            {'category': 'units', 'label': 'kWh', 'units': ['kwh', 'kw']},
+            {'category': 'units', 'label': 'MWh', 'units': ['mwh', 'mw']},
+            {'category': 'units', 'label': 'Wh', 'units': ['wh', 'w']},
+            {'category': 'units', 'label': 'kW', 'units': ['kw']},
+            {'category': 'units', 'label': 'MW', 'units': ['mw']},
+            {'category': 'units', 'label': 'W', 'units': ['w']},
+            {'category': 'units', 'label': 'V', 'units': ['v']},
+            {'category': 'units', 'label': 'A', 'units': ['a']},
+            {'category': 'units', 'label': 'Hz', 'units': ['hz']},
+            {'category': 'units', 'label': '°C', 'units': ['°c']},
+            # 行为
+            {'category': 'behaviors', 'label': '累积', 'keywords': ['累积', '累计', '总']},
+            {'category': 'behaviors', 'label': '瞬时', 'keywords': ['瞬时', '当前', '实时']},
+            {'category': 'behaviors', 'label': '间隔', 'keywords': ['间隔', '区间']},
+            # 功率修饰
+            {'category': '', 'label': '有功', 'keywords': ['有功']},
+            {'category': '', 'label': '无功', 'keywords': ['无功']},
+        ]
+    
+    @staticmethod
+    def _compile_element_pattern(element_tags: List[Dict]) -> Tuple:
+        """把全部要素关键词编译为一个正则，一次扫描找出所有标签
+        
+        正则是在每个位置尝试的前瞻，因此重叠的关键词 (如 "电能表" 与 "电能") 都能找到:
+        每个位置只取最长的关键词，再由"关键词 -> 它所包含的全部关键词的标签"补全。
+        
+        Returns:
+            (正则, 关键词 -> 标签序号集合, 单位写法 -> 标签序号集合)
+        """
+        keyword_owner = {}
+        unit_tags = {}
+        for index, tag in enumerate(element_tags):
+            for keyword in tag.get('keywords', []):
+                keyword_owner.setdefault(keyword, set()).add(index)
+            for unit in tag.get('units', []):
+                unit_tags.setdefault(unit, set()).add(index)
+        keyword_tags = {
+            keyword: frozenset().union(*(owners for other, owners in keyword_owner.items() if other in keyword))
+            for keyword in keyword_owner
+        }
+        unit_tags = {unit: frozenset(indices) for unit, indices in unit_tags.items()}
+        
+        def alternation(words, boundary=False):
+            # 以非单词字符开头的写法 (如 "°c") 前面不要求单词边界
+            return '|'.join((r'\b' if boundary and re.match(r'\w', word) else '') + re.escape(word)
+                            for word in sorted(words, key=len, reverse=True))
+        
+        pattern = re.compile(
+            r'(?=(?P<keyword>' + alternation(keyword_tags) + r')'
+            r'|(?P<unit>(?:' + alternation(unit_tags, boundary=True) + r')\b))'
+        )
+        return pattern, keyword_tags, unit_tags
     
     def _init_keyword_mappings(self) -> Dict:
         """初始化关键词映射规则"""
@@ -252,26 +358,13 @@ class SemanticParser:
     
     def build_reading_type_id(self, field_values: Dict[str, int]) -> str:
         """构建ReadingTypeID字符串"""
-        values = []
-        for i in range(16):
-            field_key = f"field_{i+1}"
-            values.append(str(field_values.get(field_key, 0)))
-        return "-".join(values)
+        return reading_type_codec.build_reading_type_id(reading_type_codec.from_field_dict(field_values))
     
     def parse_reading_type_id(self, reading_type_id: str) -> Dict[str, int]:
-        """解析ReadingTypeID字符串为字段值"""
+        """解析ReadingTypeID字符串为字段值 (支持'-'/'.'分隔和负数)"""
         try:
-            parts = reading_type_id.split('-')
-            if len(parts) != 16:
-                raise ValueError("ReadingTypeID必须包含16个字段")
-            
-            field_values = {}
-            for i, value in enumerate(parts):
-                field_key = f"field_{i+1}"
-                field_values[field_key] = int(float(value))  # 支持小数转整数
-            
-            return field_values
-        except Exception as e:
+            return reading_type_codec.to_field_dict(reading_type_codec.parse_reading_type_id(reading_type_id))
+        except ValueError as e:
             raise ValueError(f"无效的ReadingTypeID格式: {e}")
     
     def extract_measurement_info(self, description: str) -> Dict[str, List[str]]:
@@ -293,82 +386,23 @@ class SemanticParser:
             'behaviors': []  # 行为
         }
         
-        desc_lower = description.lower()
-        
-        # 设备类型
-        if any(word in desc_lower for word in ['表计', '电表', '电能表']):
-            info['device_types'].append('电表')
-        if any(word in desc_lower for word in ['储能', '电池', 'pcs']):
-            info['device_types'].append('储能')
-        if any(word in desc_lower for word in ['气象', '环境']):
-            info['device_types'].append('气象')
-        
-        # 测量类型
-        if any(word in desc_lower for word in ['电压']):
-            info['measurement_kinds'].append('电压')
-        if any(word in desc_lower for word in ['电流']):
-            info['measurement_kinds'].append('电流')
-        if any(word in desc_lower for word in ['功率']):
-            if '有功' in desc_lower:
-                info['measurement_kinds'].append('有功功率')
-            elif '无功' in desc_lower:
-                info['measurement_kinds'].append('无功功率')
-            else:
-                info['measurement_kinds'].append('功率')
-        if any(word in desc_lower for word in ['能量', '电能']):
-            info['measurement_kinds'].append('电能')
-        
-        # 流向
-        if any(word in desc_lower for word in ['正向', '充电']):
-            info['flow_directions'].append('正向')
-        if any(word in desc_lower for word in ['反向', '放电']):
-            info['flow_directions'].append('反向')
-        if any(word in desc_lower for word in ['净', '双向']):
-            info['flow_directions'].append('净值')
-        
-        # 相位
-        if 'a相' in desc_lower:
-            info['phases'].append('A相')
-        if 'b相' in desc_lower:
-            info['phases'].append('B相')
-        if 'c相' in desc_lower:
-            info['phases'].append('C相')
-        if '三相' in desc_lower:
-            info['phases'].append('三相')
-        
-        # 时间周期
-        if any(word in desc_lower for word in ['15分钟', '15min']):
-            info['time_periods'].append('15分钟')
-        if any(word in desc_lower for word in ['5分钟', '5min']):
-            info['time_periods'].append('5分钟')
-        if any(word in desc_lower for word in ['小时']):
-            info['time_periods'].append('1小时')
-        
-        # 单位
-        unit_patterns = [
-            (r'\bkwh?\b', 'kWh'),
-            (r'\bmwh?\b', 'MWh'), 
-            (r'\bwh?\b', 'Wh'),
-            (r'\bkw\b', 'kW'),
-            (r'\bmw\b', 'MW'),
-            (r'\bw\b', 'W'),
-            (r'\bv\b', 'V'),
-            (r'\ba\b', 'A'),
-            (r'\bhz\b', 'Hz'),
-            (r'°c\b', '°C')
-        ]
-        
-        for pattern, unit in unit_patterns:
-            if re.search(pattern, desc_lower):
-                info['units'].append(unit)
-        
-        # 行为
-        if any(word in desc_lower for word in ['累积', '累计', '总']):
-            info['behaviors'].append('累积')
-        if any(word in desc_lower for word in ['瞬时', '当前', '实时']):
-            info['behaviors'].append('瞬时')
-        if any(word in desc_lower for word in ['间隔', '区间']):
-            info['behaviors'].append('间隔')
+        # 一次扫描收集全部标签，再按标签顺序输出
+        found = set()
+        for keyword, unit in self._element_pattern.findall(description.lower()):
+            found.update(self._element_keyword_tags[keyword] if keyword else self._element_unit_tags[unit])
+        
+        modifiers = {self.element_tags[index]['label'] for index in found
+                     if not self.element_tags[index]['category']}
+        for index in sorted(found):
+            category, label = self.element_tags[index]['category'], self.element_tags[index]['label']
+            if not category:
+                continue
+            if label == '功率':
+                if '有功' in modifiers:
+                    label = '有功功率'
+                elif '无功' in modifiers:
+                    label = '无功功率'
+            info[category].append(label)
         
         return info
     
@@ -419,30 +453,10 @@ class SemanticParser:
         """
         errors = []
         
-        # 检查功率类型与单位的匹配
-        power_kinds = [37, 53, 15]  # 功率类型
-        if (analysis.get('field_7') in power_kinds and
-            analysis.get('field_15') not in [38, 0]):  # 不是W或无单位
-            errors.append("功率类型应该使用瓦特(W)作为单位")
-        
-        # 检查能量类型与单位的匹配
-        if (analysis.get('field_7') == 12 and  # 能量
-            analysis.get('field_15') not in [72, 0]):  # 不是Wh或无单位
-            errors.append("能量类型应该使用瓦时(Wh)作为单位")
-        
-        # 检查电压类型与单位的匹配
-        if (analysis.get('field_7') == 54 and  # 电压
-            analysis.get('field_15') not in [29, 0]):  # 不是V或无单位
-            errors.append("电压类型应该使用伏特(V)作为单位")
-        
-        # 检查电流类型与单位的匹配
-        if (analysis.get('field_7') == 4 and  # 电流
-            analysis.get('field_15') not in [5, 0]):  # 不是A或无单位
-            errors.append("电流类型应该使用安培(A)作为单位")
-        
-        # 检查状态类型不应有物理单位
-        if (analysis.get('field_7') == 118 and  # 状态
-            analysis.get('field_15') not in [0]):  # 有单位
-            errors.append("状态类型不应该有物理单位")
+        # 检查测量类型与单位的匹配
+        for rule in self.combination_rules:
+            if (analysis.get('field_7') in rule['kinds'] and
+                analysis.get('field_15') not in rule['uoms']):
+                errors.append(rule['message'])
         
         return len(errors) == 0, errors
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""工具调用预取
+
+多数对话轮次最终会以接近用户原话的参数调用 search_reading_type 或 generate_reading_type。
+ToolPrefetcher 在第一次请求大模型的同时，在工具线程池中按预测的参数提前执行这些只读工具；
+模型返回的工具调用与预测一致时直接使用预取结果，不再重新执行。
+未被使用的预取在本轮结束时取消 (尚未开始的) 或计入浪费，由 SpeculationMeter 统计。
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from agent_runtime import get_tool_executor
+from prompt_cache import canonical_json
+
+
+def call_key(name: str, args: Dict) -> str:
+    """工具调用的匹配键: 参数按键排序，字符串参数去掉首尾空白"""
+    normalized = {key: value.strip() if isinstance(value, str) else value for key, value in args.items()}
+    return canonical_json({"name": name, "args": normalized})
+
+
+class SpeculationMeter:
+    """预取命中与浪费统计 (线程安全)"""
+
+    def __init__(self):
+        self.turns = 0
+        self.predictions = 0
+        self.hits = 0
+        self.wasted = 0
+        self.wasted_seconds = 0.0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, predictions: int, hits: int, wasted: int, wasted_seconds: float, saved_seconds: float) -> None:
+        """记录一轮对话的预取情况"""
+        with self._lock:
+            self.turns += 1
+            self.predictions += predictions
+            self.hits += hits
+            self.wasted += wasted
+            self.wasted_seconds += wasted_seconds
+            self.saved_seconds += saved_seconds
+
+    def add_waste(self, seconds: float) -> None:
+        """补记本轮结束后才完成的预取耗时"""
+        with self._lock:
+            self.wasted_seconds += seconds
+
+    def summary(self) -> Dict:
+        """汇总统计"""
+        with self._lock:
+            return {
+                "turns": self.turns,
+                "predictions": self.predictions,
+                "hits": self.hits,
+                "wasted": self.wasted,
+                "hit_ratio": self.hits / self.predictions if self.predictions else 0.0,
+                "wasted_seconds": self.wasted_seconds,
+                "saved_seconds": self.saved_seconds
+            }
+
+    def format_summary(self) -> List[str]:
+        """汇总统计 -> 输出行"""
+        summary = self.summary()
+        return [f"🔮 工具预取: {summary['turns']}轮, 命中 {summary['hits']}/{summary['predictions']} "
+                f"({summary['hit_ratio']:.1%}), 节省 {summary['saved_seconds'] * 1000:.0f}ms, "
+                f"浪费 {summary['wasted_seconds'] * 1000:.0f}ms"]
+
+
+def _elapsed(future) -> float:
+    return 0.0 if future.exception() is not None else future.result()[1]
+
+
+class ToolPrefetcher:
+    """一轮对话的工具预取
+
+    用 handle_function_call 替换原来的工具执行函数传给对话实现，本轮结束后调用 finish。
+    """
+
+    def __init__(self, run_tool: Callable[[str, Dict], object],
+                 fallback: Callable[[Dict], str],
+                 predictions: Sequence[Tuple[str, Dict]],
+                 to_content: Callable[[str, object], str] = lambda name, result: str(result),
+                 meter: Optional[SpeculationMeter] = None,
+                 tracer=None):
+        """
+        Args:
+            run_tool: (工具名称, 参数) -> 工具返回值，预取在工具线程池中调用，必须是只读的
+            fallback: 未命中预取时使用的原工具执行函数
+            predictions: 预测的 (工具名称, 参数) 列表，提交后立即开始执行
+            to_content: (工具名称, 工具返回值) -> tool消息内容，命中时调用
+            meter: 预取统计
+            tracer: 调用追踪 (Tracer)，命中预取时记录带 prefetched=True 属性的工具span
+        """
+        self._run_tool = run_tool
+        self._fallback = fallback
+        self._to_content = to_content
+        self._meter = meter
+        self._tracer = tracer
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._predictions = 0
+        self._hits = 0
+        self._saved = 0.0
+
+        executor = get_tool_executor()
+        for name, args in predictions:
+            key = call_key(name, args)
+            if key not in self._pending:
+                self._pending[key] = {"name": name,
+                                      "future": executor.submit(self._speculate, name, args)}
+        self._predictions = len(self._pending)
+
+    def _speculate(self, name: str, args: Dict):
+        start = time.perf_counter()
+        result = self._run_tool(name, args)
+        return result, time.perf_counter() - start
+
+    def handle_function_call(self, function_call: Dict) -> str:
+        """执行工具调用，与预测一致时使用预取结果"""
+        try:
+            args = json.loads(function_call.get("arguments") or "{}")
+        except json.JSONDecodeError:
+            args = None
+        entry = None
+        if isinstance(args, dict):
+            with self._lock:
+                entry = self._pending.pop(call_key(function_call.get("name"), args), None)
+        if entry is None:
+            return self._fallback(function_call)
+
+        waited_from = time.perf_counter()
+        try:
+            result, elapsed = entry["future"].result()
+        except Exception:
+            # 预取失败时按正常流程重新执行，错误由原工具执行函数处理
+            return self._fallback(function_call)
+        with self._lock:
+            self._hits += 1
+            self._saved += max(elapsed - (time.perf_counter() - waited_from), 0.0)
+        # 命中时工具不经过 fallback，在这里记录工具span (span耗时只含转换内容，prefetch_ms 为预取执行的耗时)
+        if self._tracer is not None and self._tracer.enabled:
+            return self._tracer.trace_tool_call(lambda call: self._to_content(entry["name"], result),
+                                                function_call, prefetched=True,
+                                                prefetch_ms=round(elapsed * 1000, 3))
+        return self._to_content(entry["name"], result)
+
+    def finish(self) -> Dict:
+        """结束本轮: 取消未开始的预取，统计浪费
+
+        Returns:
+            {"predictions", "hits", "wasted", "wasted_seconds", "saved_seconds"}
+        """
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+        wasted_seconds = 0.0
+        for entry in pending:
+            future = entry["future"]
+            if future.cancel():
+                continue
+            if future.done():
+                wasted_seconds += _elapsed(future)
+            elif self._meter is not None:
+                # 仍在执行的预取不等待，完成后再计入浪费的耗时
+                future.add_done_callback(lambda done: self._meter.add_waste(_elapsed(done)))
+        stats = {"predictions": self._predictions, "hits": self._hits, "wasted": len(pending),
+                 "wasted_seconds": wasted_seconds, "saved_seconds": self._saved}
+        if self._meter is not None:
+            self._meter.record(**stats)
+        return stats
@@ -0,0 +1,130 @@
+"""结构化工具结果
+
+工具返回 ToolResult: data 为结构化数据，发送给大模型时序列化为紧凑JSON (to_model)，
+记录列表按表格形式输出 (列名只出现一次)；只有面向用户的命令行输出才渲染为带emoji的文本 (to_text)。
+ToolResultMeter 按工具统计两种形式的token数，报告紧凑模式节省的提示token。
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from history_manager import estimate_tokens
+
+
+def tabulate(obj):
+    """递归把记录列表 (两条以上的字典) 转为 {"columns": [...], "rows": [[...], ...]}"""
+    if isinstance(obj, dict):
+        return {key: tabulate(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        if len(obj) > 1 and all(isinstance(item, dict) for item in obj):
+            columns = list(dict.fromkeys(key for item in obj for key in item))
+            return {"columns": columns, "rows": [[tabulate(item.get(key)) for key in columns] for item in obj]}
+        return [tabulate(item) for item in obj]
+    return obj
+
+
+class ToolResult:
+    """工具执行结果"""
+
+    __slots__ = ("data", "_render", "_compact", "_text")
+
+    def __init__(self, data: Dict, render: Callable[[Dict], str],
+                 compact: Optional[Callable[[Dict], Dict]] = None):
+        """
+        Args:
+            data: 可JSON序列化的结构化结果
+            render: data -> 面向用户的文本
+            compact: data -> 发送给大模型的数据，可去掉只用于渲染的冗余字段；为None时使用data
+        """
+        self.data = data
+        self._render = render
+        self._compact = compact
+        self._text = None
+
+    @classmethod
+    def error(cls, message: str) -> "ToolResult":
+        """错误结果"""
+        return cls({"error": message}, lambda data: f"❌ {data['error']}")
+
+    def to_model(self) -> str:
+        """发送给大模型的紧凑JSON"""
+        data = self._compact(self.data) if self._compact is not None else self.data
+        # NaN/Infinity 不是合法的JSON，出现时报错而不是发给大模型
+        return json.dumps(tabulate(data), ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+    def to_text(self) -> str:
+        """面向用户的文本 (首次调用时渲染)"""
+        if self._text is None:
+            self._text = self._render(self.data)
+        return self._text
+
+    def __str__(self) -> str:
+        return self.to_text()
+
+
+class ToolResultMeter:
+    """按工具统计紧凑模式节省的token (线程安全)"""
+
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled: 是否统计 (可随时修改)；统计时每次调用都要额外渲染文本形式
+        """
+        self.enabled = enabled
+        self.tools = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, result: ToolResult) -> Dict:
+        """记录一次工具调用
+
+        Returns:
+            {"text_tokens": 文本形式token数, "model_tokens": 紧凑JSON token数}
+        """
+        entry = {"text_tokens": estimate_tokens(result.to_text()),
+                 "model_tokens": estimate_tokens(result.to_model())}
+        with self._lock:
+            stats = self.tools.setdefault(name, {"calls": 0, "text_tokens": 0, "model_tokens": 0})
+            stats["calls"] += 1
+            stats["text_tokens"] += entry["text_tokens"]
+            stats["model_tokens"] += entry["model_tokens"]
+        return entry
+
+    def summary(self) -> Dict[str, Dict]:
+        """按工具汇总 {工具名: {"calls", "text_tokens", "model_tokens", "saved", "ratio"}}"""
+        with self._lock:
+            return {
+                name: dict(stats, saved=stats["text_tokens"] - stats["model_tokens"],
+                           ratio=1 - stats["model_tokens"] / stats["text_tokens"] if stats["text_tokens"] else 0.0)
+                for name, stats in self.tools.items()
+            }
+
+    def format_summary(self) -> List[str]:
+        """汇总统计 -> 输出行"""
+        summary = self.summary()
+        text_tokens = sum(stats["text_tokens"] for stats in summary.values())
+        model_tokens = sum(stats["model_tokens"] for stats in summary.values())
+        ratio = 1 - model_tokens / text_tokens if text_tokens else 0.0
+        if not summary and not self.enabled:
+            return ["📦 工具结果: 暂无统计 (未开启)"]
+        lines = [f"📦 工具结果: 紧凑JSON {model_tokens} tokens, 文本 {text_tokens} tokens, 节省 {ratio:.1%}"]
+        for name, stats in summary.items():
+            lines.append(f"   • {name}: {stats['calls']}次, {stats['text_tokens']} → {stats['model_tokens']} tokens "
+                         f"(节省 {stats['ratio']:.1%})")
+        return lines
+
+
+def result_text(result) -> str:
+    """工具返回值 -> 面向用户的文本 (兼容仍返回字符串的工具)"""
+    return result.to_text() if isinstance(result, ToolResult) else result
+
+
+def result_content(result, compact: bool = True, meter: Optional[ToolResultMeter] = None,
+                   name: Optional[str] = None) -> str:
+    """工具返回值 -> 发送给大模型的tool消息内容"""
+    if not isinstance(result, ToolResult):
+        return result
+    if meter is not None and meter.enabled:
+        meter.record(name, result)
+    return result.to_model() if compact else result.to_text()
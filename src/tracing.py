@@ -0,0 +1,453 @@
+"""工具调用与API调用的轻量追踪
+
+每次工具调用和每次 chat.completions.create 记录为一个span: 耗时、参数大小、结果大小和结果 (ok/error)。
+span按名称 (tool.<工具名>、chat.completions) 汇总到进程内的耗时直方图，
+明细保留最近 max_spans 条，可导出为JSON Lines或OpenTelemetry的OTLP/JSON格式
+(可直接POST到collector的 /v1/traces、/v1/metrics)。
+
+Tracer默认关闭，关闭时 span() 返回共用的空span，TracedClient 和工具调用只多一次属性判断。
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from client_wrapper import AsyncWrappedCompletions, StreamObserver, WrappedClient, WrappedCompletions
+
+# span类型 (与OTLP的SpanKind取值一致)
+KIND_INTERNAL = 1
+KIND_CLIENT = 3
+
+# 耗时直方图的桶上界 (毫秒)
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+def payload_size(value) -> int:
+    """参数或结果的UTF-8字节数"""
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return len(value)
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list, tuple)) else str(value)
+    return len(value.encode("utf-8"))
+
+
+def tool_error(content) -> Optional[str]:
+    """从工具返回内容判断是否出错，出错时返回错误信息
+
+    兼容 "错误: ..."、"❌ ..." 开头的文本和 ToolResult.error 的紧凑JSON
+    """
+    if not isinstance(content, str):
+        return None
+    if content.startswith(("错误", "❌")):
+        return content.split("\n", 1)[0]
+    if content.startswith('{"error":'):
+        try:
+            return str(json.loads(content)["error"])
+        except (ValueError, KeyError, TypeError):
+            return content
+    return None
+
+
+class Histogram:
+    """固定桶的耗时直方图 (毫秒)，另记录参数和结果的总字节数"""
+
+    __slots__ = ("bounds", "counts", "count", "errors", "sum", "min", "max", "args_bytes", "result_bytes")
+
+    def __init__(self, bounds=DURATION_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.args_bytes = 0
+        self.result_bytes = 0
+
+    def add(self, duration_ms: float, error: bool = False, args_bytes: int = 0, result_bytes: int = 0) -> None:
+        self.counts[bisect_left(self.bounds, duration_ms)] += 1
+        self.count += 1
+        self.errors += bool(error)
+        self.sum += duration_ms
+        self.min = duration_ms if self.min is None else min(self.min, duration_ms)
+        self.max = duration_ms if self.max is None else max(self.max, duration_ms)
+        self.args_bytes += args_bytes
+        self.result_bytes += result_bytes
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估计分位数 (首尾桶以实际的最小/最大值为边界)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else self.min
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": self.sum / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max or 0.0,
+            "args_bytes": self.args_bytes,
+            "result_bytes": self.result_bytes,
+        }
+
+
+class Span:
+    """一次被追踪的调用，作为上下文管理器使用，退出时记录到Tracer (异常记为error后继续抛出)"""
+
+    __slots__ = ("tracer", "name", "kind", "attributes", "trace_id", "span_id", "start_ns", "end_ns",
+                 "_start", "duration_ms", "error", "_ended")
+
+    recording = True
+
+    def __init__(self, tracer: "Tracer", name: str, kind: int, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+        self._ended = False
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def set_error(self, message: str) -> None:
+        self.error = message
+
+    def end(self) -> None:
+        """结束span (重复调用无效)"""
+        if self._ended:
+            return
+        self._ended = True
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+        self.tracer._record(self)
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+        return False
+
+    def to_dict(self) -> Dict:
+        """JSON Lines导出的一条记录"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "name": self.name,
+            "kind": "client" if self.kind == KIND_CLIENT else "internal",
+            "start": self.start_ns / 1e9,
+            "duration_ms": self.duration_ms,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空span"""
+
+    __slots__ = ()
+
+    recording = False
+
+    def set(self, **attributes) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict) -> List[Dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Tracer:
+    """span的记录、汇总与导出 (线程安全)"""
+
+    def __init__(self, enabled: bool = False, max_spans: int = 10000, service_name: str = "reading-type-agent"):
+        """
+        Args:
+            enabled: 是否记录 (可随时修改)
+            max_spans: 保留的span明细条数，直方图不受限制
+            service_name: OTLP导出的 service.name
+        """
+        self.enabled = enabled
+        self.service_name = service_name
+        self._spans = deque(maxlen=max_spans)
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._started_ns = time.time_ns()
+
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes):
+        """开始一个span；追踪关闭时返回空span"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, kind, attributes)
+
+    def _record(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = Histogram()
+            histogram.add(span.duration_ms, span.error is not None,
+                          span.attributes.get("args_bytes") or 0, span.attributes.get("result_bytes") or 0)
+
+    def trace_tool_call(self, handle_function_call: Callable[[Dict], object], function_call: Dict, **attributes):
+        """追踪一次工具调用: 记录参数字节数、返回内容字节数，异常或错误内容记为error
+
+        attributes 为附加的span属性 (如预取命中时的 prefetched=True)
+        """
+        name = function_call.get("name")
+        with self.span(f"tool.{name}", KIND_INTERNAL, tool=name,
+                       args_bytes=payload_size(function_call.get("arguments")), **attributes) as span:
+            content = handle_function_call(function_call)
+            span.set(result_bytes=payload_size(content))
+            error = tool_error(content)
+            if error is not None:
+                span.set_error(error)
+        return content
+
+    def spans(self) -> List[Dict]:
+        """保留的span明细"""
+        with self._lock:
+            spans = list(self._spans)
+        return [span.to_dict() for span in spans]
+
+    def summary(self) -> Dict[str, Dict]:
+        """按span名称汇总 {名称: {"count", "errors", "mean_ms", "p50_ms", "p95_ms", "max_ms", "args_bytes", "result_bytes"}}"""
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in sorted(self._histograms.items())}
+
+    def format_summary(self) -> List[str]:
+        """汇总 -> 输出行"""
+        summary = self.summary()
+        if not summary:
+            return ["🧭 调用追踪: 暂无记录" + ("" if self.enabled else " (未开启)")]
+        lines = [f"🧭 调用追踪: {sum(stats['count'] for stats in summary.values())}次调用"]
+        for name, stats in summary.items():
+            lines.append(f"   • {name}: {stats['count']}次, 出错 {stats['errors']}, "
+                         f"p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, 最大 {stats['max_ms']:.1f}ms, "
+                         f"参数 {stats['args_bytes']}B, 结果 {stats['result_bytes']}B")
+        return lines
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self._histograms.clear()
+            self._started_ns = time.time_ns()
+
+    def export_jsonl(self, path: str) -> int:
+        """span明细追加写入JSON Lines文件，返回写入条数"""
+        spans = self.spans()
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+        return len(spans)
+
+    def _resource(self) -> Dict:
+        return {"attributes": _otlp_attributes({"service.name": self.service_name})}
+
+    def to_otlp(self) -> Dict:
+        """span明细 -> OTLP/JSON的 ExportTraceServiceRequest"""
+        with self._lock:
+            spans = list(self._spans)
+        return {"resourceSpans": [{
+            "resource": self._resource(),
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    "kind": span.kind,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": _otlp_attributes(span.attributes),
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+                } for span in spans]
+            }]
+        }]}
+
+    def metrics_to_otlp(self) -> Dict:
+        """耗时直方图 -> OTLP/JSON的 ExportMetricsServiceRequest (累计值)"""
+        now = str(time.time_ns())
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            data_points = [{
+                "attributes": _otlp_attributes({"span.name": name}),
+                "startTimeUnixNano": str(self._started_ns),
+                "timeUnixNano": now,
+                "count": str(histogram.count),
+                "sum": histogram.sum,
+                "min": histogram.min,
+                "max": histogram.max,
+                "bucketCounts": [str(count) for count in histogram.counts],
+                "explicitBounds": list(histogram.bounds),
+            } for name, histogram in histograms]
+        return {"resourceMetrics": [{
+            "resource": self._resource(),
+            "scopeMetrics": [{
+                "scope": {"name": __name__},
+                "metrics": [{
+                    "name": "span.duration",
+                    "unit": "ms",
+                    "histogram": {"dataPoints": data_points, "aggregationTemporality": 2},
+                }]
+            }]
+        }]}
+
+    def export_otlp(self, path: str) -> int:
+        """span明细以OTLP/JSON写入文件 (每次导出一行 ExportTraceServiceRequest)，返回span条数"""
+        request = self.to_otlp()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        return len(request["resourceSpans"][0]["scopeSpans"][0]["spans"])
+
+    def export(self, path: str, fmt: str = "jsonl") -> int:
+        """按格式 (jsonl/otlp) 导出span明细"""
+        if fmt == "otlp":
+            return self.export_otlp(path)
+        if fmt == "jsonl":
+            return self.export_jsonl(path)
+        raise ValueError(f"未知的导出格式: {fmt}")
+
+
+def _request_attributes(params: Dict) -> Dict:
+    return {
+        "model": params.get("model"),
+        "stream": bool(params.get("stream")),
+        "tool_choice": params.get("tool_choice"),
+        "messages": len(params.get("messages") or ()),
+        "args_bytes": payload_size(params.get("messages")),
+    }
+
+
+def _message_size(message) -> int:
+    size = payload_size(getattr(message, "content", None))
+    for tool_call in getattr(message, "tool_calls", None) or ():
+        size += payload_size(tool_call.function.name) + payload_size(tool_call.function.arguments)
+    return size
+
+
+def _set_usage(span: Span, usage) -> None:
+    if usage is not None:
+        span.set(prompt_tokens=getattr(usage, "prompt_tokens", None),
+                 completion_tokens=getattr(usage, "completion_tokens", None))
+
+
+class _StreamTrace(StreamObserver):
+    """累计流式回复的大小，流结束时结束span"""
+
+    def __init__(self, span: Span):
+        self.span = span
+        self.size = 0
+        self.first = None
+
+    def add(self, chunk) -> None:
+        if self.first is None:
+            self.first = time.perf_counter()
+            self.span.set(ttft_ms=(self.first - self.span._start) * 1000)
+        _set_usage(self.span, getattr(chunk, "usage", None))
+        if chunk.choices:
+            delta = chunk.choices[0].delta
+            self.size += _message_size(delta)
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.span.set(result_bytes=self.size)
+        if error is not None:
+            self.span.set_error(f"{type(error).__name__}: {error}")
+        self.span.end()
+
+
+class _TracedCompletions(WrappedCompletions):
+    def __init__(self, completions, tracer: Tracer):
+        super().__init__(completions)
+        self.tracer = tracer
+
+    def _enabled(self) -> bool:
+        return self.tracer.enabled
+
+    def _start(self, params: Dict) -> Span:
+        return self.tracer.span("chat.completions", KIND_CLIENT, **_request_attributes(params))
+
+    def _failed(self, span: Span, error: Exception) -> None:
+        span.set_error(f"{type(error).__name__}: {error}")
+        span.end()
+
+    def _completed(self, span: Span, response) -> None:
+        if getattr(response, "choices", None):
+            span.set(result_bytes=_message_size(response.choices[0].message))
+        _set_usage(span, getattr(response, "usage", None))
+        span.end()
+
+    def _observer(self, span: Span) -> _StreamTrace:
+        return _StreamTrace(span)
+
+
+class _AsyncTracedCompletions(AsyncWrappedCompletions, _TracedCompletions):
+    pass
+
+
+class TracedClient(WrappedClient):
+    """追踪API调用的OpenAI客户端包装，只拦截 chat.completions.create (追踪关闭时直接转发)"""
+
+    _completions_class = _TracedCompletions
+
+    def __init__(self, client, tracer: Tracer):
+        super().__init__(client, tracer)
+        self.tracer = tracer
+
+
+class AsyncTracedClient(TracedClient):
+    """追踪API调用的AsyncOpenAI客户端包装"""
+
+    _completions_class = _AsyncTracedCompletions
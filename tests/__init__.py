@@ -10,6 +10,8 @@ import pytest
 # 添加项目根目录到路径
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
+# src目录下的模块以顶层模块方式互相导入
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
 
 # 测试配置
 TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
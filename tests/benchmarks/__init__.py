@@ -0,0 +1,9 @@
+"""
+性能基准测试
+覆盖编码库、字典、语义解析器、编码编解码和端到端对话轮次 (本地桩服务)，
+结果以JSON输出，便于在不同提交之间比较。
+
+用法:
+    python tests/benchmarks/run_benchmarks.py --sizes 500 2000 8000 --output benchmark.json
+    python tests/benchmarks/run_benchmarks.py --compare benchmark.json
+"""
@@ -0,0 +1,56 @@
+"""
+端到端对话轮次基准
+
+智能体连接本地OpenAI兼容桩服务 (无网络延迟、不产生API费用)，测量一轮对话中
+请求组装、工具执行和回复处理的本地开销。编码库按规模参数化。
+"""
+
+import asyncio
+
+from tests.benchmarks.harness import benchmark
+from tests.conftest import OpenAIStubServer
+
+
+def start_agent(context):
+    """创建连接桩服务的智能体，返回 (智能体, 事件循环)"""
+    from src import reading_type_agent
+
+    stub = OpenAIStubServer().start()
+    context.on_cleanup(stub.stop)
+    saved = reading_type_agent.DEEPSEEK_API_KEY, reading_type_agent.DEEPSEEK_BASE_URL
+    reading_type_agent.DEEPSEEK_API_KEY, reading_type_agent.DEEPSEEK_BASE_URL = "benchmark", stub.base_url
+    try:
+        agent = reading_type_agent.ReadingTypeAgent()
+    finally:
+        reading_type_agent.DEEPSEEK_API_KEY, reading_type_agent.DEEPSEEK_BASE_URL = saved
+
+    loop = asyncio.new_event_loop()
+
+    def close():
+        loop.run_until_complete(agent.async_client.close())
+        loop.close()
+    context.on_cleanup(close)
+    return agent, loop
+
+
+def turn(context, user_input):
+    agent, loop = start_agent(context)
+    return lambda: loop.run_until_complete(agent.get_response_async(user_input, []))
+
+
+@benchmark("agent", "turn_with_tool", sized=True)
+def turn_with_tool(context):
+    """模型调用 search_reading_type 后回复 (两次模型请求)"""
+    return turn(context, "有功电能")
+
+
+@benchmark("agent", "turn_parallel_tools", sized=True)
+def turn_parallel_tools(context):
+    """模型一次调用两个工具"""
+    return turn(context, "A相电压和储能功率")
+
+
+@benchmark("agent", "turn_direct_reply")
+def turn_direct_reply(context):
+    """模型直接回复文本 (一次模型请求)"""
+    return turn(context, "你好")
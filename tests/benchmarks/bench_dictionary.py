@@ -0,0 +1,55 @@
+"""
+字典基准: 字段值说明、字段选项、智能搜索、批量解码
+"""
+
+from dictionary_manager import DictionaryManager
+from src.enhanced_dictionary_manager import EnhancedDictionaryManager
+from tests.benchmarks.bench_parser import library_ids
+from tests.benchmarks.harness import benchmark
+
+FIELD_VALUES = [("measurementKind", "12"), ("uom", "72"), ("phase", "128"), ("commodity", "1"),
+                ("accumulationBehaviour", "4"), ("flowDirection", "19"), ("macroPeriod", "0"), ("tier", "3")]
+
+SEARCH_TERMS = [("电压", ""), ("有功功率", ""), ("千瓦时", "uom"), ("A相", "phase"), ("反向", "flowDirection")]
+
+
+@benchmark("dictionary", "get_field_description")
+def get_field_description(context):
+    manager = DictionaryManager(context.dictionaries_file)
+    return lambda: [manager.get_field_description(field, value) for field, value in FIELD_VALUES]
+
+
+@benchmark("dictionary", "get_field_options")
+def get_field_options(context):
+    manager = DictionaryManager(context.dictionaries_file)
+    return lambda: [manager.get_field_options(field) for field, _ in FIELD_VALUES]
+
+
+@benchmark("dictionary", "enhanced_get_field_description")
+def enhanced_get_field_description(context):
+    manager = EnhancedDictionaryManager(context.dictionaries_file)
+    return lambda: [manager.get_field_description(field, value) for field, value in FIELD_VALUES]
+
+
+@benchmark("dictionary", "smart_search")
+def smart_search(context):
+    """每次调用前清空查询缓存，测量实际的搜索开销"""
+    manager = EnhancedDictionaryManager(context.dictionaries_file)
+
+    def run():
+        manager.query_cache.clear()
+        return [manager.smart_search(term, field) for term, field in SEARCH_TERMS]
+    return run
+
+
+@benchmark("dictionary", "smart_search_cached")
+def smart_search_cached(context):
+    manager = EnhancedDictionaryManager(context.dictionaries_file)
+    return lambda: [manager.smart_search(term, field) for term, field in SEARCH_TERMS]
+
+
+@benchmark("dictionary", "decode_many", sized=True)
+def decode_many(context):
+    manager = DictionaryManager(context.dictionaries_file)
+    ids = library_ids(context)
+    return lambda: list(manager.decode_many(ids))
@@ -0,0 +1,56 @@
+"""
+编码库基准: 搜索、筛选、添加、导出 (按编码库规模参数化)
+"""
+
+import itertools
+
+from reading_type_database import ReadingTypeDatabase
+from tests.benchmarks.harness import benchmark
+
+
+def open_database(context):
+    return ReadingTypeDatabase(context.codes_file, context.dictionaries_file, context.history_file)
+
+
+@benchmark("library", "search_codes_exact", sized=True)
+def search_exact(context):
+    database = open_database(context)
+    return lambda: database.search_codes("A相电压")
+
+
+@benchmark("library", "search_codes_fuzzy", sized=True)
+def search_fuzzy(context):
+    database = open_database(context)
+    return lambda: database.search_codes("储能功率")
+
+
+@benchmark("library", "filter_codes", sized=True)
+def filter_codes(context):
+    database = open_database(context)
+    return lambda: database.filter_codes(category="表计", measurement_kind="电压")
+
+
+@benchmark("library", "add_code", sized=True)
+def add_code(context):
+    """每次添加一个新编码 (包含写回CSV和记录操作历史)，编码库随调用次数缓慢增长"""
+    database = open_database(context)
+    counter = itertools.count(1)
+
+    def run():
+        i = next(counter)
+        reading_type_id = f"0-0-0-6-0-1-54-0-0-0-{i // 1000}-{i % 1000}-128-0-29-0"
+        success, message = database.add_code(f"基准编码{i}", reading_type_id, "基准测试添加", "基准")
+        assert success, message
+    return run
+
+
+@benchmark("library", "export_csv", sized=True)
+def export_csv(context):
+    database = open_database(context)
+    return lambda: database.export_data("csv")
+
+
+@benchmark("library", "export_json", sized=True)
+def export_json(context):
+    database = open_database(context)
+    return lambda: database.export_data("json")
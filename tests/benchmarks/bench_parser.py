@@ -0,0 +1,67 @@
+"""
+语义解析器和编码编解码基准
+"""
+
+import numpy as np
+import pandas as pd
+
+import reading_type_codec
+from dictionary_manager import DictionaryManager
+from src.enhanced_semantic_parser import EnhancedSemanticParser
+from semantic_parser import SemanticParser
+from tests.benchmarks.harness import benchmark
+
+DESCRIPTIONS = [
+    "A相电压",
+    "正向有功电能总量，单位kWh",
+    "15分钟平均三相无功功率",
+    "储能电池充电累计电量",
+    "反向无功电能第3阶梯，按日冻结",
+    "B相电流3次谐波有效值",
+    "月最大需量，单位kW",
+    "燃气累计流量",
+]
+
+
+@benchmark("parser", "analyze_measurement_description")
+def analyze(context):
+    parser = SemanticParser()
+    return lambda: [parser.analyze_measurement_description(text) for text in DESCRIPTIONS]
+
+
+@benchmark("parser", "analyze_description_enhanced")
+def analyze_enhanced(context):
+    parser = EnhancedSemanticParser(DictionaryManager(context.dictionaries_file))
+    return lambda: [parser.analyze_description_enhanced(text) for text in DESCRIPTIONS]
+
+
+def library_ids(context):
+    return pd.read_csv(context.codes_file, encoding="utf-8-sig")["reading_type_id"].astype(str).tolist()
+
+
+@benchmark("codec", "parse_build_single", sized=True)
+def parse_build_single(context):
+    """逐个解析再生成ReadingTypeID (与批量接口对照)"""
+    ids = library_ids(context)
+    return lambda: [reading_type_codec.build_reading_type_id(reading_type_codec.parse_reading_type_id(value))
+                    for value in ids]
+
+
+@benchmark("codec", "decode_batch", sized=True)
+def decode_batch(context):
+    ids = library_ids(context)
+    return lambda: reading_type_codec.decode_batch(ids)
+
+
+@benchmark("codec", "encode_batch", sized=True)
+def encode_batch(context):
+    matrix, valid = reading_type_codec.decode_batch(library_ids(context))
+    matrix = np.ascontiguousarray(matrix[valid])
+    return lambda: reading_type_codec.encode_batch(matrix)
+
+
+@benchmark("codec", "pack_batch", sized=True)
+def pack_batch(context):
+    matrix, valid = reading_type_codec.decode_batch(library_ids(context))
+    matrix = np.ascontiguousarray(matrix[valid])
+    return lambda: reading_type_codec.pack_batch(matrix)
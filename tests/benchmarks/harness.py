@@ -0,0 +1,234 @@
+"""
+基准测试框架
+
+每个基准是一个 setup 函数 (用 @benchmark 注册)，接收 BenchContext，返回被计时的无参函数。
+按编码库规模参数化的基准 (sized=True) 对每个规模各运行一次，编码库由 library_generator 按固定种子合成，
+其余基准只运行一次 (size 为 None)，使用项目编码库。
+每个基准在独立的临时工作目录中运行，目录中有编码库和字典的副本，添加、导出等写操作不影响项目文件。
+"""
+
+import datetime
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from history_logger import flush_all
+from library_generator import generate_library
+from tests import PROJECT_ROOT
+
+CODES_FILE = "reading_type_codes.csv"
+DICTIONARIES_FILE = "field_dictionaries.csv"
+HISTORY_FILE = "operation_history.jsonl"
+
+# 结果JSON的格式版本
+SCHEMA_VERSION = 1
+
+# 注册的基准: (分组, 名称) -> {"setup", "sized"}
+BENCHMARKS = {}
+
+
+def benchmark(group: str, name: str, sized: bool = False):
+    """注册基准的装饰器
+
+    Args:
+        group: 分组 (library/dictionary/parser/codec/agent)
+        name: 基准名称
+        sized: 是否按编码库规模参数化
+    """
+    def register(setup: Callable[["BenchContext"], Callable[[], object]]):
+        BENCHMARKS[(group, name)] = {"setup": setup, "sized": sized}
+        return setup
+    return register
+
+
+class BenchContext:
+    """一次基准运行的工作目录和资源"""
+
+    def __init__(self, workdir: str, size: Optional[int]):
+        self.workdir = workdir
+        self.size = size
+        self._cleanups = []
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.workdir, filename)
+
+    @property
+    def codes_file(self) -> str:
+        return self.path(CODES_FILE)
+
+    @property
+    def dictionaries_file(self) -> str:
+        return self.path(DICTIONARIES_FILE)
+
+    @property
+    def history_file(self) -> str:
+        return self.path(HISTORY_FILE)
+
+    def on_cleanup(self, func: Callable[[], None]) -> None:
+        """登记基准结束后执行的清理函数 (按登记的相反顺序执行)"""
+        self._cleanups.append(func)
+
+    def cleanup(self) -> None:
+        while self._cleanups:
+            self._cleanups.pop()()
+
+
+def make_library(target: str, size: int, seed: int = 0) -> int:
+    """生成 size 条的合成编码库写入 target (相同种子生成相同的编码库)，返回实际条数"""
+    return generate_library(target, size, seed=seed, dictionaries_file=os.path.join(PROJECT_ROOT, DICTIONARIES_FILE))
+
+
+def measure(func: Callable[[], object], repeat: int = 5, min_time: float = 0.05) -> Dict:
+    """计时: 预热调用一次后，每轮连续调用多次，使一轮不少于 min_time 秒，共 repeat 轮
+
+    Returns:
+        {"rounds", "loops", "min_ms", "median_ms", "mean_ms", "stdev_ms"}，时间为单次调用的毫秒数
+    """
+    func()
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+    loops = max(1, math.ceil(min_time / first)) if first > 0 else 1000
+
+    timings = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        timings.append((time.perf_counter() - start) / loops * 1000)
+    return {
+        "rounds": len(timings),
+        "loops": loops,
+        "min_ms": min(timings),
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "stdev_ms": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def environment() -> Dict:
+    """运行环境和代码版本"""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+
+    import numpy
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def select(patterns: Optional[Iterable[str]] = None) -> List[tuple]:
+    """按 "分组" 或 "分组.名称" 的前缀选择基准，patterns 为空时选择全部"""
+    patterns = list(patterns or [])
+    return [key for key in BENCHMARKS
+            if not patterns or any(f"{key[0]}.{key[1]}".startswith(pattern) for pattern in patterns)]
+
+
+def run_benchmarks(sizes: Iterable[int] = (500, 2000, 8000), patterns: Optional[Iterable[str]] = None,
+                   repeat: int = 5, min_time: float = 0.05, seed: int = 0,
+                   log: Optional[Callable[[str], None]] = None) -> Dict:
+    """运行基准
+
+    Returns:
+        {"schema", "created", "environment", "config", "results": [{"group", "name", "size", ...计时}]}
+    """
+    # 导入各基准模块，完成注册
+    from tests.benchmarks import bench_agent, bench_dictionary, bench_library, bench_parser  # noqa: F401
+
+    sizes = sorted(set(sizes))
+    keys = select(patterns)
+    results = []
+    root = tempfile.mkdtemp(prefix="reading_type_bench_")
+    cwd = os.getcwd()
+    try:
+        libraries = {}
+        for size in sizes:
+            libraries[size] = os.path.join(root, f"codes_{size}.csv")
+            make_library(libraries[size], size, seed)
+
+        for group, name in keys:
+            entry = BENCHMARKS[(group, name)]
+            for size in (sizes if entry["sized"] else [None]):
+                workdir = tempfile.mkdtemp(dir=root)
+                shutil.copy(libraries[size] if size else os.path.join(PROJECT_ROOT, CODES_FILE),
+                            os.path.join(workdir, CODES_FILE))
+                shutil.copy(os.path.join(PROJECT_ROOT, DICTIONARIES_FILE), workdir)
+                context = BenchContext(workdir, size)
+                os.chdir(workdir)
+                try:
+                    timing = measure(entry["setup"](context), repeat=repeat, min_time=min_time)
+                finally:
+                    context.cleanup()
+                    os.chdir(cwd)
+                result = dict({"group": group, "name": name, "size": size}, **timing)
+                results.append(result)
+                if log is not None:
+                    log(format_result(result))
+    finally:
+        os.chdir(cwd)
+        flush_all()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {"sizes": sizes, "repeat": repeat, "min_time": min_time, "seed": seed},
+        "results": results,
+    }
+
+
+def result_id(result: Dict) -> str:
+    """结果的唯一标识 "分组.名称[规模]" """
+    size = f"[{result['size']}]" if result.get("size") else ""
+    return f"{result['group']}.{result['name']}{size}"
+
+
+def format_result(result: Dict) -> str:
+    return (f"{result_id(result):<45} 中位数 {result['median_ms']:>10.3f}ms  "
+            f"最小 {result['min_ms']:>10.3f}ms  ({result['rounds']}轮 × {result['loops']}次)")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[Dict]:
+    """按中位数比较两次结果
+
+    Args:
+        threshold: 相对变化超过该比例时标记为 regression/improvement
+
+    Returns:
+        [{"id", "baseline_ms", "current_ms", "ratio", "status"}]，status 为 regression/improvement/same/new
+    """
+    previous = {result_id(result): result for result in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        key = result_id(result)
+        old = previous.get(key)
+        if old is None or not old["median_ms"]:
+            rows.append({"id": key, "baseline_ms": None, "current_ms": result["median_ms"],
+                         "ratio": None, "status": "new"})
+            continue
+        ratio = result["median_ms"] / old["median_ms"]
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "same"
+        rows.append({"id": key, "baseline_ms": old["median_ms"], "current_ms": result["median_ms"],
+                     "ratio": ratio, "status": status})
+    return rows
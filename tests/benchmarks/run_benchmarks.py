@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+运行性能基准测试
+
+用法:
+    python tests/benchmarks/run_benchmarks.py                                  # 全部基准，输出到 benchmark.json
+    python tests/benchmarks/run_benchmarks.py --sizes 500 2000 --only library codec.decode_batch
+    python tests/benchmarks/run_benchmarks.py --output new.json --compare old.json --fail-on-regression
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from tests.benchmarks.harness import compare, run_benchmarks  # noqa: E402
+
+
+def print_comparison(rows, threshold, file=sys.stdout):
+    marks = {"regression": "🔴", "improvement": "🟢", "same": "  ", "new": "🆕"}
+    print(f"\n与基线比较 (阈值 ±{threshold:.0%}):", file=file)
+    for row in rows:
+        if row["ratio"] is None:
+            print(f"{marks[row['status']]} {row['id']:<45} {row['current_ms']:>10.3f}ms", file=file)
+        else:
+            print(f"{marks[row['status']]} {row['id']:<45} {row['baseline_ms']:>10.3f}ms → "
+                  f"{row['current_ms']:>10.3f}ms  ({row['ratio']:.2f}x)", file=file)
+    regressions = sum(row["status"] == "regression" for row in rows)
+    improvements = sum(row["status"] == "improvement" for row in rows)
+    print(f"变慢 {regressions} 项, 变快 {improvements} 项, 共 {len(rows)} 项", file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ReadingType性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 8000], help="编码库规模")
+    parser.add_argument("--only", nargs="+", metavar="PREFIX", help="只运行 分组 或 分组.名称 前缀匹配的基准")
+    parser.add_argument("--seed", type=int, default=0, help="合成编码库的随机种子")
+    parser.add_argument("--repeat", type=int, default=5, help="每个基准的计时轮数")
+    parser.add_argument("--min-time", type=float, default=0.05, help="每轮最短时长(秒)")
+    parser.add_argument("--output", default="benchmark.json", help="结果JSON文件 ('-' 输出到标准输出)")
+    parser.add_argument("--compare", metavar="BASELINE", help="与之前的结果JSON比较")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定变慢/变快的相对变化")
+    parser.add_argument("--fail-on-regression", action="store_true", help="有变慢的基准时返回非零退出码")
+    args = parser.parse_args()
+
+    log = (lambda line: print(line, file=sys.stderr)) if args.output == "-" else print
+    report = run_benchmarks(args.sizes, args.only, repeat=args.repeat, min_time=args.min_time,
+                            seed=args.seed, log=log)
+
+    data = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(data)
+    else:
+        Path(args.output).write_text(data + "\n", encoding="utf-8")
+        print(f"\n结果已保存: {args.output} (提交 {(report['environment']['commit'] or '未知')[:12]})")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        rows = compare(baseline, report, args.threshold)
+        print_comparison(rows, args.threshold, sys.stderr if args.output == "-" else sys.stdout)
+        if args.fail_on_regression and any(row["status"] == "regression" for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
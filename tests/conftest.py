@@ -6,16 +6,24 @@ import pytest
 import pandas as pd
 import tempfile
 import os
+import json
+import threading
+import time
 import xml.etree.ElementTree as ET
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Dict, List
 
+from history_logger import flush_all
+
 
 @pytest.fixture
 def temp_dir():
     """临时目录夹具"""
     with tempfile.TemporaryDirectory() as tmpdir:
         yield tmpdir
+        # 目录删除前写完其中的操作历史
+        flush_all()
 
 
 @pytest.fixture
@@ -134,4 +142,156 @@ def operation_history_data():
             'timestamp': '2024-01-15 10:31:00',
             'user': 'test_user'
         }
-    ] 
\ No newline at end of file
+    ] 
+
+
+class OpenAIStubServer:
+    """OpenAI兼容接口的本地桩服务，只实现 POST /v1/chat/completions
+
+    默认对话脚本:
+    - 带工具定义且最后一条是用户消息: 以 "你好" 开头时直接回复文本，否则调用 search_reading_type
+      (用户消息含 "和" 时按 "和" 拆分，每部分一个调用)
+    - 其余情况 (工具结果之后或 tool_choice="none"): 回复 "已完成: <用户消息>"，stream=true 时以SSE分段返回
+
+    stream=true 时文本按4个字符、工具调用参数按8个字符分段，每段之间间隔 chunk_delay 秒；
+    usage 模拟DeepSeek的上下文缓存: 工具定义和消息序列化后按64 token (256字符) 分块，
+    与之前请求逐块相同的前缀计为 prompt_cache_hit_tokens
+    """
+
+    def __init__(self, delay: float = 0.0, chunk_delay: float = 0.0):
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.stream_finished = []
+        self._lock = threading.Lock()
+        self._cached_blocks = set()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with server._lock:
+                    server.requests.append(body)
+                if server.delay:
+                    time.sleep(server.delay)
+                message = server.reply(body)
+                usage = server.usage(body)
+                if body.get('stream'):
+                    include_usage = (body.get('stream_options') or {}).get('include_usage')
+                    self._send_stream(message, usage if include_usage else None)
+                else:
+                    # 非流式响应等到全部内容生成完才返回
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay * len(server.stream_deltas(message)))
+                    self._send_json({
+                        'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0,
+                        'model': body.get('model'),
+                        'choices': [{'index': 0, 'message': message,
+                                     'finish_reason': 'tool_calls' if message.get('tool_calls') else 'stop'}],
+                        'usage': usage
+                    })
+
+            def _send_json(self, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, message, usage=None):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                for delta in server.stream_deltas(message):
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                    self._send_chunk({'index': 0, 'delta': delta, 'finish_reason': None})
+                finish_reason = 'tool_calls' if message.get('tool_calls') else 'stop'
+                self._send_chunk({'index': 0, 'delta': {}, 'finish_reason': finish_reason})
+                if usage is not None:
+                    self._send_chunk(None, usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                server.stream_finished.append(time.perf_counter())
+
+            def _send_chunk(self, choice, usage=None):
+                chunk = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': 0,
+                         'model': 'stub', 'choices': [choice] if choice else []}
+                if usage is not None:
+                    chunk['usage'] = usage
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        self.httpd = Server(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def reply(self, body: Dict) -> Dict:
+        """根据请求生成assistant消息"""
+        messages = body['messages']
+        user_input = next(m['content'] for m in reversed(messages) if m['role'] == 'user')
+        if body.get('tools') and body.get('tool_choice') != 'none' and \
+                messages[-1]['role'] == 'user' and not user_input.startswith('你好'):
+            return {'role': 'assistant', 'content': None, 'tool_calls': [{
+                'id': f"call_{len(self.requests)}_{i}", 'type': 'function',
+                'function': {'name': 'search_reading_type',
+                             'arguments': json.dumps({'name': name}, ensure_ascii=False)}
+            } for i, name in enumerate(user_input.split('和'))]}
+        return {'role': 'assistant', 'content': f"已完成: {user_input}"}
+
+    @staticmethod
+    def stream_deltas(message: Dict) -> List[Dict]:
+        """assistant消息 -> 流式增量列表"""
+        content = message.get('content') or ''
+        deltas = [{'content': content[i:i + 4]} for i in range(0, len(content), 4)]
+        for index, tool_call in enumerate(message.get('tool_calls') or ()):
+            arguments = tool_call['function']['arguments']
+            deltas.append({'tool_calls': [{'index': index, 'id': tool_call['id'], 'type': 'function',
+                                           'function': {'name': tool_call['function']['name'],
+                                                        'arguments': ''}}]})
+            deltas.extend({'tool_calls': [{'index': index, 'function': {'arguments': arguments[i:i + 8]}}]}
+                          for i in range(0, len(arguments), 8))
+        return deltas
+
+    def usage(self, body: Dict) -> Dict:
+        """按请求前缀计算usage，并把本次请求的前缀块加入缓存"""
+        prompt = json.dumps({'tools': body.get('tools'), 'messages': body['messages']}, ensure_ascii=False)
+        prompt_tokens = len(prompt) // 4 + 1
+        hit_blocks, chained, hitting = 0, None, True
+        with self._lock:
+            for start in range(0, len(prompt) - 255, 256):
+                chained = hash((chained, prompt[start:start + 256]))
+                if hitting and chained in self._cached_blocks:
+                    hit_blocks += 1
+                else:
+                    hitting = False
+                    self._cached_blocks.add(chained)
+        hit_tokens = hit_blocks * 64
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': 5,
+                'total_tokens': prompt_tokens + 5,
+                'prompt_cache_hit_tokens': hit_tokens,
+                'prompt_cache_miss_tokens': prompt_tokens - hit_tokens}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def openai_stub():
+    """本地OpenAI兼容桩服务"""
+    server = OpenAIStubServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,180 @@
+"""
+HTTP服务集成测试
+基于本地OpenAI兼容桩服务和Flask测试客户端，验证会话、SSE流式回复和工具接口
+"""
+
+import json
+import os
+import shutil
+
+import pytest
+
+from tests import PROJECT_ROOT
+
+
+@pytest.fixture
+def service(openai_stub, temp_dir, monkeypatch):
+    """连接到桩服务的AgentService"""
+    for filename in ('reading_type_codes.csv', 'field_dictionaries.csv'):
+        shutil.copy(os.path.join(PROJECT_ROOT, filename), temp_dir)
+    monkeypatch.chdir(temp_dir)
+
+    from src import reading_type_agent
+    from src.agent_server import AgentService, SessionStore
+    monkeypatch.setattr(reading_type_agent, 'DEEPSEEK_API_KEY', 'test-key')
+    monkeypatch.setattr(reading_type_agent, 'DEEPSEEK_BASE_URL', openai_stub.base_url)
+    service = AgentService(sessions=SessionStore(max_sessions=3))
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def client(service):
+    from src.agent_server import create_app
+    return create_app(service).test_client()
+
+
+def read_events(response):
+    """解析SSE响应体"""
+    return [json.loads(line[len("data: "):]) for line in response.get_data(as_text=True).splitlines()
+            if line.startswith("data: ")]
+
+
+class TestAgentServer:
+    """HTTP服务测试类"""
+
+    @pytest.mark.integration
+    def test_chat_keeps_session_history(self, client, openai_stub):
+        """测试同一会话的多轮对话共用历史，系统提示位于开头"""
+        first = client.post("/api/chat", json={"message": "有功电能"}).get_json()
+        assert first["reply"] == "已完成: 有功电能"
+        assert [tool["name"] for tool in first["tools"]] == ["search_reading_type"]
+        assert first["timing"]["total"] > 0
+
+        second = client.post("/api/chat", json={"message": "你好", "session_id": first["session_id"]}).get_json()
+        assert second["reply"] == "已完成: 你好"
+        assert openai_stub.requests[-1]["messages"][0]["role"] == "system"
+
+        messages = client.get(f"/api/sessions/{first['session_id']}").get_json()["messages"]
+        assert [message["role"] for message in messages] == \
+            ["system", "user", "assistant", "tool", "assistant", "user", "assistant"]
+
+    @pytest.mark.integration
+    def test_sse_stream(self, client):
+        """测试SSE流式回复: 先逐段推送文本，最后推送完整回复"""
+        response = client.post("/api/chat", json={"message": "有功电能和储能", "stream": True})
+        assert response.mimetype == "text/event-stream"
+
+        events = read_events(response)
+        tokens = [event["content"] for event in events if event["type"] == "token"]
+        assert len(tokens) > 1
+        assert events[0]["session_id"]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["reply"] == "".join(tokens) == "已完成: 有功电能和储能"
+        assert len(events[-1]["tools"]) == 2
+
+    @pytest.mark.integration
+    def test_tool_endpoint(self, client, openai_stub):
+        """测试直接调用工具，不请求大模型"""
+        response = client.post("/api/tools/search_reading_type", json={"name": "有功电能"})
+        assert response.status_code == 200
+        assert "有功电能" in response.get_json()["result"]
+        assert client.post("/api/tools/rm_rf", json={}).status_code == 404
+        names = [tool["name"] for tool in client.get("/api/tools").get_json()["tools"]]
+        assert "search_reading_type" in names
+        assert openai_stub.requests == []
+
+    @pytest.mark.integration
+    def test_tool_endpoint_guards(self, client, service):
+        """测试默认不能直接调用有副作用的工具，参数不是JSON对象或无效时返回400"""
+        names = [tool["name"] for tool in client.get("/api/tools").get_json()["tools"]]
+        assert "add_to_library" not in names and "export_data" not in names
+        response = client.post("/api/tools/add_to_library", json={"name": "x", "reading_type_id": "0-0-0"})
+        assert response.status_code == 403
+        assert client.post("/api/tools/search_reading_type", json=[]).status_code == 400
+        assert client.post("/api/tools/search_reading_type", data="{", content_type="application/json").status_code == 400
+        assert client.post("/api/tools/view_codes_library", json={"page": "第一页"}).status_code == 400
+        assert client.post("/api/tools/get_statistics").status_code == 200
+        for name, args in (("search_reading_type", {"name": 5}), ("search_reading_type", {}),
+                           ("query_dictionary", {"field_name": 5}), ("filter_codes", {"category": 5}),
+                           ("view_codes_library", {"per_page": 0}), ("view_codes_library", {"page": -1}),
+                           ("view_codes_library", {"page": True})):
+            assert client.post(f"/api/tools/{name}", json=args).status_code == 400, (name, args)
+        assert client.post("/api/tools/view_codes_library", json={"page": 1, "per_page": 2}).status_code == 200
+        assert client.post("/api/chat", json={"message": 5}).status_code == 400
+        assert client.post("/api/chat", json={"message": "你好", "session_id": 5}).status_code == 400
+        assert client.post("/api/chat", json=["你好"]).status_code == 400
+
+        service.allow_write_tools = True
+        assert "export_data" in [tool["name"] for tool in client.get("/api/tools").get_json()["tools"]]
+
+    @pytest.mark.integration
+    def test_sessions_bounded_and_shared_data(self, client, service):
+        """测试会话数量有上限，所有会话共用同一份编码库"""
+        session_ids = [client.post("/api/sessions").get_json()["session_id"] for _ in range(5)]
+
+        assert len(service.sessions) == 3
+        assert client.get(f"/api/sessions/{session_ids[0]}").status_code == 404
+        assert client.post("/api/chat", json={"message": "你好", "session_id": session_ids[0]}).status_code == 404
+        assert client.delete(f"/api/sessions/{session_ids[-1]}").status_code == 204
+        assert client.post("/api/chat", json={"message": ""}).status_code == 400
+        health = client.get("/api/health").get_json()
+        assert health["codes"] == len(service.agent.database.reading_type_codes) > 0
+
+    @pytest.mark.integration
+    def test_busy_session_rejected(self, client, service, openai_stub):
+        """测试同一会话的对话进行中时拒绝新的请求"""
+        openai_stub.delay = 0.3
+        session_id = client.post("/api/sessions").get_json()["session_id"]
+        pending = service.submit(session_id, "你好")
+
+        response = client.post("/api/chat", json={"message": "你好", "session_id": session_id})
+        assert response.status_code == 409
+        assert pending.result(5)["reply"] == "已完成: 你好"
+        assert client.post("/api/chat", json={"message": "你好", "session_id": session_id}).status_code == 200
+
+    @pytest.mark.integration
+    def test_busy_session_kept_and_timeout(self, client, service, openai_stub):
+        """测试正在对话的会话不被淘汰，对话超时返回504并释放会话"""
+        openai_stub.delay = 0.5
+        session_id = client.post("/api/sessions").get_json()["session_id"]
+        pending = service.submit(session_id, "你好")
+        for _ in range(4):
+            client.post("/api/sessions")
+        assert service.sessions.get(session_id) is not None
+        assert pending.result(5)["reply"] == "已完成: 你好"
+
+        service.turn_timeout = 0.1
+        response = client.post("/api/chat", json={"message": "你好", "session_id": session_id})
+        assert response.status_code == 504
+        assert service.sessions.acquire(session_id) is not None
+
+    @pytest.mark.integration
+    def test_traces_endpoint(self, client, service):
+        """测试追踪汇总与导出接口"""
+        assert client.get("/api/traces").get_json() == {"enabled": False, "summary": {}}
+        service.agent.tracer.enabled = True
+        client.post("/api/chat", json={"message": "有功电能"})
+
+        summary = client.get("/api/traces").get_json()["summary"]
+        assert summary["chat.completions"]["count"] == 2
+        lines = client.get("/api/traces?format=jsonl").get_data(as_text=True).splitlines()
+        assert len(lines) == sum(stats["count"] for stats in summary.values())
+        spans = client.get("/api/traces?format=otlp").get_json()["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(spans) == len(lines)
+
+    @pytest.mark.integration
+    def test_metrics_endpoint(self, client):
+        """测试按会话和进程汇总的调用指标接口"""
+        first = client.post("/api/chat", json={"message": "有功电能"}).get_json()["session_id"]
+        client.post("/api/chat", json={"message": "你好"})
+
+        metrics = client.get(f"/api/metrics?session_id={first}").get_json()
+        assert metrics["process"]["calls"] == 3 and metrics["process"]["turns"] == 2
+        assert metrics["session"]["calls"] == 2 and metrics["session"]["tool_rounds"]["total"] == 1
+        assert metrics["sessions"] == 2
+        text = client.get("/api/metrics?format=prometheus").get_data(as_text=True)
+        assert "reading_type_llm_calls_total 3" in text
+
+        client.delete(f"/api/sessions/{first}")
+        assert client.get(f"/api/metrics?session_id={first}").get_json()["session"] is None
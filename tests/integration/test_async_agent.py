@@ -0,0 +1,425 @@
+"""
+异步智能体集成测试
+基于本地OpenAI兼容桩服务，验证异步对话轮次和并发会话
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from tests import PROJECT_ROOT
+
+
+@pytest.fixture
+def agent_workdir(temp_dir, monkeypatch):
+    """包含编码库和字典副本的工作目录 (智能体按相对路径读写数据文件)"""
+    for filename in ('reading_type_codes.csv', 'field_dictionaries.csv'):
+        shutil.copy(os.path.join(PROJECT_ROOT, filename), temp_dir)
+    monkeypatch.chdir(temp_dir)
+    return temp_dir
+
+
+@pytest.fixture
+def agent(openai_stub, agent_workdir, monkeypatch):
+    """连接到桩服务的ReadingTypeAgent"""
+    from src import reading_type_agent
+    monkeypatch.setattr(reading_type_agent, 'DEEPSEEK_API_KEY', 'test-key')
+    monkeypatch.setattr(reading_type_agent, 'DEEPSEEK_BASE_URL', openai_stub.base_url)
+    return reading_type_agent.ReadingTypeAgent()
+
+
+@pytest.fixture
+def optimized_agent(openai_stub, agent_workdir, monkeypatch):
+    """连接到桩服务的OptimizedReadingTypeAgent"""
+    from src import optimized_reading_type_agent
+    monkeypatch.setattr(optimized_reading_type_agent, 'DEEPSEEK_API_KEY', 'test-key')
+    monkeypatch.setattr(optimized_reading_type_agent, 'DEEPSEEK_BASE_URL', openai_stub.base_url)
+    return optimized_reading_type_agent.OptimizedReadingTypeAgent()
+
+
+class TestAsyncAgent:
+    """异步对话测试类"""
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_tool_turn(self, agent, openai_stub):
+        """测试带工具调用的一轮对话"""
+        reply = await agent.get_response_async("有功电能")
+
+        assert reply == "已完成: 有功电能"
+        roles = [message['role'] for message in agent.conversation_history]
+        assert roles == ['user', 'assistant', 'tool', 'assistant']
+        assert "有功电能" in agent.conversation_history[2]['content']
+        # 第二次请求带上了工具结果
+        assert openai_stub.requests[1]['messages'][2]['tool_call_id'] == \
+            agent.conversation_history[1]['tool_calls'][0]['id']
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_plain_reply_and_streaming(self, agent):
+        """测试无工具调用的回复与流式回调"""
+        assert await agent.get_response_async("你好") == "已完成: 你好"
+
+        tokens = []
+        reply = await agent.get_response_async("A相电压", on_token=tokens.append)
+        assert "".join(tokens) == reply == "已完成: A相电压"
+        assert len(tokens) > 1
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_concurrent_sessions(self, agent, openai_stub):
+        """测试数百个会话共享一个进程并发执行"""
+        openai_stub.delay = 0.05
+        sessions = [[] for _ in range(200)]
+
+        # 记录工具执行所在线程，工具不应在事件循环线程中执行
+        tool_threads = set()
+        search = agent.available_tools['search_reading_type']
+
+        def recording_search(args):
+            tool_threads.add(threading.get_ident())
+            return search(args)
+
+        agent.available_tools['search_reading_type'] = recording_search
+
+        start = time.perf_counter()
+        replies = await asyncio.gather(*(
+            agent.get_response_async(f"有功电能{i}", conversation_history=history)
+            for i, history in enumerate(sessions)
+        ))
+        elapsed = time.perf_counter() - start
+
+        assert replies == [f"已完成: 有功电能{i}" for i in range(200)]
+        assert all(len(history) == 4 for history in sessions)
+        assert agent.conversation_history == []
+        assert tool_threads and threading.get_ident() not in tool_threads
+        # 串行需要 200 × 2 × 0.05 = 20秒
+        assert elapsed < 10
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_optimized_agent(self, optimized_agent):
+        """测试优化版智能体的异步对话"""
+        history = []
+        reply = await optimized_agent.get_response_async("有功电能", conversation_history=history)
+        assert reply == "已完成: 有功电能"
+        assert [message['role'] for message in history] == ['user', 'assistant', 'tool', 'assistant']
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_local_command(self, agent, openai_stub):
+        """测试明确命令在本地执行，不请求API"""
+        tokens = []
+        reply = await agent.get_response_async("查看编码库", on_token=tokens.append)
+        assert reply.startswith("📚 编码库") and tokens == [reply]
+        assert agent.get_response("统计", stream=False).startswith("📊 ReadingType编码库统计信息")
+        assert openai_stub.requests == []
+
+        roles = [message['role'] for message in agent.conversation_history]
+        assert roles == ['user', 'assistant', 'user', 'assistant']
+
+    @pytest.mark.integration
+    def test_query_history_tool(self, agent):
+        """测试查询操作历史工具包含尚在队列中的记录"""
+        for name in ("测试编码A", "测试编码B"):
+            agent.available_tools['add_to_library']({"name": name, "reading_type_id": "0-0-0-0-0-0-0-0-0-0-0-0-0-0-0-0"})
+
+        content = agent.handle_function_call({"name": "query_history", "arguments": '{"since": "今天"}'})
+        data = json.loads(content)
+        assert data["total"] >= 1 and data["operations"]["add"] >= 1
+        assert data["top_inputs"][0]["input"].startswith("添加编码: 测试编码")
+
+        result = agent.available_tools['query_history']({"since": "2025-13-01"})
+        assert "error" in result.data
+        result = agent.available_tools['query_history']({"days": 1e6})
+        assert "error" in result.data
+
+        # 带时区的时间换算为本地时间后比较
+        aware = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)).isoformat()
+        data = agent.available_tools['query_history']({"since": aware}).data
+        assert data["total"] >= 1
+        assert "+" not in data["since"]
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_history_budget(self, agent, openai_stub):
+        """测试长会话中每轮请求的提示token保持平稳"""
+        from history_manager import HistoryManager
+        agent.history_manager = HistoryManager(max_tokens=2000)
+        # 以渲染文本作为工具结果，使历史较快达到预算
+        agent.compact_tool_results = False
+        agent.add_message("system", "你是ReadingTypeID编码助手")
+
+        for i in range(30):
+            await agent.get_response_async(f"储能{i}")
+
+        first_requests = openai_stub.requests[::2]
+        sizes = [agent.history_manager.count_tokens(request['messages']) for request in first_requests]
+        assert first_requests[-1]['messages'][0]['content'] == "你是ReadingTypeID编码助手"
+        # 约20轮后达到预算，此后在预算的75%~100%之间往复 (不压缩时第30轮约2700 token)
+        assert max(sizes) <= 2000
+        assert all(1400 <= size <= 2000 for size in sizes[-8:])
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_stable_prompt_prefix(self, agent, openai_stub):
+        """测试工具定义逐字节稳定，多轮对话的提示前缀命中缓存"""
+        from src import reading_type_agent
+        assert reading_type_agent.ReadingTypeAgent().get_tools_definition() is agent.get_tools_definition()
+
+        agent.add_message("system", "你是ReadingTypeID编码助手")
+        tokens = []
+        for i in range(6):
+            await agent.get_response_async(f"储能{i}", on_token=tokens.append if i % 2 else None)
+
+        tools_bytes = {json.dumps(request['tools'], ensure_ascii=False) for request in openai_stub.requests}
+        assert len(tools_bytes) == 1
+        assert [request.get('tool_choice') for request in openai_stub.requests[:2]] == ['auto', 'none']
+
+        summary = agent.prompt_cache_meter.summary()
+        assert summary['calls'] == 12
+        # 第一次调用之后，工具定义和系统提示都来自缓存
+        assert all(entry['cached_tokens'] > 0 for entry in list(agent.prompt_cache_meter.records)[1:])
+        assert summary['ratio'] > 0.7
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_compact_tool_results(self, agent, openai_stub):
+        """测试工具结果以紧凑JSON发送给大模型，关闭后发送渲染文本"""
+        agent.tool_result_meter.enabled = True
+        await agent.get_response_async("有功电能")
+        content = openai_stub.requests[1]['messages'][2]['content']
+        assert json.loads(content)['query'] == "有功电能"
+        assert agent.tool_result_meter.summary()['search_reading_type']['calls'] == 1
+
+        agent.compact_tool_results = False
+        await agent.get_response_async("有功电能")
+        assert openai_stub.requests[3]['messages'][-1]['content'].startswith("✅ 找到精确匹配")
+
+    @pytest.mark.integration
+    def test_dictionary_without_descriptions(self, agent):
+        """测试字典中没有说明的取值 (pandas读为NaN) 说明为空，工具结果为合法JSON"""
+        content = agent.handle_function_call({"name": "query_dictionary",
+                                              "arguments": json.dumps({"field_name": "uom"})})
+        assert "NaN" not in content
+        assert json.loads(content)['options']['0.N/A'] == ""
+        assert agent.tool_result_meter.summary() == {}
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_speculative_prefetch(self, agent, openai_stub):
+        """测试第一次请求期间预取搜索结果，模型参数一致时不再重新执行"""
+        openai_stub.delay = 0.1
+        calls = []
+        search = agent.available_tools['search_reading_type']
+
+        def recording_search(args):
+            calls.append((time.perf_counter(), args['name']))
+            return search(args)
+
+        agent.available_tools['search_reading_type'] = recording_search
+        start = time.perf_counter()
+        reply = await agent.get_response_async("有功电能和储能")
+
+        assert reply == "已完成: 有功电能和储能"
+        assert sorted(name for _, name in calls) == ["储能", "有功电能"]
+        # 预取在第一次请求返回之前就已开始
+        assert max(at for at, _ in calls) - start < 0.1
+        assert "储能" in agent.conversation_history[3]['content']
+        summary = agent.speculation_meter.summary()
+        assert (summary['predictions'], summary['hits'], summary['wasted']) == (2, 2, 0)
+
+        # 寒暄不预取；预测与模型参数不一致时按原流程执行并计入浪费
+        await agent.get_response_async("你好")
+        await agent.get_response_async("电压和储能的编码")
+        summary = agent.speculation_meter.summary()
+        assert summary['turns'] == 2
+        assert (summary['predictions'], summary['hits'], summary['wasted']) == (4, 3, 1)
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_failed_prediction_does_not_fail_turn(self, agent, openai_stub, monkeypatch):
+        """测试多行输入和预测出错时照常完成对话"""
+        reply = await agent.get_response_async("请帮我看看\n有功电能")
+        assert reply == "已完成: 请帮我看看\n有功电能"
+
+        def broken_predict(user_input, limit=3):
+            raise RuntimeError("预测失败")
+
+        monkeypatch.setattr(agent.intent_router, 'predict', broken_predict)
+        assert await agent.get_response_async("有功电能") == "已完成: 有功电能"
+        assert agent.get_response("储能", stream=False) == "已完成: 储能"
+        assert agent.conversation_history[-1]['role'] == 'assistant'
+
+
+class TestStreamingFirstCall:
+    """第一次调用流式获取测试类"""
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_tools_start_before_stream_ends(self, agent, openai_stub):
+        """测试工具调用参数完整后即开始执行，不等整个流结束"""
+        openai_stub.chunk_delay = 0.01
+        tool_started = []
+        search = agent.available_tools['search_reading_type']
+
+        def recording_search(args):
+            tool_started.append(time.perf_counter())
+            return search(args)
+
+        agent.available_tools['search_reading_type'] = recording_search
+        tokens, reports = [], []
+        reply = await agent.get_response_async("有功电能和无功电能和储能", on_token=tokens.append,
+                                               on_tool_report=reports.append)
+
+        assert reply == "".join(tokens) == "已完成: 有功电能和无功电能和储能"
+        assert min(tool_started) < openai_stub.stream_finished[0]
+        tool_messages = [message for message in agent.conversation_history if message['role'] == 'tool']
+        assert [message['tool_call_id'] for message in tool_messages] == \
+            [tool_call['id'] for tool_call in agent.conversation_history[1]['tool_calls']]
+        assert "无功电能" in tool_messages[1]['content']
+        assert len(reports[0]['results']) == 3
+
+    @pytest.mark.integration
+    def test_time_to_first_token(self, agent, openai_stub, capsys):
+        """测试流式第一次调用缩短首token耗时"""
+        openai_stub.chunk_delay = 0.01
+        question = "你好" + "，请介绍ReadingTypeID" * 5
+
+        agent.get_response(question, stream=False)
+        before = agent.last_timing
+        agent.get_response(question, stream=True)
+        after = agent.last_timing
+
+        assert capsys.readouterr().out.count("已完成: " + question) == 2
+        assert before['streamed'] is False and after['streamed'] is True
+        assert after['ttft'] < before['ttft'] / 3
+        assert [message['role'] for message in agent.conversation_history] == ['user', 'assistant'] * 2
+
+
+class TestCompletionCache:
+    """补全缓存测试类"""
+
+    @pytest.mark.integration
+    def test_repeated_question_served_from_cache(self, agent, openai_stub, agent_workdir, capsys):
+        """测试不同会话中的相同问题直接由缓存回复，不再请求API"""
+        from src import reading_type_agent
+        from completion_cache import CompletionCache
+
+        cache = CompletionCache(os.path.join(agent_workdir, "cache.sqlite3"))
+        agent.enable_completion_cache(cache)
+        agent.get_response("有功电能", stream=True)
+        assert len(openai_stub.requests) == 2
+
+        other = reading_type_agent.ReadingTypeAgent()
+        other.enable_completion_cache(cache)
+        start = time.perf_counter()
+        other.get_response("  有功电能 ", stream=False)
+        elapsed = time.perf_counter() - start
+
+        assert len(openai_stub.requests) == 2
+        assert capsys.readouterr().out.count("已完成: 有功电能") == 2
+        assert elapsed < 0.1
+        roles = [message['role'] for message in other.conversation_history]
+        assert roles == ['user', 'assistant', 'tool', 'assistant']
+        # 回放的工具调用使用新的ID，并与工具结果配对
+        assert other.conversation_history[1]['tool_calls'][0]['id'] != \
+            agent.conversation_history[1]['tool_calls'][0]['id']
+        assert other.conversation_history[2]['tool_call_id'] == other.conversation_history[1]['tool_calls'][0]['id']
+        assert cache.stats()['hits'] == 2
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_async_streaming_hit(self, agent, openai_stub, agent_workdir):
+        """测试异步流式对话命中缓存，未命中的新问题照常请求API"""
+        from completion_cache import CompletionCache
+
+        agent.enable_completion_cache(CompletionCache(os.path.join(agent_workdir, "cache.sqlite3")))
+        await agent.get_response_async("你好")
+        agent.clear_history()
+        tokens = []
+        reply = await agent.get_response_async("你好", on_token=tokens.append)
+
+        assert reply == "".join(tokens) == "已完成: 你好"
+        assert len(openai_stub.requests) == 1
+        await agent.get_response_async("你好呀")
+        assert len(openai_stub.requests) == 2
+
+
+class TestTracing:
+    """调用追踪测试类"""
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_tool_and_api_spans(self, agent, openai_stub, agent_workdir):
+        """测试每次工具调用和API调用各记录一个span，并可导出"""
+        agent.speculative_tools = frozenset()
+        await agent.get_response_async("有功电能和储能")
+        assert agent.tracer.summary() == {}
+
+        agent.tracer.enabled = True
+        await agent.get_response_async("有功电能和储能", on_token=lambda content: None)
+        agent.get_response("电压", stream=True)
+        summary = agent.tracer.summary()
+
+        assert summary['chat.completions']['count'] == 4
+        assert summary['tool.search_reading_type']['count'] == 3
+        assert summary['tool.search_reading_type']['errors'] == 0
+        spans = agent.tracer.spans()
+        api_spans = [span for span in spans if span['name'] == 'chat.completions']
+        assert [span['attributes']['tool_choice'] for span in api_spans] == ['auto', 'none'] * 2
+        assert all(span['attributes']['stream'] and span['attributes']['ttft_ms'] is not None for span in api_spans)
+        assert all(span['attributes']['args_bytes'] > 0 and span['attributes']['result_bytes'] > 0
+                   for span in spans)
+
+        path = os.path.join(agent_workdir, "traces.jsonl")
+        assert agent.tracer.export(path) == 7
+        with open(path, encoding="utf-8") as f:
+            assert [json.loads(line)['span_id'] for line in f] == [span['span_id'] for span in spans]
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_api_error_span(self, agent, openai_stub, monkeypatch):
+        """测试API调用失败记为error"""
+        import functools
+        from src import reading_type_agent
+        monkeypatch.setattr(reading_type_agent, 'DEEPSEEK_BASE_URL', "http://127.0.0.1:1/v1")
+        monkeypatch.setattr(reading_type_agent, 'AsyncOpenAI',
+                            functools.partial(reading_type_agent.AsyncOpenAI, max_retries=0))
+        broken = reading_type_agent.ReadingTypeAgent()
+        broken.tracer.enabled = True
+
+        assert (await broken.get_response_async("你好")).startswith("发生错误")
+        span, = broken.tracer.spans()
+        assert span['status'] == 'error' and "Error" in span['error']
+
+
+class TestMetrics:
+    """大模型调用指标测试类"""
+
+    @pytest.mark.integration
+    @pytest.mark.asyncio
+    async def test_call_and_turn_metrics(self, agent, openai_stub):
+        """测试每次API调用和每轮对话的指标"""
+        openai_stub.chunk_delay = 0.005
+        await agent.get_response_async("有功电能", on_token=lambda content: None)
+        with agent.metrics.session("s1"):
+            await agent.get_response_async("你好")
+        agent.get_response("储能", stream=False)
+
+        result = agent.get_metrics("s1")
+        process, session = result["process"], result["session"]
+        assert (process["calls"], process["errors"], process["turns"]) == (5, 0, 3)
+        assert process["tool_rounds"]["total"] == 2
+        assert process["completion_tokens"]["total"] == 5 * 5
+        assert process["prompt_tokens"]["total"] == agent.prompt_cache_meter.summary()["prompt_tokens"]
+        assert process["cached_tokens"]["total"] == agent.prompt_cache_meter.summary()["cached_tokens"]
+        # 流式调用的首token早于流结束
+        assert process["ttft_ms"]["p50"] < process["latency_ms"]["max"]
+        assert (session["calls"], session["turns"], session["tool_rounds"]["max"]) == (1, 1, 0)
@@ -0,0 +1,58 @@
+"""
+性能基准测试套件的冒烟测试
+以最小规模和单轮计时运行全部基准，验证每个基准可执行且结果JSON格式完整
+"""
+
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from tests.benchmarks.harness import BENCHMARKS, compare, make_library, result_id, run_benchmarks
+
+
+class TestBenchmarks:
+    """基准测试套件测试类"""
+
+    @pytest.mark.integration
+    def test_make_library_reproducible(self, temp_dir):
+        """测试相同种子生成相同的编码库"""
+        first, second = os.path.join(temp_dir, "a.csv"), os.path.join(temp_dir, "b.csv")
+        assert make_library(first, 300, seed=7) == 300
+        make_library(second, 300, seed=7)
+
+        with open(first, "rb") as f, open(second, "rb") as g:
+            assert f.read() == g.read()
+        assert pd.read_csv(first, encoding="utf-8-sig")["reading_type_id"].is_unique
+
+    @pytest.mark.integration
+    @pytest.mark.slow
+    def test_run_all_benchmarks(self):
+        """测试所有基准在小规模下运行，结果可序列化并与自身比较"""
+        cwd = os.getcwd()
+        report = run_benchmarks(sizes=[20, 40], repeat=1, min_time=0)
+
+        assert os.getcwd() == cwd
+        groups = {result["group"] for result in report["results"]}
+        assert groups == {"library", "dictionary", "parser", "codec", "agent"}
+        expected = sum(2 if entry["sized"] else 1 for entry in BENCHMARKS.values())
+        assert len(report["results"]) == expected
+        assert len({result_id(result) for result in report["results"]}) == expected
+        assert all(result["median_ms"] > 0 for result in report["results"])
+
+        restored = json.loads(json.dumps(report))
+        assert restored["schema"] == 1 and restored["config"]["sizes"] == [20, 40]
+        assert {row["status"] for row in compare(restored, report)} == {"same"}
+
+    @pytest.mark.integration
+    def test_compare_flags_regression(self):
+        """测试中位数变化超过阈值时标记变慢/变快"""
+        def report(*timings):
+            return {"results": [{"group": "library", "name": name, "size": 500, "median_ms": ms}
+                                for name, ms in timings]}
+
+        rows = compare(report(("a", 10.0), ("b", 10.0), ("c", 10.0)),
+                       report(("a", 13.0), ("b", 7.0), ("c", 11.0), ("d", 1.0)))
+        assert [row["status"] for row in rows] == ["regression", "improvement", "same", "new"]
+        assert rows[0]["id"] == "library.a[500]" and rows[0]["ratio"] == pytest.approx(1.3)
@@ -0,0 +1,96 @@
+"""
+命令行入口集成测试
+在子进程中运行 main.py，验证横幅和输入提示符不等待后台加载，以及 --profile-startup 输出
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from tests import PROJECT_ROOT
+
+
+def run_cli(workdir, *args, stdin="退出\n"):
+    env = dict(os.environ, DEEPSEEK_API_KEY="test-key", PYTHONIOENCODING="utf-8")
+    return subprocess.run([sys.executable, os.path.join(PROJECT_ROOT, "main.py"), *args], input=stdin,
+                          capture_output=True, text=True, encoding="utf-8", cwd=workdir, env=env, timeout=120)
+
+
+@pytest.fixture
+def cli_workdir(temp_dir):
+    for filename in ('reading_type_codes.csv', 'field_dictionaries.csv'):
+        shutil.copy(os.path.join(PROJECT_ROOT, filename), temp_dir)
+    return temp_dir
+
+
+class TestCli:
+    """命令行入口测试类"""
+
+    @pytest.mark.integration
+    def test_prompt_before_loading_finishes(self, cli_workdir):
+        """测试提示符在后台加载完成前出现，需要智能体的命令等待加载完成"""
+        env = dict(os.environ, DEEPSEEK_API_KEY="test-key", PYTHONIOENCODING="utf-8", PYTHONUNBUFFERED="1")
+        process = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "main.py")], cwd=cli_workdir,
+                                   env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                   encoding="utf-8")
+        try:
+            output = ""
+            while "💬" not in output:
+                char = process.stdout.read(1)
+                assert char, output
+                output += char
+            # 提示符出现时后台还在导入模块，数据库状态尚未显示
+            assert "数据库状态" not in output
+            rest, _ = process.communicate("帮助\n统计\n退出\n", timeout=120)
+        finally:
+            process.kill()
+        assert rest.index("ReadingTypeID助手使用指南") < rest.index("📊 数据库状态: ") < \
+            rest.index("ReadingType编码库统计信息")
+
+    @pytest.mark.integration
+    def test_profile_startup(self, cli_workdir):
+        """测试 --profile-startup 报告导入和加载耗时"""
+        result = run_cli(cli_workdir, "--profile-startup")
+        assert result.returncode == 0, result.stderr
+        for step in ("提示符就绪", "导入 openai", "导入 pandas", "创建智能体", "后台加载完成"):
+            assert f"• {step}" in result.stdout
+        assert result.stdout.index("⏱️ 启动耗时") < result.stdout.index("💬")
+
+    @pytest.mark.integration
+    def test_exit_without_waiting(self, cli_workdir):
+        """测试直接退出不需要等待加载完成"""
+        result = run_cli(cli_workdir)
+        assert result.returncode == 0 and "再见" in result.stdout
+        assert "数据库状态" not in result.stdout
+
+    @pytest.mark.integration
+    def test_evaluate_command(self, cli_workdir):
+        """测试 evaluate 命令不进入对话，输出评估结果并保存JSON"""
+        result = run_cli(cli_workdir, "evaluate", "--parsers", "basic", "--workers", "1",
+                         "--output", "evaluation.json", stdin="")
+        assert result.returncode == 0, result.stderr
+        assert "🧪 解析器评估" in result.stdout and "commodity" in result.stdout
+        assert "💬" not in result.stdout
+        with open(os.path.join(cli_workdir, "evaluation.json"), encoding="utf-8") as f:
+            report = json.load(f)
+        assert list(report["parsers"]) == ["basic"] and report["samples"] > 400
+
+    @pytest.mark.integration
+    def test_encode_command(self, cli_workdir):
+        """测试 encode 命令离线编码并报告吞吐量"""
+        with open(os.path.join(cli_workdir, "points.csv"), "w", encoding="utf-8") as f:
+            f.write("description\n有功电能\n储能电池充电累计电量\n")
+        result = run_cli(cli_workdir, "encode", "--input", "points.csv", "--output", "codes_out.csv",
+                         "--workers", "1", stdin="")
+        assert result.returncode == 0, result.stderr
+        assert "✅ 已编码 2 行" in result.stdout and "行/秒" in result.stdout
+        assert "⏳ 已处理 2 行" in result.stderr
+        with open(os.path.join(cli_workdir, "codes_out.csv"), encoding="utf-8") as f:
+            assert [line.split(",")[3] for line in f.read().splitlines()[1:]] == ["library", "generated"]
+
+        missing = run_cli(cli_workdir, "encode", "--input", "missing.csv", "--output", "x.csv", stdin="")
+        assert missing.returncode == 1 and "批量编码失败" in missing.stderr
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+HTTP服务压力测试
+
+在子进程中启动 agent_server (连接本地OpenAI兼容桩服务，不产生API费用)，
+多个客户端线程并发请求，统计每秒请求数和服务进程每CPU秒处理的请求数 (即单核吞吐)。
+
+用法:
+    python tests/load_test.py --clients 16 --seconds 10
+    python tests/load_test.py --scenario tool --seconds 5
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from tests.conftest import OpenAIStubServer  # noqa: E402
+
+# 场景 -> (方法, 路径, 请求体)
+SCENARIOS = {
+    "chat": ("POST", "/api/chat", {"message": "有功电能"}),
+    "stream": ("POST", "/api/chat", {"message": "有功电能", "stream": True}),
+    "tool": ("POST", "/api/tools/search_reading_type", {"name": "电压"}),
+    "health": ("GET", "/api/health", None),
+}
+
+
+def serve(base_url, workdir, ready, start, stop, results):
+    """服务子进程: 启动HTTP服务，记录压测期间的CPU时间"""
+    os.chdir(workdir)
+    sys.path.insert(0, str(PROJECT_ROOT / "src"))
+    from werkzeug.serving import make_server
+
+    from src import reading_type_agent
+    from src.agent_server import AgentService, create_app
+
+    reading_type_agent.DEEPSEEK_API_KEY = "load-test"
+    reading_type_agent.DEEPSEEK_BASE_URL = base_url
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, create_app(AgentService()), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put(server.server_port)
+
+    start.wait()
+    cpu_start = time.process_time()
+    stop.wait()
+    results.put(time.process_time() - cpu_start)
+    server.shutdown()
+
+
+def request(port, method, path, body):
+    """发送一个请求并读完响应，返回状态码"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_load(port, scenario, clients, seconds):
+    """并发压测，返回 {"requests", "errors", "latencies"}"""
+    method, path, body = SCENARIOS[scenario]
+    deadline = time.perf_counter() + seconds
+    stats = {"requests": 0, "errors": 0, "latencies": []}
+    lock = threading.Lock()
+
+    def client():
+        while time.perf_counter() < deadline:
+            begin = time.perf_counter()
+            try:
+                ok = request(port, method, path, body) == 200
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - begin
+            with lock:
+                stats["requests"] += 1
+                stats["errors"] += not ok
+                stats["latencies"].append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP服务压力测试")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chat")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数")
+    parser.add_argument("--seconds", type=float, default=10, help="压测时长(秒)")
+    parser.add_argument("--api-delay", type=float, default=0.05, help="桩服务每次调用的模拟延迟(秒)")
+    args = parser.parse_args()
+
+    stub = OpenAIStubServer(delay=args.api_delay).start()
+    workdir = tempfile.mkdtemp()
+    for filename in ("reading_type_codes.csv", "field_dictionaries.csv"):
+        shutil.copy(PROJECT_ROOT / filename, workdir)
+
+    ready, results = multiprocessing.Queue(), multiprocessing.Queue()
+    start, stop = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(stub.base_url, workdir, ready, start, stop, results))
+    process.start()
+    try:
+        port = ready.get(timeout=60)
+        # 预热: 建立连接池、加载工具定义
+        method, path, body = SCENARIOS[args.scenario]
+        request(port, method, path, body)
+
+        start.set()
+        began = time.perf_counter()
+        stats = run_load(port, args.scenario, args.clients, args.seconds)
+        wall = time.perf_counter() - began
+        stop.set()
+        cpu = results.get(timeout=60)
+    finally:
+        stop.set()
+        process.join(timeout=10)
+        stub.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies = sorted(stats["latencies"]) or [0.0]
+    rps = stats["requests"] / wall
+    print(f"场景: {args.scenario}, 并发: {args.clients}, 时长: {wall:.1f}s, 模拟API延迟: {args.api_delay * 1000:.0f}ms")
+    print(f"请求: {stats['requests']} (失败 {stats['errors']}), 吞吐: {rps:.1f} req/s")
+    print(f"延迟: p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms")
+    print(f"服务进程CPU: {cpu:.2f}s ({cpu / wall:.2f}核), 单核吞吐: {stats['requests'] / cpu:.1f} req/CPU秒"
+          if cpu else "服务进程CPU: 0")
+    return 0 if stats["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+智能体对话轮次公共实现单元测试
+"""
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent_runtime import (ToolCallAssembler, execute_tool_calls, execute_tool_calls_async,
+                           format_tool_report)
+
+
+def make_tool_call(call_id, name, **arguments):
+    """构造与API返回结构一致的工具调用"""
+    return SimpleNamespace(id=call_id, type="function",
+                           function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+class RecordingTools:
+    """按参数休眠并记录执行顺序的工具集合"""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def __call__(self, function_call):
+        args = json.loads(function_call["arguments"])
+        with self.lock:
+            self.events.append(("start", function_call["name"]))
+        time.sleep(args.get("sleep", 0))
+        if args.get("fail"):
+            raise RuntimeError("数据文件不可用")
+        with self.lock:
+            self.events.append(("end", function_call["name"]))
+        return f"{function_call['name']}结果"
+
+
+class TestExecuteToolCalls:
+    """工具调用并发执行测试类"""
+
+    @pytest.mark.unit
+    def test_parallel_results_in_order(self):
+        """测试独立调用并发执行且结果保持原顺序"""
+        tool_calls = [make_tool_call(f"call_{i}", f"tool_{i}", sleep=0.2 - i * 0.05) for i in range(4)]
+        report = execute_tool_calls(tool_calls, RecordingTools())
+
+        assert [result["tool_call"].id for result in report["results"]] == [f"call_{i}" for i in range(4)]
+        assert [result["content"] for result in report["results"]] == [f"tool_{i}结果" for i in range(4)]
+        assert report["serial_elapsed"] >= 0.5
+        assert report["elapsed"] < 0.35
+
+    @pytest.mark.unit
+    def test_failure_isolated(self):
+        """测试单个调用失败不影响其他调用"""
+        tool_calls = [make_tool_call("call_0", "search", sleep=0.01),
+                      make_tool_call("call_1", "query", fail=True),
+                      make_tool_call("call_2", "view")]
+        results = execute_tool_calls(tool_calls, RecordingTools())["results"]
+
+        assert [result["error"] for result in results] == [None, "数据文件不可用", None]
+        assert results[1]["content"] == "错误: 工具 'query' 执行失败: 数据文件不可用"
+        assert results[2]["content"] == "view结果"
+
+    @pytest.mark.unit
+    def test_serial_tools_are_barriers(self):
+        """测试有副作用的工具在前面的调用完成后单独执行"""
+        tools = RecordingTools()
+        tool_calls = [make_tool_call("call_0", "search", sleep=0.05),
+                      make_tool_call("call_1", "add_to_library"),
+                      make_tool_call("call_2", "get_statistics")]
+        execute_tool_calls(tool_calls, tools, serial_tools={"add_to_library"})
+
+        assert tools.events == [("start", "search"), ("end", "search"),
+                                ("start", "add_to_library"), ("end", "add_to_library"),
+                                ("start", "get_statistics"), ("end", "get_statistics")]
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_async_parallel(self):
+        """测试异步版本并发执行且不在事件循环线程中运行工具"""
+        loop_thread = threading.get_ident()
+        tool_threads = set()
+        tools = RecordingTools()
+
+        def handle_function_call(function_call):
+            tool_threads.add(threading.get_ident())
+            return tools(function_call)
+
+        tool_calls = [make_tool_call(f"call_{i}", f"tool_{i}", sleep=0.1) for i in range(3)]
+        tool_calls.append(make_tool_call("call_3", "broken", fail=True))
+        report = await execute_tool_calls_async(tool_calls, handle_function_call)
+
+        assert [result["content"] for result in report["results"][:3]] == [f"tool_{i}结果" for i in range(3)]
+        assert report["results"][3]["error"] == "数据文件不可用"
+        assert report["elapsed"] < 0.25
+        assert loop_thread not in tool_threads
+
+    @pytest.mark.unit
+    def test_format_tool_report(self):
+        """测试耗时报告输出"""
+        tool_calls = [make_tool_call("call_0", "search"), make_tool_call("call_1", "query", fail=True)]
+        lines = format_tool_report(execute_tool_calls(tool_calls, RecordingTools()))
+
+        assert lines[0].startswith("🔧 工具使用: search (")
+        assert lines[1].endswith("❌")
+        assert "2个工具调用耗时" in lines[2]
+        assert format_tool_report(execute_tool_calls(tool_calls[:1], RecordingTools()))[1:] == []
+
+
+def make_delta(index, call_id=None, name=None, arguments=None):
+    """构造流式返回的tool_calls增量"""
+    return SimpleNamespace(index=index, id=call_id, type="function" if call_id else None,
+                           function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class TestToolCallAssembler:
+    """流式工具调用拼接测试类"""
+
+    @pytest.mark.unit
+    def test_assemble_and_complete_early(self):
+        """测试按index拼接参数，下一个调用开始时前一个调用即完成"""
+        completed = []
+        assembler = ToolCallAssembler(completed.append)
+
+        assembler.add([make_delta(0, "call_0", "search_reading_type", "")])
+        assembler.add([make_delta(0, arguments='{"name": ')])
+        assembler.add([make_delta(0, arguments='"有功电能"}')])
+        assert completed == []
+
+        assembler.add([make_delta(1, "call_1", "query_dictionary", '{"field_name"'),
+                       make_delta(1, arguments=': "uom"}')])
+        assert [tool_call.id for tool_call in completed] == ["call_0"]
+        assert json.loads(completed[0].function.arguments) == {"name": "有功电能"}
+
+        tool_calls = assembler.finish()
+        assert [tool_call.id for tool_call in completed] == ["call_0", "call_1"]
+        assert tool_calls == completed
+        assert tool_calls[1].function.name == "query_dictionary"
+        assert json.loads(tool_calls[1].function.arguments) == {"field_name": "uom"}
+
+    @pytest.mark.unit
+    def test_no_tool_calls(self):
+        """测试没有工具调用时不触发回调"""
+        completed = []
+        assert ToolCallAssembler(completed.append).finish() == []
+        assert completed == []
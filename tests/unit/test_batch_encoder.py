@@ -0,0 +1,89 @@
+"""
+离线批量编码单元测试
+"""
+
+import csv
+import os
+
+import pytest
+
+from batch_encoder import OUTPUT_COLUMNS, Resolver, encode_file, find_column
+from tests import PROJECT_ROOT
+
+CODES_FILE = os.path.join(PROJECT_ROOT, 'reading_type_codes.csv')
+DICTIONARIES_FILE = os.path.join(PROJECT_ROOT, 'field_dictionaries.csv')
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_output(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.fixture
+def points_file(temp_dir):
+    """测点表: 编码库中的名称、需要生成的描述和空描述交替出现"""
+    descriptions = ["有功电能", "储能电池充电累计电量", "", "A相电压", "B相电流3次谐波有效值"]
+    path = os.path.join(temp_dir, 'points.csv')
+    write_csv(path, ["编号", "名称"], [[i, descriptions[i % len(descriptions)]] for i in range(53)])
+    return path
+
+
+class TestBatchEncoder:
+    """批量编码测试类"""
+
+    @pytest.mark.unit
+    def test_resolver(self):
+        """测试编码库精确匹配优先，否则本地生成"""
+        resolver = Resolver(CODES_FILE, DICTIONARIES_FILE)
+        assert resolver.resolve("有功电能") == ("0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0", "library", "有功电能", True, "")
+
+        reading_type_id, source, matched, valid, _ = resolver.resolve("储能电池充电累计电量")
+        assert source == "generated" and matched == "" and len(reading_type_id.split("-")) == 16
+        assert resolver.resolve("") == ("", "empty", "", False, "描述为空")
+
+    @pytest.mark.unit
+    def test_find_column(self):
+        """测试描述列的识别"""
+        assert find_column(["编号", "名称"]) == 1
+        assert find_column(["id", "Description", "name"]) == 1
+        assert find_column(["a", "b"]) == 0
+        assert find_column(["a", "b"], "2") == 1
+        assert find_column(["a", "b"], "b") == 1
+        with pytest.raises(ValueError):
+            find_column(["a", "b"], "c")
+
+    @pytest.mark.unit
+    def test_encode_file(self, points_file, temp_dir):
+        """测试结果按输入顺序写入，统计各来源的行数"""
+        output = os.path.join(temp_dir, 'codes.csv')
+        reports = []
+        stats = encode_file(points_file, output, codes_file=CODES_FILE, dictionaries_file=DICTIONARIES_FILE,
+                            workers=1, chunk_size=10, progress=reports.append)
+
+        assert stats["rows"] == 53
+        assert (stats["library"], stats["generated"], stats["empty"]) == (21, 21, 11)
+        assert reports and reports[-1] is stats
+
+        rows = read_output(output)
+        assert list(rows[0]) == list(OUTPUT_COLUMNS)
+        assert [row["row"] for row in rows] == [str(i) for i in range(2, 55)]
+        assert rows[0]["source"] == "library" and rows[0]["matched_name"] == "有功电能"
+        assert rows[2]["source"] == "empty" and rows[2]["reading_type_id"] == ""
+
+    @pytest.mark.unit
+    def test_parallel_matches_serial(self, points_file, temp_dir):
+        """测试进程池并行编码与单进程结果一致"""
+        serial, parallel = os.path.join(temp_dir, 'serial.csv'), os.path.join(temp_dir, 'parallel.csv')
+        encode_file(points_file, serial, codes_file=CODES_FILE, dictionaries_file=DICTIONARIES_FILE,
+                    workers=1, chunk_size=7)
+        stats = encode_file(points_file, parallel, codes_file=CODES_FILE, dictionaries_file=DICTIONARIES_FILE,
+                            workers=2, chunk_size=7)
+        assert stats["rows"] == 53
+        assert read_output(serial) == read_output(parallel)
@@ -0,0 +1,163 @@
+"""
+补全缓存单元测试
+"""
+
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from completion_cache import (AsyncCachedClient, CachedClient, CompletionCache, is_deterministic,
+                              normalize_messages, request_key)
+from metrics import LLMMetrics
+
+
+def make_request(question, call_id="call_abc", **params):
+    """一次带工具结果的第二次调用请求"""
+    return dict({
+        "model": "deepseek-chat",
+        "messages": [
+            {"role": "system", "content": "系统提示"},
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": None, "tool_calls": [
+                {"id": call_id, "type": "function",
+                 "function": {"name": "search_reading_type", "arguments": '{"name": "有功电能", "limit": 5}'}}]},
+            {"role": "tool", "tool_call_id": call_id, "content": "找到1个编码"},
+        ],
+        "tools": [{"type": "function", "function": {"name": "search_reading_type"}}],
+    }, **params)
+
+
+@pytest.fixture
+def cache(temp_dir):
+    cache = CompletionCache(os.path.join(temp_dir, "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+class TestRequestKey:
+    """缓存键测试类"""
+
+    @pytest.mark.unit
+    def test_equivalent_requests_share_key(self):
+        """测试空白、工具调用ID、参数键顺序和传输参数不影响缓存键"""
+        request = make_request("生成A相电压编码")
+        variant = make_request("  生成A相电压编码\n", call_id="call_xyz", stream=True,
+                               stream_options={"include_usage": True})
+        variant["messages"][2]["tool_calls"][0]["function"]["arguments"] = '{"limit":5,"name":"有功电能"}'
+
+        assert request_key(request) == request_key(variant)
+        assert normalize_messages(variant["messages"])[3]["tool_call_id"] == "#0"
+
+    @pytest.mark.unit
+    def test_different_requests_differ(self):
+        """测试问题、模型、工具结果和采样参数不同时缓存键不同"""
+        key = request_key(make_request("生成A相电压编码"))
+        other_result = make_request("生成A相电压编码")
+        other_result["messages"][3]["content"] = "找到2个编码"
+
+        assert key != request_key(make_request("生成B相电压编码"))
+        assert key != request_key(make_request("生成A相电压编码", model="deepseek-reasoner"))
+        assert key != request_key(other_result)
+        assert key != request_key(make_request("生成A相电压编码", max_tokens=100))
+
+    @pytest.mark.unit
+    def test_sampling_opt_out(self, temp_dir):
+        """测试显式随机采样的请求默认不使用缓存"""
+        assert is_deterministic({}) and is_deterministic({"temperature": 0, "top_p": 1})
+        assert not is_deterministic({"temperature": 0.7})
+        assert not is_deterministic({"n": 3})
+
+        cache = CompletionCache(os.path.join(temp_dir, "cache.sqlite3"))
+        assert cache.key_for(make_request("问题", temperature=1.0)) is None
+        assert cache.stats()["skipped"] == 1
+        sampled = CompletionCache(os.path.join(temp_dir, "cache.sqlite3"), cache_sampled=True)
+        assert sampled.key_for(make_request("问题", temperature=1.0)) is not None
+
+
+class TestCompletionCache:
+    """SQLite缓存测试类"""
+
+    @pytest.mark.unit
+    def test_put_get_and_stats(self, cache, temp_dir):
+        """测试写入、命中、未命中统计，且缓存可被其他实例读取"""
+        message = {"content": "已完成", "tool_calls": None, "finish_reason": "stop"}
+        assert cache.get("k1") is None
+        cache.put("k1", message)
+
+        assert cache.get("k1") == message
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["stores"], stats["entries"]) == (1, 1, 1, 1)
+        assert stats["hit_ratio"] == 0.5
+        assert CompletionCache(os.path.join(temp_dir, "cache.sqlite3")).get("k1") == message
+        assert "命中 1/2" in cache.format_stats()[0]
+
+    @pytest.mark.unit
+    def test_ttl_expiry(self, cache):
+        """测试过期条目不再命中并被删除"""
+        cache.put("k1", {"content": "旧回复"})
+        cache.ttl = -1
+        assert cache.get("k1") is None
+        assert cache.stats()["entries"] == 0
+
+    @pytest.mark.unit
+    def test_evict_least_recently_used(self, temp_dir):
+        """测试超出条数和字节上限时淘汰最久未使用的条目"""
+        cache = CompletionCache(os.path.join(temp_dir, "cache.sqlite3"), max_entries=2)
+        cache.put("k1", {"content": "一"})
+        cache.put("k2", {"content": "二"})
+        cache.get("k1")
+        cache.put("k3", {"content": "三"})
+        assert cache.get("k2") is None
+        assert cache.get("k1") is not None and cache.get("k3") is not None
+
+        cache.max_bytes = 40
+        cache.put("k4", {"content": "四" * 5})
+        assert cache.stats()["entries"] == 1 and cache.get("k4") is not None
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_async_lookup_does_not_block_loop(self, cache):
+        """测试异步客户端在线程中读缓存，SQLite变慢时事件循环上的其他会话照常运行"""
+        request = make_request("有功电能的编码")
+        cache.put(cache.key_for(request), {"content": "已缓存", "tool_calls": None, "finish_reason": "stop"})
+        get = cache.get
+        cache.get = lambda key: time.sleep(0.2) or get(key)
+        client = AsyncCachedClient(SimpleNamespace(chat=SimpleNamespace(completions=None)), cache)
+
+        ticks = []
+
+        async def other_session():
+            while len(ticks) < 10:
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        response, _ = await asyncio.gather(client.chat.completions.create(**request), other_session())
+        assert response.choices[0].message.content == "已缓存"
+        # 读缓存的0.2秒内其他协程持续运行
+        assert ticks[-1] - start < 0.2
+
+    @pytest.mark.unit
+    def test_lookups_recorded_in_metrics(self, cache):
+        """测试传入指标时缓存命中和未命中都计入当前会话，命中不调用API"""
+        api_calls = []
+
+        def create(**params):
+            api_calls.append(params)
+            message = SimpleNamespace(content="新回复", tool_calls=None)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+        metrics = LLMMetrics()
+        client = CachedClient(SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))),
+                              cache, metrics)
+        with metrics.session("s"):
+            client.chat.completions.create(**make_request("有功电能的编码"))
+            response = client.chat.completions.create(**make_request("有功电能的编码"))
+
+        assert response.choices[0].message.content == "新回复" and len(api_calls) == 1
+        session = metrics.get_metrics("s")["session"]
+        assert (session["cache_hits"], session["cache_misses"]) == (1, 1)
+        assert session["cache_hit_ms"]["count"] == 1
@@ -219,4 +219,51 @@ class TestDictionaryManager:
         results = dict_manager.fuzzy_search("功")
         # 应该返回包含"功"字的所有相关字段值
         assert isinstance(results, list)
-        assert len(results) > 0 
\ No newline at end of file
+        assert len(results) > 0 
+
+class TestDecodeMany:
+    """批量解码测试类 (使用实际的字典文件)"""
+
+    @pytest.fixture
+    def manager(self, temp_dir):
+        """字典文件的副本 (add_custom_value 会写回文件)"""
+        import shutil
+        from dictionary_manager import DictionaryManager
+        from tests import PROJECT_ROOT
+
+        path = os.path.join(temp_dir, 'field_dictionaries.csv')
+        shutil.copy(os.path.join(PROJECT_ROOT, 'field_dictionaries.csv'), path)
+        return DictionaryManager(path)
+
+    @pytest.mark.unit
+    def test_decode_known_id(self, manager):
+        """测试解码结果与逐个查询字段说明一致"""
+        reading_type_id = "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0"
+        row = next(manager.decode_many([reading_type_id]))
+        assert row["reading_type_id"] == reading_type_id and row["valid"] is True
+        assert row["measurementKind"] == manager.get_field_description("measurementKind", "12")
+        assert row["uom"] == manager.get_field_description("uom", "72")
+        assert len(row) == 18
+
+    @pytest.mark.unit
+    def test_invalid_ids_and_order(self, manager):
+        """测试非法编码的字段为空，迭代器输入跨块时保持顺序"""
+        ids = ["0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0", "1-2-3", "0-0-0-0-1-1-54-0-0-0-0-0-0-0-29-0"] * 5
+        rows = list(manager.decode_many(iter(ids), chunk_size=4))
+        assert [row["reading_type_id"] for row in rows] == ids
+        assert [row["valid"] for row in rows] == [True, False, True] * 5
+        assert rows[1]["measurementKind"] == "" and rows[1]["uom"] == ""
+        assert rows[2]["uom"] == manager.get_field_description("uom", "29")
+
+    @pytest.mark.unit
+    def test_custom_value_invalidates_cache(self, manager):
+        """测试添加自定义值后解码结果更新"""
+        reading_type_id = "99-0-0-0-0-0-0-0-0-0-0-0-0-0-0-0"
+        assert manager.validate_field_value("macroPeriod", "99") is False
+        assert next(manager.decode_many([reading_type_id]))["macroPeriod"] == "值: 99"
+
+        success, _ = manager.add_custom_value("macroPeriod", "99", "测试周期", "测试")
+        assert success is True
+        assert manager.validate_field_value("macroPeriod", "99") is True
+        assert next(manager.decode_many([reading_type_id]))["macroPeriod"] == "测试周期"
+        assert manager.add_custom_value("macroPeriod", "99", "重复", "")[0] is False
@@ -0,0 +1,114 @@
+"""
+操作历史记录器单元测试
+"""
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from history_logger import HistoryLogger, get_history_logger
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestHistoryLogger:
+    """历史记录器测试类"""
+
+    @pytest.mark.unit
+    def test_batched_background_writes(self, temp_dir):
+        """测试记录先进入队列，由后台线程批量写入"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path, flush_interval=10)
+        for i in range(5):
+            assert logger.log("search", f"电压{i}", "结果")
+        assert not os.path.exists(path)
+
+        assert logger.flush(timeout=5)
+        records = read_records(path)
+        assert [record["input"] for record in records] == [f"电压{i}" for i in range(5)]
+        assert records[0]["operation"] == "search" and records[0]["user_action"] == "pending"
+        assert logger.stats()["batches"] == 1 and logger.stats()["written"] == 5
+        logger.close()
+
+    @pytest.mark.unit
+    def test_batch_size_triggers_write(self, temp_dir):
+        """测试攒够一批时不等间隔立即写入"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path, flush_interval=10, batch_size=3)
+        for i in range(3):
+            logger.log("search", str(i))
+        deadline = time.time() + 5
+        while logger.stats()["written"] < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert len(read_records(path)) == 3
+        logger.close()
+
+    @pytest.mark.unit
+    def test_special_characters_and_truncation(self, temp_dir):
+        """测试逗号、引号和换行不破坏文件，过长的结果被截断"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path)
+        text = '有功,无功 "电能"\n第二行'
+        logger.log("generate", text, "x" * 500, extra_field=1)
+        logger.close()
+
+        record, = read_records(path)
+        assert record["input"] == text
+        assert record["result"] == "x" * 200 + "..." and record["result_length"] == 500
+        assert record["extra_field"] == 1
+
+    @pytest.mark.unit
+    def test_rotation(self, temp_dir):
+        """测试文件超过大小时轮转，只保留指定数量的旧文件"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path, max_bytes=300, backup_count=2)
+        for i in range(20):
+            logger.log("search", f"量测{i}", "结果")
+            logger.flush()
+        logger.close()
+
+        assert os.path.exists(path + ".1") and os.path.exists(path + ".2")
+        assert not os.path.exists(path + ".3")
+        assert all(os.path.getsize(name) <= 300 for name in (path, path + ".1", path + ".2"))
+        assert read_records(path)[-1]["input"] == "量测19"
+
+    @pytest.mark.unit
+    def test_full_queue_drops(self, temp_dir):
+        """测试队列已满时丢弃新记录而不阻塞"""
+        logger = HistoryLogger(os.path.join(temp_dir, "history.jsonl"), max_queue=2, flush_interval=10)
+        gate = threading.Lock()
+        gate.acquire()
+        logger._file_lock.acquire()  # 阻塞后台写入
+        try:
+            results = [logger.log("search", str(i)) for i in range(2)]
+            logger.flush(timeout=0.2)
+            results += [logger.log("search", str(i)) for i in range(2, 6)]
+        finally:
+            logger._file_lock.release()
+        assert results[:2] == [True, True] and results.count(False) >= 2
+        assert logger.stats()["dropped"] == results.count(False)
+        logger.close()
+
+    @pytest.mark.unit
+    def test_close_flushes_and_later_writes_are_synchronous(self, temp_dir):
+        """测试关闭时写完队列，关闭后的记录直接写入"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path, flush_interval=10)
+        logger.log("search", "关闭前")
+        logger.close()
+        logger.log("search", "关闭后")
+        assert [record["input"] for record in read_records(path)] == ["关闭前", "关闭后"]
+
+    @pytest.mark.unit
+    def test_shared_logger_per_file(self, temp_dir, monkeypatch):
+        """测试同一文件共用一个记录器"""
+        monkeypatch.chdir(temp_dir)
+        logger = get_history_logger("shared.jsonl")
+        assert get_history_logger(os.path.join(temp_dir, "shared.jsonl")) is logger
+        assert get_history_logger("other.jsonl") is not logger
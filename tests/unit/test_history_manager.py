@@ -0,0 +1,89 @@
+"""
+对话历史压缩单元测试
+"""
+
+import pytest
+
+from history_manager import SUMMARY_PREFIX, HistoryManager, estimate_tokens
+
+
+def make_turn(i, listing_size=2000):
+    """一轮带工具调用的对话，工具输出为较长的编码列表"""
+    return [
+        {"role": "user", "content": f"查看第{i}页编码"},
+        {"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{i}", "type": "function",
+             "function": {"name": "view_codes_library", "arguments": f'{{"page": {i}}}'}}]},
+        {"role": "tool", "tool_call_id": f"call_{i}", "content": "📋 ID: 0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0\n" * (listing_size // 40)},
+        {"role": "assistant", "content": f"这是第{i}页的编码列表。"},
+    ]
+
+
+class TestHistoryManager:
+    """对话历史压缩测试类"""
+
+    @pytest.mark.unit
+    def test_estimate_tokens(self):
+        """测试中英文token估算"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("有功电能") == 3
+        assert estimate_tokens("a" * 100) == 31
+
+    @pytest.mark.unit
+    def test_within_budget_untouched(self):
+        """测试未超出预算时不做修改"""
+        messages = [{"role": "system", "content": "系统提示"}] + make_turn(1, 200)
+        original = [dict(message) for message in messages]
+        stats = HistoryManager(max_tokens=4000).compact(messages)
+        assert messages == original
+        assert stats["before"] == stats["after"]
+
+    @pytest.mark.unit
+    def test_stale_tool_outputs_truncated(self):
+        """测试较早轮次的工具输出被截断，系统提示和最近轮次原样保留"""
+        system = {"role": "system", "content": "系统提示" * 100}
+        turns = [make_turn(i) for i in range(4)]
+        messages = [system] + [message for turn in turns for message in turn]
+        manager = HistoryManager(max_tokens=2500, keep_recent_turns=2, stale_tool_chars=100)
+
+        stats = manager.compact(messages)
+
+        assert messages[0] is system
+        assert messages[-8:] == turns[2] + turns[3]
+        stale_tools = [message for message in messages[:-8] if message["role"] == "tool"]
+        assert len(stale_tools) == 2
+        assert all(message["content"].endswith("字]") and len(message["content"]) < 130
+                   for message in stale_tools)
+        assert stats["elided"] == 2 and stats["folded_turns"] == 0
+        assert stats["after"] <= 2500
+
+    @pytest.mark.unit
+    def test_fold_into_summary(self):
+        """测试超出预算时最早的轮次折叠为摘要，多次压缩后token保持平稳"""
+        manager = HistoryManager(max_tokens=1500, keep_recent_turns=1, max_summary_lines=5)
+        messages = [{"role": "system", "content": "系统提示"}]
+        sizes = []
+        for i in range(30):
+            messages.extend(make_turn(i))
+            sizes.append(manager.compact(messages)["after"])
+
+        assert messages[0]["content"] == "系统提示"
+        summary = messages[1]["content"]
+        assert summary.startswith(SUMMARY_PREFIX)
+        assert "(更早的" in summary and "view_codes_library" in summary
+        assert summary.count("\n- 用户") == 5
+        assert messages[-4:] == make_turn(29)
+        # 工具调用消息与工具结果保持配对
+        roles = [message["role"] for message in messages[2:]]
+        assert roles[0] == "user"
+        assert all(1000 < size <= 1500 for size in sizes[5:])
+
+    @pytest.mark.unit
+    def test_drop_without_summary(self):
+        """测试关闭摘要时直接丢弃最早的轮次"""
+        manager = HistoryManager(max_tokens=1500, keep_recent_turns=1, summarize=False)
+        messages = [message for i in range(5) for message in make_turn(i)]
+        manager.compact(messages)
+        assert all(not (message.get("content") or "").startswith(SUMMARY_PREFIX) for message in messages)
+        assert messages[0]["role"] == "user" and messages[-4:] == make_turn(4)
+        assert manager.count_tokens(messages) <= 1500
@@ -0,0 +1,133 @@
+"""
+操作历史查询单元测试
+"""
+
+import datetime
+import json
+import os
+
+import pytest
+
+from history_logger import HistoryLogger
+from history_reader import HistoryReader, time_key
+
+START = datetime.datetime(2025, 6, 10)
+
+
+def write_records(path, records):
+    """按 HistoryLogger 的格式追加记录"""
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def make_record(minutes, operation="search", input_text="电压", result="ok"):
+    timestamp = (START + datetime.timedelta(minutes=minutes)).isoformat(timespec="milliseconds")
+    return {"timestamp": timestamp, "operation": operation, "input": input_text, "result": result,
+            "result_length": len(result), "user_action": "pending"}
+
+
+@pytest.fixture
+def rotated_history(temp_dir):
+    """三个文件 (.2、.1 和当前文件)，每个文件一天、每小时一条记录"""
+    path = os.path.join(temp_dir, "history.jsonl")
+    for day, segment in enumerate((path + ".2", path + ".1", path)):
+        write_records(segment, [
+            make_record(day * 1440 + hour * 60,
+                        operation="generate" if hour % 3 == 0 else "search",
+                        input_text=f"描述{hour % 4}",
+                        result="❌ 生成失败" if hour == 5 else "ok")
+            for hour in range(24)
+        ])
+    return path
+
+
+class TestHistoryReader:
+    """历史查询测试类"""
+
+    @pytest.mark.unit
+    def test_segments_oldest_first(self, rotated_history):
+        """测试轮转文件按时间从旧到新排列"""
+        reader = HistoryReader(rotated_history)
+        assert reader.segments() == [rotated_history + ".2", rotated_history + ".1", rotated_history]
+
+    @pytest.mark.unit
+    def test_time_range_scan(self, rotated_history):
+        """测试时间范围跨文件扫描，起点包含、终点不包含"""
+        reader = HistoryReader(rotated_history, index_every=5)
+        records = list(reader.scan("2025-06-10T22:00", "2025-06-11T03:00"))
+
+        assert [record["timestamp"][11:16] for record in records] == \
+            ["22:00", "23:00", "00:00", "01:00", "02:00"]
+        assert len(list(reader.scan())) == 72
+        assert len(list(reader.scan(since=datetime.date(2025, 6, 12)))) == 24
+        assert list(reader.scan(since="2025-06-13")) == []
+
+    @pytest.mark.unit
+    def test_sparse_index(self, rotated_history):
+        """测试每个文件按间隔建立索引点"""
+        reader = HistoryReader(rotated_history, index_every=10)
+        list(reader.scan(since="2025-06-12"))
+        assert reader.stats() == {"segments": 3, "records": 72, "index_points": 9}
+
+    @pytest.mark.unit
+    def test_streaming_aggregations(self, rotated_history):
+        """测试操作类型计数、最常见输入和失败记录"""
+        reader = HistoryReader(rotated_history)
+        assert reader.count_operations() == {"search": 48, "generate": 24}
+        assert reader.count_operations(since="2025-06-11", until="2025-06-11T06:00") == \
+            {"generate": 2, "search": 4}
+        assert reader.top_inputs(2, operation="generate") == [("描述0", 6), ("描述3", 6)]
+
+        summary = reader.summarize(since="2025-06-11", until="2025-06-12", top=1)
+        assert summary["total"] == 24
+        assert summary["first"].startswith("2025-06-11T00:00")
+        assert summary["top_inputs"] == [("描述0", 6)]
+        assert summary["failed"] == 1
+        assert summary["failures"][0]["timestamp"].startswith("2025-06-11T05:00")
+        assert [record["input"] for record in reader.scan(failed=True)] == ["描述1"] * 3
+
+    @pytest.mark.unit
+    def test_growing_file_and_rotation(self, temp_dir):
+        """测试当前文件增长时补充索引，轮转后已建立的索引继续使用"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        reader = HistoryReader(path, index_every=2)
+        assert list(reader.scan()) == []
+
+        write_records(path, [make_record(i) for i in range(3)])
+        # 写入中的不完整行不返回
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"timestamp": "2025-06-10T09')
+        assert len(list(reader.scan())) == 3
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(':00:00.000", "operation": "add", "input": "x", "result": ""}\n')
+        assert [record["operation"] for record in reader.scan()] == ["search"] * 3 + ["add"]
+        assert reader.stats()["records"] == 4
+
+        os.replace(path, path + ".1")
+        write_records(path, [make_record(120, operation="generate")])
+        assert reader.count_operations() == {"search": 3, "add": 1, "generate": 1}
+        assert reader.stats() == {"segments": 2, "records": 5, "index_points": 3}
+
+    @pytest.mark.unit
+    def test_reads_logger_output(self, temp_dir):
+        """测试读取 HistoryLogger 写入并轮转的文件"""
+        path = os.path.join(temp_dir, "history.jsonl")
+        logger = HistoryLogger(path, max_bytes=2000, batch_size=1)
+        for i in range(30):
+            logger.log("search", f"电能{i % 3}", "结果" * 20)
+            logger.flush(timeout=5)
+        logger.close()
+
+        reader = HistoryReader(path)
+        assert len(reader.segments()) > 1
+        assert reader.count_operations() == {"search": 30}
+        assert reader.top_inputs(1)[0][1] == 10
+
+    @pytest.mark.unit
+    def test_time_key(self):
+        """测试时间边界的格式"""
+        assert time_key(datetime.datetime(2025, 6, 12, 8, 30)) == "2025-06-12T08:30:00.000"
+        assert time_key(datetime.date(2025, 6, 12)) == "2025-06-12"
+        assert time_key("2025-06-12 08:30") == "2025-06-12T08:30"
+        assert time_key(None) is None
@@ -0,0 +1,78 @@
+"""
+本地意图路由单元测试
+"""
+
+import pytest
+
+from intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    fields = [('commodity', '商品类型'), ('measurementKind', '测量类型'), ('uom', '单位')]
+    return IntentRouter(fields, lambda: ['表计', '储能', '告警'])
+
+
+class TestIntentRouter:
+    """意图路由测试类"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text,expected", [
+        ("搜索有功电能", ("search_reading_type", {"name": "有功电能"})),
+        ("查找 储能 ", ("search_reading_type", {"name": "储能"})),
+        ("搜索A相电压的编码", ("search_reading_type", {"name": "A相电压"})),
+        ("查询commodity字段", ("query_dictionary", {"field_name": "commodity"})),
+        ("查询字典 measurementkind", ("query_dictionary", {"field_name": "measurementKind"})),
+        ("查询单位字段", ("query_dictionary", {"field_name": "uom"})),
+        ("查询字典", ("query_dictionary", {})),
+        ("查看编码库", ("view_codes_library", {})),
+        ("查看编码库第3页", ("view_codes_library", {"page": 3})),
+        ("查看表计类编码", ("view_codes_library", {"category": "表计"})),
+        ("统计", ("get_statistics", {})),
+        ("统计信息。", ("get_statistics", {})),
+    ])
+    def test_explicit_commands(self, router, text, expected):
+        """测试明确命令映射为工具调用"""
+        assert router.route(text) == expected
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text", [
+        "",
+        "你好",
+        "生成储能充电功率编码",
+        "搜索有功电能并生成无功电能编码",
+        "搜索有功电能是什么？",
+        "查询有功电能",
+        "查询voltage字段",
+        "查看光伏类编码",
+        "导出",
+        "导出数据",
+        "导出告警类数据为JSON",
+        "我需要电压测量编码",
+        "搜索有功电能\n无功电能",
+        "搜索有功电能和无功电能",
+        "搜索有功电能与无功电能",
+        "搜索电压及电流",
+        "搜索电压、电流",
+        "搜索电压,电流",
+        "搜索电压，电流的编码",
+    ])
+    def test_ambiguous_falls_through(self, router, text):
+        """测试含糊、复合或会写文件的输入交给大模型"""
+        assert router.route(text) is None
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("text,expected", [
+        ("有功电能", [("search_reading_type", {"name": "有功电能"})]),
+        ("查找 A相电压 编码", [("search_reading_type", {"name": "A相电压"})]),
+        ("有功电能和储能", [("search_reading_type", {"name": "有功电能"}),
+                       ("search_reading_type", {"name": "储能"})]),
+        ("帮我生成一个储能充电功率的编码", [("generate_reading_type", {"description": "储能充电功率"})]),
+        ("你好", []),
+        ("A相电压是什么？", []),
+        ("请帮我看看\n有功电能", []),
+        ("我需要一个" + "很长的描述" * 10, []),
+    ])
+    def test_predict_tool_calls(self, router, text, expected):
+        """测试预测大模型可能发起的只读工具调用"""
+        assert router.predict(text) == expected
@@ -0,0 +1,94 @@
+"""
+合成编码库生成器单元测试
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from library_generator import COLUMNS, LibraryGenerator, SeenFilter, generate_library, row_keys
+from reading_type_database import ReadingTypeDatabase
+from tests import PROJECT_ROOT
+
+DICTIONARIES_FILE = os.path.join(PROJECT_ROOT, "field_dictionaries.csv")
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return LibraryGenerator(DICTIONARIES_FILE, seed=1)
+
+
+class TestLibraryGenerator:
+    """合成编码库生成器测试类"""
+
+    @pytest.mark.unit
+    def test_deterministic_from_seed(self, generator):
+        """测试相同种子生成相同的编码，不同种子不同"""
+        first = list(generator.iter_codes(200))
+        assert first == list(generator.iter_codes(200))
+        assert first != list(LibraryGenerator(DICTIONARIES_FILE, seed=2).iter_codes(200))
+
+    @pytest.mark.unit
+    def test_codes_consistent_with_dictionaries(self, generator, temp_dir):
+        """测试生成的编码库通过一致性审计: 字段值在字典内、满足组合规则、单位与名称一致、无重复"""
+        codes_file = os.path.join(temp_dir, "codes.csv")
+        assert generate_library(codes_file, 3000, seed=5, dictionaries_file=DICTIONARIES_FILE) == 3000
+
+        df = pd.read_csv(codes_file, encoding="utf-8-sig")
+        assert list(df.columns) == COLUMNS
+        assert df["id"].tolist() == list(range(1, 3001))
+        assert set(df["category"]) <= {"表计", "储能", "告警", "其他"}
+
+        database = ReadingTypeDatabase(codes_file, DICTIONARIES_FILE, os.path.join(temp_dir, "history.csv"))
+        summary = database.audit()["summary"]
+        for check in ("invalid_ids", "field_column_mismatches", "unknown_values",
+                      "rule_violations", "name_mismatches", "duplicate_ids"):
+            assert summary[check] == 0, check
+
+    @pytest.mark.unit
+    def test_names_describe_fields(self, generator):
+        """测试名称和说明由字段值合成"""
+        for code in generator.iter_codes(300):
+            if code["field_7"] == 12:
+                assert "电能" in code["name"]
+                assert code["description"].endswith(("Wh", "kWh", "MWh"))
+            if code["field_13"] == 128:
+                assert "A相" in code["name"]
+            assert code["description"].startswith(code["name"])
+
+    @pytest.mark.unit
+    def test_exhausted_combinations(self, generator):
+        """测试组合空间用尽时报错而不是生成重复编码"""
+        small = LibraryGenerator(DICTIONARIES_FILE, seed=1)
+        small.profiles, small.profile_weights = [(41, 11)], [1.0]
+        with pytest.raises(ValueError):
+            list(small.iter_codes(2))
+
+
+class TestSeenFilter:
+    """布隆过滤器测试类"""
+
+    @pytest.mark.unit
+    def test_add(self):
+        seen = SeenFilter(1000)
+        keys = np.arange(1000, dtype=np.uint64)
+        assert seen.add(keys).sum() >= 990
+        assert not seen.add(keys).any()
+
+    @pytest.mark.unit
+    def test_duplicates_in_batch(self):
+        """测试同一批内重复的键只有第一个算新键"""
+        seen = SeenFilter(100)
+        assert seen.add(np.array([7, 8, 7, 7], dtype=np.uint64)).tolist() == [True, True, False, False]
+
+    @pytest.mark.unit
+    def test_row_keys(self):
+        """测试字段矩阵的哈希键: 相同行相同，改动任一字段不同"""
+        matrix = np.zeros((17, 16), dtype=np.int64)
+        for column in range(16):
+            matrix[column + 1, column] = 1
+        keys = row_keys(matrix)
+        assert len(set(keys.tolist())) == 17
+        assert row_keys(matrix[:1])[0] == keys[0]
@@ -0,0 +1,162 @@
+"""
+大模型调用指标单元测试
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import AsyncMeteredClient, LLMMetrics, MeteredClient, Series
+
+
+def usage(prompt_tokens=100, completion_tokens=5, cached=60):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           prompt_cache_hit_tokens=cached)
+
+
+def chunk(content=None, chunk_usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))] if content else []
+    return SimpleNamespace(choices=choices, usage=chunk_usage)
+
+
+class FakeCompletions:
+    """按参数返回完整回复或流式片段的补全接口"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def create(self, **params):
+        if self.fail:
+            raise ConnectionError("连接失败")
+        if params.get("stream"):
+            return iter([chunk(), chunk("已"), chunk("完成"), chunk(chunk_usage=usage())])
+        return SimpleNamespace(choices=[], usage=usage(200, 10, 0))
+
+
+class AsyncFakeCompletions(FakeCompletions):
+    async def create(self, **params):
+        result = super().create(**params)
+        if not params.get("stream"):
+            return result
+
+        async def replay():
+            for item in result:
+                yield item
+        return replay()
+
+
+class TestLLMMetrics:
+    """调用指标测试类"""
+
+    @pytest.mark.unit
+    def test_series_quantiles(self):
+        """测试分位数基于最近的样本，累计值包含全部样本"""
+        series = Series(window=100)
+        for value in range(1, 201):
+            series.add(value)
+        summary = series.summary()
+        assert summary["count"] == 200 and summary["total"] == sum(range(1, 201))
+        assert (summary["p50"], summary["p95"], summary["p99"]) == (150, 195, 199)
+        assert summary["max"] == 200
+        assert Series(10).summary()["p99"] == 0.0
+
+    @pytest.mark.unit
+    def test_process_and_session_aggregates(self):
+        """测试进程汇总包含全部调用，会话汇总只包含该会话的调用"""
+        metrics = LLMMetrics(max_sessions=2)
+        metrics.record_call(0.1, 0.5, usage())
+        with metrics.session("a"):
+            metrics.record_call(0.2, 1.0, usage(300, 20, 0))
+            metrics.record_turn(2)
+        metrics.record_call(None, 0.3, error=True, session_id="b")
+
+        result = metrics.get_metrics("a")
+        process, session = result["process"], result["session"]
+        assert (process["calls"], process["errors"], process["turns"]) == (3, 1, 1)
+        assert process["prompt_tokens"]["total"] == 400 and process["cached_tokens"]["total"] == 60
+        assert process["ttft_ms"]["count"] == 2 and process["latency_ms"]["count"] == 3
+        assert session["calls"] == 1 and session["tool_rounds"]["max"] == 2
+        assert session["completion_tokens"]["total"] == 20
+        assert result["sessions"] == 2
+
+        metrics.record_call(0.1, 0.1, session_id="c")
+        assert metrics.get_metrics("a")["session"] is None
+        metrics.drop_session("c")
+        assert metrics.get_metrics()["sessions"] == 1
+
+    @pytest.mark.unit
+    def test_cache_lookups(self):
+        """测试补全缓存的命中/未命中按进程和会话计数，命中耗时单独成为一项指标"""
+        metrics = LLMMetrics()
+        metrics.record_cache(False, 0.01)
+        with metrics.session("a"):
+            metrics.record_cache(True, 0.002)
+            metrics.record_cache(True, 0.004)
+
+        result = metrics.get_metrics("a")
+        process, session = result["process"], result["session"]
+        assert (process["cache_hits"], process["cache_misses"]) == (2, 1)
+        assert (session["cache_hits"], session["cache_misses"]) == (2, 0)
+        assert session["cache_hit_ms"]["count"] == 2 and session["cache_hit_ms"]["max"] == 4
+        # 缓存查找不是API调用
+        assert process["calls"] == 0
+
+        text = metrics.to_prometheus()
+        assert "reading_type_llm_cache_hits_total 2" in text
+        assert "reading_type_llm_cache_misses_total 1" in text
+        assert "reading_type_llm_cache_hit_ms_count 2" in text
+        assert metrics.format_summary()[-1].startswith("   • 补全缓存: 命中 2, 未命中 1")
+
+    @pytest.mark.unit
+    def test_metered_client(self):
+        """测试同步客户端包装记录完整回复、流式回复和失败的调用"""
+        metrics = LLMMetrics()
+        client = MeteredClient(SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()), timeout=5),
+                               metrics)
+        assert client.timeout == 5
+        client.chat.completions.create(model="m", messages=[])
+        with metrics.session("s"):
+            stream = client.chat.completions.create(model="m", messages=[], stream=True)
+        assert "".join(item.choices[0].delta.content for item in stream if item.choices) == "已完成"
+
+        failing = MeteredClient(SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(fail=True))),
+                                metrics)
+        with pytest.raises(ConnectionError):
+            failing.chat.completions.create(model="m", messages=[])
+
+        result = metrics.get_metrics("s")
+        assert (result["process"]["calls"], result["process"]["errors"]) == (3, 1)
+        assert result["process"]["prompt_tokens"]["total"] == 300
+        # 流式调用在流开始时所在的会话中记录
+        assert result["session"]["calls"] == 1 and result["session"]["cached_tokens"]["total"] == 60
+        assert result["session"]["ttft_ms"]["max"] <= result["session"]["latency_ms"]["max"]
+
+    @pytest.mark.unit
+    def test_async_metered_client(self):
+        """测试异步客户端包装"""
+        metrics = LLMMetrics()
+        client = AsyncMeteredClient(SimpleNamespace(chat=SimpleNamespace(completions=AsyncFakeCompletions())),
+                                    metrics)
+
+        async def run():
+            await client.chat.completions.create(model="m", messages=[])
+            with metrics.session("s"):
+                stream = await client.chat.completions.create(model="m", messages=[], stream=True)
+                return [item async for item in stream]
+
+        assert len(asyncio.run(run())) == 4
+        result = metrics.get_metrics("s")
+        assert result["process"]["calls"] == 2 and result["session"]["prompt_tokens"]["total"] == 100
+
+    @pytest.mark.unit
+    def test_formats(self):
+        """测试输出行和Prometheus文本格式"""
+        metrics = LLMMetrics()
+        metrics.record_call(0.1, 0.2, usage())
+        metrics.record_turn(1)
+        assert metrics.format_summary()[0].startswith("📈 大模型调用: 1次")
+        text = metrics.to_prometheus()
+        assert "reading_type_llm_calls_total 1" in text
+        assert 'reading_type_llm_latency_ms{quantile="0.99"} 200.0' in text
+        assert "reading_type_llm_tool_rounds_count 1" in text
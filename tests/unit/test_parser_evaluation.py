@@ -0,0 +1,88 @@
+"""
+语义解析器评估单元测试
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.parser_evaluation import evaluate, format_report, load_samples, score
+from src.semantic_parser import SemanticParser
+from tests import PROJECT_ROOT
+
+FIELD_NAMES = SemanticParser().field_names
+
+
+@pytest.fixture
+def small_library(temp_dir):
+    """编码库的前40条，另加一条无效编码和一条没有文本的编码"""
+    df = pd.read_csv(os.path.join(PROJECT_ROOT, 'reading_type_codes.csv'), encoding='utf-8-sig', dtype=str,
+                     keep_default_na=False).head(40)
+    extra = pd.DataFrame([
+        dict(df.iloc[0], name="无效编码", reading_type_id="1-2-3"),
+        dict(df.iloc[0], name="", description=""),
+    ])
+    path = os.path.join(temp_dir, 'codes.csv')
+    pd.concat([df, extra]).to_csv(path, index=False)
+    return path
+
+
+class TestParserEvaluation:
+    """解析器评估测试类"""
+
+    @pytest.mark.unit
+    def test_load_samples(self, small_library):
+        """测试样本文本和期望字段矩阵"""
+        texts, expected = load_samples(small_library)
+        assert len(texts) == 40 and expected.shape == (40, 16)
+        assert texts[0] == "有功电能，电表有功电能累积量测，单位kWh"
+        assert expected[0].tolist() == [0, 0, 2, 4, 1, 1, 12, 0, 0, 0, 0, 0, 0, 0, 72, 0]
+        assert load_samples(small_library, text="name")[0][0] == "有功电能"
+        with pytest.raises(ValueError):
+            load_samples(small_library, text="id")
+
+    @pytest.mark.unit
+    def test_score(self):
+        """测试字段准确率、完全匹配率和混淆对"""
+        expected = np.zeros((4, 16), dtype=np.int64)
+        expected[:, 5] = [1, 1, 41, 41]
+        expected[:, 6] = 12
+        predicted = expected.copy()
+        predicted[2:, 5] = 1
+        predicted[3, 6] = 37
+
+        result = score(expected, predicted, FIELD_NAMES)
+        assert result["exact_match"] == 0.5
+        assert result["field_accuracy"]["commodity"] == 0.5
+        assert result["field_accuracy"]["measurementKind"] == 0.75
+        assert result["field_accuracy"]["uom"] == 1.0
+        assert result["confusion"]["commodity"]["pairs"] == [[41, 1, 2]]
+        assert result["confusion"]["measurementKind"]["pairs"] == [[12, 37, 1]]
+
+    @pytest.mark.unit
+    def test_parallel_matches_serial(self, small_library):
+        """测试进程池并行评估与单进程评估结果一致"""
+        dictionaries = os.path.join(PROJECT_ROOT, 'field_dictionaries.csv')
+        serial = evaluate(small_library, dictionaries, workers=1)
+        parallel = evaluate(small_library, dictionaries, workers=2, chunk_size=7)
+
+        assert serial["samples"] == parallel["samples"] == 40
+        assert parallel["workers"] == 2
+        for name in ("basic", "enhanced"):
+            for key in ("exact_match", "field_accuracy", "confusion"):
+                assert serial["parsers"][name][key] == parallel["parsers"][name][key]
+            assert parallel["parsers"][name]["throughput"] > 0
+
+        lines = format_report(serial)
+        assert lines[0].startswith("🧪 解析器评估: 40条样本")
+        assert any(line.split() == ["macroPeriod"] + [
+            f"{serial['parsers'][name]['field_accuracy']['macroPeriod']:.1%}" for name in ("basic", "enhanced")]
+            for line in lines)
+
+    @pytest.mark.unit
+    def test_unknown_parser(self, small_library):
+        """测试未知的解析器名称"""
+        with pytest.raises(ValueError):
+            evaluate(small_library, parsers=["llm"], workers=1)
@@ -0,0 +1,56 @@
+"""
+提示前缀缓存单元测试
+"""
+
+import copy
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from prompt_cache import PromptCacheMeter, cached_prompt_tokens, canonical_json, freeze_json
+
+
+class TestPromptCache:
+    """提示前缀缓存测试类"""
+
+    @pytest.mark.unit
+    def test_freeze_is_readonly_and_ordered(self):
+        """测试冻结后不可修改，且序列化与构造顺序无关"""
+        tools = [{"type": "function", "function": {"name": "a", "parameters": {"required": ["x"]}}}]
+        reordered = [{"function": {"parameters": {"required": ["x"]}, "name": "a"}, "type": "function"}]
+        frozen = freeze_json(tools)
+
+        assert json.dumps(frozen) == json.dumps(freeze_json(reordered))
+        assert json.loads(json.dumps(frozen)) == tools
+        assert canonical_json(tools) == canonical_json(reordered)
+        with pytest.raises(TypeError):
+            frozen[0]["type"] = "other"
+        with pytest.raises(TypeError):
+            frozen[0]["function"].update(name="b")
+        assert isinstance(frozen[0]["function"]["parameters"]["required"], tuple)
+        assert copy.deepcopy(frozen) is frozen
+
+    @pytest.mark.unit
+    def test_cached_prompt_tokens(self):
+        """测试兼容DeepSeek与OpenAI两种usage格式"""
+        deepseek = SimpleNamespace(prompt_tokens=1000, prompt_cache_hit_tokens=768)
+        openai = SimpleNamespace(prompt_tokens=500,
+                                 prompt_tokens_details=SimpleNamespace(cached_tokens=256))
+        assert cached_prompt_tokens(deepseek) == (768, 1000)
+        assert cached_prompt_tokens(openai) == (256, 500)
+        assert cached_prompt_tokens(SimpleNamespace(prompt_tokens=10)) == (0, 10)
+        assert cached_prompt_tokens(None) == (0, 0)
+
+    @pytest.mark.unit
+    def test_meter(self):
+        """测试按调用记录命中比例并汇总"""
+        meter = PromptCacheMeter()
+        assert meter.record(None) is None
+        assert meter.record(SimpleNamespace(prompt_tokens=1000, prompt_cache_hit_tokens=0))["ratio"] == 0
+        assert meter.record(SimpleNamespace(prompt_tokens=1000, prompt_cache_hit_tokens=900))["ratio"] == 0.9
+
+        summary = meter.summary()
+        assert summary == {"calls": 2, "prompt_tokens": 2000, "cached_tokens": 900, "ratio": 0.45}
+        lines = meter.format_summary()
+        assert "900/2000" in lines[0] and len(lines) == 3
@@ -0,0 +1,176 @@
+"""
+ReadingTypeID编解码单元测试
+"""
+
+import numpy as np
+import pytest
+
+from reading_type_codec import (
+    KEY_SIZE,
+    build_reading_type_id,
+    canonical_key,
+    decode_batch,
+    encode_batch,
+    from_field_dict,
+    is_valid_reading_type_id,
+    key_to_reading_type_id,
+    normalize_reading_type_id,
+    pack_batch,
+    pack_key,
+    parse_reading_type_id,
+    reading_type_key,
+    to_field_dict,
+    unpack_batch,
+    unpack_key,
+)
+
+
+class TestReadingTypeCodec:
+    """ReadingTypeID编解码测试类"""
+
+    @pytest.mark.unit
+    def test_parse_both_separators(self):
+        """测试'-'和'.'两种分隔符解析结果一致"""
+        expected = (0, 0, 2, 12, 61, 1, 7, 58, 128, 0, 0, 0, 0, 0, 0, 0)
+        assert parse_reading_type_id("0-0-2-12-61-1-7-58-128-0-0-0-0-0-0-0") == expected
+        assert parse_reading_type_id("0.0.2.12.61.1.7.58.128.0.0.0.0.0.0.0") == expected
+
+    @pytest.mark.unit
+    def test_parse_negative_values(self):
+        """测试负数乘数 (含字典中的en-dash写法)"""
+        for text in ("0-0-2-6-1-1-37-0-0-0-0-0-224--3-38-0",
+                     "0-0-2-6-1-1-37-0-0-0-0-0-224-–3-38-0",
+                     "0.0.2.6.1.1.37.0.0.0.0.0.224.-3.38.0"):
+            assert parse_reading_type_id(text)[13] == -3
+
+    @pytest.mark.unit
+    def test_parse_integral_decimal(self):
+        """测试整数值小数视为整数，真正的小数值报错"""
+        assert parse_reading_type_id("0-0-2-12.0-61-1-7-58-128-0-0-0-0-0-0-0")[3] == 12
+        with pytest.raises(ValueError):
+            parse_reading_type_id("0-0-2-12.5-61-1-7-58-128-0-0-0-0-0-0-0")
+
+    @pytest.mark.unit
+    def test_invalid_formats(self):
+        """测试非法格式"""
+        for text in ("", "invalid.format", "0-0-2-4-1", "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-x", None):
+            assert is_valid_reading_type_id(text) is False
+
+    @pytest.mark.unit
+    def test_build_and_field_dict(self):
+        """测试构建、规范化与字段字典互转"""
+        values = parse_reading_type_id("0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0")
+        assert build_reading_type_id(values) == "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0"
+        assert build_reading_type_id(values, '.') == "0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0"
+        assert normalize_reading_type_id("0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0") == \
+            "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0"
+        assert from_field_dict(to_field_dict(values)) == values
+        assert from_field_dict({'field_15': 72}) == (0,) * 14 + (72, 0)
+        with pytest.raises(ValueError):
+            build_reading_type_id(values[:15])
+
+    @pytest.mark.unit
+    def test_batch_roundtrip(self):
+        """测试批量编码与解码互为逆运算"""
+        rng = np.random.default_rng(0)
+        matrix = rng.integers(0, 1000, size=(500, 16))
+        matrix[::7, 13] = -3
+        ids = encode_batch(matrix)
+        assert ids[0] == '-'.join(str(value) for value in matrix[0])
+        decoded, valid = decode_batch(ids)
+        assert valid.all()
+        assert (decoded == matrix).all()
+        assert encode_batch(matrix, '.') == ['.'.join(map(str, row)) for row in matrix.tolist()]
+
+    @pytest.mark.unit
+    def test_batch_mixed_formats(self):
+        """测试批量解码混合格式与非法编码"""
+        ids = ["0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0",
+               "0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0",
+               "0-0-2-4-1",
+               "0--0-2-4-1-1-12-0-0-0-0-0-0-0-72-0"]
+        matrix, valid = decode_batch(ids)
+        assert valid.tolist() == [True, True, False, True]
+        assert (matrix[0] == matrix[1]).all()
+        assert (matrix[2] == 0).all()
+        assert matrix[3, 1] == 0 and matrix[3, 2] == 2
+        assert decode_batch([])[0].shape == (0, 16)
+
+    @pytest.mark.unit
+    def test_batch_signed_dashes(self):
+        """测试批量解码负数字段和多余的'-'，结果与逐个解析一致"""
+        ids = ["-1-0-0-0-0-0-0-0-0-0-0-0-0--3-72-0",
+               "0-0-0-0-0-0-0-0-0-0-0-0-0--24-0--1",
+               "0-0---3-0-0-0-0-0-0-0-0-0-0-0-0",
+               "0-0-0-0-0-0-0-0-0-0-0-0-0-0-0-",
+               "--1-0-0-0-0-0-0-0-0-0-0-0-0-0-0-0"]
+        for batch in (ids[:2], ids):
+            matrix, valid = decode_batch(batch)
+            for rid, row, ok in zip(batch, matrix, valid):
+                assert ok == is_valid_reading_type_id(rid)
+                if ok:
+                    assert tuple(row) == parse_reading_type_id(rid)
+        assert decode_batch(ids[:2])[0][1, 13] == -24
+
+    @pytest.mark.unit
+    def test_batch_separator_spellings(self):
+        """测试批量解码'.'、'–'分隔及同一行混用分隔符，批量编码多字符分隔符，结果与逐个处理一致"""
+        ids = ["0.0.2.6.1.1.37.0.0.0.0.0.224.-3.38.0",
+               "0–0–2–6–1–1–37–0–0–0–0–0–224–-3–38–0",
+               "-1.0.2.6.1.1.37.0.0.0.0.0.224.0.38.0",
+               "0.0-2-6-1-1-37-0-0-0-0-0-224-0-38-0",
+               "0-0-2-6.0-1-1-37-0-0-0-0-0-224-0-38-0",
+               "0.0.2.6.1.1.37.0.0.0.0.0.224.0.38"]
+        for batch in (ids[:3], ids):
+            matrix, valid = decode_batch(batch)
+            for rid, row, ok in zip(batch, matrix, valid):
+                assert ok == is_valid_reading_type_id(rid)
+                if ok:
+                    assert tuple(row) == parse_reading_type_id(rid)
+
+        matrix = decode_batch(ids[:3])[0]
+        for separator in ('–', ', '):
+            assert encode_batch(matrix, separator) == [build_reading_type_id(row, separator) for row in matrix]
+
+
+class TestReadingTypeKey:
+    """紧凑键测试类"""
+
+    @pytest.mark.unit
+    def test_equivalent_spellings_share_key(self):
+        """测试等价写法得到同一个16字节键"""
+        key = reading_type_key("0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0")
+        assert len(key) == KEY_SIZE
+        assert reading_type_key("0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0") == key
+        assert reading_type_key("0-0-2-4.0-1-1-12-0-0-0-0-0-0-0-72-0") == key
+        assert key_to_reading_type_id(key) == "0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0"
+
+    @pytest.mark.unit
+    def test_key_roundtrip_extremes(self):
+        """测试字段取值边界与负乘数的无损往返"""
+        values = (63, 63, 127, 31, 31, 1023, 1023, 63, 1023, 1023, 63, 63, 32767, -32, 1023, 1023)
+        assert unpack_key(pack_key(values)) == values
+        values = (0, 0, 2, 6, 1, 1, 37, 0, 0, 0, 0, 0, 17153, -24, 38, 978)
+        assert unpack_key(pack_key(values)) == values
+
+    @pytest.mark.unit
+    def test_key_out_of_range(self):
+        """测试超出位宽的字段值"""
+        values = (0,) * 9 + (5000,) + (0,) * 6
+        with pytest.raises(ValueError):
+            pack_key(values)
+        assert canonical_key(values) == build_reading_type_id(values)
+
+    @pytest.mark.unit
+    def test_batch_keys(self):
+        """测试批量打包与逐个打包一致，且键的字节序即字段字典序"""
+        rng = np.random.default_rng(1)
+        matrix = rng.integers(0, 32, size=(300, 16))
+        matrix[:, 13] -= 16
+        matrix[0, 12] = 40000
+        keys, packable = pack_batch(matrix)
+        assert keys[0] is None and packable[1:].all()
+        assert keys[1:] == [pack_key(row) for row in matrix[1:]]
+        assert (unpack_batch(keys[1:]) == matrix[1:]).all()
+        order = sorted(range(1, 300), key=lambda i: keys[i])
+        assert order == sorted(range(1, 300), key=lambda i: tuple(matrix[i]))
@@ -182,4 +182,191 @@ class TestReadingTypeDatabase:
         # 应该返回统计信息字典
         assert isinstance(stats, dict)
         assert 'total_records' in stats
-        assert 'categories' in stats 
\ No newline at end of file
+        assert 'categories' in stats 
+
+
+class TestReadingTypeDatabaseAudit:
+    """编码库一致性审计测试"""
+
+    @pytest.fixture
+    def audit_db(self, temp_dir):
+        """包含典型不一致问题的真实数据库实例"""
+        from tests import PROJECT_ROOT
+        from reading_type_database import ReadingTypeDatabase
+
+        rows = [
+            ('有功电能', '电表有功电能，单位kWh', '0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0'),
+            ('储能容量', '储能设备容量，单位Ah', '0-0-0-1-0-41-119-0-0-0-0-0-0-0-72-0'),
+            ('储能充电功率', '储能设备充电功率', '0-0-15-1-1-41-37-0-0-0-0-0-0-0-30-0'),
+            ('通信告警1', '储能设备通信告警', '0-0-15-0-0-41-118-0-0-1-1-0-0-0-0-0'),
+            ('通信告警2', '储能设备通信告警', '0-0-15-0-0-41-118-0-0-2-1-0-0-0-0-0'),
+            ('有功电能副本', '重复编码', '0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0'),
+            ('格式错误', '', '0-0-2-4-1'),
+        ]
+        records = []
+        for i, (name, description, reading_type_id) in enumerate(rows, 1):
+            record = {'id': i, 'name': name, 'description': description,
+                      'reading_type_id': reading_type_id, 'category': '测试'}
+            parts = reading_type_id.split('-')
+            for j in range(16):
+                record[f'field_{j+1}'] = parts[j] if j < len(parts) else 0
+            records.append(record)
+
+        codes_file = os.path.join(temp_dir, 'codes.csv')
+        pd.DataFrame(records).to_csv(codes_file, index=False)
+        return ReadingTypeDatabase(
+            codes_file=codes_file,
+            dictionaries_file=os.path.join(PROJECT_ROOT, 'field_dictionaries.csv'),
+            history_file=os.path.join(temp_dir, 'history.jsonl')
+        )
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_field_matrix_shape(self, audit_db):
+        """测试字段矩阵与合法行标记"""
+        matrix = audit_db.get_field_matrix()
+        assert matrix.shape == (7, 16)
+        assert matrix[0, 14] == 72
+        assert audit_db.get_field_matrix_valid().tolist() == [True] * 6 + [False]
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_audit_report(self, audit_db):
+        """测试审计报告覆盖各类不一致"""
+        report = audit_db.audit()
+
+        assert report['total_codes'] == 7
+        assert [row['id'] for row in report['invalid_ids']] == [7]
+        assert any(row['id'] == 3 for row in report['rule_violations'])
+        assert {'id': 2, 'field': 'uom', 'stored': 72, 'expected': 106}.items() <= \
+            next(row for row in report['name_mismatches'] if row['id'] == 2).items()
+        assert [[row['id'] for row in group] for group in report['duplicate_ids']] == [[1, 6]]
+        assert [[row['id'] for row in group] for group in report['near_duplicates']] == [[4, 5]]
+        assert report['summary']['invalid_ids'] == 1
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_audit_name_analysis(self, audit_db):
+        """测试开启名称分析后，名称的语义分析结果与编码不一致的行也记入 name_mismatches"""
+        assert all(row['source'] == 'unit_cue' for row in audit_db.audit()['name_mismatches'])
+
+        mismatches = audit_db.audit(analyze_names=True)['name_mismatches']
+        assert {'id': 3, 'field': 'uom', 'stored': 30, 'expected': 38, 'source': 'parser'}.items() <= \
+            next(row for row in mismatches if row['id'] == 3 and row['source'] == 'parser').items()
+        # 名称中没有相位关键词的行不比较相位
+        assert not any(row['field'] == 'phase' for row in mismatches)
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_unit_cues(self, audit_db):
+        """测试每行取最靠前的单位线索，说明换行不影响行的对应"""
+        codes = audit_db.reading_type_codes
+        codes[0]['description'] = '电表有功电能\n(kWh)，单位A'
+        codes[2]['description'] = '储能设备\n充电功率'
+        codes[3]['name'] = '通信告警（A）'
+        cues = audit_db._unit_cues(codes).tolist()
+        assert cues[:4] == [72, 106, -1, 5]
+        assert len(cues) == 7
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_audit_tracks_added_codes(self, audit_db):
+        """测试新增编码后字段矩阵失效重建"""
+        success, _ = audit_db.add_code('A相电流', '0-0-0-6-0-1-4-0-0-0-0-0-128-0-5-0', '单位A')
+        assert success
+        assert audit_db.get_field_matrix().shape == (8, 16)
+        assert audit_db.audit()['field_column_mismatches'] == []
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_field_matrix_snapshot_during_adds(self, audit_db):
+        """测试其他线程添加编码时，检索和审计使用的矩阵与合法标记行数一致"""
+        import threading
+        
+        errors = []
+        
+        def add_codes():
+            for i in range(20):
+                audit_db.add_code(f'并发编码{i}', f'0-0-0-6-0-1-4-0-0-0-0-0-128-0-{i + 100}-0', '单位A')
+        
+        def read_codes():
+            try:
+                for _ in range(20):
+                    matrix, valid = audit_db.get_field_matrix_snapshot()
+                    assert len(matrix) == len(valid)
+                    audit_db.nearest_codes('0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0', k=3)
+                    report = audit_db.audit()
+                    assert report['summary']['invalid_ids'] == 1
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=add_codes), threading.Thread(target=read_codes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert audit_db.get_field_matrix_snapshot()[0].shape == (27, 16)
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_add_code_logs_history(self, audit_db):
+        """测试操作历史经共用的记录器以JSONL写入"""
+        import json
+        from history_logger import get_history_logger
+
+        audit_db.add_code('A相电流, 备用', '0-0-0-6-0-1-4-0-0-0-0-0-128-0-5-0', '单位A')
+        assert get_history_logger(audit_db.history_file).flush(timeout=5)
+        with open(audit_db.history_file, encoding='utf-8') as f:
+            record, = [json.loads(line) for line in f]
+        assert record['operation'] == 'add' and record['input'] == '添加编码: A相电流, 备用'
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_lookup_ignores_formatting(self, audit_db):
+        """测试按紧凑键查找与重复检查不受写法影响"""
+        codes = audit_db.get_codes_by_reading_type_id('0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0')
+        assert [code['id'] for code in codes] == [1, 6]
+        success, message = audit_db.add_code('新名称', '0.0.15.1.1.41.37.0.0.0.0.0.0.0.30.0')
+        assert not success and '储能充电功率' in message
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_lookup_by_name(self, audit_db):
+        """测试按名称查找 (不区分大小写)，新增编码后索引更新"""
+        assert [code['id'] for code in audit_db.get_codes_by_name(' 有功电能 ')] == [1]
+        assert audit_db.get_codes_by_name('A相电流') == []
+        audit_db.add_code('A相电流', '0-0-0-6-0-1-4-0-0-0-0-0-128-0-5-0')
+        assert [code['name'] for code in audit_db.get_codes_by_name('a相电流')] == ['A相电流']
+        success, message = audit_db.add_code('a相电流', '0-0-0-6-0-1-4-0-0-0-0-0-64-0-5-0')
+        assert not success and 'A相电流' in message
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_diff_and_union(self, audit_db):
+        """测试编码库差异与合并"""
+        other = [
+            {'name': '有功电能', 'reading_type_id': '0.0.2.4.1.1.12.0.0.0.0.0.0.0.72.0'},
+            {'name': 'A相电压', 'reading_type_id': '0-0-0-6-0-1-54-0-0-0-0-0-128-0-29-0'},
+            {'name': 'A相电压副本', 'reading_type_id': '0-0-0-6-0-1-54-0-0-0-0-0-128-0-29-0'},
+        ]
+        diff = audit_db.diff_library(other)
+        assert [code['name'] for code in diff['added']] == ['A相电压']
+        assert [code['id'] for code in diff['common']] == [1, 6]
+        assert [code['id'] for code in diff['removed']] == [2, 3, 4, 5]
+        assert len(audit_db.union_library(other)) == 8
+
+    @pytest.mark.unit
+    @pytest.mark.database
+    def test_nearest_codes(self, audit_db):
+        """测试加权汉明距离检索相近编码"""
+        nearest = audit_db.nearest_codes('0-0-2-4-1-1-12-0-0-0-0-0-0-0-72-0', k=3)
+        assert [(code['id'], distance) for code, distance in nearest][:2] == [(1, 0.0), (6, 0.0)]
+
+        # 只差货币的编码比只差测量类型的编码更近
+        query = {'field_3': 15, 'field_4': 1, 'field_5': 1, 'field_6': 41, 'field_7': 37,
+                 'field_15': 30, 'field_16': 978}
+        nearest = audit_db.nearest_codes(query, k=2)
+        assert nearest[0][0]['id'] == 3 and nearest[0][1] == 0.5
+        assert audit_db.nearest_codes(query, k=5, max_distance=0.5) == nearest[:1]
+        assert audit_db.nearest_codes(query, k=0) == []
@@ -254,4 +254,42 @@ class TestSemanticParser:
         # 模糊输入在电力上下文中应该偏向电力相关解释
         result = semantic_parser.parse("功率")
         
-        assert result["commodity"] == 1  # 电力商品类型 
\ No newline at end of file
+        assert result["commodity"] == 1  # 电力商品类型 
+
+class TestExtractMeasurementInfo:
+    """量测要素提取测试类 (真实SemanticParser)"""
+
+    @pytest.fixture
+    def parser(self):
+        """语义解析器实例"""
+        from semantic_parser import SemanticParser
+        return SemanticParser()
+
+    @pytest.mark.unit
+    def test_overlapping_keywords(self, parser):
+        """测试重叠关键词都能识别，且按固定顺序输出"""
+        info = parser.extract_measurement_info('A相电能表正向有功功率 15min kWh')
+        assert info == {
+            'device_types': ['电表'],
+            'measurement_kinds': ['有功功率', '电能'],
+            'flow_directions': ['正向'],
+            'phases': ['A相'],
+            'time_periods': ['15分钟', '5分钟'],
+            'units': ['kWh'],
+            'behaviors': [],
+        }
+
+    @pytest.mark.unit
+    def test_unit_word_boundaries(self, parser):
+        """测试单位按单词边界匹配"""
+        assert parser.extract_measurement_info('储能PCS功率 kw')['units'] == ['kWh', 'kW']
+        assert parser.extract_measurement_info('温度 °C')['units'] == ['°C']
+        assert parser.extract_measurement_info('a相电流')['units'] == []
+        assert parser.extract_measurement_info('电流 A')['units'] == ['A']
+
+    @pytest.mark.unit
+    def test_power_modifiers(self, parser):
+        """测试功率按有功/无功细分"""
+        assert parser.extract_measurement_info('无功功率')['measurement_kinds'] == ['无功功率']
+        assert parser.extract_measurement_info('视在功率')['measurement_kinds'] == ['功率']
+        assert parser.extract_measurement_info('有功')['measurement_kinds'] == []
@@ -0,0 +1,107 @@
+"""
+工具调用预取单元测试
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from speculation import SpeculationMeter, ToolPrefetcher, call_key
+from tracing import Tracer
+
+
+class SlowTools:
+    """按名称休眠并记录调用的只读工具"""
+
+    def __init__(self, sleep=0.05):
+        self.sleep = sleep
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def run(self, name, args):
+        with self.lock:
+            self.calls.append((name, args))
+        time.sleep(self.sleep)
+        return f"{name}:{args.get('name')}"
+
+    def handle_function_call(self, function_call):
+        return "fallback:" + self.run(function_call["name"], json.loads(function_call["arguments"]))
+
+
+def function_call(tool_name, **args):
+    return {"name": tool_name, "arguments": json.dumps(args, ensure_ascii=False)}
+
+
+class TestToolPrefetcher:
+    """工具预取测试类"""
+
+    @pytest.mark.unit
+    def test_call_key_normalizes_arguments(self):
+        """测试参数顺序和首尾空白不影响匹配"""
+        assert call_key("search", {"name": " 电压 ", "limit": 5}) == call_key("search", {"limit": 5, "name": "电压"})
+        assert call_key("search", {"name": "电压"}) != call_key("generate", {"name": "电压"})
+
+    @pytest.mark.unit
+    def test_hit_uses_prefetched_result(self):
+        """测试参数一致时使用预取结果，工具只执行一次且不需要等待完整耗时"""
+        tools, meter = SlowTools(), SpeculationMeter()
+        prefetcher = ToolPrefetcher(tools.run, tools.handle_function_call,
+                                    [("search_reading_type", {"name": "有功电能"})], meter=meter)
+        time.sleep(0.06)  # 模拟等待第一次请求返回
+
+        start = time.perf_counter()
+        content = prefetcher.handle_function_call(function_call("search_reading_type", name="有功电能 "))
+        assert time.perf_counter() - start < 0.03
+        assert content == "search_reading_type:有功电能"
+        assert len(tools.calls) == 1
+
+        stats = prefetcher.finish()
+        assert (stats["predictions"], stats["hits"], stats["wasted"]) == (1, 1, 0)
+        assert stats["saved_seconds"] > 0.03
+        assert meter.summary()["hit_ratio"] == 1.0
+
+    @pytest.mark.unit
+    def test_hit_recorded_in_trace(self):
+        """测试开启追踪时命中预取也记录工具span，并标记 prefetched"""
+        tools, tracer = SlowTools(sleep=0), Tracer(enabled=True)
+        prefetcher = ToolPrefetcher(tools.run, tools.handle_function_call,
+                                    [("search_reading_type", {"name": "有功电能"})], tracer=tracer)
+        prefetcher.handle_function_call(function_call("search_reading_type", name="有功电能"))
+        prefetcher.finish()
+
+        spans = tracer.spans()
+        assert [span["name"] for span in spans] == ["tool.search_reading_type"]
+        assert spans[0]["attributes"]["prefetched"] is True
+        assert spans[0]["attributes"]["result_bytes"] > 0
+        assert tracer.summary()["tool.search_reading_type"]["count"] == 1
+
+    @pytest.mark.unit
+    def test_miss_falls_back_and_counts_waste(self):
+        """测试参数不一致时按原流程执行，未使用的预取计入浪费"""
+        tools, meter = SlowTools(sleep=0.01), SpeculationMeter()
+        prefetcher = ToolPrefetcher(tools.run, tools.handle_function_call,
+                                    [("search_reading_type", {"name": "有功"})], meter=meter)
+
+        content = prefetcher.handle_function_call(function_call("search_reading_type", name="有功电能"))
+        assert content == "fallback:search_reading_type:有功电能"
+
+        stats = prefetcher.finish()
+        assert (stats["hits"], stats["wasted"]) == (0, 1)
+        time.sleep(0.02)
+        summary = meter.summary()
+        assert summary["wasted"] == 1 and 0 < summary["wasted_seconds"] < 0.05
+        assert "命中 0/1" in meter.format_summary()[0]
+
+    @pytest.mark.unit
+    def test_failed_prefetch_falls_back(self):
+        """测试预取出错时重新执行原工具调用"""
+        def broken(name, args):
+            raise RuntimeError("数据文件不可用")
+
+        tools = SlowTools(sleep=0)
+        prefetcher = ToolPrefetcher(broken, tools.handle_function_call, [("search_reading_type", {"name": "电压"})])
+        assert prefetcher.handle_function_call(function_call("search_reading_type", name="电压")) == \
+            "fallback:search_reading_type:电压"
+        assert prefetcher.finish()["hits"] == 0
@@ -0,0 +1,82 @@
+"""
+结构化工具结果单元测试
+"""
+
+import json
+
+import pytest
+
+from tool_result import ToolResult, ToolResultMeter, result_content, result_text, tabulate
+
+
+def render_codes(data):
+    return "\n".join(f"📋 {code['name']}: {code['reading_type_id']}" for code in data["codes"])
+
+
+CODES = {"total": 2, "codes": [{"name": "A相电压", "reading_type_id": "0-0-0-6"},
+                               {"name": "B相电压", "reading_type_id": "0-0-0-7"}]}
+
+
+class TestToolResult:
+    """工具结果序列化测试类"""
+
+    @pytest.mark.unit
+    def test_tabulate_records(self):
+        """测试记录列表转为表格，单条记录和普通列表不变"""
+        table = tabulate(CODES)
+        assert table["codes"] == {"columns": ["name", "reading_type_id"],
+                                  "rows": [["A相电压", "0-0-0-6"], ["B相电压", "0-0-0-7"]]}
+        assert tabulate({"codes": [{"name": "A"}], "tags": ["x", "y"]}) == {"codes": [{"name": "A"}], "tags": ["x", "y"]}
+        # 键不一致的记录缺失处补null
+        assert tabulate([{"a": 1}, {"b": 2}]) == {"columns": ["a", "b"], "rows": [[1, None], [None, 2]]}
+
+    @pytest.mark.unit
+    def test_model_and_text_forms(self):
+        """测试大模型收到紧凑JSON，用户看到渲染文本"""
+        result = ToolResult(CODES, render_codes)
+        model = result.to_model()
+
+        assert " " not in model.replace("A相电压", "").replace("B相电压", "")
+        assert json.loads(model)["codes"]["rows"][1] == ["B相电压", "0-0-0-7"]
+        assert str(result) == result.to_text() == "📋 A相电压: 0-0-0-6\n📋 B相电压: 0-0-0-7"
+        assert len(model) < len(json.dumps(CODES, ensure_ascii=False))
+
+    @pytest.mark.unit
+    def test_compact_projection_and_error(self):
+        """测试发送给大模型的数据可去掉冗余字段，错误结果渲染为错误提示"""
+        result = ToolResult(CODES, render_codes, lambda data: {"names": [code["name"] for code in data["codes"]]})
+        assert json.loads(result.to_model()) == {"names": ["A相电压", "B相电压"]}
+        assert "A相电压" in result.to_text()
+
+        error = ToolResult.error("请提供要搜索的量测名称")
+        assert error.to_text() == "❌ 请提供要搜索的量测名称"
+        assert json.loads(error.to_model()) == {"error": "请提供要搜索的量测名称"}
+
+    @pytest.mark.unit
+    def test_meter_and_helpers(self):
+        """测试按工具统计节省的token，字符串结果原样传递"""
+        meter = ToolResultMeter()
+        result = ToolResult(CODES, lambda data: render_codes(data) + "\n💡 可以查看下一页或指定页码" * 3)
+
+        assert result_content(result, meter=meter, name="view_codes_library") == result.to_model()
+        assert result_content(result, compact=False) == result.to_text()
+        assert result_content("纯文本", meter=meter, name="legacy") == result_text("纯文本") == "纯文本"
+
+        summary = meter.summary()
+        assert list(summary) == ["view_codes_library"]
+        stats = summary["view_codes_library"]
+        assert stats["calls"] == 1 and stats["saved"] > 0 and 0 < stats["ratio"] < 1
+        assert meter.format_summary()[1].startswith("   • view_codes_library: 1次")
+
+        # 关闭时不统计，也不渲染文本
+        meter.enabled = False
+        rendered = []
+        lazy = ToolResult(CODES, lambda data: rendered.append(1) or render_codes(data))
+        result_content(lazy, meter=meter, name="view_codes_library")
+        assert rendered == [] and meter.summary()["view_codes_library"]["calls"] == 1
+
+    @pytest.mark.unit
+    def test_nan_rejected(self):
+        """测试NaN不会以非法JSON发给大模型"""
+        with pytest.raises(ValueError):
+            ToolResult({"value": float("nan")}, str).to_model()
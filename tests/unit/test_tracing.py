@@ -0,0 +1,176 @@
+"""
+调用追踪单元测试
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from tracing import NOOP_SPAN, AsyncTracedClient, Histogram, TracedClient, Tracer, payload_size, tool_error
+
+
+def function_call(tool_name, **args):
+    return {"name": tool_name, "arguments": json.dumps(args, ensure_ascii=False)}
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))],
+                           usage=None)
+
+
+class FakeCompletions:
+    """流式请求返回两段后中断的补全接口"""
+
+    def create(self, **params):
+        if not params.get("stream"):
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="完成", tool_calls=None))],
+                                   usage=None)
+
+        def stream():
+            yield chunk("已")
+            yield chunk("完成")
+            raise ConnectionError("连接中断")
+        return stream()
+
+
+class AsyncFakeCompletions:
+    async def create(self, **params):
+        async def stream():
+            yield chunk("已完成")
+        return stream()
+
+
+class TestTracer:
+    """调用追踪测试类"""
+
+    @pytest.mark.unit
+    def test_disabled_records_nothing(self):
+        """测试关闭时返回空span，工具照常执行且不记录"""
+        tracer = Tracer()
+        assert tracer.span("tool.x") is NOOP_SPAN
+        with tracer.span("tool.x") as span:
+            span.set(result_bytes=1)
+        assert tracer.spans() == [] and tracer.summary() == {}
+        assert "未开启" in tracer.format_summary()[0]
+
+    @pytest.mark.unit
+    def test_tool_call_span(self):
+        """测试工具调用记录参数、结果大小和结果"""
+        tracer = Tracer(enabled=True)
+        assert tracer.trace_tool_call(lambda call: "结果", function_call("search", name="电压")) == "结果"
+        tracer.trace_tool_call(lambda call: "❌ 请提供要搜索的量测名称\n详情", function_call("search"))
+        tracer.trace_tool_call(lambda call: '{"error":"未知字段"}', function_call("query"))
+        with pytest.raises(ValueError):
+            tracer.trace_tool_call(lambda call: int("x"), function_call("query"))
+
+        ok, failed, compact_error, raised = tracer.spans()
+        assert ok['name'] == "tool.search" and ok['status'] == "ok"
+        assert ok['attributes']['args_bytes'] == len('{"name": "电压"}'.encode("utf-8"))
+        assert ok['attributes']['result_bytes'] == 6
+        assert failed['error'] == "❌ 请提供要搜索的量测名称"
+        assert compact_error['error'] == "未知字段"
+        assert raised['status'] == "error" and raised['error'].startswith("ValueError")
+
+        summary = tracer.summary()
+        assert summary['tool.search']['count'] == 2 and summary['tool.search']['errors'] == 1
+        assert summary['tool.query']['errors'] == 2
+
+    @pytest.mark.unit
+    def test_histogram_quantiles(self):
+        """测试直方图分位数估计"""
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(float(value))
+        assert histogram.count == 100 and histogram.min == 1 and histogram.max == 100
+        assert 40 <= histogram.quantile(0.5) <= 60
+        assert 90 <= histogram.quantile(0.95) <= 100
+        assert sum(histogram.counts) == 100
+        assert Histogram().quantile(0.5) == 0.0
+
+    @pytest.mark.unit
+    def test_max_spans_keeps_histogram(self):
+        """测试明细只保留最近的span，直方图累计全部"""
+        tracer = Tracer(enabled=True, max_spans=3)
+        for _ in range(5):
+            with tracer.span("chat.completions"):
+                pass
+        assert len(tracer.spans()) == 3
+        assert tracer.summary()['chat.completions']['count'] == 5
+        tracer.clear()
+        assert tracer.summary() == {}
+
+    @pytest.mark.unit
+    def test_otlp_export(self, temp_dir):
+        """测试OTLP/JSON格式"""
+        tracer = Tracer(enabled=True, service_name="test")
+        with tracer.span("tool.search", tool="search", args_bytes=10, cached=False):
+            pass
+        with pytest.raises(RuntimeError):
+            with tracer.span("chat.completions", 3):
+                raise RuntimeError("超时")
+
+        request = tracer.to_otlp()
+        resource = request['resourceSpans'][0]
+        assert resource['resource']['attributes'] == [{"key": "service.name", "value": {"stringValue": "test"}}]
+        tool, api = resource['scopeSpans'][0]['spans']
+        assert len(tool['traceId']) == 32 and len(tool['spanId']) == 16
+        assert int(tool['endTimeUnixNano']) >= int(tool['startTimeUnixNano'])
+        assert {"key": "args_bytes", "value": {"intValue": "10"}} in tool['attributes']
+        assert {"key": "cached", "value": {"boolValue": False}} in tool['attributes']
+        assert tool['status'] == {"code": 1}
+        assert api['kind'] == 3 and api['status'] == {"code": 2, "message": "RuntimeError: 超时"}
+
+        metrics = tracer.metrics_to_otlp()['resourceMetrics'][0]['scopeMetrics'][0]['metrics'][0]
+        points = metrics['histogram']['dataPoints']
+        assert [point['count'] for point in points] == ["1", "1"]
+        assert len(points[0]['bucketCounts']) == len(points[0]['explicitBounds']) + 1
+
+        path = f"{temp_dir}/traces.otlp.json"
+        assert tracer.export(path, "otlp") == 2
+        with open(path, encoding="utf-8") as f:
+            assert json.loads(f.readline()) == request
+        with pytest.raises(ValueError):
+            tracer.export(path, "xml")
+
+    @pytest.mark.unit
+    def test_helpers(self):
+        """测试大小与错误判断"""
+        assert payload_size(None) == 0
+        assert payload_size("电压") == 6
+        assert payload_size(b"abc") == 3
+        assert payload_size({"a": 1}) == len('{"a": 1}')
+        assert tool_error("✅ 找到") is None
+        assert tool_error(None) is None
+        assert tool_error("错误: 未知的函数 'x'") == "错误: 未知的函数 'x'"
+
+    @pytest.mark.unit
+    def test_traced_client(self):
+        """测试客户端包装记录完整回复和中断的流，追踪关闭时直接转发"""
+        tracer = Tracer(enabled=True)
+        client = TracedClient(SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions()), timeout=5), tracer)
+        assert client.timeout == 5
+        client.chat.completions.create(model="m", messages=[])
+        with pytest.raises(ConnectionError):
+            list(client.chat.completions.create(model="m", messages=[], stream=True))
+
+        complete, interrupted = tracer.spans()
+        assert complete['status'] == "ok" and complete['attributes']['result_bytes'] == 6
+        assert interrupted['status'] == "error" and interrupted['error'].startswith("ConnectionError")
+        assert interrupted['attributes']['result_bytes'] == 9
+
+        disabled = Tracer()
+        client = TracedClient(SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions())), disabled)
+        client.chat.completions.create(model="m", messages=[])
+        assert disabled.spans() == []
+
+    @pytest.mark.unit
+    @pytest.mark.asyncio
+    async def test_async_traced_client(self):
+        """测试异步客户端包装在流结束时结束span"""
+        tracer = Tracer(enabled=True)
+        client = AsyncTracedClient(SimpleNamespace(chat=SimpleNamespace(completions=AsyncFakeCompletions())), tracer)
+        stream = await client.chat.completions.create(model="m", messages=[], stream=True)
+        assert [item.choices[0].delta.content async for item in stream] == ["已完成"]
+        span, = tracer.spans()
+        assert span['name'] == "chat.completions" and span['attributes']['result_bytes'] == 9